@@ -25,13 +25,152 @@ def create_app(config_name=None):
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     
+    # Connection pooling profile of this process (web, bot or cli)
+    from core.database import detect_process_role, engine_options, pgbouncer_enabled
+    app.config['PROCESS_ROLE'] = detect_process_role()
+    app.config['DB_PGBOUNCER'] = pgbouncer_enabled()
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(
+        app.config['PROCESS_ROLE'], app.config['SQLALCHEMY_DATABASE_URI']
+    )
+    
     # Telegram configuration
     app.config['TELEGRAM_BOT_TOKEN'] = os.getenv('TELEGRAM_BOT_TOKEN')
+    # Username of the bot for the notification link of the account page (services/telegram_link.py)
+    app.config['TELEGRAM_BOT_USERNAME'] = os.getenv('TELEGRAM_BOT_USERNAME')
+    app.config['TELEGRAM_LINK_MAX_AGE_SECONDS'] = int(os.getenv('TELEGRAM_LINK_MAX_AGE_SECONDS', 86400))
     app.config['TELEGRAM_API_ID'] = os.getenv('TELEGRAM_API_ID')
     app.config['TELEGRAM_API_HASH'] = os.getenv('TELEGRAM_API_HASH')
     app.config['TELEGRAM_SESSION_NAME'] = os.getenv('TELEGRAM_SESSION_NAME', 'telegram_bot')
+    app.config['TELEGRAM_SESSION_DIR'] = os.getenv('TELEGRAM_SESSION_DIR')
     app.config['TELEGRAM_WEBHOOK_URL'] = os.getenv('TELEGRAM_WEBHOOK_URL')
     
+    # Bot API client: server URLs (e.g. a local or fake Bot API server), per-method rates, retries
+    app.config['TELEGRAM_API_BASE_URL'] = os.getenv('TELEGRAM_API_BASE_URL')
+    app.config['TELEGRAM_API_BASE_FILE_URL'] = os.getenv('TELEGRAM_API_BASE_FILE_URL')
+    app.config['TELEGRAM_API_RATE_LIMITS'] = os.getenv('TELEGRAM_API_RATE_LIMITS', '')
+    app.config['TELEGRAM_API_MAX_RETRIES'] = int(os.getenv('TELEGRAM_API_MAX_RETRIES', 3))
+    app.config['TELEGRAM_API_MAX_RETRY_AFTER'] = float(os.getenv('TELEGRAM_API_MAX_RETRY_AFTER', 60))
+    
+    # Live feed (Server-Sent Events) configuration
+    app.config['REDIS_URL'] = os.getenv('REDIS_URL')
+    app.config['LIVE_FEED_HEARTBEAT'] = int(os.getenv('LIVE_FEED_HEARTBEAT', 15))
+    app.config['LIVE_FEED_MAX_STREAM_SECONDS'] = int(os.getenv('LIVE_FEED_MAX_STREAM_SECONDS', 300))
+    
+    # Performance instrumentation
+    app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    app.config['SERVER_TIMING_ENABLED'] = os.getenv('SERVER_TIMING_ENABLED', 'true').lower() == 'true'
+    # The bot has no web server: it serves its metrics on this port (0 disables)
+    app.config['BOT_METRICS_PORT'] = int(os.getenv('BOT_METRICS_PORT', 9101))
+    app.config['BOT_METRICS_ADDR'] = os.getenv('BOT_METRICS_ADDR', '127.0.0.1')
+    
+    # Read replicas (comma separated URLs) for GET requests of main and api
+    app.config['DATABASE_REPLICA_URLS'] = os.getenv('DATABASE_REPLICA_URLS')
+    app.config['REPLICA_HEALTH_CHECK_SECONDS'] = int(os.getenv('REPLICA_HEALTH_CHECK_SECONDS', 10))
+    app.config['REPLICA_MAX_LAG_SECONDS'] = float(os.getenv('REPLICA_MAX_LAG_SECONDS', 30))
+    app.config['READ_YOUR_WRITES_SECONDS'] = int(os.getenv('READ_YOUR_WRITES_SECONDS', 10))
+    
+    # Posts partitioning (Postgres): future partitions, retention and listing bound
+    app.config['POSTS_PARTITION_PREMAKE_MONTHS'] = int(os.getenv('POSTS_PARTITION_PREMAKE_MONTHS', 3))
+    app.config['POSTS_RETENTION_MONTHS'] = int(os.getenv('POSTS_RETENTION_MONTHS', 0))
+    app.config['POSTS_RETENTION_ACTION'] = os.getenv('POSTS_RETENTION_ACTION', 'detach')
+    app.config['POSTS_LISTING_MAX_AGE_DAYS'] = int(os.getenv('POSTS_LISTING_MAX_AGE_DAYS', 0))
+    
+    # Cold archive of old posts (flask archive run)
+    app.config['ARCHIVE_DIR'] = os.getenv('ARCHIVE_DIR')
+    app.config['ARCHIVE_AFTER_DAYS'] = int(os.getenv('ARCHIVE_AFTER_DAYS', 365))
+    app.config['ARCHIVE_COMPRESSION'] = os.getenv('ARCHIVE_COMPRESSION', 'zstd')
+    # Decoded segments kept in memory per process for paging
+    app.config['ARCHIVE_CACHE_SEGMENTS'] = int(os.getenv('ARCHIVE_CACHE_SEGMENTS', 16))
+    
+    # Slow-query log
+    app.config['SLOW_QUERY_ENABLED'] = os.getenv('SLOW_QUERY_ENABLED', 'true').lower() == 'true'
+    app.config['SLOW_QUERY_THRESHOLD_MS'] = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 200))
+    app.config['SLOW_QUERY_EXPLAIN_SAMPLE_RATE'] = float(os.getenv('SLOW_QUERY_EXPLAIN_SAMPLE_RATE', 0.1))
+    # Parameters can contain user data, record them only when asked to
+    app.config['SLOW_QUERY_LOG_PARAMETERS'] = os.getenv('SLOW_QUERY_LOG_PARAMETERS', 'false').lower() == 'true'
+    app.config['SLOW_QUERY_BUFFER_SIZE'] = int(os.getenv('SLOW_QUERY_BUFFER_SIZE', 200))
+    # Shared by all processes; rotate it externally (logrotate)
+    app.config['SLOW_QUERY_LOG_FILE'] = os.getenv('SLOW_QUERY_LOG_FILE', 'logs/slow_queries.log')
+    
+    # Ingest latency telemetry
+    app.config['INGEST_STATS_WINDOW_SECONDS'] = int(os.getenv('INGEST_STATS_WINDOW_SECONDS', 300))
+    app.config['INGEST_STATS_FLUSH_SECONDS'] = int(os.getenv('INGEST_STATS_FLUSH_SECONDS', 60))
+    app.config['INGEST_STATS_RETENTION_DAYS'] = int(os.getenv('INGEST_STATS_RETENTION_DAYS', 7))
+    app.config['INGEST_LAG_ALERT_SECONDS'] = float(os.getenv('INGEST_LAG_ALERT_SECONDS', 60))
+    
+    # Subscription notification digests (sent by the bot process)
+    app.config['NOTIFY_ENABLED'] = os.getenv('NOTIFY_ENABLED', 'true').lower() == 'true'
+    app.config['NOTIFY_TRANSPORTS'] = os.getenv('NOTIFY_TRANSPORTS', 'telegram,email')
+    app.config['NOTIFY_DIGEST_INTERVAL_SECONDS'] = int(os.getenv('NOTIFY_DIGEST_INTERVAL_SECONDS', 300))
+    app.config['NOTIFY_DIGEST_MAX_POSTS'] = int(os.getenv('NOTIFY_DIGEST_MAX_POSTS', 10))
+    app.config['NOTIFY_RATE_PER_SECOND'] = float(os.getenv('NOTIFY_RATE_PER_SECOND', 20))
+    app.config['NOTIFY_FILE_PATH'] = os.getenv('NOTIFY_FILE_PATH', 'logs/notifications.jsonl')
+    app.config['SMTP_HOST'] = os.getenv('SMTP_HOST')
+    app.config['SMTP_PORT'] = int(os.getenv('SMTP_PORT', 587))
+    app.config['SMTP_USERNAME'] = os.getenv('SMTP_USERNAME')
+    app.config['SMTP_PASSWORD'] = os.getenv('SMTP_PASSWORD')
+    app.config['SMTP_FROM'] = os.getenv('SMTP_FROM')
+    app.config['SMTP_STARTTLS'] = os.getenv('SMTP_STARTTLS', 'true').lower() == 'true'
+    
+    # Saved-search alerts matched at ingest
+    app.config['SAVED_SEARCH_ALERTS_ENABLED'] = os.getenv('SAVED_SEARCH_ALERTS_ENABLED', 'true').lower() == 'true'
+    app.config['SAVED_SEARCH_REFRESH_SECONDS'] = int(os.getenv('SAVED_SEARCH_REFRESH_SECONDS', 30))
+    
+    # In-memory facet counts for the listing sidebar (per web process)
+    app.config['FACET_INDEX_ENABLED'] = os.getenv('FACET_INDEX_ENABLED', 'true').lower() == 'true'
+    app.config['FACET_REFRESH_SECONDS'] = int(os.getenv('FACET_REFRESH_SECONDS', 5))
+    app.config['FACET_REBUILD_SECONDS'] = int(os.getenv('FACET_REBUILD_SECONDS', 600))
+    
+    # Subscription timelines ("my feed"), fanned out on write by the bot
+    app.config['TIMELINE_ENABLED'] = os.getenv('TIMELINE_ENABLED', 'true').lower() == 'true'
+    app.config['TIMELINE_MAX_ENTRIES'] = int(os.getenv('TIMELINE_MAX_ENTRIES', 800))
+    app.config['TIMELINE_FANOUT_LIMIT'] = int(os.getenv('TIMELINE_FANOUT_LIMIT', 10000))
+    
+    # Background feed deletion jobs
+    app.config['FEED_DELETE_BATCH_SIZE'] = int(os.getenv('FEED_DELETE_BATCH_SIZE', 1000))
+    app.config['FEED_DELETE_STALE_SECONDS'] = int(os.getenv('FEED_DELETE_STALE_SECONDS', 120))
+    app.config['FEED_DELETE_PAUSE_SECONDS'] = float(os.getenv('FEED_DELETE_PAUSE_SECONDS', 0.05))
+    
+    # Periodic channel health checks (bot process)
+    app.config['CHANNEL_HEALTH_ENABLED'] = os.getenv('CHANNEL_HEALTH_ENABLED', 'true').lower() == 'true'
+    app.config['CHANNEL_HEALTH_INTERVAL_SECONDS'] = int(os.getenv('CHANNEL_HEALTH_INTERVAL_SECONDS', 3600))
+    app.config['CHANNEL_HEALTH_JITTER_SECONDS'] = int(os.getenv('CHANNEL_HEALTH_JITTER_SECONDS', 60))
+    app.config['CHANNEL_HEALTH_CONCURRENCY'] = int(os.getenv('CHANNEL_HEALTH_CONCURRENCY', 10))
+    app.config['CHANNEL_HEALTH_TIMEOUT_SECONDS'] = float(os.getenv('CHANNEL_HEALTH_TIMEOUT_SECONDS', 10))
+    
+    # Single active bot poller: standby bot processes wait for the poller lock
+    app.config['BOT_LEADER_ENABLED'] = os.getenv('BOT_LEADER_ENABLED', 'true').lower() == 'true'
+    app.config['BOT_LEADER_HEARTBEAT_SECONDS'] = int(os.getenv('BOT_LEADER_HEARTBEAT_SECONDS', 5))
+    app.config['BOT_LEADER_RETRY_SECONDS'] = float(os.getenv('BOT_LEADER_RETRY_SECONDS', 2))
+    app.config['BOT_LEADER_DATABASE_URL'] = os.getenv('BOT_LEADER_DATABASE_URL')
+    app.config['BOT_LEADER_LOCK_FILE'] = os.getenv('BOT_LEADER_LOCK_FILE', '/tmp/telegram_feed_bot.lock')
+    
+    # Durable ingest journal: the bot appends updates to local files, a task saves them to the DB
+    app.config['INGEST_JOURNAL_ENABLED'] = os.getenv('INGEST_JOURNAL_ENABLED', 'true').lower() == 'true'
+    app.config['INGEST_JOURNAL_DIR'] = os.getenv('INGEST_JOURNAL_DIR')
+    app.config['INGEST_JOURNAL_SEGMENT_BYTES'] = int(os.getenv('INGEST_JOURNAL_SEGMENT_BYTES', 16 * 1024 * 1024))
+    app.config['INGEST_JOURNAL_FSYNC_BATCH'] = int(os.getenv('INGEST_JOURNAL_FSYNC_BATCH', 100))
+    app.config['INGEST_JOURNAL_FSYNC_MS'] = float(os.getenv('INGEST_JOURNAL_FSYNC_MS', 50))
+    app.config['INGEST_JOURNAL_CHECKPOINT_SECONDS'] = float(os.getenv('INGEST_JOURNAL_CHECKPOINT_SECONDS', 1))
+    
+    # Channel history import over MTProto (flask telegram sync, and new channels in the bot)
+    app.config['HISTORY_BACKFILL_CONCURRENCY'] = int(os.getenv('HISTORY_BACKFILL_CONCURRENCY', 4))
+    app.config['HISTORY_BACKFILL_REQUESTS_PER_SECOND'] = float(os.getenv('HISTORY_BACKFILL_REQUESTS_PER_SECOND', 1))
+    app.config['HISTORY_BACKFILL_BATCH_SIZE'] = int(os.getenv('HISTORY_BACKFILL_BATCH_SIZE', 100))
+    app.config['HISTORY_BACKFILL_LIMIT'] = int(os.getenv('HISTORY_BACKFILL_LIMIT', 1000))
+    app.config['HISTORY_BACKFILL_MAX_FLOOD_WAIT'] = int(os.getenv('HISTORY_BACKFILL_MAX_FLOOD_WAIT', 300))
+    app.config['HISTORY_BACKFILL_ON_CHANNEL_ADDED'] = os.getenv('HISTORY_BACKFILL_ON_CHANNEL_ADDED', 'true').lower() == 'true'
+    
+    # Periodic jobs, run by the one process holding the scheduler leader lock
+    app.config['SCHEDULER_ENABLED'] = os.getenv('SCHEDULER_ENABLED', 'true').lower() == 'true'
+    app.config['SCHEDULER_PROCESS_ROLES'] = os.getenv('SCHEDULER_PROCESS_ROLES', 'web,bot')
+    app.config['SCHEDULER_LEADER_CHECK_SECONDS'] = int(os.getenv('SCHEDULER_LEADER_CHECK_SECONDS', 15))
+    app.config['SCHEDULER_LOCK_DATABASE_URL'] = os.getenv('SCHEDULER_LOCK_DATABASE_URL')
+    app.config['SCHEDULER_LOCK_FILE'] = os.getenv('SCHEDULER_LOCK_FILE', '/tmp/telegram_feed_scheduler.lock')
+    app.config['DELTA_SYNC_RETENTION_DAYS'] = int(os.getenv('DELTA_SYNC_RETENTION_DAYS', 30))
+    # Delta sync cursors stay behind changes younger than this, for transactions still committing
+    app.config['DELTA_SYNC_SETTLE_SECONDS'] = int(os.getenv('DELTA_SYNC_SETTLE_SECONDS', 10))
+    
     # Add custom Jinja2 filters
     @app.template_filter('clean_text')
     def clean_text_filter(text):
@@ -75,6 +214,10 @@ def create_app(config_name=None):
         
         print("Step 3: Initializing database...")
         db.init_app(app)
+        from core import database
+        database.init_app(app, db)
+        from core.replicas import replica_router
+        replica_router.init_app(app)
         
         print("Step 4: Initializing Flask-Migrate...")
         migrate = Migrate(app, db)
@@ -82,12 +225,22 @@ def create_app(config_name=None):
         print("Step 5: Importing blueprints...")
         from routes.main import main_bp
         from routes.api import api_bp
+        from routes.admin import admin_bp
+        from routes.auth import auth_bp
+        from routes.account import account_bp
         
         print("Step 6: Registering blueprints...")
+        from core.extensions import login_manager
+        login_manager.init_app(app)
         app.register_blueprint(main_bp)
         app.register_blueprint(api_bp, url_prefix='/api')
+        app.register_blueprint(auth_bp)
+        app.register_blueprint(account_bp)
+        # Admin users only (routes/admin.py), create one with: flask users create --admin
+        app.register_blueprint(admin_bp, url_prefix='/admin')
         
         print("Step 7: Creating database tables...")
+        # Missing tables only; columns added to existing tables need: flask schema upgrade
         with app.app_context():
             db.create_all()
             
@@ -96,8 +249,58 @@ def create_app(config_name=None):
         cli.init_app(app)
         
         print("Step 9: Initializing Telegram bot...")
+        from services.telegram_client import api_limits
+        api_limits.init_app(app)
+        
         from services.telegram_bot import telegram_bot
         telegram_bot.init_app(app)
+        
+        from services.ingest_telemetry import ingest_telemetry
+        ingest_telemetry.init_app(app)
+        
+        from services.notifications import notification_dispatcher
+        notification_dispatcher.init_app(app)
+        
+        from services.search_alerts import saved_search_matcher
+        saved_search_matcher.init_app(app)
+        
+        from services.facet_index import facet_index
+        facet_index.init_app(app)
+        
+        from services.timeline import timeline
+        timeline.init_app(app)
+        
+        from services.channel_health import channel_health
+        channel_health.init_app(app)
+        
+        from services.bot_leader import bot_leader
+        bot_leader.init_app(app)
+        
+        from services.ingest_journal import ingest_journal
+        ingest_journal.init_app(app)
+        
+        from services.history_backfill import history_backfill
+        history_backfill.init_app(app)
+        
+        from services import post_pipeline
+        post_pipeline.init_app(app)
+        
+        print("Step 10: Initializing live feed...")
+        from services.live_feed import live_feed
+        live_feed.init_app(app)
+        
+        print("Step 11: Installing performance instrumentation...")
+        from core import instrumentation
+        instrumentation.init_app(app)
+        
+        print("Step 12: Installing slow-query log...")
+        from core.slow_query import slow_query_log
+        slow_query_log.init_app(app)
+        
+        print("Step 13: Registering scheduled jobs...")
+        # Started by the Gunicorn workers and the bot, not on import
+        from services.scheduler import scheduler
+        scheduler.init_app(app)
             
         print("✅ Full application loaded successfully!")
         return app
@@ -0,0 +1,30 @@
+"""
+Benchmarks for Telegram Feed Website.
+
+Every benchmark prints a JSON document to stdout; application start-up
+messages are redirected to stderr so the output can be piped or saved.
+"""
+import contextlib
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def create_bench_app(database_url):
+    """
+    Create the Flask application against a benchmark database.
+
+    Args:
+        database_url (str): SQLAlchemy URL, e.g. ``sqlite:///bench.db``
+
+    Returns:
+        tuple: (app, db)
+    """
+    os.environ['DATABASE_URL'] = database_url
+    with contextlib.redirect_stdout(sys.stderr):
+        from app import app
+        from core.extensions import db
+    return app, db
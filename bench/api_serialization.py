@@ -0,0 +1,79 @@
+"""
+Micro-benchmark: ORM ``Post.to_dict`` + ``jsonify`` versus the lean
+column-projected serializer used by ``/api/posts``.
+
+Usage:
+    python -m bench.api_serialization --posts 2000 --per-page 100
+"""
+import argparse
+import json
+import os
+import tempfile
+import timeit
+
+from bench import create_bench_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--per-page', type=int, default=100)
+    parser.add_argument('--number', type=int, default=50)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app, db = create_bench_app(f'sqlite:///{db_path}')
+
+    from flask import jsonify
+    from bench.seed import seed_database
+    from models import Post
+    from services import post_serializer
+
+    with app.app_context():
+        seed_database(db, feeds=5, posts=args.posts)
+
+    def orm_path():
+        with app.test_request_context('/api/posts'):
+            posts = Post.query.order_by(Post.telegram_date.desc()).limit(args.per_page).all()
+            jsonify({'posts': [post.to_dict() for post in posts]}).get_data()
+            db.session.remove()
+
+    def lean_path():
+        with app.test_request_context('/api/posts'):
+            posts = post_serializer.select_posts(
+                post_serializer.DEFAULT_FIELDS,
+                order_by=Post.telegram_date.desc(),
+                limit=args.per_page
+            )
+            post_serializer.json_response({'posts': posts}).get_data()
+            db.session.remove()
+
+    def lean_projected_path():
+        with app.test_request_context('/api/posts'):
+            posts = post_serializer.select_posts(
+                ('id', 'feed_id', 'telegram_date', 'has_contacts'),
+                order_by=Post.telegram_date.desc(),
+                limit=args.per_page
+            )
+            post_serializer.json_response({'posts': posts}).get_data()
+            db.session.remove()
+
+    results = {}
+    for name, func in (('orm_to_dict', orm_path),
+                       ('lean_default_fields', lean_path),
+                       ('lean_projected_fields', lean_projected_path)):
+        func()  # warm up
+        seconds = min(timeit.repeat(func, number=args.number, repeat=3)) / args.number
+        results[name] = round(seconds * 1000, 3)
+
+    print(json.dumps({
+        'benchmark': 'api_serialization',
+        'per_page': args.per_page,
+        'json_backend': 'orjson' if post_serializer.orjson else 'json',
+        'ms_per_request': results,
+        'speedup_default_fields': round(results['orm_to_dict'] / results['lean_default_fields'], 2),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Micro-benchmark: sidebar facet counts from the in-memory bitmap index
+versus one COUNT query per feed, category and city.
+
+Usage:
+    python -m bench.facet_counts --posts 50000 --feeds 20
+"""
+import argparse
+import json
+import os
+import tempfile
+import timeit
+
+from bench import create_bench_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--posts', type=int, default=50000)
+    parser.add_argument('--feeds', type=int, default=20)
+    parser.add_argument('--number', type=int, default=20)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app, db = create_bench_app(f'sqlite:///{db_path}')
+
+    from bench.seed import seed_database
+    from models import Category, Feed, Post
+    from services.facet_index import facet_index
+    from services.vacancy_extractor import backfill
+
+    filters = {'city': 'Москва', 'salary_from': 50000, 'hide_duplicates': True}
+
+    with app.app_context():
+        seed_database(db, feeds=args.feeds, posts=args.posts)
+        backfill(log=lambda message: None)
+        rebuild_seconds = min(timeit.repeat(facet_index.rebuild, number=1, repeat=3))
+        bitmaps = facet_index.bitmaps
+        feeds = Feed.query.all()
+        categories = Category.query.all()
+        cities = list(bitmaps.cities)
+
+        def count_queries():
+            base = Post.query.filter(*Post.vacancy_criteria(salary_from=filters['salary_from'])).filter(
+                (Post.is_primary_duplicate == True) | (Post.duplicate_group_id.is_(None))
+            )
+            scoped = base.filter(Post.city == filters['city'])
+            scoped.count()
+            for feed in feeds:
+                scoped.filter(Post.feed_id == feed.id).count()
+            for category in categories:
+                scoped.filter(Post.feed_id.in_([f.id for f in feeds if f.category_id == category.id])).count()
+            for city in cities:
+                base.filter(Post.city == city).count()
+
+        def bitmap_uncached():
+            bitmaps._cache.clear()
+            bitmaps.counts(**filters)
+
+        def bitmap_cached():
+            bitmaps.counts(**filters)
+
+        results = {}
+        for name, func in (('count_queries', count_queries),
+                           ('bitmap_uncached', bitmap_uncached),
+                           ('bitmap_cached', bitmap_cached)):
+            func()  # warm up
+            seconds = min(timeit.repeat(func, number=args.number, repeat=3)) / args.number
+            results[name] = round(seconds * 1_000_000, 1)
+
+        changed = [post_id for post_id, in db.session.query(Post.id).order_by(Post.id.desc()).limit(100)]
+        rows = list(facet_index._rows(Post.id.in_(changed)))
+        apply_seconds = min(timeit.repeat(lambda: bitmaps.apply(changed, rows), number=10, repeat=3)) / 10
+
+    print(json.dumps({
+        'benchmark': 'facet_counts',
+        'posts': args.posts,
+        'facets': len(feeds) + len(categories) + len(cities),
+        'bitmap_bytes': sum(
+            (bitmap.bit_length() + 7) // 8
+            for group in (bitmaps.feeds, bitmaps.categories, bitmaps.cities, bitmaps.salaries)
+            for bitmap in group.values()
+        ),
+        'rebuild_ms': round(rebuild_seconds * 1000, 1),
+        'us_per_sidebar': results,
+        'speedup_uncached': round(results['count_queries'] / results['bitmap_uncached'], 1),
+        'apply_100_changes_ms': round(apply_seconds * 1000, 3),
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
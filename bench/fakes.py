@@ -0,0 +1,189 @@
+"""
+Offline stand-ins for the Telegram Bot API and MTProto history used by benchmarks.
+"""
+import asyncio
+import random
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from telegram import Chat, Message, PhotoSize, Update
+from telegram.ext import ExtBot
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+
+
+class FakeBot:
+    """Replaces ``telegram.Bot`` in benchmarks: answers instantly (or after ``latency``)"""
+
+    def __init__(self, latency=0.0, bot_id=1):
+        self.latency = latency
+        self.id = bot_id
+        self.username = 'bench_bot'
+        self.calls = Counter()
+
+    async def _call(self, method):
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def get_file(self, file_id):
+        await self._call('get_file')
+        return SimpleNamespace(file_id=file_id, file_path=f'https://api.telegram.org/file/botTOKEN/photos/{file_id}.jpg')
+
+    async def get_chat_member(self, chat_id, user_id):
+        await self._call('get_chat_member')
+        return SimpleNamespace(status='administrator')
+
+    async def get_chat(self, chat_id):
+        await self._call('get_chat')
+        return SimpleNamespace(id=int(chat_id), title=f'Channel {chat_id}', username=None,
+                               description='', type='channel')
+
+    async def get_me(self):
+        await self._call('get_me')
+        return SimpleNamespace(id=self.id, first_name='Bench', username=self.username)
+
+
+class OfflineBot(ExtBot):
+    """
+    Real ``ExtBot`` (usable by a PTB ``Application``) that answers the Bot API
+    locally: getMe and getFile succeed after ``latency`` seconds, any other
+    method raises, so nothing ever reaches Telegram.
+    """
+
+    def __init__(self, token='123456:bench', latency=0.0):
+        super().__init__(token)
+        with self._unfrozen():
+            self.latency = latency
+            self.calls = Counter()
+
+    async def _do_post(self, endpoint, data, **kwargs):
+        self.calls[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if endpoint == 'getMe':
+            return BOT_USER
+        if endpoint == 'getFile':
+            file_id = data['file_id']
+            return {'file_id': file_id, 'file_unique_id': f'u-{file_id}', 'file_path': f'photos/{file_id}.jpg'}
+        raise RuntimeError(f'OfflineBot does not answer {endpoint}')
+
+
+def make_channel_update(update_id, chat_id, message_id, text, date=None, edited=False,
+                        photo=False, title='Bench channel'):
+    """
+    Build a ``channel_post`` (or ``edited_channel_post``) Update.
+
+    Args:
+        update_id (int): Update id
+        chat_id (int): Channel id, e.g. -1001000000000
+        message_id (int): Message id inside the channel
+        text (str): Message text, used as caption for photos
+        date (datetime): Message date, defaults to now
+        edited (bool): Build an edited_channel_post
+        photo (bool): Attach a photo so media resolution runs
+        title (str): Channel title
+
+    Returns:
+        telegram.Update: The update
+    """
+    now = datetime.now(timezone.utc)
+    chat = Chat(id=chat_id, type=Chat.CHANNEL, title=title)
+    kwargs = {'caption': text} if photo else {'text': text}
+    if photo:
+        kwargs['photo'] = (PhotoSize(f'photo-{chat_id}-{message_id}', f'u-{message_id}', 1280, 720),)
+    message = Message(
+        message_id=message_id,
+        date=date or now,
+        chat=chat,
+        edit_date=now if edited else None,
+        **kwargs
+    )
+    if edited:
+        return Update(update_id=update_id, edited_channel_post=message)
+    return Update(update_id=update_id, channel_post=message)
+
+
+def make_member_update(update_id, chat_id, added=True, title='Bench channel', date=None):
+    """
+    Build a ``my_chat_member`` Update: the bot promoted to (or removed from)
+    administrator of a channel.
+
+    Returns:
+        dict: The update as Bot API JSON, like ``Update.to_dict()``
+    """
+    timestamp = int((date or datetime.now(timezone.utc)).timestamp())
+    administrator = {
+        'status': 'administrator', 'user': BOT_USER, 'can_be_edited': False, 'is_anonymous': False,
+        'can_manage_chat': True, 'can_delete_messages': True, 'can_manage_video_chats': True,
+        'can_restrict_members': True, 'can_promote_members': False, 'can_change_info': True,
+        'can_invite_users': True, 'can_post_messages': True,
+    }
+    left = {'status': 'left', 'user': BOT_USER}
+    return {
+        'update_id': update_id,
+        'my_chat_member': {
+            'chat': {'id': chat_id, 'type': 'channel', 'title': title},
+            'from': {'id': 777, 'is_bot': False, 'first_name': 'Owner'},
+            'date': timestamp,
+            'old_chat_member': left if added else administrator,
+            'new_chat_member': administrator if added else left,
+        },
+    }
+
+
+class FakeHistoryClient:
+    """
+    Stands in for the MTProto history client (services/history_backfill.py).
+
+    Channel ``channel_id`` has ``channels[channel_id]`` messages with ids
+    1..N, one per ``spacing`` of time up to now. Every ``flood_every``-th
+    request raises FloodWait(``flood_seconds``) instead of answering.
+    """
+
+    def __init__(self, channels, latency=0.0, flood_every=0, flood_seconds=1, seed=42):
+        self.channels = {str(channel_id): count for channel_id, count in channels.items()}
+        self.latency = latency
+        self.flood_every = flood_every
+        self.flood_seconds = flood_seconds
+        self.seed = seed
+        self.requests = 0
+        self.request_times = []
+        self.started = False
+
+    async def start(self):
+        self.started = True
+
+    async def stop(self):
+        self.started = False
+
+    def message(self, channel_id, message_id, now=None):
+        from bench.seed import generate_post_text
+        from services.history_backfill import HistoryMessage
+
+        rng = random.Random(f'{self.seed}:{channel_id}:{message_id}')
+        count = self.channels[str(channel_id)]
+        now = now or datetime.now(timezone.utc).replace(second=0, microsecond=0)
+        return HistoryMessage(
+            message_id=message_id,
+            date=now - timedelta(minutes=30 * (count - message_id)),
+            text=generate_post_text(rng, message_id),
+            media_type='photo' if message_id % 7 == 0 else None,
+            views=rng.randrange(1000),
+            edit_date=None,
+        )
+
+    async def get_history(self, channel_id, offset_id=0, limit=100):
+        from services.history_backfill import FloodWait
+
+        self.requests += 1
+        self.request_times.append(asyncio.get_running_loop().time())
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.flood_every and self.requests % self.flood_every == 0:
+            raise FloodWait(self.flood_seconds)
+        count = self.channels[str(channel_id)]
+        top = min(count, offset_id - 1) if offset_id else count
+        now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+        return [self.message(channel_id, message_id, now) for message_id in range(top, max(0, top - limit), -1)]
@@ -0,0 +1,119 @@
+"""
+Benchmark: concurrent history import with a fake MTProto client.
+
+Creates --channels feeds with --messages messages each, imports them with
+HistoryBackfill through FakeHistoryClient (--latency per request, a flood
+wait every --flood-every requests) and reports posts per second, requests
+and the highest request rate seen in any one second, which must stay within
+--rate. With --interrupt-after the first run is cancelled after that many
+seconds and a second run resumes it; the report checks that every message
+was imported exactly once.
+
+Usage:
+    python -m bench.history_backfill --database-url sqlite:////tmp/history.db --channels 20 --messages 500
+    python -m bench.history_backfill --channels 10 --messages 300 --rate 20 --interrupt-after 2
+"""
+import argparse
+import asyncio
+import json
+from time import perf_counter
+
+from bench import create_bench_app
+
+
+def peak_rate(times):
+    """Most requests started within any one-second window"""
+    peak, start = 0, 0
+    for end, moment in enumerate(times):
+        while moment - times[start] >= 1:
+            start += 1
+        peak = max(peak, end - start + 1)
+    return peak
+
+
+async def run(app, args):
+    from bench.fakes import FakeHistoryClient
+    from core.extensions import db
+    from models import Feed, Post
+    from services.history_backfill import history_backfill
+
+    with app.app_context():
+        channels = {}
+        for n in range(args.channels):
+            channel_id = str(-1007000000000 - n)
+            feed = Feed.query.filter_by(telegram_channel_id=channel_id).first()
+            if feed is None:
+                feed = Feed(name=f'History channel {n}', url=f'https://t.me/c/{n}',
+                            telegram_channel_id=channel_id, is_active=True)
+                db.session.add(feed)
+                db.session.flush()
+            channels[channel_id] = args.messages
+        db.session.commit()
+        feed_ids = [feed.id for feed in Feed.query.filter(Feed.telegram_channel_id.in_(channels))]
+        posts_before = Post.query.filter(Post.feed_id.in_(feed_ids)).count()
+
+    history_backfill.concurrency = args.concurrency
+    history_backfill.limits.rates = {'default': args.rate}
+    history_backfill.limits._buckets.clear()
+    client = FakeHistoryClient(channels, latency=args.latency_ms / 1000,
+                               flood_every=args.flood_every, flood_seconds=args.flood_seconds)
+
+    started = perf_counter()
+    runs = []
+    if args.interrupt_after:
+        try:
+            await asyncio.wait_for(history_backfill.run(feed_ids, args.limit, client), args.interrupt_after)
+            runs.append('completed')
+        except asyncio.TimeoutError:
+            runs.append('interrupted')
+    results = await history_backfill.run(feed_ids, args.limit, client)
+    runs.append('completed')
+    seconds = perf_counter() - started
+
+    with app.app_context():
+        posts = Post.query.filter(Post.feed_id.in_(feed_ids)).count() - posts_before
+        duplicates = db.session.query(Post.feed_id, Post.telegram_message_id).filter(
+            Post.feed_id.in_(feed_ids)
+        ).group_by(Post.feed_id, Post.telegram_message_id).having(db.func.count() > 1).count()
+
+    return {
+        'runs': runs,
+        'seconds': round(seconds, 3),
+        'posts_imported': posts,
+        'posts_imported_last_run': sum(results.values()),
+        'posts_per_second': round(posts / seconds, 1),
+        'duplicates': duplicates,
+        'requests': client.requests,
+        'peak_requests_per_second': peak_rate(client.request_times),
+        'flood_waits': client.requests // args.flood_every if args.flood_every else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--database-url', default='sqlite:///bench.db')
+    parser.add_argument('--channels', type=int, default=20)
+    parser.add_argument('--messages', type=int, default=500, help='Messages per channel')
+    parser.add_argument('--limit', type=int, default=100000, help='Older messages per feed per run')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=50, help='History requests per second, all feeds')
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--flood-every', type=int, default=0)
+    parser.add_argument('--flood-seconds', type=int, default=1)
+    parser.add_argument('--interrupt-after', type=float, default=0)
+    args = parser.parse_args()
+
+    app, db = create_bench_app(args.database_url)
+    report = asyncio.run(run(app, args))
+    print(json.dumps({
+        'benchmark': 'history_backfill',
+        'channels': args.channels,
+        'messages_per_channel': args.messages,
+        'concurrency': args.concurrency,
+        'rate_limit': args.rate,
+        **report,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,318 @@
+"""
+Benchmark: ingest throughput of the real update handlers, without Telegram.
+
+Updates are fed to a PTB ``Application`` carrying the bot's own handlers
+(``TelegramBot.add_handlers``), with ``OfflineBot`` answering getMe and
+getFile locally. They come from a file, with one Update JSON per line; an
+ingest journal segment also works. Or they are generated: new text and
+photo posts, edits of earlier posts, and ``my_chat_member`` updates adding
+the bot to new channels.
+
+Updates are sent at --rate per second (0: as fast as possible), one at a
+time like the poller does. Latency runs from the moment an update was due
+to the moment it was saved; with --journal that is when the applier saved
+it, not when it was journaled. The report has messages per second, latency
+percentiles and SQL statements per update.
+
+With --baseline the run is compared with a previous report and the process
+exits with status 1 when throughput, p99 latency or statements per update
+got worse by more than --tolerance.
+
+Usage:
+    python -m bench.ingest_replay --database-url sqlite:///bench.db --updates 2000
+    python -m bench.ingest_replay --updates 2000 --record updates.jsonl
+    python -m bench.ingest_replay --input updates.jsonl --rate 200 --journal
+    python -m bench.ingest_replay --input updates.jsonl --output after.json --baseline before.json
+
+Note: the replay inserts posts (and feeds for unknown channels) into the database.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from time import perf_counter
+
+from bench import create_bench_app
+
+# Gated metrics and the direction that is better
+GATES = {
+    'messages_per_second': 'higher',
+    'latency_ms.p99': 'lower',
+    'db_statements_per_update': 'lower',
+}
+
+
+def parse_mix(value):
+    """Parse 'text=70,photo=15,edit=10,member=5' into weights"""
+    mix = {}
+    for item in value.split(','):
+        kind, _, weight = item.partition('=')
+        mix[kind.strip()] = float(weight)
+    return mix
+
+
+def update_kind(data):
+    if 'my_chat_member' in data:
+        return 'member'
+    if 'edited_channel_post' in data:
+        return 'edit'
+    message = data.get('channel_post') or {}
+    return 'photo' if message.get('photo') else 'text'
+
+
+def generate_updates(count, channels, mix, seed=42):
+    """
+    Generate a workload as Update JSON.
+
+    Edits rewrite a random earlier post of the same channel, member updates
+    add the bot to a new channel which then receives posts too.
+    """
+    from bench.fakes import make_channel_update, make_member_update
+    from bench.seed import generate_post_text
+
+    rng = random.Random(seed)
+    kinds, weights = zip(*mix.items())
+    base_message_id = int(time.time())
+    chat_ids = [-1006000000000 - n for n in range(channels)]
+    sent = {}
+    updates = []
+    for update_id in range(1, count + 1):
+        kind = rng.choices(kinds, weights)[0]
+        if kind == 'member':
+            chat_id = chat_ids[-1] - 1
+            chat_ids.append(chat_id)
+            updates.append(make_member_update(update_id, chat_id, title=f'Bench channel {chat_id}'))
+            continue
+
+        chat_id = rng.choice(chat_ids)
+        title = f'Bench channel {chat_id}'
+        if kind == 'edit' and sent.get(chat_id):
+            message_id, date = rng.choice(sent[chat_id])
+            update = make_channel_update(update_id, chat_id, message_id, generate_post_text(rng, message_id),
+                                         date=date, edited=True, title=title)
+        else:
+            message_id = base_message_id + update_id
+            date = datetime.now(timezone.utc).replace(microsecond=0)
+            update = make_channel_update(update_id, chat_id, message_id, generate_post_text(rng, message_id),
+                                         date=date, photo=kind == 'photo', title=title)
+            sent.setdefault(chat_id, []).append((message_id, date))
+        updates.append(update.to_dict())
+    return updates
+
+
+def read_updates(path):
+    """Update JSON lines, or ingest journal lines ('<crc32> <json>')"""
+    from services.ingest_journal import decode_record
+
+    updates = []
+    with open(path, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            data = json.loads(line) if line.startswith(b'{') else decode_record(line)
+            if data is not None:
+                updates.append(data)
+    return updates
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+
+    def at(q):
+        return round(samples[min(len(samples) - 1, int(len(samples) * q))], 3)
+
+    return {'p50': at(0.5), 'p90': at(0.9), 'p99': at(0.99), 'max': round(samples[-1], 3)}
+
+
+class ErrorCounter(logging.Handler):
+    """Counts errors logged by the services (handlers log and swallow them)"""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+async def replay(app, updates, rate, journal_dir, api_latency):
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from telegram import Update
+    from telegram.ext import Application
+
+    from bench.fakes import OfflineBot
+    from models import Post
+    from core.extensions import db
+    from services.ingest_journal import ingest_journal
+    from services.telegram_bot import telegram_bot
+    from services.telegram_client import ApiLimits, TelegramClient
+
+    bot = OfflineBot(latency=api_latency)
+    application = Application.builder().bot(bot).updater(None).build()
+    telegram_bot.app = app
+    telegram_bot.bot = bot
+    # No client-side rate limits: the benchmark measures ingest, not the Bot API budget
+    limits = ApiLimits()
+    limits.rates = {'default': 0}
+    telegram_bot.client = TelegramClient(bot, limits)
+    telegram_bot.add_handlers(application)
+    await application.initialize()
+
+    with app.app_context():
+        posts_before = db.session.query(db.func.count(Post.id)).scalar()
+
+    due = {}
+    latencies = []
+    statements = Counter()
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements['total'] += 1
+
+    async def apply(data):
+        await telegram_bot.apply_journaled(data)
+        scheduled = due.pop(data['update_id'], None)
+        if scheduled is not None:
+            latencies.append((perf_counter() - scheduled) * 1000)
+
+    if journal_dir is not None:
+        app.config.update(INGEST_JOURNAL_ENABLED=True, INGEST_JOURNAL_DIR=journal_dir)
+        ingest_journal.init_app(app)
+        ingest_journal.open()
+        ingest_journal.start(apply)
+
+    errors = ErrorCounter()
+    logging.getLogger('services').addHandler(errors)
+    event.listen(Engine, 'before_cursor_execute', count_statement)
+    started = perf_counter()
+    try:
+        for n, data in enumerate(updates):
+            scheduled = started + n / rate if rate else perf_counter()
+            delay = scheduled - perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            due[data['update_id']] = scheduled
+            await application.process_update(Update.de_json(data, bot))
+            if not (ingest_journal.is_open and update_kind(data) != 'member'):
+                latencies.append((perf_counter() - due.pop(data['update_id'])) * 1000)
+        if ingest_journal.is_open:
+            while ingest_journal.backlog:
+                await asyncio.sleep(0.01)
+        seconds = perf_counter() - started
+    finally:
+        event.remove(Engine, 'before_cursor_execute', count_statement)
+        logging.getLogger('services').removeHandler(errors)
+        await ingest_journal.close()
+        await application.shutdown()
+
+    with app.app_context():
+        posts_after = db.session.query(db.func.count(Post.id)).scalar()
+
+    return {
+        'seconds': round(seconds, 3),
+        'messages_per_second': round(len(updates) / seconds, 1),
+        'latency_ms': percentiles(latencies),
+        'db_statements': statements['total'],
+        'db_statements_per_update': round(statements['total'] / len(updates), 2),
+        'posts_inserted': posts_after - posts_before,
+        'handler_errors': errors.count,
+        'api_calls': dict(bot.calls),
+    }
+
+
+def lookup(document, key):
+    for part in key.split('.'):
+        document = (document or {}).get(part)
+    return document
+
+
+def compare(report, baseline, tolerance):
+    """Compare gated metrics with a previous report; returns (comparison, regressions)."""
+    comparison, regressions = {}, []
+    for key, better in GATES.items():
+        before, after = lookup(baseline, key), lookup(report, key)
+        if not before or after is None:
+            continue
+        ratio = after / before
+        comparison[key] = {'baseline': before, 'value': after, 'ratio': round(ratio, 3)}
+        if (ratio < 1 - tolerance) if better == 'higher' else (ratio > 1 + tolerance):
+            regressions.append(key)
+    return comparison, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--database-url', default='sqlite:///bench.db')
+    parser.add_argument('--input', help='Update JSON lines (or an ingest journal segment) to replay')
+    parser.add_argument('--updates', type=int, default=1000, help='Updates to generate without --input')
+    parser.add_argument('--channels', type=int, default=20)
+    parser.add_argument('--mix', default='text=70,photo=15,edit=10,member=5')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--record', help='Write the generated updates to this file and continue')
+    parser.add_argument('--rate', type=float, default=0, help='Updates per second, 0 for as fast as possible')
+    parser.add_argument('--api-latency-ms', type=float, default=0, help='Latency of the fake getFile')
+    parser.add_argument('--journal', nargs='?', const='', metavar='DIR',
+                        help='Go through the ingest journal (in DIR, or a temporary directory)')
+    parser.add_argument('--output', help='Also write the JSON result to this file')
+    parser.add_argument('--baseline', help='Report of a previous run; exit 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative regression')
+    args = parser.parse_args()
+
+    if args.input:
+        updates = read_updates(args.input)
+    else:
+        updates = generate_updates(args.updates, args.channels, parse_mix(args.mix), args.seed)
+        if args.record:
+            with open(args.record, 'w', encoding='utf-8') as f:
+                for data in updates:
+                    f.write(json.dumps(data, ensure_ascii=False) + '\n')
+    if not updates:
+        parser.error('no updates to replay')
+
+    journal_dir = args.journal
+    if journal_dir == '':
+        journal_dir = tempfile.mkdtemp(prefix='ingest-journal-')
+
+    app, db = create_bench_app(args.database_url)
+    with app.app_context():
+        backend = db.engine.url.get_backend_name()
+
+    report = asyncio.run(replay(app, updates, args.rate, journal_dir, args.api_latency_ms / 1000))
+    document = {
+        'benchmark': 'ingest_replay',
+        'timestamp': datetime.utcnow().isoformat(),
+        'database': backend,
+        'source': args.input or 'generated',
+        'updates': len(updates),
+        'by_type': dict(Counter(update_kind(data) for data in updates)),
+        'rate': args.rate or 'max',
+        'journal': journal_dir is not None,
+        **report,
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            document['comparison'], regressions = compare(document, json.load(f), args.tolerance)
+        document['regressions'] = regressions
+
+    output = json.dumps(document, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    print(output)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+"""
+End-to-end benchmark runner.
+
+Runs listing pages, the posts API, search, the ``format_post_text`` filter,
+contact extraction and ``handle_channel_message`` against a seeded database
+and prints one JSON document, so runs can be saved and compared.
+
+Usage:
+    python -m bench.seed --database-url sqlite:///bench.db --posts 1000000
+    python -m bench.run --database-url sqlite:///bench.db --output before.json
+    python -m bench.run --database-url sqlite:///bench.db --compare before.json
+
+Note: the ingest benchmarks insert posts into the benchmark database.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from bench import ROOT, create_bench_app
+
+BENCHMARKS = {}
+
+
+def benchmark(name, iterations=None):
+    """Register a benchmark; the function receives a context and runs one iteration."""
+    def decorator(func):
+        BENCHMARKS[name] = (func, iterations)
+        return func
+    return decorator
+
+
+def measure(func, iterations, warmup=2):
+    """
+    Time ``iterations`` calls of ``func`` after ``warmup`` calls.
+
+    Returns:
+        dict: Timing statistics in milliseconds
+    """
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+
+    samples.sort()
+    return {
+        'iterations': iterations,
+        'min_ms': round(samples[0], 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'max_ms': round(samples[-1], 3),
+    }
+
+
+class Context:
+    """State shared by benchmarks: app, test client and sample data"""
+
+    def __init__(self, app, db):
+        from models import Category, Post
+
+        self.app = app
+        self.db = db
+        self.client = app.test_client()
+        self.loop = asyncio.new_event_loop()
+        self.update_id = 0
+        self.message_id = int(time.time())
+
+        with app.app_context():
+            self.post_count = db.session.query(db.func.count(Post.id)).scalar()
+            self.category_id = db.session.query(db.func.min(Category.id)).scalar()
+            self.samples = db.session.execute(
+                db.select(Post.content).order_by(Post.id.desc()).limit(200)
+            ).scalars().all()
+
+    def get(self, url):
+        response = self.client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f'GET {url} returned {response.status_code}')
+        return response
+
+
+@benchmark('index_page')
+def bench_index_page(ctx):
+    ctx.get('/')
+
+
+@benchmark('index_page_category')
+def bench_index_page_category(ctx):
+    ctx.get(f'/?category_id={ctx.category_id}')
+
+
+@benchmark('index_page_deep')
+def bench_index_page_deep(ctx):
+    ctx.get('/?page=200')
+
+
+@benchmark('api_posts')
+def bench_api_posts(ctx):
+    ctx.get('/api/posts?per_page=100')
+
+
+@benchmark('api_posts_search')
+def bench_api_posts_search(ctx):
+    ctx.get('/api/posts?search=%D0%B2%D0%BE%D0%B4%D0%B8%D1%82%D0%B5%D0%BB%D1%8C&per_page=20')
+
+
+@benchmark('format_post_text_x200', iterations=20)
+def bench_format_post_text(ctx):
+    format_post_text = ctx.app.jinja_env.filters['format_post_text']
+    for content in ctx.samples:
+        format_post_text(content)
+
+
+@benchmark('extract_contacts_x200', iterations=20)
+def bench_extract_contacts(ctx):
+    from services.telegram_bot import extract_contacts_from_text
+    for content in ctx.samples:
+        extract_contacts_from_text(content)
+
+
+def _handle(ctx, update):
+    from services.telegram_bot import telegram_bot
+    ctx.loop.run_until_complete(telegram_bot.handle_channel_message(update, None))
+
+
+@benchmark('ingest_new_message')
+def bench_ingest_new_message(ctx):
+    from bench.fakes import make_channel_update
+    ctx.update_id += 1
+    ctx.message_id += 1
+    _handle(ctx, make_channel_update(
+        ctx.update_id, -1009999999999, ctx.message_id,
+        ctx.samples[ctx.update_id % len(ctx.samples)] if ctx.samples else 'Требуется водитель'
+    ))
+
+
+@benchmark('ingest_new_photo_message')
+def bench_ingest_new_photo_message(ctx):
+    from bench.fakes import make_channel_update
+    ctx.update_id += 1
+    ctx.message_id += 1
+    _handle(ctx, make_channel_update(
+        ctx.update_id, -1009999999999, ctx.message_id, 'Требуется кладовщик, +7 900 123-45-67', photo=True
+    ))
+
+
+@benchmark('ingest_edited_message')
+def bench_ingest_edited_message(ctx):
+    from bench.fakes import make_channel_update
+    ctx.update_id += 1
+    _handle(ctx, make_channel_update(
+        ctx.update_id, -1009999999999, ctx.message_id, f'Отредактировано #{ctx.update_id}', edited=True
+    ))
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """Compare medians against a previous run; ratio > 1 means slower."""
+    comparison = {}
+    previous = baseline.get('benchmarks', {})
+    for name, stats in results.items():
+        before = previous.get(name, {}).get('median_ms')
+        if before and 'median_ms' in stats:
+            comparison[name] = {
+                'baseline_median_ms': before,
+                'median_ms': stats['median_ms'],
+                'ratio': round(stats['median_ms'] / before, 3),
+            }
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run end-to-end benchmarks.')
+    parser.add_argument('--database-url', default='sqlite:///bench.db')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--only', help='Comma separated benchmark names')
+    parser.add_argument('--seed-posts', type=int, default=0,
+                        help='Seed this many posts first if the database is empty')
+    parser.add_argument('--output', help='Also write the JSON result to this file')
+    parser.add_argument('--compare', help='JSON result of a previous run to compare with')
+    parser.add_argument('--list', action='store_true', help='List benchmark names and exit')
+    args = parser.parse_args()
+
+    if args.list:
+        print('\n'.join(BENCHMARKS))
+        return
+
+    app, db = create_bench_app(args.database_url)
+
+    from services.telegram_bot import telegram_bot
+    from services.telegram_client import TelegramClient
+    from bench.fakes import FakeBot
+    telegram_bot.app = app
+    telegram_bot.bot = FakeBot()
+    # Media lookups go through the client, as in the bot
+    telegram_bot.client = TelegramClient(telegram_bot.bot)
+
+    with app.app_context():
+        from models import Post
+        if args.seed_posts and not db.session.query(Post.id).first():
+            from bench.seed import seed_database
+            seed_database(db, posts=args.seed_posts, log=lambda m: print(m, file=sys.stderr))
+        backend = db.engine.url.get_backend_name()
+
+    ctx = Context(app, db)
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+
+    results = {}
+    for name in names:
+        func, iterations = BENCHMARKS[name]
+        print(f'Running {name}...', file=sys.stderr)
+        try:
+            results[name] = measure(lambda: func(ctx), iterations or args.iterations)
+        except Exception as e:
+            results[name] = {'error': str(e)}
+
+    document = {
+        'timestamp': datetime.utcnow().isoformat(),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'database': backend,
+        'posts': ctx.post_count,
+        'benchmarks': results,
+    }
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            document['comparison'] = compare(results, json.load(f))
+
+    output = json.dumps(document, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
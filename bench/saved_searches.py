@@ -0,0 +1,118 @@
+"""
+Micro-benchmark: saved-search matching with one Aho-Corasick automaton
+versus one regex per saved search.
+
+The naive matcher is timed on a sample of the searches and extrapolated,
+since running 100k regexes per post would take minutes.
+
+Usage:
+    python -m bench.saved_searches --searches 100000 --posts 500
+"""
+import argparse
+import json
+import random
+import re
+import statistics
+import time
+
+from bench.seed import CITIES, PERKS, PROFESSIONS, SCHEDULES, generate_post_text
+from services.search_alerts import SearchIndex, normalize_text
+from models.saved_search import SavedSearch
+
+
+def generate_terms(rng, search_id):
+    """One to three terms: a profession stem, often a city or perk, sometimes a rare word."""
+    profession = SavedSearch.normalize_term(rng.choice(PROFESSIONS))
+    terms = [profession.split()[0][:max(4, len(profession.split()[0]) - 2)]]
+    if rng.random() < 0.7:
+        terms.append(SavedSearch.normalize_term(rng.choice(CITIES)))
+    if rng.random() < 0.3:
+        terms.append(SavedSearch.normalize_term(rng.choice(PERKS + SCHEDULES)))
+    if rng.random() < 0.2:
+        # Rare terms keep the automaton realistically large
+        terms.append(f'навык{search_id % 20000}')
+    return SavedSearch.normalize_terms(terms)
+
+
+def timed_ms(func):
+    started = time.perf_counter()
+    result = func()
+    return (time.perf_counter() - started) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--searches', type=int, default=100000)
+    parser.add_argument('--posts', type=int, default=500)
+    parser.add_argument('--naive-sample', type=int, default=2000, help='Searches timed for the regex baseline')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    searches = {search_id: generate_terms(rng, search_id) for search_id in range(1, args.searches + 1)}
+    posts = [normalize_text(generate_post_text(rng, message_id)) for message_id in range(args.posts)]
+
+    def build_incrementally():
+        index = SearchIndex()
+        for search_id, terms in searches.items():
+            index.add(search_id, search_id % 5000, terms)
+        return index
+
+    incremental_build_ms, _ = timed_ms(build_incrementally)
+    build_ms, index = timed_ms(
+        lambda: SearchIndex.build((search_id, search_id % 5000, terms) for search_id, terms in searches.items())
+    )
+
+    samples = []
+    matches = 0
+    for text in posts:
+        elapsed, matched = timed_ms(lambda: index.match(text))
+        samples.append(elapsed)
+        matches += len(matched)
+
+    # Baseline: every search compiled to its own regexes, checked one by one
+    sample_ids = rng.sample(sorted(searches), min(args.naive_sample, len(searches)))
+    compiled = [[re.compile(re.escape(term)) for term in searches[search_id]] for search_id in sample_ids]
+
+    def naive_post(text):
+        return [patterns for patterns in compiled if all(p.search(text) for p in patterns)]
+
+    naive_ms = statistics.median(timed_ms(lambda: naive_post(text))[0] for text in posts[:50])
+    naive_ms *= len(searches) / len(sample_ids)
+
+    # Incremental updates against the built index
+    next_id = args.searches + 1
+    add_known = [timed_ms(lambda i=i: index.add(next_id + i, 1, searches[rng.randint(1, args.searches)]))[0]
+                 for i in range(200)]
+    add_new = [timed_ms(lambda i=i: index.add(next_id + 1000 + i, 1, [f'новыйтермин{i}', 'москва']))[0]
+               for i in range(200)]
+    first_match_after_add_ms, _ = timed_ms(lambda: index.match(posts[0]))
+    remove = [timed_ms(lambda i=i: index.remove(next_id + i))[0] for i in range(200)]
+
+    samples.sort()
+    print(json.dumps({
+        'benchmark': 'saved_searches',
+        'searches': args.searches,
+        'terms': len(index.term_ids),
+        'automaton_nodes': len(index.main.goto),
+        'build_ms': round(build_ms, 1),
+        'incremental_build_ms': round(incremental_build_ms, 1),
+        'match_ms_per_post': {
+            'median': round(statistics.median(samples), 3),
+            'p95': round(samples[int(len(samples) * 0.95)], 3),
+            'max': round(samples[-1], 3),
+        },
+        'matches_per_post': round(matches / len(posts), 1),
+        'naive_regex_ms_per_post_extrapolated': round(naive_ms, 1),
+        'speedup': round(naive_ms / statistics.median(samples), 1),
+        'update_ms': {
+            'add_known_terms_median': round(statistics.median(add_known), 4),
+            'add_new_terms_median': round(statistics.median(add_new), 4),
+            'first_match_after_new_terms': round(first_match_after_add_ms, 3),
+            'remove_median': round(statistics.median(remove), 4),
+        },
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
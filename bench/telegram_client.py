@@ -0,0 +1,149 @@
+"""
+Benchmark: media resolution through TelegramClient against a local fake Bot API server.
+
+The server answers getFile, getChat, getChatMember and getMe like the Bot
+API, with flood control (429 + retry_after) for the first --flood getFile
+requests and 502 errors for a share (--fail-rate) of the others. Each of
+--files file ids is requested --repeat times concurrently, once with bare
+``Bot.get_file`` calls and once through the client.
+
+Usage:
+    python -m bench.telegram_client --files 50 --repeat 4 --flood 5 --fail-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+from urllib.parse import parse_qs
+
+from telegram import Bot
+
+from services.telegram_client import ApiLimits, TelegramClient
+
+TOKEN = '123456:bench'
+
+
+class FakeBotApi(ThreadingHTTPServer):
+    """Minimal Bot API server on 127.0.0.1 with injectable flood control and errors"""
+
+    daemon_threads = True
+
+    def __init__(self, flood=0, fail_rate=0.0, retry_after=1):
+        super().__init__(('127.0.0.1', 0), FakeBotApiHandler)
+        self.flood = flood
+        self.fail_rate = fail_rate
+        self.retry_after = retry_after
+        self.calls = Counter()
+        self.file_calls = Counter()
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/bot'
+
+    def answer(self, method, params):
+        with self.lock:
+            self.calls[method] += 1
+            if method == 'getFile':
+                self.file_calls[params.get('file_id')] += 1
+                if self.flood > 0:
+                    self.flood -= 1
+                    return 429, {'ok': False, 'error_code': 429,
+                                 'description': f'Too Many Requests: retry after {self.retry_after}',
+                                 'parameters': {'retry_after': self.retry_after}}
+        if method == 'getFile' and random.random() < self.fail_rate:
+            return 502, {'ok': False, 'error_code': 502, 'description': 'Bad Gateway'}
+
+        if method == 'getFile':
+            file_id = params.get('file_id')
+            result = {'file_id': file_id, 'file_unique_id': f'u-{file_id}', 'file_path': f'photos/{file_id}.jpg'}
+        elif method == 'getChat':
+            result = {'id': int(params.get('chat_id')), 'type': 'channel', 'title': 'Fake channel'}
+        elif method == 'getChatMember':
+            result = {'status': 'administrator', 'user': {'id': 1, 'is_bot': True, 'first_name': 'Bench'},
+                      'can_be_edited': False, 'is_anonymous': False, 'can_manage_chat': True,
+                      'can_delete_messages': True, 'can_manage_video_chats': True, 'can_restrict_members': True,
+                      'can_promote_members': False, 'can_change_info': True, 'can_invite_users': True,
+                      'can_post_messages': True}
+        elif method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+        else:
+            return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found'}
+        return 200, {'ok': True, 'result': result}
+
+
+class FakeBotApiHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        method = self.path.rsplit('/', 1)[-1]
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode()
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            params = json.loads(body or '{}')
+        else:
+            params = {key: values[0] for key, values in parse_qs(body).items()}
+        status, payload = self.server.answer(method, params)
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+async def resolve_all(get_file, file_ids):
+    started = perf_counter()
+    results = await asyncio.gather(*(get_file(file_id) for file_id in file_ids), return_exceptions=True)
+    failed = [result for result in results if isinstance(result, Exception)]
+    return {
+        'seconds': round(perf_counter() - started, 3),
+        'resolved': len(results) - len(failed),
+        'failed': len(failed),
+        'errors': dict(Counter(type(error).__name__ for error in failed)),
+    }
+
+
+async def run(args):
+    file_ids = [f'file-{n}' for n in range(args.files)] * args.repeat
+    random.shuffle(file_ids)
+    report = {}
+    for name in ('bot', 'client'):
+        server = FakeBotApi(flood=args.flood, fail_rate=args.fail_rate)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        bot = Bot(TOKEN, base_url=server.base_url)
+        get_file = bot.get_file if name == 'bot' else TelegramClient(bot, ApiLimits()).get_file
+        async with bot:
+            report[name] = await resolve_all(get_file, file_ids)
+        report[name]['api_calls'] = sum(server.file_calls.values())
+        server.shutdown()
+        server.server_close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--files', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=4)
+    parser.add_argument('--flood', type=int, default=5)
+    parser.add_argument('--fail-rate', type=float, default=0.05)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps({
+        'benchmark': 'telegram_client',
+        'requests': args.files * args.repeat,
+        'distinct_files': args.files,
+        'flood_responses': args.flood,
+        'fail_rate': args.fail_rate,
+        **report,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
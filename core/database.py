@@ -0,0 +1,196 @@
+"""
+SQLAlchemy engine profiles per process role.
+
+The web workers, the Telegram bot and CLI commands have different
+connection needs: many short requests, a few long-lived sessions, or a
+single batch job. ``engine_options`` builds ``SQLALCHEMY_ENGINE_OPTIONS``
+for the role of the current process (pool size, overflow, checkout
+timeout, recycle, pre-ping and a server-side statement timeout), every
+value overridable per role from the environment.
+
+With DB_PGBOUNCER enabled the options are compatible with PgBouncer in
+transaction pooling mode: no startup parameters, the statement timeout
+is applied with ``SET LOCAL`` at the start of each transaction, and
+server-side prepared statements are disabled for drivers that use them.
+
+Postgres pools are ``InstrumentedQueuePool`` instances that export
+checkout wait time and saturation as Prometheus metrics.
+"""
+import logging
+import os
+import sys
+from time import perf_counter
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from core import metrics
+
+ROLES = ('web', 'bot', 'cli')
+
+# Shared by all roles: recycle before typical firewall/PgBouncer idle timeouts
+COMMON_DEFAULTS = {'POOL_PRE_PING': True, 'POOL_RECYCLE': 1800}
+
+# Defaults per role, overridden by DB_<ROLE>_<NAME> or DB_<NAME>
+ROLE_DEFAULTS = {
+    # Sync Gunicorn workers hold one connection per request; overflow covers SSE and threads
+    'web': {'POOL_SIZE': 5, 'MAX_OVERFLOW': 5, 'POOL_TIMEOUT': 10, 'STATEMENT_TIMEOUT_MS': 15000},
+    # One event loop plus the live feed listener and telemetry flushes
+    'bot': {'POOL_SIZE': 2, 'MAX_OVERFLOW': 2, 'POOL_TIMEOUT': 30, 'STATEMENT_TIMEOUT_MS': 60000},
+    # Migrations, backfills and maintenance may legitimately run long
+    'cli': {'POOL_SIZE': 1, 'MAX_OVERFLOW': 2, 'POOL_TIMEOUT': 60, 'STATEMENT_TIMEOUT_MS': 0},
+}
+
+POOL_CHECKOUT_WAIT = metrics.histogram(
+    'db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection',
+    ['role'], buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+)
+POOL_CHECKOUT_TIMEOUTS = metrics.counter(
+    'db_pool_checkout_timeouts_total', 'Connection checkouts that hit the pool timeout',
+    ['role']
+)
+POOL_CHECKED_OUT = metrics.gauge(
+    'db_pool_checked_out', 'Connections currently checked out of the pool',
+    ['role'], multiprocess_mode='livesum'
+)
+POOL_CAPACITY = metrics.gauge(
+    'db_pool_capacity', 'Maximum connections of the pool (size + overflow)',
+    ['role'], multiprocess_mode='livesum'
+)
+POOL_SATURATION = metrics.gauge(
+    'db_pool_saturation', 'Checked out connections divided by pool capacity',
+    ['role'], multiprocess_mode='livemax'
+)
+
+logger = logging.getLogger(__name__)
+
+
+def detect_process_role():
+    """
+    Role of this process: PROCESS_ROLE if set, else guessed from the command line.
+
+    ``flask telegram monitor`` runs the bot, other ``flask`` commands are CLI
+    jobs, anything else (Gunicorn, ``python app.py``) serves web requests.
+    """
+    role = os.getenv('PROCESS_ROLE')
+    if role:
+        if role not in ROLES:
+            raise ValueError(f"PROCESS_ROLE must be one of {', '.join(ROLES)}, got {role!r}")
+        return role
+
+    program = os.path.basename(sys.argv[0]) if sys.argv else ''
+    if program in ('flask', 'flask.exe') or (program == '__main__.py' and 'flask' in sys.argv[0]):
+        return 'bot' if 'monitor' in sys.argv[1:] else 'cli'
+    return 'web'
+
+
+def role_setting(role, name, cast=int):
+    """Read DB_<ROLE>_<NAME>, then DB_<NAME>, then the role default."""
+    value = os.getenv(f'DB_{role.upper()}_{name}', os.getenv(f'DB_{name}'))
+    if value is None:
+        return ROLE_DEFAULTS[role].get(name, COMMON_DEFAULTS.get(name))
+    if cast is bool:
+        return value.lower() == 'true'
+    return cast(value)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that reports checkout wait time and saturation"""
+
+    role = 'web'
+
+    def _do_get(self):
+        started = perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            POOL_CHECKOUT_TIMEOUTS.labels(role=self.role).inc()
+            raise
+        finally:
+            POOL_CHECKOUT_WAIT.labels(role=self.role).observe(perf_counter() - started)
+        self._report()
+        return connection
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        self._report()
+
+    def _report(self):
+        checked_out = self.checkedout()
+        capacity = self.size() + max(self._max_overflow, 0)
+        POOL_CHECKED_OUT.labels(role=self.role).set(checked_out)
+        POOL_CAPACITY.labels(role=self.role).set(capacity)
+        POOL_SATURATION.labels(role=self.role).set(checked_out / capacity if capacity else 0)
+
+
+def instrumented_pool_class(role):
+    """Pool class bound to ``role``; recreate() keeps the class, so the label survives."""
+    return type(f'InstrumentedQueuePool_{role}', (InstrumentedQueuePool,), {'role': role})
+
+
+def engine_options(role, database_uri):
+    """
+    Build SQLALCHEMY_ENGINE_OPTIONS for a process role.
+
+    Args:
+        role (str): 'web', 'bot' or 'cli'
+        database_uri (str): SQLAlchemy database URL
+
+    Returns:
+        dict: Keyword arguments for ``create_engine``
+    """
+    options = {'pool_pre_ping': role_setting(role, 'POOL_PRE_PING', bool)}
+    if not database_uri or not database_uri.startswith('postgresql'):
+        # SQLite picks its own pool class; sizing options do not apply
+        return options
+
+    options.update({
+        'poolclass': instrumented_pool_class(role),
+        'pool_size': role_setting(role, 'POOL_SIZE'),
+        'max_overflow': role_setting(role, 'MAX_OVERFLOW'),
+        'pool_timeout': role_setting(role, 'POOL_TIMEOUT'),
+        'pool_recycle': role_setting(role, 'POOL_RECYCLE'),
+    })
+
+    statement_timeout = role_setting(role, 'STATEMENT_TIMEOUT_MS')
+    connect_args = {'application_name': f'telegram_feed_{role}'}
+    if pgbouncer_enabled():
+        # Transaction pooling: the server connection changes between
+        # transactions, so session state (startup options, prepared
+        # statements) cannot be relied upon.
+        if make_url(database_uri).get_driver_name() == 'psycopg':
+            connect_args['prepare_threshold'] = None
+    elif statement_timeout:
+        connect_args['options'] = f'-c statement_timeout={statement_timeout}'
+    options['connect_args'] = connect_args
+    return options
+
+
+def pgbouncer_enabled():
+    return os.getenv('DB_PGBOUNCER', 'false').lower() == 'true'
+
+
+def init_app(app, db):
+    """Apply per-transaction settings that engine options cannot express."""
+    role = app.config['PROCESS_ROLE']
+    statement_timeout = role_setting(role, 'STATEMENT_TIMEOUT_MS')
+    if not (app.config.get('DB_PGBOUNCER') and statement_timeout):
+        return
+
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'postgresql':
+        return
+
+    @event.listens_for(engine, 'begin')
+    def set_local_statement_timeout(conn):
+        # Raw cursor: one round trip per transaction, invisible to query metrics
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute(f'SET LOCAL statement_timeout = {int(statement_timeout)}')
+        finally:
+            cursor.close()
+
+    logger.info(f"PgBouncer mode: statement_timeout={statement_timeout}ms set per transaction")
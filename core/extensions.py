@@ -3,10 +3,15 @@ Flask extensions initialization.
 """
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from flask_login import LoginManager
+
+from core.replicas import RoutingSession
 
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
+login_manager = LoginManager()
+login_manager.login_view = 'auth.login'
 
 def init_extensions(app):
     """Initialize Flask extensions with app."""
@@ -14,6 +19,7 @@ def init_extensions(app):
     # Database only
     db.init_app(app)
     migrate.init_app(app, db)
+    login_manager.init_app(app)
 
 def register_blueprints(app):
     """Register application blueprints."""
@@ -0,0 +1,119 @@
+"""
+Per-request performance instrumentation.
+
+Counts SQL statements and database time per request through SQLAlchemy
+cursor hooks, times Jinja rendering through Flask's template signals,
+adds a ``Server-Timing`` header and feeds per-endpoint Prometheus
+histograms exposed on ``/metrics``. The hot path only adds a few
+``perf_counter`` calls per request and per statement.
+"""
+from time import perf_counter
+
+from flask import Response, before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from core import metrics
+
+REQUEST_LATENCY = metrics.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by endpoint',
+    ['endpoint', 'method', 'status']
+)
+REQUEST_DB_TIME = metrics.histogram(
+    'http_request_db_seconds', 'Database time spent per request by endpoint',
+    ['endpoint']
+)
+REQUEST_RENDER_TIME = metrics.histogram(
+    'http_request_render_seconds', 'Template rendering time per request by endpoint',
+    ['endpoint']
+)
+REQUEST_QUERIES = metrics.histogram(
+    'http_request_db_queries', 'SQL statements executed per request by endpoint',
+    ['endpoint'], buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
+DB_STATEMENTS = metrics.counter(
+    'db_statements_total', 'SQL statements executed, in and outside requests'
+)
+
+_listeners_installed = False
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = perf_counter() - conn.info['query_start_time'].pop()
+    DB_STATEMENTS.inc()
+    if has_request_context() and 'request_started' in g:
+        g.db_queries += 1
+        g.db_time += elapsed
+
+
+def _before_render_template(sender, template, context, **extra):
+    if has_request_context() and 'request_started' in g:
+        g.render_started = perf_counter()
+
+
+def _template_rendered(sender, template, context, **extra):
+    if has_request_context() and g.get('render_started') is not None:
+        g.render_time += perf_counter() - g.render_started
+        g.render_started = None
+
+
+def install_engine_listeners():
+    """Listen on every Engine (primary, replicas, CLI), once per process."""
+    global _listeners_installed
+    if _listeners_installed:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    _listeners_installed = True
+
+
+def init_app(app):
+    """Install request hooks, template timing and the /metrics endpoint."""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    install_engine_listeners()
+    before_render_template.connect(_before_render_template, app)
+    template_rendered.connect(_template_rendered, app)
+    server_timing = app.config.get('SERVER_TIMING_ENABLED', True)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = perf_counter()
+        g.db_queries = 0
+        g.db_time = 0.0
+        g.render_time = 0.0
+        g.render_started = None
+
+    @app.after_request
+    def record_request_metrics(response):
+        if 'request_started' not in g or request.endpoint == 'metrics':
+            return response
+
+        total = perf_counter() - g.request_started
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_LATENCY.labels(endpoint=endpoint, method=request.method,
+                               status=str(response.status_code)).observe(total)
+        REQUEST_DB_TIME.labels(endpoint=endpoint).observe(g.db_time)
+        REQUEST_RENDER_TIME.labels(endpoint=endpoint).observe(g.render_time)
+        REQUEST_QUERIES.labels(endpoint=endpoint).observe(g.db_queries)
+
+        if server_timing:
+            response.headers.add('Server-Timing', ', '.join((
+                f'db;dur={g.db_time * 1000:.1f};desc="{g.db_queries} queries"',
+                f'render;dur={g.render_time * 1000:.1f}',
+                f'total;dur={total * 1000:.1f}',
+            )))
+        return response
+
+    def metrics_view():
+        body, content_type = metrics.render()
+        if body is None:
+            return Response('prometheus_client is not installed\n', status=503, mimetype='text/plain')
+        return Response(body, content_type=content_type)
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,122 @@
+"""
+Prometheus metrics registry shared by the web app, the bot and CLI jobs.
+
+Under Gunicorn every worker is a separate process, so metrics use the
+prometheus_client multiprocess mode when PROMETHEUS_MULTIPROC_DIR is set
+(see gunicorn.conf.py) and the web app serves them on ``/metrics``. The
+bot is a separate process with no web server; it serves its own metrics
+on BOT_METRICS_PORT (``serve``). Without prometheus_client installed all
+metrics are no-ops, so instrumented code never has to check for it.
+"""
+import os
+from contextlib import contextmanager
+from time import perf_counter
+
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+except ImportError:  # prometheus_client is optional
+    prometheus_client = None
+
+# Latency buckets in seconds, tuned for web requests and DB statements
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _NoopMetric:
+    """Stands in for a metric when prometheus_client is not installed"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+    @contextmanager
+    def time(self):
+        yield
+
+
+def multiprocess_enabled():
+    return bool(os.getenv('PROMETHEUS_MULTIPROC_DIR'))
+
+
+def counter(name, documentation, labelnames=()):
+    """Create a counter, or a no-op if prometheus_client is missing."""
+    if prometheus_client is None:
+        return _NoopMetric()
+    return Counter(name, documentation, labelnames)
+
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    """Create a histogram, or a no-op if prometheus_client is missing."""
+    if prometheus_client is None:
+        return _NoopMetric()
+    return Histogram(name, documentation, labelnames, buckets=buckets)
+
+
+def gauge(name, documentation, labelnames=(), multiprocess_mode='livesum'):
+    """Create a gauge, or a no-op if prometheus_client is missing."""
+    if prometheus_client is None:
+        return _NoopMetric()
+    return Gauge(name, documentation, labelnames, multiprocess_mode=multiprocess_mode)
+
+
+@contextmanager
+def timed(metric, **labels):
+    """Observe the duration of the block, in seconds, on a histogram."""
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        (metric.labels(**labels) if labels else metric).observe(perf_counter() - started)
+
+
+def _registry():
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return prometheus_client.REGISTRY
+
+
+def render():
+    """
+    Render all metrics in the Prometheus text format.
+
+    Returns:
+        tuple: (body bytes, content type), body is None if metrics are unavailable
+    """
+    if prometheus_client is None:
+        return None, 'text/plain'
+    return prometheus_client.generate_latest(_registry()), prometheus_client.CONTENT_TYPE_LATEST
+
+
+def serve(port, addr='127.0.0.1'):
+    """
+    Serve metrics over HTTP from a background thread, for processes without a web app (the bot).
+
+    Returns:
+        bool: False if prometheus_client is missing or the port is taken
+    """
+    if prometheus_client is None or not port:
+        return False
+    try:
+        prometheus_client.start_http_server(port, addr=addr, registry=_registry())
+    except OSError:
+        return False
+    return True
+
+
+def mark_process_dead(pid):
+    """Drop live gauges of an exited worker (called from gunicorn.conf.py)."""
+    if prometheus_client is not None and multiprocess_enabled():
+        multiprocess.mark_process_dead(pid)
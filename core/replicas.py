@@ -0,0 +1,251 @@
+"""
+Read-replica routing.
+
+Anonymous GET traffic of the listing pages and the API (``main.*`` and
+``api.*``) is routed to the replicas in DATABASE_REPLICA_URLS; everything
+else, the bot and CLI commands included, stays on the primary. Routing is
+decided per request and applied in ``RoutingSession.get_bind``:
+
+* flushes, DML statements and ``SELECT ... FOR UPDATE`` always go to the
+  primary, and after the first write the rest of the request does too;
+* replicas are health-checked every REPLICA_HEALTH_CHECK_SECONDS by a
+  background thread of each worker (connectivity and, on Postgres, replay
+  lag), never on a request thread, and skipped while down or lagging,
+  falling back to the primary when none is usable;
+* endpoints fetched right after a commit elsewhere (the live feed loads
+  the card of a post it was just told about) always read the primary;
+* after a request that wrote, a short-lived cookie pins the client to the
+  primary for READ_YOUR_WRITES_SECONDS so it sees its own edits.
+
+A second SQLite file can stand in for a replica in development.
+"""
+import itertools
+import logging
+import threading
+import time
+from time import monotonic
+
+from flask import request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.elements import TextClause
+
+from core import metrics
+
+# Blueprints whose GET/HEAD requests may read from a replica
+READ_BLUEPRINTS = ('main', 'api')
+# Endpoints of those blueprints that must see the latest commits
+PRIMARY_ENDPOINTS = ('main.post_card',)
+SAFE_METHODS = ('GET', 'HEAD')
+
+# Cookie pinning a client to the primary right after it wrote something
+PRIMARY_COOKIE = 'db_primary'
+
+# Zero when caught up: on an idle primary the last replay timestamp keeps aging
+REPLICA_LAG_SQL = text(
+    'SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 '
+    'WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+)
+
+REQUESTS_ROUTED = metrics.counter(
+    'db_requests_routed_total', 'Requests by database target chosen for their reads',
+    ['target']
+)
+REPLICA_HEALTHY = metrics.gauge(
+    'db_replica_healthy', 'Whether a read replica passed its last health check',
+    ['replica'], multiprocess_mode='livemin'
+)
+REPLICA_LAG = metrics.gauge(
+    'db_replica_lag_seconds', 'Replay lag of a read replica at its last health check',
+    ['replica'], multiprocess_mode='livemax'
+)
+
+
+def is_write(clause):
+    """Statements that must run on the primary."""
+    if clause is None:
+        return False
+    if getattr(clause, 'is_dml', False):
+        return True
+    if getattr(clause, '_for_update_arg', None) is not None:
+        return True
+    if isinstance(clause, TextClause):
+        return not clause.text.lstrip().upper().startswith(('SELECT', 'WITH'))
+    return False
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that sends eligible reads to a replica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get('use_replica'):
+            if self._flushing or is_write(clause):
+                self.info['use_replica'] = False
+                self.info['wrote'] = True
+            else:
+                engine = replica_router.get_engine()
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_session_wrote(session, flush_context):
+    session.info['wrote'] = True
+    session.info['use_replica'] = False
+
+
+class Replica:
+    """One read replica and its last health check"""
+
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        # Out of rotation until the first health check passes
+        self.healthy = False
+        self.lag = None
+        self.checked_at = None
+
+
+class ReplicaRouter:
+    """Chooses a healthy replica for read-only requests"""
+
+    def __init__(self, app=None):
+        self.app = app
+        self.replicas = []
+        self.check_interval = 10
+        self.max_lag = 30.0
+        self.read_your_writes = 10
+        self.logger = logging.getLogger(__name__)
+        self._round_robin = itertools.count()
+        self._checker_lock = threading.Lock()
+        self._checker = None
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.check_interval = app.config.get('REPLICA_HEALTH_CHECK_SECONDS', 10)
+        self.max_lag = app.config.get('REPLICA_MAX_LAG_SECONDS', 30.0)
+        self.read_your_writes = app.config.get('READ_YOUR_WRITES_SECONDS', 10)
+
+        urls = [url.strip() for url in (app.config.get('DATABASE_REPLICA_URLS') or '').split(',') if url.strip()]
+        role = app.config.get('PROCESS_ROLE', 'web')
+        if not urls:
+            return
+        if role != 'web':
+            # The bot and CLI jobs write and must see their own writes
+            self.logger.info(f"Read replicas ignored in the {role} process")
+            return
+
+        self.replicas = [self._create_replica(index, url, role) for index, url in enumerate(urls)]
+        app.before_request(self._choose_target)
+        app.after_request(self._pin_after_write)
+        self.logger.info(f"Routing reads to {len(self.replicas)} replica(s)")
+
+    def _create_replica(self, index, url, role):
+        from core.database import engine_options, instrumented_pool_class
+
+        options = engine_options(role, url)
+        if 'poolclass' in options:
+            options['poolclass'] = instrumented_pool_class(f'{role}_replica')
+            options['connect_args'].setdefault('connect_timeout', 3)
+        engine = create_engine(url, **options)
+        replica = Replica(f'replica{index}:{make_url(url).host or make_url(url).database}', engine)
+
+        @event.listens_for(engine, 'handle_error')
+        def mark_down_on_disconnect(context):
+            if context.is_disconnect:
+                self._set_health(replica, False, None)
+
+        return replica
+
+    @property
+    def enabled(self):
+        return bool(self.replicas)
+
+    def get_engine(self):
+        """A healthy replica engine, round-robin, or None to use the primary."""
+        self._ensure_checker()
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._round_robin) % len(healthy)].engine
+
+    def _ensure_checker(self):
+        # Started in the worker on first use: threads do not survive Gunicorn's fork
+        if self._checker and self._checker.is_alive():
+            return
+        with self._checker_lock:
+            if self._checker and self._checker.is_alive():
+                return
+            self._checker = threading.Thread(target=self._check_forever, name='replica-health-check', daemon=True)
+            self._checker.start()
+
+    def _check_forever(self):
+        while True:
+            for replica in self.replicas:
+                self.check(replica)
+            time.sleep(self.check_interval)
+
+    def check(self, replica):
+        """Check connectivity and, on Postgres, replay lag."""
+        try:
+            with replica.engine.connect() as conn:
+                if replica.engine.dialect.name == 'postgresql':
+                    lag = conn.execute(REPLICA_LAG_SQL).scalar()
+                    lag = float(lag) if lag is not None else None
+                else:
+                    conn.execute(text('SELECT 1'))
+                    lag = 0.0
+        except Exception as e:
+            self.logger.warning(f"Replica {replica.name} health check failed: {e}")
+            self._set_health(replica, False, None)
+            return
+
+        # A replica with no replayed transaction yet (lag None) is usable
+        self._set_health(replica, lag is None or lag <= self.max_lag, lag)
+
+    def _set_health(self, replica, healthy, lag):
+        if healthy != replica.healthy:
+            state = 'back in rotation' if healthy else 'taken out of rotation'
+            self.logger.warning(f"Replica {replica.name} {state} (lag={lag})")
+        replica.healthy = healthy
+        replica.lag = lag
+        replica.checked_at = monotonic()
+        REPLICA_HEALTHY.labels(replica=replica.name).set(1 if healthy else 0)
+        if lag is not None:
+            REPLICA_LAG.labels(replica=replica.name).set(lag)
+
+    def _choose_target(self):
+        from core.extensions import db
+
+        use_replica = (
+            request.method in SAFE_METHODS
+            and request.blueprint in READ_BLUEPRINTS
+            and request.endpoint not in PRIMARY_ENDPOINTS
+            and not request.cookies.get(PRIMARY_COOKIE)
+        )
+        db.session.info['use_replica'] = use_replica
+        REQUESTS_ROUTED.labels(target='replica' if use_replica else 'primary').inc()
+
+    def _pin_after_write(self, response):
+        from core.extensions import db
+
+        if request.method not in SAFE_METHODS and db.session.info.get('wrote') and self.read_your_writes:
+            response.set_cookie(PRIMARY_COOKIE, '1', max_age=self.read_your_writes,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def status(self):
+        return [
+            {'name': replica.name, 'healthy': replica.healthy, 'lag': replica.lag}
+            for replica in self.replicas
+        ]
+
+
+# Global instance
+replica_router = ReplicaRouter()
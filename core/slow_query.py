@@ -0,0 +1,226 @@
+"""
+Slow-query log.
+
+Engine-level cursor hooks record every statement slower than
+SLOW_QUERY_THRESHOLD_MS together with the endpoint or CLI command that
+issued it and, for a sample of them, the query plan (``EXPLAIN`` on
+Postgres, ``EXPLAIN QUERY PLAN`` on SQLite). Parameters can hold user
+data, so they are only recorded with SLOW_QUERY_LOG_PARAMETERS. Entries
+are kept in a bounded in-memory ring buffer per process, shown on the
+admin slow-queries page, and appended as JSON lines to a log file that all
+processes (web workers, bot, CLI) share.
+
+Every process appends to the file, so none of them may rotate it: rotate
+it externally (logrotate). The WatchedFileHandler reopens the file once it
+has been moved away.
+"""
+import json
+import logging
+import os
+import random
+import re
+import threading
+from collections import deque
+from datetime import datetime
+from logging.handlers import WatchedFileHandler
+from time import perf_counter
+
+import click
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from core import metrics
+
+SLOW_STATEMENTS = metrics.counter(
+    'db_slow_statements_total', 'SQL statements slower than the slow-query threshold',
+    ['source']
+)
+
+# Statements whose plan can be shown without executing them
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+
+
+def current_source():
+    """
+    Describe what issued the statement: endpoint, CLI command or thread.
+
+    The value is a metric label, so it never contains the request path or
+    thread numbers.
+    """
+    if has_request_context():
+        return f'{request.method} {request.endpoint or "unmatched"}'
+    ctx = click.get_current_context(silent=True)
+    if ctx is not None:
+        return f'cli: {ctx.command_path}'
+    # ThreadPoolExecutor-0_3, Thread-5 (worker) -> ThreadPoolExecutor, Thread (worker)
+    name = re.sub(r'[-_]\d+', '', threading.current_thread().name)
+    return f'thread: {name}'
+
+
+def format_parameters(parameters, limit=1000):
+    text = repr(parameters)
+    return text if len(text) <= limit else text[:limit] + '…'
+
+
+class SlowQueryLog:
+    """Records slow statements of every Engine in this process"""
+
+    def __init__(self, app=None):
+        self.app = app
+        self.enabled = False
+        self.threshold = 0.2
+        self.explain_rate = 0.1
+        self.log_parameters = False
+        self.entries = deque(maxlen=200)
+        self.log_file = None
+        self.logger = logging.getLogger(__name__)
+        self.file_logger = None
+        self._lock = threading.Lock()
+        self._installed = False
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('SLOW_QUERY_ENABLED', True)
+        self.threshold = app.config.get('SLOW_QUERY_THRESHOLD_MS', 200) / 1000
+        self.explain_rate = app.config.get('SLOW_QUERY_EXPLAIN_SAMPLE_RATE', 0.1)
+        self.log_parameters = app.config.get('SLOW_QUERY_LOG_PARAMETERS', False)
+        self.entries = deque(self.entries, maxlen=app.config.get('SLOW_QUERY_BUFFER_SIZE', 200))
+
+        if not self.enabled:
+            return
+
+        self.log_file = app.config.get('SLOW_QUERY_LOG_FILE')
+        if self.log_file and self.file_logger is None:
+            self.file_logger = self._create_file_logger(self.log_file)
+
+        if not self._installed:
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            self._installed = True
+
+    def _create_file_logger(self, path):
+        try:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            handler = WatchedFileHandler(path, encoding='utf-8')
+        except OSError as e:
+            self.logger.error(f"Cannot open slow-query log {path}: {e}")
+            self.log_file = None
+            return None
+
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        file_logger = logging.getLogger('slow_query')
+        file_logger.setLevel(logging.INFO)
+        file_logger.propagate = False
+        file_logger.addHandler(handler)
+        return file_logger
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('slow_query_start', []).append(perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = perf_counter() - conn.info['slow_query_start'].pop()
+        if elapsed < self.threshold:
+            return
+
+        source = current_source()
+        entry = {
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+            'duration_ms': round(elapsed * 1000, 1),
+            'statement': statement,
+            'parameters': format_parameters(parameters) if self.log_parameters else None,
+            'executemany': executemany,
+            'source': source,
+            'pid': os.getpid(),
+            'explain': None,
+        }
+        if not executemany and random.random() < self.explain_rate:
+            entry['explain'] = self.explain(conn, statement, parameters)
+
+        SLOW_STATEMENTS.labels(source=source).inc()
+        with self._lock:
+            self.entries.append(entry)
+        if self.file_logger:
+            self.file_logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+
+    def explain(self, conn, statement, parameters):
+        """
+        Capture the plan of ``statement`` on the connection that ran it.
+
+        Uses a raw DBAPI cursor so the EXPLAIN does not re-enter the engine
+        hooks. On Postgres it runs inside a savepoint: a failing EXPLAIN must
+        not abort the caller's transaction.
+
+        Returns:
+            str: Plan text, or None if the statement cannot be explained
+        """
+        if statement.lstrip().split(None, 1)[0].upper() not in EXPLAINABLE:
+            return None
+
+        dialect = conn.dialect.name
+        if dialect == 'sqlite':
+            prefix = 'EXPLAIN QUERY PLAN '
+        elif dialect == 'postgresql':
+            prefix = 'EXPLAIN '
+        else:
+            return None
+
+        cursor = conn.connection.cursor()
+        savepoint = dialect == 'postgresql'
+        try:
+            if savepoint:
+                cursor.execute('SAVEPOINT slow_query_explain')
+            try:
+                cursor.execute(prefix + statement, parameters)
+                rows = cursor.fetchall()
+            except Exception as e:
+                if savepoint:
+                    cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+                return f'EXPLAIN failed: {e}'
+            finally:
+                if savepoint:
+                    cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+        except Exception as e:
+            self.logger.warning(f"Slow-query EXPLAIN failed: {e}")
+            return None
+        finally:
+            cursor.close()
+
+        if dialect == 'sqlite':
+            # (id, parent, notused, detail)
+            return '\n'.join(str(row[-1]) for row in rows)
+        return '\n'.join(str(row[0]) for row in rows)
+
+    def recent(self, limit=100):
+        """Newest entries of this process's ring buffer first."""
+        with self._lock:
+            entries = list(self.entries)
+        return entries[::-1][:limit]
+
+    def read_log_file(self, limit=100):
+        """Newest entries of the shared log file first (all processes)."""
+        if not self.log_file or not os.path.exists(self.log_file):
+            return []
+
+        with open(self.log_file, encoding='utf-8') as f:
+            lines = deque(f, maxlen=limit)
+
+        entries = []
+        for line in reversed(lines):
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+        return entries
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+
+# Global instance
+slow_query_log = SlowQueryLog()
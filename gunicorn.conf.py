@@ -1,13 +1,15 @@
 # Gunicorn configuration for Docker deployment
 import multiprocessing
+import os
 
 # Server socket
 bind = "0.0.0.0:8000"
 backlog = 2048
 
 # Worker processes
-workers = 1  # Reduced for debugging
-worker_class = "sync"
+workers = int(os.getenv("GUNICORN_WORKERS", 1))  # Reduced for debugging
+# "gevent" for the stream service: SSE connections must not tie up sync workers
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "sync")
 worker_connections = 1000
 timeout = 30
 keepalive = 2
@@ -29,3 +31,41 @@ pidfile = "/tmp/gunicorn.pid"
 
 # Application
 pythonpath = "/app"
+
+# Prometheus metrics are aggregated across workers through this directory
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_multiproc")
+
+
+def on_starting(server):
+    """Drop metric files of processes that are gone; files of running processes sharing the directory stay."""
+    import glob
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    os.makedirs(metrics_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(metrics_dir, "*.db")):
+        # Files are named <type>_<pid>.db
+        pid = os.path.basename(path)[:-3].rpartition("_")[2]
+        if pid.isdigit() and _running(int(pid)):
+            continue
+        os.remove(path)
+
+
+def _running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def post_worker_init(worker):
+    """Start the job scheduler in each worker; importing the app alone does not."""
+    from services.scheduler import scheduler
+    scheduler.start_if_enabled()
+
+
+def child_exit(server, worker):
+    """Drop live gauges of exited workers."""
+    from core.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
@@ -14,6 +14,14 @@ from .post import Post
 from .user_post import UserPost, PostStatus
 from .user_subscription import UserSubscription, SubscriptionStatus
 from .post_statistics import PostStatistics
+from .post_change import PostChange, ChangeType
+from .ingest_stat import IngestStat
+from .saved_search import SavedSearch
+from .timeline_entry import TimelineEntry
+from .feed_deletion_job import FeedDeletionJob, DeletionStatus
+from .channel_health import ChannelHealth, HealthStatus
+from .job_run import JobRun
+from .feed_backfill import FeedBackfill
 
 # Export all models and enums for easy importing
 __all__ = [
@@ -24,5 +32,13 @@ __all__ = [
     'Post',
     'UserPost', 'PostStatus',
     'UserSubscription', 'SubscriptionStatus',
-    'PostStatistics'
+    'PostStatistics',
+    'PostChange', 'ChangeType',
+    'IngestStat',
+    'SavedSearch',
+    'TimelineEntry',
+    'FeedDeletionJob', 'DeletionStatus',
+    'ChannelHealth', 'HealthStatus',
+    'JobRun',
+    'FeedBackfill'
 ]
@@ -0,0 +1,54 @@
+"""
+ChannelHealth model: result of the latest health check of each channel feed.
+"""
+from .base import BaseModel
+from core.extensions import db
+from datetime import datetime
+import enum
+
+class HealthStatus(enum.Enum):
+    """Outcome of a channel health check"""
+    OK = "ok"                # Bot is an administrator of the channel
+    NOT_ADMIN = "not_admin"  # Bot lost its rights, the feed was deactivated
+    ERROR = "error"          # Check failed (timeout, network, unknown chat); feed left as is
+
+class ChannelHealth(BaseModel, db.Model):
+    """Latest health check of a feed's Telegram channel, one row per feed"""
+    __tablename__ = 'channel_health'
+
+    feed_id = db.Column(db.Integer, db.ForeignKey('feeds.id', ondelete='CASCADE'), primary_key=True)
+    status = db.Column(db.Enum(HealthStatus), nullable=False, index=True)
+    member_status = db.Column(db.String(20))  # ChatMember status reported by Telegram
+    error = db.Column(db.Text)
+    consecutive_errors = db.Column(db.Integer, default=0, nullable=False)
+    duration_ms = db.Column(db.Float)
+    last_checked = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    last_ok_at = db.Column(db.DateTime)
+
+    def __init__(self, feed_id, status):
+        self.feed_id = feed_id
+        self.status = status
+        self.consecutive_errors = 0
+
+    def __repr__(self):
+        return f'<ChannelHealth feed_id={self.feed_id} {self.status.value}>'
+
+    def to_dict(self):
+        """Convert health check to dictionary for API responses"""
+        return {
+            'feed_id': self.feed_id,
+            'status': self.status.value,
+            'member_status': self.member_status,
+            'error': self.error,
+            'consecutive_errors': self.consecutive_errors,
+            'duration_ms': self.duration_ms,
+            'last_checked': self.last_checked.isoformat(),
+            'last_ok_at': self.last_ok_at.isoformat() if self.last_ok_at else None
+        }
+
+    @classmethod
+    def get_by_feed(cls, feed_ids):
+        """Get health rows of the given feeds as feed_id -> row"""
+        if not feed_ids:
+            return {}
+        return {row.feed_id: row for row in cls.query.filter(cls.feed_id.in_(feed_ids))}
@@ -0,0 +1,58 @@
+"""
+FeedBackfill model: progress of the history import of each channel feed.
+"""
+from .base import BaseModel
+from core.extensions import db
+from datetime import datetime
+
+class FeedBackfill(BaseModel, db.Model):
+    """History import checkpoint of a feed, one row per feed"""
+    __tablename__ = 'feed_backfills'
+
+    feed_id = db.Column(db.Integer, db.ForeignKey('feeds.id', ondelete='CASCADE'), primary_key=True)
+    newest_message_id = db.Column(db.BigInteger)  # Highest message id imported
+    oldest_message_id = db.Column(db.BigInteger)  # Where the next run continues into older history
+    history_complete = db.Column(db.Boolean, default=False, nullable=False)
+    imported_count = db.Column(db.Integer, default=0, nullable=False)
+    last_error = db.Column(db.Text)
+    started_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+
+    def __init__(self, feed_id):
+        self.feed_id = feed_id
+        self.history_complete = False
+        self.imported_count = 0
+
+    def __repr__(self):
+        return f'<FeedBackfill feed_id={self.feed_id} oldest={self.oldest_message_id}>'
+
+    def to_dict(self):
+        """Convert checkpoint to dictionary for API responses"""
+        return {
+            'feed_id': self.feed_id,
+            'newest_message_id': self.newest_message_id,
+            'oldest_message_id': self.oldest_message_id,
+            'history_complete': self.history_complete,
+            'imported_count': self.imported_count,
+            'last_error': self.last_error,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+
+    @classmethod
+    def get_or_create(cls, feed_id):
+        """Get the checkpoint of a feed, adding it to the session if missing (no commit)"""
+        backfill = db.session.get(cls, feed_id)
+        if backfill is None:
+            backfill = cls(feed_id)
+            db.session.add(backfill)
+        return backfill
+
+    @classmethod
+    def get_by_feed(cls, feed_ids):
+        """Get checkpoints of the given feeds as feed_id -> row"""
+        if not feed_ids:
+            return {}
+        return {row.feed_id: row for row in cls.query.filter(cls.feed_id.in_(feed_ids))}
@@ -0,0 +1,118 @@
+"""
+FeedDeletionJob model: progress of a feed being deleted in the background.
+"""
+from .base import BaseModel
+from core.extensions import db
+from datetime import datetime, timedelta
+import enum
+
+class DeletionStatus(enum.Enum):
+    """Deletion job status enumeration"""
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class FeedDeletionJob(BaseModel, db.Model):
+    """One feed deletion, deleted in batches and resumable from last_post_id"""
+    __tablename__ = 'feed_deletion_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # No foreign key: the feed row is deleted by the job itself
+    feed_id = db.Column(db.Integer, nullable=False, index=True)
+    feed_name = db.Column(db.String(200), nullable=False)
+    status = db.Column(db.Enum(DeletionStatus), default=DeletionStatus.PENDING, nullable=False, index=True)
+    total_posts = db.Column(db.Integer, default=0, nullable=False)
+    deleted_posts = db.Column(db.Integer, default=0, nullable=False)
+    last_post_id = db.Column(db.Integer, default=0, nullable=False)  # Keyset cursor of the next batch
+    owner = db.Column(db.String(64))  # Runner holding the job, see claim()
+    heartbeat_at = db.Column(db.DateTime)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def __init__(self, feed_id, feed_name, total_posts=0):
+        self.feed_id = feed_id
+        self.feed_name = feed_name
+        self.total_posts = total_posts
+        self.status = DeletionStatus.PENDING
+
+    def __repr__(self):
+        return f'<FeedDeletionJob {self.id} feed_id={self.feed_id} {self.status.value}>'
+
+    @property
+    def is_finished(self):
+        return self.status in (DeletionStatus.COMPLETED, DeletionStatus.FAILED)
+
+    @property
+    def progress(self):
+        """Share of posts deleted, 0..100"""
+        if self.status == DeletionStatus.COMPLETED:
+            return 100
+        if not self.total_posts:
+            return 0
+        return min(99, int(self.deleted_posts * 100 / self.total_posts))
+
+    def to_dict(self):
+        """Convert job to dictionary for API responses"""
+        return {
+            'id': self.id,
+            'feed_id': self.feed_id,
+            'feed_name': self.feed_name,
+            'status': self.status.value,
+            'total_posts': self.total_posts,
+            'deleted_posts': self.deleted_posts,
+            'progress': self.progress,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+    @classmethod
+    def claim(cls, job_id, owner, stale_after):
+        """
+        Take a job that is pending or whose runner stopped heartbeating.
+
+        Returns:
+            bool: True when ``owner`` now holds the job
+        """
+        now = datetime.utcnow()
+        claimed = cls.query.filter(
+            cls.id == job_id,
+            db.or_(
+                cls.status == DeletionStatus.PENDING,
+                db.and_(cls.status == DeletionStatus.RUNNING,
+                        db.or_(cls.heartbeat_at.is_(None), cls.heartbeat_at < now - stale_after))
+            )
+        ).update({'status': DeletionStatus.RUNNING, 'owner': owner, 'heartbeat_at': now},
+                 synchronize_session=False)
+        db.session.commit()
+        return claimed == 1
+
+    @classmethod
+    def get_active_for_feed(cls, feed_id):
+        """Get the unfinished job of a feed, if any"""
+        return cls.query.filter(
+            cls.feed_id == feed_id,
+            cls.status.in_([DeletionStatus.PENDING, DeletionStatus.RUNNING])
+        ).first()
+
+    @classmethod
+    def get_resumable(cls, stale_after):
+        """Get pending jobs and running jobs whose runner stopped heartbeating"""
+        cutoff = datetime.utcnow() - stale_after
+        return cls.query.filter(db.or_(
+            cls.status == DeletionStatus.PENDING,
+            db.and_(cls.status == DeletionStatus.RUNNING,
+                    db.or_(cls.heartbeat_at.is_(None), cls.heartbeat_at < cutoff))
+        )).order_by(cls.id).all()
+
+    @classmethod
+    def get_recent(cls, days=7):
+        """Get unfinished jobs and jobs finished in the last ``days``"""
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        return cls.query.filter(db.or_(
+            cls.finished_at.is_(None), cls.finished_at >= cutoff
+        )).order_by(cls.created_at.desc()).all()
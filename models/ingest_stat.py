@@ -0,0 +1,44 @@
+"""
+IngestStat model: per-feed ingest latency histograms in fixed time windows.
+"""
+from .base import BaseModel
+from core.extensions import db
+from datetime import datetime
+
+class IngestStat(BaseModel, db.Model):
+    """Bucketed ingest stage durations of one feed in one time window"""
+    __tablename__ = 'ingest_stats'
+
+    id = db.Column(db.Integer, primary_key=True)
+    feed_id = db.Column(db.Integer, db.ForeignKey('feeds.id', ondelete='CASCADE'), nullable=False, index=True)
+    stage = db.Column(db.String(20), nullable=False)  # lag, queue, parse, media, commit
+    window_start = db.Column(db.DateTime, nullable=False, index=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+    total_seconds = db.Column(db.Float, default=0.0, nullable=False)
+    max_seconds = db.Column(db.Float, default=0.0, nullable=False)
+    buckets = db.Column(db.JSON, nullable=False)  # counts per bucket, last one is +Inf
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('feed_id', 'stage', 'window_start', name='unique_feed_stage_window'),)
+
+    def __init__(self, feed_id, stage, window_start, buckets):
+        self.feed_id = feed_id
+        self.stage = stage
+        self.window_start = window_start
+        self.buckets = buckets
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def __repr__(self):
+        return f'<IngestStat feed_id={self.feed_id} stage={self.stage} window={self.window_start}>'
+
+    @classmethod
+    def get_since(cls, since):
+        """Get all windows starting at or after ``since``"""
+        return cls.query.filter(cls.window_start >= since).all()
+
+    @classmethod
+    def prune(cls, older_than):
+        """Delete windows older than ``older_than`` (no commit)"""
+        return cls.query.filter(cls.window_start < older_than).delete(synchronize_session=False)
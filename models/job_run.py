@@ -0,0 +1,41 @@
+"""
+JobRun model: outcome of the latest run of each scheduled job.
+"""
+from .base import BaseModel
+from core.extensions import db
+
+class JobRun(BaseModel, db.Model):
+    """Latest run of a scheduled job, one row per job id"""
+    __tablename__ = 'job_runs'
+
+    job_id = db.Column(db.String(100), primary_key=True)
+    last_status = db.Column(db.String(20))  # running, success, error
+    last_error = db.Column(db.Text)
+    last_started_at = db.Column(db.DateTime)
+    last_finished_at = db.Column(db.DateTime)
+    last_duration_ms = db.Column(db.Float)
+    run_count = db.Column(db.Integer, default=0, nullable=False)
+    error_count = db.Column(db.Integer, default=0, nullable=False)
+    host = db.Column(db.String(100))  # hostname:pid of the process that ran it
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.run_count = 0
+        self.error_count = 0
+
+    def __repr__(self):
+        return f'<JobRun {self.job_id} {self.last_status}>'
+
+    @classmethod
+    def get_or_create(cls, job_id):
+        """Get the row of a job, adding it to the session if missing (no commit)"""
+        run = db.session.get(cls, job_id)
+        if run is None:
+            run = cls(job_id)
+            db.session.add(run)
+        return run
+
+    @classmethod
+    def get_all(cls):
+        """Get rows of all jobs as job_id -> row"""
+        return {run.job_id: run for run in cls.query.all()}
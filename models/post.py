@@ -3,7 +3,8 @@ Post model for storing feed posts with contact extraction.
 """
 from .base import BaseModel
 from core.extensions import db
-from datetime import datetime
+from datetime import datetime, timedelta
+from flask import current_app
 import hashlib
 import json
 
@@ -33,6 +34,14 @@ class Post(BaseModel, db.Model):
     duplicate_group_id = db.Column(db.String(36), index=True)
     is_primary_duplicate = db.Column(db.Boolean, default=True)
     
+    # Structured vacancy fields (services/vacancy_extractor.py)
+    city = db.Column(db.String(50), nullable=True)
+    salary_min = db.Column(db.Integer, nullable=True, index=True)
+    salary_max = db.Column(db.Integer, nullable=True, index=True)
+    salary_currency = db.Column(db.String(10), nullable=True)
+    company_name = db.Column(db.String(100), nullable=True)
+    extraction_version = db.Column(db.SmallInteger, default=0, nullable=False)
+    
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -41,6 +50,12 @@ class Post(BaseModel, db.Model):
     user_posts = db.relationship('UserPost', back_populates='post', lazy='dynamic')
     statistics = db.relationship('PostStatistics', back_populates='post', uselist=False)
     
+    # City filter, newest first; one row per Telegram message (the date keeps it valid on partitions)
+    __table_args__ = (
+        db.Index('ix_posts_city_telegram_date', 'city', 'telegram_date'),
+        db.Index('uq_posts_feed_message', 'feed_id', 'telegram_message_id', 'telegram_date', unique=True),
+    )
+    
     def __init__(self, telegram_message_id, content, feed_id, telegram_date, 
                  media_url=None, media_type=None, is_edited=False, views=0):
         self.telegram_message_id = telegram_message_id
@@ -51,15 +66,19 @@ class Post(BaseModel, db.Model):
         self.media_type = media_type
         self.is_edited = is_edited
         self.views = views
-        self.content_hash = self.generate_content_hash()
     
     def __repr__(self):
         return f'<Post {self.id} from {self.feed.name if self.feed else "Unknown"}>'
     
     def generate_content_hash(self):
         """Generate SHA256 hash of normalized content for duplicate detection"""
-        if self.content:
-            normalized_content = self.content.strip().lower()
+        return self.hash_content(self.content)
+    
+    @staticmethod
+    def hash_content(content):
+        """SHA256 of stripped, lowercased content, None for empty content"""
+        if content:
+            normalized_content = content.strip().lower()
             return hashlib.sha256(normalized_content.encode('utf-8')).hexdigest()
         return None
     
@@ -104,6 +123,26 @@ class Post(BaseModel, db.Model):
             self.urls = contacts['urls'] if contacts['urls'] else None
             self.contacts_extracted = True
     
+    def set_vacancy(self, fields, version):
+        """Set structured vacancy fields from extracted data"""
+        self.city = fields.get('city')
+        self.salary_min = fields.get('salary_min')
+        self.salary_max = fields.get('salary_max')
+        self.salary_currency = fields.get('salary_currency')
+        self.company_name = fields.get('company_name')
+        self.extraction_version = version
+    
+    def get_salary_range(self):
+        """Get formatted salary range"""
+        currency = self.salary_currency or 'RUB'
+        if self.salary_min and self.salary_max:
+            return f"{self.salary_min:,} - {self.salary_max:,} {currency}"
+        elif self.salary_min:
+            return f"от {self.salary_min:,} {currency}"
+        elif self.salary_max:
+            return f"до {self.salary_max:,} {currency}"
+        return None
+    
     def get_contacts_dict(self):
         """Get contacts as a dictionary for template rendering"""
         return {
@@ -172,6 +211,36 @@ class Post(BaseModel, db.Model):
         ).order_by(cls.telegram_date.desc()).offset(offset).limit(limit).all()
     
     @classmethod
-    def get_by_telegram_message_id(cls, telegram_message_id, feed_id):
-        """Get post by telegram message ID and feed ID"""
-        return cls.query.filter_by(telegram_message_id=telegram_message_id, feed_id=feed_id).first()
+    def get_by_telegram_message_id(cls, telegram_message_id, feed_id, telegram_date=None):
+        """Get post by telegram message ID and feed ID, the date narrows the search to one partition"""
+        query = cls.query.filter_by(telegram_message_id=telegram_message_id, feed_id=feed_id)
+        if telegram_date is not None:
+            query = query.filter(cls.telegram_date == telegram_date)
+        return query.first()
+    
+    @classmethod
+    def vacancy_criteria(cls, city=None, salary_from=None, currency='RUB'):
+        """Filters on extracted fields; salary_from keeps posts whose range reaches it"""
+        criteria = []
+        if city:
+            criteria.append(cls.city == city)
+        if salary_from:
+            criteria.append(db.or_(cls.salary_max >= salary_from, cls.salary_min >= salary_from))
+            criteria.append(cls.salary_currency == currency)
+        return criteria
+    
+    @classmethod
+    def listing_criteria(cls):
+        """Date bound for listings (POSTS_LISTING_MAX_AGE_DAYS) so Postgres prunes old partitions"""
+        max_age = current_app.config.get('POSTS_LISTING_MAX_AGE_DAYS')
+        if not max_age:
+            return []
+        return [cls.telegram_date >= datetime.utcnow() - timedelta(days=max_age)]
+
+
+@db.event.listens_for(Post.content, 'set')
+def _content_changed(post, value, oldvalue, initiator):
+    """Rehash changed content and flag the post for services/post_pipeline.py at the next flush"""
+    if value != oldvalue:
+        post.content_hash = Post.hash_content(value)
+        post.content_changed = True
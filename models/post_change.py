@@ -0,0 +1,101 @@
+"""
+PostChange model: append-only change log used by the delta sync API.
+"""
+from .base import BaseModel
+from core.extensions import db
+from datetime import datetime
+from sqlalchemy import literal, select
+import enum
+
+class ChangeType(enum.Enum):
+    """Kind of change recorded for a post"""
+    INSERT = "insert"
+    UPDATE = "update"
+    DELETE = "delete"
+
+class PostChange(BaseModel, db.Model):
+    """One row per inserted, edited or deleted post, ordered by id"""
+    __tablename__ = 'post_changes'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # No foreign key: tombstones must outlive the post they point to
+    post_id = db.Column(db.Integer, nullable=False, index=True)
+    feed_id = db.Column(db.Integer, nullable=False, index=True)
+    change_type = db.Column(db.Enum(ChangeType), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def __init__(self, post_id, feed_id, change_type):
+        self.post_id = post_id
+        self.feed_id = feed_id
+        self.change_type = change_type
+
+    def __repr__(self):
+        return f'<PostChange {self.id} {self.change_type.value} post_id={self.post_id}>'
+
+    @classmethod
+    def record(cls, post, change_type):
+        """Add a change for a flushed post to the current transaction (no commit)"""
+        change = cls(post_id=post.id, feed_id=post.feed_id, change_type=change_type)
+        db.session.add(change)
+        return change
+
+    @classmethod
+    def record_feed_deletion(cls, feed_id):
+        """Write delete tombstones for every post of a feed with one INSERT ... SELECT"""
+        from .post import Post
+        cls.record_deletions(Post.feed_id == feed_id)
+
+    @classmethod
+    def record_deletions(cls, *criteria):
+        """Write delete tombstones for every post matching ``criteria`` (no commit)"""
+        cls._record_matching(ChangeType.DELETE, criteria)
+
+    @classmethod
+    def record_insertions(cls, *criteria):
+        """Write insert changes for every post matching ``criteria``, e.g. restored from the archive (no commit)"""
+        cls._record_matching(ChangeType.INSERT, criteria)
+
+    @classmethod
+    def _record_matching(cls, change_type, criteria):
+        from .post import Post
+        change_type = literal(change_type, type_=cls.__table__.c.change_type.type)
+        posts = select(
+            Post.id, Post.feed_id, change_type, literal(datetime.utcnow())
+        ).where(*criteria)
+
+        db.session.execute(
+            cls.__table__.insert().from_select(
+                ['post_id', 'feed_id', 'change_type', 'created_at'], posts
+            )
+        )
+
+    @classmethod
+    def get_since(cls, last_id, limit, feed_id=None):
+        """Get up to ``limit`` changes with id greater than ``last_id``"""
+        query = cls.query.filter(cls.id > last_id)
+        if feed_id:
+            query = query.filter_by(feed_id=feed_id)
+        return query.order_by(cls.id).limit(limit).all()
+
+    @classmethod
+    def get_head_id(cls, created_before=None):
+        """Get the id of the most recent change (created before a moment), 0 if there is none"""
+        query = db.session.query(db.func.max(cls.id))
+        if created_before is not None:
+            query = query.filter(cls.created_at <= created_before)
+        return query.scalar() or 0
+
+    @classmethod
+    def get_tail_id(cls):
+        """Get the id of the oldest retained change, None if the log is empty"""
+        return db.session.query(db.func.min(cls.id)).scalar()
+
+    @classmethod
+    def prune(cls, older_than):
+        """Delete changes created before ``older_than`` except the newest, returns deleted row count"""
+        # The newest change always stays: it tells cursors from before the pruned ones apart
+        deleted = cls.query.filter(
+            cls.created_at < older_than, cls.id < cls.get_head_id()
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
@@ -11,6 +11,7 @@ class PostStatistics(BaseModel, db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     user_post_id = db.Column(db.Integer, db.ForeignKey('user_posts.id'), nullable=False, index=True)
+    # The foreign key is dropped when posts is partitioned (services/partitioning.py)
     post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), nullable=True, index=True)
     date = db.Column(db.Date, nullable=False, index=True)
     views = db.Column(db.Integer, default=0, nullable=False)
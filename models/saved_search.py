@@ -0,0 +1,86 @@
+"""
+SavedSearch model for keyword alerts on incoming posts.
+"""
+from .base import BaseModel
+from core.extensions import db
+from datetime import datetime
+
+class SavedSearch(BaseModel, db.Model):
+    """Saved search: a post matches when its text contains every term"""
+    __tablename__ = 'saved_searches'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    name = db.Column(db.String(100), nullable=False)
+    terms = db.Column(db.JSON, nullable=False, default=list)  # Normalized keywords, all must occur
+    is_active = db.Column(db.Boolean, default=True, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+    # Relationships
+    user = db.relationship('User', back_populates='saved_searches')
+
+    def __init__(self, user_id, name, terms, is_active=True):
+        self.user_id = user_id
+        self.name = name
+        self.terms = self.normalize_terms(terms)
+        self.is_active = is_active
+
+    def __repr__(self):
+        return f'<SavedSearch {self.id} user_id={self.user_id} terms={self.terms}>'
+
+    @staticmethod
+    def normalize_term(term):
+        """Lowercase, fold ё to е and collapse whitespace"""
+        return ' '.join(term.lower().replace('ё', 'е').split())
+
+    @classmethod
+    def normalize_terms(cls, terms):
+        """Normalize terms given as a list or a comma separated string, dropping duplicates"""
+        if isinstance(terms, str):
+            terms = terms.split(',')
+        normalized = []
+        for term in terms:
+            term = cls.normalize_term(term)
+            if term and term not in normalized:
+                normalized.append(term)
+        return normalized
+
+    def set_terms(self, terms):
+        """Replace the terms"""
+        self.terms = self.normalize_terms(terms)
+        self.updated_at = datetime.utcnow()
+        return self.save()
+
+    def deactivate(self):
+        """Stop alerting; kept as a row so running matchers notice the change"""
+        self.is_active = False
+        self.updated_at = datetime.utcnow()
+        return self.save()
+
+    def to_dict(self):
+        """Convert saved search to dictionary for API responses"""
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'name': self.name,
+            'terms': self.terms,
+            'is_active': self.is_active,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    @classmethod
+    def get_user_searches(cls, user_id):
+        """Get user's saved searches, newest first"""
+        return cls.query.filter_by(user_id=user_id).order_by(cls.created_at.desc()).all()
+
+    @classmethod
+    def get_changed_since(cls, since):
+        """Get saved searches created or changed after a moment, oldest change first"""
+        return cls.query.filter(cls.updated_at > since).order_by(cls.updated_at).all()
+
+    @classmethod
+    def count_active(cls):
+        """Get number of active saved searches"""
+        return cls.query.filter_by(is_active=True).count()
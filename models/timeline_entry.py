@@ -0,0 +1,24 @@
+"""
+TimelineEntry model: per-user "my feed" entries when Redis is not configured.
+"""
+from .base import BaseModel
+from core.extensions import db
+
+class TimelineEntry(BaseModel, db.Model):
+    """One post pushed into a subscriber's timeline, read newest first"""
+    __tablename__ = 'timeline_entries'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    # No foreign key: posts are partitioned and archived independently of timelines
+    post_id = db.Column(db.Integer, primary_key=True)
+    telegram_date = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (db.Index('ix_timeline_entries_user_date', 'user_id', 'telegram_date'),)
+
+    def __init__(self, user_id, post_id, telegram_date):
+        self.user_id = user_id
+        self.post_id = post_id
+        self.telegram_date = telegram_date
+
+    def __repr__(self):
+        return f'<TimelineEntry user_id={self.user_id} post_id={self.post_id}>'
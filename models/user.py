@@ -23,12 +23,14 @@ class User(BaseModel, UserMixin, db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(200), nullable=False)
     role = db.Column(db.Enum(UserRole), default=UserRole.USER, nullable=False)
+    telegram_chat_id = db.Column(db.BigInteger, nullable=True)  # Private chat for notification digests
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     posts = db.relationship('UserPost', back_populates='user', lazy='dynamic')
     subscriptions = db.relationship('UserSubscription', back_populates='user', lazy='dynamic')
+    saved_searches = db.relationship('SavedSearch', back_populates='user', lazy='dynamic')
     
     def __init__(self, username, email, password, role=UserRole.USER):
         self.username = username
@@ -19,6 +19,7 @@ class UserPost(BaseModel, db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    # The foreign key is dropped when posts is partitioned (services/partitioning.py)
     post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), nullable=True, index=True)  # For interactions
     
     # User-created post fields
@@ -100,3 +100,37 @@ class UserSubscription(BaseModel, db.Model):
     def get_category_subscribers(cls, category_id, status=SubscriptionStatus.ACTIVE):
         """Get subscribers for a category"""
         return cls.query.filter_by(category_id=category_id, status=status).all()
+    
+    @classmethod
+    def get_notification_targets(cls, category_ids):
+        """Get (category_id, user) pairs of active subscriptions with notifications on"""
+        from .user import User
+        if not category_ids:
+            return []
+        return db.session.query(cls.category_id, User).join(User, User.id == cls.user_id).filter(
+            cls.category_id.in_(category_ids),
+            cls.status == SubscriptionStatus.ACTIVE,
+            cls.notifications_enabled == True
+        ).all()
+    
+    @classmethod
+    def get_subscriber_ids(cls, category_id):
+        """Get ids of users with an active subscription to a category"""
+        return db.session.execute(
+            db.select(cls.user_id).filter_by(category_id=category_id, status=SubscriptionStatus.ACTIVE)
+        ).scalars().all()
+    
+    @classmethod
+    def get_user_category_ids(cls, user_id):
+        """Get ids of categories a user is actively subscribed to"""
+        return db.session.execute(
+            db.select(cls.category_id).filter_by(user_id=user_id, status=SubscriptionStatus.ACTIVE)
+        ).scalars().all()
+    
+    @classmethod
+    def get_categories_with_more_subscribers(cls, limit):
+        """Get ids of categories with more than ``limit`` active subscribers"""
+        return db.session.execute(
+            db.select(cls.category_id).filter_by(status=SubscriptionStatus.ACTIVE)
+            .group_by(cls.category_id).having(db.func.count(cls.id) > limit)
+        ).scalars().all()
@@ -4,6 +4,9 @@ Routes package - Contains all Flask blueprints and route handlers
 
 from .main import main_bp
 from .api import api_bp
+from .auth import auth_bp
+from .account import account_bp
+from .admin import admin_bp
 
 # Export all blueprints for easy importing
-__all__ = ['main_bp', 'api_bp']
\ No newline at end of file
+__all__ = ['main_bp', 'api_bp', 'auth_bp', 'account_bp', 'admin_bp']
\ No newline at end of file
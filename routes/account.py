@@ -1,9 +1,11 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import login_required, current_user
-from models import UserPost, UserSubscription, Feed, PostStatistics, PostStatus
+from models import UserPost, UserSubscription, Category, PostStatistics, PostStatus, SavedSearch
 from core.extensions import db
 from datetime import datetime, timedelta
 from sqlalchemy import func
+from services.timeline import timeline, TimelinePagination
+from services.telegram_link import link_url
 
 account_bp = Blueprint('account', __name__, url_prefix='/account')
 
@@ -160,32 +162,51 @@ def delete_post(post_id):
     
     return redirect(url_for('account.posts'))
 
+@account_bp.route('/feed')
+@login_required
+def timeline_feed():
+    """Posts of the categories the user is subscribed to, newest first"""
+    page = request.args.get('page', 1, type=int)
+    posts = TimelinePagination(page=page, per_page=10, error_out=False, user_id=current_user.id)
+    return render_template('account/timeline.html', posts=posts)
+
+def _rebuild_timeline():
+    try:
+        timeline.rebuild_user(current_user.id)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Timeline rebuild for user {current_user.id} failed: {e}")
+
 @account_bp.route('/subscriptions')
 @login_required
 def subscriptions():
     user_subscriptions = UserSubscription.query.filter_by(user_id=current_user.id).all()
-    available_feeds = Feed.query.filter(~Feed.id.in_([s.feed_id for s in user_subscriptions])).all()
+    subscribed_ids = [s.category_id for s in user_subscriptions]
+    available_categories = Category.query.filter(~Category.id.in_(subscribed_ids)).order_by(
+        Category.sort_order, Category.display_name
+    ).all()
     
     return render_template('account/subscriptions.html', 
                          subscriptions=user_subscriptions, 
-                         available_feeds=available_feeds)
+                         available_categories=available_categories,
+                         telegram_link=link_url())
 
 @account_bp.route('/subscriptions/add', methods=['POST'])
 @login_required
 def add_subscription():
-    feed_id = request.form.get('feed_id', type=int)
+    category_id = request.form.get('category_id', type=int)
     
-    if not feed_id:
-        flash('Выберите канал для подписки', 'error')
+    if not category_id or not db.session.get(Category, category_id):
+        flash('Выберите категорию для подписки', 'error')
         return redirect(url_for('account.subscriptions'))
     
     # Check if subscription already exists
-    existing = UserSubscription.query.filter_by(user_id=current_user.id, feed_id=feed_id).first()
+    existing = UserSubscription.query.filter_by(user_id=current_user.id, category_id=category_id).first()
     if existing:
-        flash('Вы уже подписаны на этот канал', 'warning')
+        flash('Вы уже подписаны на эту категорию', 'warning')
         return redirect(url_for('account.subscriptions'))
     
-    subscription = UserSubscription(user_id=current_user.id, feed_id=feed_id)
+    subscription = UserSubscription(user_id=current_user.id, category_id=category_id)
     
     try:
         db.session.add(subscription)
@@ -194,7 +215,9 @@ def add_subscription():
     except Exception as e:
         db.session.rollback()
         flash('Произошла ошибка при добавлении подписки', 'error')
+        return redirect(url_for('account.subscriptions'))
     
+    _rebuild_timeline()
     return redirect(url_for('account.subscriptions'))
 
 @account_bp.route('/subscriptions/<int:subscription_id>/delete', methods=['POST'])
@@ -212,9 +235,51 @@ def delete_subscription(subscription_id):
     except Exception as e:
         db.session.rollback()
         flash('Произошла ошибка при отмене подписки', 'error')
+        return redirect(url_for('account.subscriptions'))
     
+    _rebuild_timeline()
     return redirect(url_for('account.subscriptions'))
 
+@account_bp.route('/searches')
+@login_required
+def saved_searches():
+    searches = SavedSearch.get_user_searches(current_user.id)
+    return render_template('account/saved_searches.html', searches=searches)
+
+@account_bp.route('/searches/add', methods=['POST'])
+@login_required
+def add_saved_search():
+    terms = SavedSearch.normalize_terms(request.form.get('terms', ''))
+    name = request.form.get('name', '').strip() or ', '.join(terms)
+    
+    if not terms:
+        flash('Укажите хотя бы одно ключевое слово', 'error')
+        return redirect(url_for('account.saved_searches'))
+    
+    try:
+        db.session.add(SavedSearch(user_id=current_user.id, name=name[:100], terms=terms))
+        db.session.commit()
+        flash('Поиск сохранен, новые подходящие посты придут в уведомлениях', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('Произошла ошибка при сохранении поиска', 'error')
+    
+    return redirect(url_for('account.saved_searches'))
+
+@account_bp.route('/searches/<int:search_id>/delete', methods=['POST'])
+@login_required
+def delete_saved_search(search_id):
+    search = SavedSearch.query.filter_by(id=search_id, user_id=current_user.id).first_or_404()
+    
+    try:
+        search.deactivate()
+        flash('Поиск удален', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('Произошла ошибка при удалении поиска', 'error')
+    
+    return redirect(url_for('account.saved_searches'))
+
 @account_bp.route('/statistics')
 @login_required
 def statistics():
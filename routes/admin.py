@@ -1,13 +1,26 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, abort
+from flask_login import current_user
 from models.post import Post
 from models.feed import Feed
 from models.category import Category
-from core.extensions import db
-from services.telegram_bot import telegram_bot
-import asyncio
+from models.feed_deletion_job import FeedDeletionJob
+from models.channel_health import ChannelHealth
+from core.extensions import db, login_manager
+from sqlalchemy import func
+from services.ingest_telemetry import ingest_telemetry, STAGE_LABELS
+from services import feed_deletion
+from core.slow_query import slow_query_log
 
 admin_bp = Blueprint('admin', __name__)
 
+@admin_bp.before_request
+def require_admin():
+    """Every admin page needs a logged in user with the admin role"""
+    if not current_user.is_authenticated:
+        return login_manager.unauthorized()
+    if not current_user.is_admin:
+        abort(403)
+
 @admin_bp.route('/')
 def dashboard():
     """Admin dashboard"""
@@ -25,7 +38,10 @@ def feeds():
     """Manage feeds"""
     feeds = Feed.query.order_by(Feed.name).all()
     categories = Category.query.order_by(Category.display_name).all()
-    return render_template('admin/feeds.html', feeds=feeds, categories=categories)
+    deletion_jobs = FeedDeletionJob.get_recent()
+    deleting_feed_ids = {job.feed_id for job in deletion_jobs if not job.is_finished}
+    return render_template('admin/feeds.html', feeds=feeds, categories=categories,
+                         deletion_jobs=deletion_jobs, deleting_feed_ids=deleting_feed_ids)
 
 @admin_bp.route('/feeds/add', methods=['GET', 'POST'])
 def add_feed():
@@ -57,13 +73,19 @@ def add_feed():
 
 @admin_bp.route('/feeds/<int:feed_id>/delete', methods=['POST'])
 def delete_feed(feed_id):
-    """Delete feed"""
+    """Delete feed: posts are deleted in batches by a background job"""
     feed = Feed.query.get_or_404(feed_id)
-    db.session.delete(feed)
-    db.session.commit()
-    flash('Feed deleted successfully!', 'success')
+    job = feed_deletion.start(feed)
+    feed_deletion.run_async(current_app._get_current_object(), job.id)
+    flash(f'Deleting feed {job.feed_name} and its {job.total_posts} posts in the background', 'info')
     return redirect(url_for('admin.feeds'))
 
+@admin_bp.route('/feed-deletions/<int:job_id>')
+def feed_deletion_status(job_id):
+    """Progress of a feed deletion job, polled by the feeds page"""
+    job = FeedDeletionJob.query.get_or_404(job_id)
+    return jsonify(job.to_dict())
+
 @admin_bp.route('/categories')
 def categories():
     """Manage categories"""
@@ -147,6 +169,13 @@ def telegram_bot():
         )
     ).order_by(Post.telegram_date.desc()).limit(12).all()
     
+    # Post count and latest post per feed in one grouped query
+    feed_posts = {
+        feed_id: (count, last_date) for feed_id, count, last_date in db.session.query(
+            Post.feed_id, func.count(Post.id), func.max(Post.telegram_date)
+        ).filter(Post.feed_id.in_([feed.id for feed in telegram_feeds])).group_by(Post.feed_id)
+    }
+    
     stats = {
         'total_telegram_feeds': len(telegram_feeds),
         'active_telegram_feeds': len([f for f in telegram_feeds if f.is_active]),
@@ -154,9 +183,43 @@ def telegram_bot():
         'recent_telegram_posts': recent_posts
     }
     
+    # Ingest latency per feed, flushed by the bot process
+    ingest_stats = ingest_telemetry.summarize(datetime.utcnow() - timedelta(hours=1))
+    
     return render_template('admin/telegram_bot.html', 
                          telegram_feeds=telegram_feeds, 
-                         stats=stats)
+                         feed_posts=feed_posts,
+                         stats=stats,
+                         ingest_stats=ingest_stats,
+                         channel_health=ChannelHealth.get_by_feed([feed.id for feed in telegram_feeds]),
+                         stage_labels=STAGE_LABELS,
+                         lag_alert_seconds=ingest_telemetry.alert_seconds)
+
+
+@admin_bp.route('/slow-queries')
+def slow_queries():
+    """Slow SQL statements with their source and sampled EXPLAIN plans"""
+    source = request.args.get('source', 'process')
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    
+    if source == 'file' and slow_query_log.log_file:
+        entries = slow_query_log.read_log_file(limit)
+    else:
+        source = 'process'
+        entries = slow_query_log.recent(limit)
+    
+    return render_template('admin/slow_queries.html',
+                         entries=entries,
+                         source=source,
+                         slow_query_log=slow_query_log)
+
+
+@admin_bp.route('/slow-queries/clear', methods=['POST'])
+def clear_slow_queries():
+    """Clear the in-memory slow-query buffer of this process"""
+    slow_query_log.clear()
+    flash('Slow-query buffer cleared', 'success')
+    return redirect(url_for('admin.slow_queries'))
 
 
 @admin_bp.route('/telegram-sync', methods=['POST'])
@@ -1,7 +1,14 @@
-from flask import Blueprint, jsonify, request
+import json
+import queue
+import time
+from flask import Blueprint, Response, jsonify, request
+from sqlalchemy import select
 from models.post import Post
 from models.feed import Feed
 from models.category import Category
+from core.extensions import db
+from services import post_serializer, delta_sync
+from services.live_feed import live_feed
 
 api_bp = Blueprint('api', __name__)
 
@@ -14,36 +21,54 @@ def get_posts():
     category_id = request.args.get('category_id', type=int)
     hide_duplicates = request.args.get('hide_duplicates', 'false').lower() == 'true'
     search = request.args.get('search', '')
+    city = request.args.get('city', '').strip()
+    salary_from = request.args.get('salary_from', type=int)
+    
+    try:
+        fields = post_serializer.parse_fields(request.args.get('fields', ''))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     # Limit per_page to reasonable values
     per_page = min(per_page, 100)
     offset = (page - 1) * per_page
     
-    # Build query
-    query = Post.query
+    # Build filter criteria
+    criteria = Post.listing_criteria()
     
     if feed_id:
-        query = query.filter_by(feed_id=feed_id)
+        criteria.append(Post.feed_id == feed_id)
     elif category_id:
-        feed_ids = [f.id for f in Feed.query.filter_by(category_id=category_id).all()]
+        feed_ids = db.session.execute(
+            select(Feed.id).where(Feed.category_id == category_id)
+        ).scalars().all()
         if feed_ids:
-            query = query.filter(Post.feed_id.in_(feed_ids))
+            criteria.append(Post.feed_id.in_(feed_ids))
     
     if hide_duplicates:
-        query = query.filter(
+        criteria.append(
             (Post.is_primary_duplicate == True) | 
             (Post.duplicate_group_id.is_(None))
         )
     
     if search:
-        query = query.filter(Post.content.contains(search))
+        criteria.append(Post.content.contains(search))
+    
+    # Extracted vacancy fields, served by indexes
+    criteria.extend(Post.vacancy_criteria(city=city, salary_from=salary_from))
     
     # Get results
-    posts = query.order_by(Post.telegram_date.desc()).offset(offset).limit(per_page).all()
-    total = query.count()
+    posts = post_serializer.select_posts(
+        fields,
+        criteria,
+        order_by=Post.telegram_date.desc(),
+        offset=offset,
+        limit=per_page
+    )
+    total = post_serializer.count_posts(criteria)
     
-    return jsonify({
-        'posts': [post.to_dict() for post in posts],
+    return post_serializer.json_response({
+        'posts': posts,
         'pagination': {
             'page': page,
             'per_page': per_page,
@@ -52,6 +77,62 @@ def get_posts():
         }
     })
 
+@api_bp.route('/posts/changes')
+def get_post_changes():
+    """API endpoint returning posts inserted, edited or deleted since a cursor"""
+    cursor = request.args.get('cursor', '')
+    limit = min(request.args.get('limit', 500, type=int), 1000)
+    feed_id = request.args.get('feed_id', type=int)
+    
+    try:
+        fields = post_serializer.parse_fields(request.args.get('fields', ''))
+        changes = delta_sync.get_changes(cursor, limit=max(limit, 1), feed_id=feed_id, fields=fields)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except delta_sync.CursorExpired as e:
+        return jsonify({'error': str(e)}), 410
+    
+    return post_serializer.json_response(changes)
+
+@api_bp.route('/posts/stream')
+def stream_posts():
+    """Server-Sent Events stream of newly ingested posts"""
+    if not live_feed.enabled:
+        return jsonify({'error': 'Live feed is not configured'}), 503
+    if not live_feed.can_stream(request.environ):
+        # Streams belong on the async (gevent) workers, see gunicorn.conf.py
+        return jsonify({'error': 'Streaming is not available on this worker'}), 503
+    
+    feed_id = request.args.get('feed_id', type=int)
+    category_id = request.args.get('category_id', type=int)
+    subscription = live_feed.subscribe()
+    
+    def generate():
+        # Streams are recycled periodically, EventSource reconnects on its own
+        deadline = time.monotonic() + live_feed.max_stream_seconds
+        try:
+            yield 'retry: 5000\n\n'
+            while time.monotonic() < deadline:
+                try:
+                    payload = subscription.get(timeout=live_feed.heartbeat)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                
+                event = json.loads(payload)
+                if feed_id and event['feed_id'] != feed_id:
+                    continue
+                if category_id and event['category_id'] != category_id:
+                    continue
+                yield f"event: post\nid: {event['id']}\ndata: {payload}\n\n"
+        finally:
+            live_feed.unsubscribe(subscription)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @api_bp.route('/feeds')
 def get_feeds():
     """API endpoint to get all feeds"""
@@ -0,0 +1,72 @@
+from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask_login import login_user, logout_user, login_required, current_user
+from models.user import User
+from core.extensions import db, login_manager
+
+auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
+
+@login_manager.user_loader
+def load_user(user_id):
+    return db.session.get(User, int(user_id))
+
+def _safe_next(target):
+    """Only redirect back to paths of this site"""
+    if target and target.startswith('/') and not target.startswith('//'):
+        return target
+    return url_for('main.index')
+
+@auth_bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if current_user.is_authenticated:
+        return redirect(_safe_next(request.args.get('next')))
+
+    if request.method == 'POST':
+        username = request.form.get('username', '').strip()
+        password = request.form.get('password', '')
+        user = User.get_by_username(username) or User.get_by_email(username)
+
+        if user is None or not user.check_password(password):
+            flash('Неверное имя пользователя или пароль', 'error')
+            return render_template('auth/login.html'), 401
+
+        login_user(user, remember=bool(request.form.get('remember')))
+        return redirect(_safe_next(request.args.get('next')))
+
+    return render_template('auth/login.html')
+
+@auth_bp.route('/register', methods=['GET', 'POST'])
+def register():
+    if current_user.is_authenticated:
+        return redirect(url_for('account.dashboard'))
+
+    if request.method == 'POST':
+        username = request.form.get('username', '').strip()
+        email = request.form.get('email', '').strip().lower()
+        password = request.form.get('password', '')
+
+        if not username or not email or len(password) < 6:
+            flash('Укажите имя, email и пароль не короче 6 символов', 'error')
+            return render_template('auth/register.html'), 400
+        if User.get_by_username(username) or User.get_by_email(email):
+            flash('Пользователь с таким именем или email уже существует', 'error')
+            return render_template('auth/register.html'), 400
+
+        user = User(username, email, password)
+        try:
+            db.session.add(user)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            flash('Произошла ошибка при регистрации', 'error')
+            return render_template('auth/register.html'), 500
+
+        login_user(user)
+        return redirect(url_for('account.dashboard'))
+
+    return render_template('auth/register.html')
+
+@auth_bp.route('/logout', methods=['POST'])
+@login_required
+def logout():
+    logout_user()
+    return redirect(url_for('main.index'))
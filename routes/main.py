@@ -2,6 +2,10 @@ from flask import Blueprint, render_template, request
 from models import Post, Feed, Category
 from core.extensions import db
 from flask_login import current_user
+from services.live_feed import live_feed
+from services.archive import FeedPagination
+from services.vacancy_extractor import city_choices
+from services.facet_index import facet_index
 
 main_bp = Blueprint('main', __name__)
 
@@ -12,10 +16,12 @@ def index():
     feed_id = request.args.get('feed_id', type=int)
     category_id = request.args.get('category_id', type=int)
     hide_duplicates = request.args.get('hide_duplicates', 'true').lower() == 'true'
+    city = request.args.get('city', '').strip()
+    salary_from = request.args.get('salary_from', type=int)
     per_page = 10
     
     # Get posts with filters
-    query = Post.query
+    query = Post.query.filter(*Post.listing_criteria(), *Post.vacancy_criteria(city=city, salary_from=salary_from))
     
     if feed_id:
         query = query.filter_by(feed_id=feed_id)
@@ -40,13 +46,22 @@ def index():
     feeds = Feed.query.filter_by(is_active=True).order_by(Feed.name).all()
     categories = Category.query.order_by(Category.sort_order, Category.display_name).all()
     
+    # Post counts per feed, category and city under the other filters, from memory
+    facets = facet_index.counts(feed_id=feed_id, category_id=category_id, city=city,
+                                salary_from=salary_from, hide_duplicates=hide_duplicates)
+    
     return render_template('index.html', 
                          posts=posts,
                          feeds=feeds,
                          categories=categories,
                          current_feed_id=feed_id,
                          current_category_id=category_id,
-                         hide_duplicates=hide_duplicates)
+                         hide_duplicates=hide_duplicates,
+                         current_city=city,
+                         current_salary_from=salary_from,
+                         cities=city_choices(),
+                         facets=facets,
+                         live_updates=live_feed.enabled and not (city or salary_from))
 
 @main_bp.route('/feed/<int:feed_id>')
 def feed_detail(feed_id):
@@ -55,12 +70,17 @@ def feed_detail(feed_id):
     page = request.args.get('page', 1, type=int)
     per_page = 10
     
-    posts = Post.query.filter_by(feed_id=feed_id).order_by(
-        Post.telegram_date.desc()
-    ).paginate(page=page, per_page=per_page, error_out=False)
+    # Pages past the posts in the database continue into the cold archive
+    posts = FeedPagination(page=page, per_page=per_page, error_out=False, feed=feed)
     
     return render_template('feed_detail.html', feed=feed, posts=posts)
 
+@main_bp.route('/post/<int:post_id>/card')
+def post_card(post_id):
+    """Rendered post card, used by the live feed to prepend new posts"""
+    post = Post.query.get_or_404(post_id)
+    return render_template('partials/post_card.html', post=post)
+
 @main_bp.route('/category/<int:category_id>')
 def category_detail(category_id):
     """Show posts from feeds in a specific category"""
@@ -69,7 +89,7 @@ def category_detail(category_id):
     per_page = 10
     
     feed_ids = [f.id for f in category.feeds if f.is_active]
-    posts = Post.query.filter(Post.feed_id.in_(feed_ids)).order_by(
+    posts = Post.query.filter(Post.feed_id.in_(feed_ids), *Post.listing_criteria()).order_by(
         Post.telegram_date.desc()
     ).paginate(page=page, per_page=per_page, error_out=False) if feed_ids else None
     
@@ -95,7 +115,7 @@ def sluzhba():
     else:
         # Get posts only from the target channel with duplicate filtering
         posts = Post.query.filter(
-            Post.feed_id == target_feed.id
+            Post.feed_id == target_feed.id, *Post.listing_criteria()
         ).filter(
             (Post.is_primary_duplicate == True) | 
             (Post.duplicate_group_id.is_(None))
@@ -0,0 +1,472 @@
+"""
+Cold archive of old posts.
+
+``archive_posts`` moves posts older than a cutoff out of the database into
+compressed JSON-lines segments, one per feed and month::
+
+    ARCHIVE_DIR/feed_<feed_id>/<YYYY-MM>.jsonl.zst   (or .jsonl.gz)
+    ARCHIVE_DIR/feed_<feed_id>/<YYYY-MM>.idx.json
+
+Every archiving run appends one compressed frame to a segment. zstd frames
+and gzip members can be concatenated, so a segment is never rewritten. The
+sidecar index holds the byte range of every frame, the segment's date range
+and maps ``telegram_message_id`` to the post id, date and frame of its
+current row. A message archived again (restored, edited, archived) gets a
+new row in a new frame and its index entry points there; the old row stays
+in the file but is no longer read. Readers use the index to skip segments,
+to decompress only the frames they need and to ignore rows that a crashed
+run wrote but never indexed. Decoded segments are cached per process
+(ARCHIVE_CACHE_SEGMENTS), so paging through a segment decompresses it once.
+
+Archived posts are removed from ``posts`` with delete tombstones for delta
+sync; ``restore`` moves them back with insert changes. Posts referenced by
+``user_posts`` or ``post_statistics`` stay in the database, so their
+foreign keys hold. ``feed_detail`` reads the archive for pages past the
+posts still in the database.
+"""
+import gzip
+import io
+import json
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime
+from itertools import groupby
+
+from flask import current_app
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy import exists, func, select
+
+from core.extensions import db
+from models.post import Post
+from models.post_change import PostChange
+from models.post_statistics import PostStatistics
+from models.user_post import UserPost
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional, gzip is used instead
+    zstandard = None
+
+CODECS = {'zstd': '.jsonl.zst', 'gzip': '.jsonl.gz'}
+DATETIME_FIELDS = ('telegram_date', 'created_at', 'updated_at')
+
+logger = logging.getLogger(__name__)
+
+
+def archive_dir():
+    return current_app.config.get('ARCHIVE_DIR') or os.path.join(current_app.root_path, 'archive')
+
+
+def feed_dir(feed_id):
+    return os.path.join(archive_dir(), f'feed_{feed_id}')
+
+
+def preferred_codec():
+    codec = current_app.config.get('ARCHIVE_COMPRESSION', 'zstd')
+    if codec == 'zstd' and zstandard is None:
+        logger.warning("zstandard is not installed, archiving with gzip")
+        return 'gzip'
+    return codec
+
+
+def compress(data, codec):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=9)
+
+
+def decompress(data, codec):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('zstandard is required to read zstd segments')
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return gzip.decompress(data)
+
+
+def open_segment(path):
+    """Text stream over every frame of a segment."""
+    raw = open(path, 'rb')
+    if path.endswith(CODECS['zstd']):
+        if zstandard is None:
+            raw.close()
+            raise RuntimeError(f'zstandard is required to read {path}')
+        stream = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+    else:
+        stream = gzip.GzipFile(fileobj=raw)
+    return io.TextIOWrapper(stream, encoding='utf-8')
+
+
+def serialize(row):
+    record = dict(row)
+    for field in DATETIME_FIELDS:
+        if record.get(field) is not None:
+            record[field] = record[field].isoformat()
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+
+
+def deserialize(line):
+    record = json.loads(line)
+    for field in DATETIME_FIELDS:
+        if record.get(field):
+            record[field] = datetime.fromisoformat(record[field])
+    return record
+
+
+class Segment:
+    """One feed-month segment and its sidecar index"""
+
+    def __init__(self, feed_id, month, path):
+        self.feed_id = feed_id
+        self.month = month
+        self.path = path
+        self.index_path = path.rsplit('.jsonl', 1)[0] + '.idx.json'
+        self.codec = 'zstd' if path.endswith(CODECS['zstd']) else 'gzip'
+        self._index = None
+        self._index_mtime = None
+
+    @property
+    def index(self):
+        mtime = os.path.getmtime(self.index_path) if os.path.exists(self.index_path) else None
+        if self._index is None or mtime != self._index_mtime:
+            if mtime is None:
+                self._index = {'feed_id': self.feed_id, 'month': self.month, 'count': 0,
+                               'min_date': None, 'max_date': None, 'frames': [], 'messages': {}}
+            else:
+                with open(self.index_path, encoding='utf-8') as f:
+                    self._index = json.load(f)
+            self._index_mtime = mtime
+        return self._index
+
+    @property
+    def count(self):
+        return self.index['count']
+
+    def append(self, rows):
+        """
+        Append rows as one compressed frame, then update the index.
+
+        Rows of messages that are already indexed replace their entries.
+        """
+        if not rows:
+            return 0
+        index = self.index
+        messages = index['messages']
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        payload = ('\n'.join(serialize(row) for row in rows) + '\n').encode('utf-8')
+        # A segment keeps the codec it was created with
+        data = compress(payload, self.codec)
+        with open(self.path, 'ab') as f:
+            offset = f.tell()
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        # Segments written before frames were indexed are only read as a whole stream
+        frames = index.setdefault('frames', [])
+        frame = None
+        if offset == 0 or frames:
+            frame = len(frames)
+            frames.append([offset, len(data)])
+        for row in rows:
+            entry = [row['id'], row['telegram_date'].isoformat()]
+            messages[str(row['telegram_message_id'])] = entry if frame is None else entry + [frame]
+        self._write_index()
+        return len(rows)
+
+    def remove(self, telegram_message_ids):
+        """Drop messages from the index; their rows stay in the file but are no longer read."""
+        messages = self.index['messages']
+        removed = [messages.pop(str(message_id)) for message_id in telegram_message_ids
+                   if str(message_id) in messages]
+        if removed:
+            self._write_index()
+        return len(removed)
+
+    def _write_index(self):
+        index = self.index
+        dates = [entry[1] for entry in index['messages'].values()]
+        index.update(count=len(dates), min_date=min(dates, default=None), max_date=max(dates, default=None))
+
+        temporary = self.index_path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(index, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.index_path)
+
+    def read(self):
+        """Indexed rows of the segment, newest first."""
+        if not os.path.exists(self.path):
+            return []
+        index = self.index
+        key = (self._index_mtime, os.path.getsize(self.path), index['count'])
+        cached = _decoded.get(self.path)
+        if cached is not None and cached[0] == key:
+            _decoded.move_to_end(self.path)
+            return cached[1]
+
+        rows = sorted(self._decode(index['messages'].values()).values(),
+                      key=lambda r: (r['telegram_date'], r['id']), reverse=True)
+        _decoded[self.path] = (key, rows)
+        while len(_decoded) > current_app.config.get('ARCHIVE_CACHE_SEGMENTS', 16):
+            _decoded.popitem(last=False)
+        return rows
+
+    def read_entry(self, entry):
+        """The row of one index entry, decompressing only its frame."""
+        return self._decode([entry]).get(entry[0])
+
+    def _decode(self, entries):
+        """Rows of the given index entries as post id -> row."""
+        wanted = {}
+        for entry in entries:
+            wanted.setdefault(entry[2] if len(entry) > 2 else None, set()).add(entry[0])
+
+        records = {}
+        if None in wanted:
+            # Unframed entries: scan the whole stream, the last row of a post wins
+            with open_segment(self.path) as f:
+                for line in f:
+                    if line.strip():
+                        record = deserialize(line)
+                        if record['id'] in wanted[None]:
+                            records[record['id']] = record
+        frames = self.index['frames']
+        with open(self.path, 'rb') as f:
+            for frame in sorted(key for key in wanted if key is not None):
+                offset, length = frames[frame]
+                f.seek(offset)
+                for line in decompress(f.read(length), self.codec).decode('utf-8').splitlines():
+                    if line.strip():
+                        record = deserialize(line)
+                        if record['id'] in wanted[frame]:
+                            records[record['id']] = record
+        return records
+
+
+class ArchivedPost:
+    """Read-only stand-in for Post in templates, built from an archived row"""
+
+    archived = True
+
+    def __init__(self, record, feed):
+        self.__dict__.update(record)
+        self.feed = feed
+
+    def get_contacts_dict(self):
+        return {
+            'phone_numbers': self.phone_numbers or [],
+            'emails': self.emails or [],
+            'telegram_users': self.telegram_users or [],
+            'urls': self.urls or []
+        }
+
+    def has_contacts(self):
+        return any([self.phone_numbers, self.emails, self.telegram_users, self.urls])
+
+
+_segments = {}
+# Decoded rows of recently read segments: path -> ((index mtime, file size), rows)
+_decoded = OrderedDict()
+
+
+def segments(feed_id):
+    """Segments of a feed, newest month first."""
+    directory = feed_dir(feed_id)
+    if not os.path.isdir(directory):
+        return []
+    found = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        for codec, extension in CODECS.items():
+            if name.endswith(extension):
+                path = os.path.join(directory, name)
+                if path not in _segments:
+                    _segments[path] = Segment(feed_id, name[:-len(extension)], path)
+                found.append(_segments[path])
+    return found
+
+
+def segment_for(feed_id, month, codec):
+    existing = [segment for segment in segments(feed_id) if segment.month == month]
+    if existing:
+        return existing[0]
+    path = os.path.join(feed_dir(feed_id), month + CODECS[codec])
+    return _segments.setdefault(path, Segment(feed_id, month, path))
+
+
+def count_archived(feed_id):
+    return sum(segment.count for segment in segments(feed_id))
+
+
+def read_archived(feed, offset, limit):
+    """Archived posts of ``feed``, newest first, skipping whole segments by their counts."""
+    posts = []
+    for segment in segments(feed.id):
+        if offset >= segment.count:
+            offset -= segment.count
+            continue
+        rows = segment.read()[offset:offset + limit - len(posts)]
+        posts.extend(ArchivedPost(row, feed) for row in rows)
+        offset = 0
+        if len(posts) >= limit:
+            break
+    return posts
+
+
+def archived_message_ids(feed_id, telegram_message_ids):
+    """The given message ids of a feed that are archived, from the segment indexes."""
+    wanted = {str(message_id) for message_id in telegram_message_ids}
+    found = set()
+    for segment in segments(feed_id):
+        found.update(int(message_id) for message_id in wanted & segment.index['messages'].keys())
+    return found
+
+
+def find(feed_id, telegram_message_id):
+    """Look up one archived message, None if it is not archived."""
+    for segment in segments(feed_id):
+        entry = segment.index['messages'].get(str(telegram_message_id))
+        if entry:
+            return segment.read_entry(entry)
+    return None
+
+
+def search(query, feed_id=None, since=None, until=None, limit=100):
+    """
+    Case-insensitive substring search over archived posts.
+
+    Segments whose indexed date range misses ``since``/``until`` are not opened.
+    """
+    needle = query.lower()
+    directory = archive_dir()
+    feed_ids = [feed_id] if feed_id else sorted(
+        int(name[len('feed_'):]) for name in os.listdir(directory) if name.startswith('feed_')
+    ) if os.path.isdir(directory) else []
+
+    results = []
+    for current_feed_id in feed_ids:
+        for segment in segments(current_feed_id):
+            index = segment.index
+            if not index['count']:
+                continue
+            if since and datetime.fromisoformat(index['max_date']) < since:
+                continue
+            if until and datetime.fromisoformat(index['min_date']) >= until:
+                continue
+            for row in segment.read():
+                if since and row['telegram_date'] < since or until and row['telegram_date'] >= until:
+                    continue
+                if needle in (row['content'] or '').lower():
+                    results.append(row)
+                    if len(results) >= limit:
+                        return results
+    return results
+
+
+def archive_posts(older_than, batch_size=1000, feed_id=None, log=print):
+    """
+    Move posts with ``telegram_date`` before ``older_than`` to the archive.
+
+    Each batch is written and fsynced before it is deleted from the
+    database, so a crash never loses posts; a rerun archives the rows of
+    the crashed batch again, replacing their index entries.
+
+    Returns:
+        int: Number of archived posts
+    """
+    codec = preferred_codec()
+    columns = list(Post.__table__.columns)
+    criteria = [
+        Post.telegram_date < older_than,
+        ~exists().where(UserPost.post_id == Post.id),
+        ~exists().where(PostStatistics.post_id == Post.id),
+    ]
+    if feed_id:
+        criteria.append(Post.feed_id == feed_id)
+
+    total = 0
+    while True:
+        rows = db.session.execute(
+            select(*columns).where(*criteria).order_by(Post.id).limit(batch_size)
+        ).mappings().all()
+        if not rows:
+            break
+
+        grouped = sorted(rows, key=lambda r: (r['feed_id'], r['telegram_date']))
+        for (group_feed_id, month), group in groupby(
+            grouped, key=lambda r: (r['feed_id'], r['telegram_date'].strftime('%Y-%m'))
+        ):
+            segment_for(group_feed_id, month, codec).append(list(group))
+
+        ids = [row['id'] for row in rows]
+        PostChange.record_deletions(Post.id.in_(ids))
+        db.session.execute(Post.__table__.delete().where(Post.id.in_(ids)))
+        db.session.commit()
+
+        total += len(rows)
+        log(f'Archived {total} posts')
+    return total
+
+
+def restore(feed_id, month=None, log=print):
+    """
+    Move archived posts of a feed (optionally one ``YYYY-MM``) back into ``posts``.
+
+    Restored posts keep their ids and get insert changes for delta sync and
+    the facet index. They are then dropped from the segment index, so feed
+    pages do not list them twice; the next archiving run archives them
+    again if they are still older than its cutoff. A rerun after a crash
+    between the commit and the index update only drops them from the index.
+
+    Returns:
+        int: Number of restored posts
+    """
+    columns = {column.name for column in Post.__table__.columns}
+    restored = 0
+    for segment in segments(feed_id):
+        if month and segment.month != month:
+            continue
+        rows = [{k: v for k, v in row.items() if k in columns} for row in segment.read()]
+        if not rows:
+            continue
+        existing = set(db.session.execute(
+            select(Post.id).where(Post.id.in_([row['id'] for row in rows]))
+        ).scalars())
+        missing = [row for row in rows if row['id'] not in existing]
+        if missing:
+            db.session.execute(Post.__table__.insert(), missing)
+            PostChange.record_insertions(Post.id.in_([row['id'] for row in missing]))
+            db.session.commit()
+            restored += len(missing)
+            log(f'Restored {len(missing)} posts of {segment.month}')
+        segment.remove(row['telegram_message_id'] for row in rows)
+    return restored
+
+
+class FeedPagination(Pagination):
+    """Pagination over a feed's posts in the database, then in the archive"""
+
+    def _query_items(self):
+        feed = self._query_args['feed']
+        db_count = self._db_count()
+        items = []
+        if self._query_offset < db_count:
+            items = Post.query.filter_by(feed_id=feed.id).filter(*Post.listing_criteria()).order_by(
+                Post.telegram_date.desc()
+            ).offset(self._query_offset).limit(self.per_page).all()
+        if len(items) < self.per_page:
+            items += read_archived(feed, max(0, self._query_offset - db_count), self.per_page - len(items))
+        return items
+
+    def _query_count(self):
+        return self._db_count() + count_archived(self._query_args['feed'].id)
+
+    def _db_count(self):
+        if 'db_count' not in self._query_args:
+            feed = self._query_args['feed']
+            self._query_args['db_count'] = db.session.execute(
+                select(func.count(Post.id)).where(Post.feed_id == feed.id, *Post.listing_criteria())
+            ).scalar()
+        return self._query_args['db_count']
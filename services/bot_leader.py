@@ -0,0 +1,167 @@
+"""
+Single active poller among bot processes.
+
+Telegram answers concurrent ``getUpdates`` calls with a conflict error, so
+only one bot process may poll. Every ``flask telegram monitor`` process
+initialises the bot, then waits in hot standby until it takes the poller
+lock; only the holder polls, processes updates and runs the bot's periodic
+work. The lock is a Postgres session advisory lock on a dedicated
+connection (BOT_LEADER_DATABASE_URL, or SCHEDULER_LOCK_DATABASE_URL, when
+DB_PGBOUNCER is on), or a file lock on SQLite.
+
+* The leader heartbeats its lock connection every
+  BOT_LEADER_HEARTBEAT_SECONDS and stops polling as soon as it fails.
+* TCP keepalives on both ends of that connection make Postgres end the
+  session of a dead or unreachable leader within about twice the
+  heartbeat, which frees the lock.
+* A standby retries every BOT_LEADER_RETRY_SECONDS, so a crashed leader is
+  replaced within seconds. A leader that stops cleanly confirms its last
+  fetched updates and unlocks at once.
+* With the ingest journal open (services/ingest_journal.py) a leader that
+  cannot reach the lock database keeps polling: updates go to the journal
+  and are saved once the database is back. No standby can take the lock
+  during the outage. Once the database returns, a standby may take the
+  lock before the leader's next heartbeat; both then poll, and Telegram
+  answers with conflict errors, for at most BOT_LEADER_HEARTBEAT_SECONDS,
+  until the old leader's heartbeat fails and it stops. Without the journal
+  the leader stops polling as soon as a heartbeat fails.
+
+Telegram keeps unconfirmed updates for 24 hours, and the new leader starts
+polling without dropping pending updates, so nothing is lost on failover.
+During an overlap the unique index on (feed_id, telegram_message_id,
+telegram_date) keeps posts from being inserted twice.
+"""
+import asyncio
+import logging
+import zlib
+from time import monotonic
+
+from core import metrics
+from services.scheduler import FileLeaderLock, PostgresLeaderLock
+
+LOCK_KEY = zlib.crc32(b'telegram_feed_website:bot-poller')
+
+IS_LEADER = metrics.gauge(
+    'telegram_bot_is_leader', 'Whether this bot process polls Telegram', multiprocess_mode='livemax'
+)
+ACQUIRED = metrics.counter(
+    'telegram_bot_leader_acquired_total', 'Times this process became the active poller'
+)
+LOST = metrics.counter(
+    'telegram_bot_leader_lost_total', 'Times the active poller lost its lock'
+)
+
+
+class BotLeader:
+    """Poller lock of the bot processes"""
+
+    def __init__(self, app=None):
+        self.app = app
+        self.enabled = True
+        self.heartbeat_seconds = 5
+        self.retry_seconds = 2
+        self.is_leader = False
+        self.logger = logging.getLogger(__name__)
+        self._lock = None
+        self._last_heartbeat = 0
+        self._outage = False
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('BOT_LEADER_ENABLED', True)
+        self.heartbeat_seconds = max(1, app.config.get('BOT_LEADER_HEARTBEAT_SECONDS', 5))
+        self.retry_seconds = app.config.get('BOT_LEADER_RETRY_SECONDS', 2)
+
+    def _make_lock(self):
+        config = self.app.config
+        direct_url = config.get('BOT_LEADER_DATABASE_URL') or config.get('SCHEDULER_LOCK_DATABASE_URL')
+        url = direct_url or config.get('SQLALCHEMY_DATABASE_URI') or ''
+        if url.startswith('postgres'):
+            if config.get('DB_PGBOUNCER') and not direct_url:
+                self.logger.error("DB_PGBOUNCER is on and BOT_LEADER_DATABASE_URL is not set: "
+                                  "polling without leader election")
+                return None
+            return PostgresLeaderLock(url, LOCK_KEY, keepalive_seconds=self.heartbeat_seconds)
+        return FileLeaderLock(config.get('BOT_LEADER_LOCK_FILE', '/tmp/telegram_feed_bot.lock'))
+
+    def _set_leader(self, leader):
+        self.is_leader = leader
+        IS_LEADER.set(1 if leader else 0)
+
+    async def _try_lock(self):
+        """True while the lock is held, False when another process holds it, None when unreachable."""
+        try:
+            return await asyncio.to_thread(self._lock.acquire)
+        except Exception as e:
+            self.logger.error(f"Bot leader lock failed: {e}")
+            return None
+
+    async def acquire(self):
+        """Wait in standby until this process holds the poller lock."""
+        if not self.enabled:
+            self._set_leader(True)
+            return
+        if self._lock is None:
+            self._lock = self._make_lock()
+            if self._lock is None:
+                self._set_leader(True)
+                return
+
+        announced = False
+        while not await self._try_lock():
+            if not announced:
+                self.logger.info("⏳ Another bot process is polling, standing by")
+                announced = True
+            await asyncio.sleep(self.retry_seconds)
+
+        self._last_heartbeat = monotonic()
+        self._set_leader(True)
+        ACQUIRED.inc()
+        self.logger.info("👑 This process is now the active poller")
+
+    async def check(self, through_outage=False):
+        """
+        Heartbeat the lock when due.
+
+        Args:
+            through_outage (bool): Keep leading while the lock database is unreachable
+                (updates are journaled meanwhile)
+
+        Returns:
+            bool: False once leadership is lost, polling must stop
+        """
+        if not self.is_leader:
+            return False
+        if self._lock is None or monotonic() - self._last_heartbeat < self.heartbeat_seconds:
+            return True
+        self._last_heartbeat = monotonic()
+        held = await self._try_lock()
+        if held:
+            if self._outage:
+                self._outage = False
+                self.logger.info("👑 Poller lock database is reachable again, lock kept")
+            return True
+        if held is None and through_outage:
+            if not self._outage:
+                self._outage = True
+                self.logger.warning("⚠️  Poller lock database unreachable, polling on into the ingest journal")
+            return True
+
+        self._outage = False
+        self._set_leader(False)
+        LOST.inc()
+        self.logger.error("💔 Lost the poller lock, stopping polling")
+        return False
+
+    async def release(self):
+        """Give up the lock so a standby takes over immediately."""
+        if self._lock is not None:
+            await asyncio.to_thread(self._lock.release)
+        self._set_leader(False)
+
+
+# Global instance
+bot_leader = BotLeader()
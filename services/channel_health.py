@@ -0,0 +1,217 @@
+"""
+Periodic health checks of the bot's channels.
+
+Every CHANNEL_HEALTH_INTERVAL_SECONDS (plus or minus up to
+CHANNEL_HEALTH_JITTER_SECONDS, so restarts of several bots do not line up)
+the monitoring loop starts one check run as a background task:
+
+* ``get_chat_member`` is called for every active channel feed, at most
+  CHANNEL_HEALTH_CONCURRENCY at a time, each request bounded by
+  CHANNEL_HEALTH_TIMEOUT_SECONDS, through the rate-limited TelegramClient
+  (flood waits and network errors are retried there);
+* the checks use their own Bot with a connection pool sized for that
+  concurrency, so they never queue behind message handling;
+* all results are written in one transaction to ``channel_health``, and
+  feeds whose channel no longer has the bot as administrator are
+  deactivated with a single UPDATE.
+
+The first run starts a random delay of up to the jitter after the bot has
+started polling, never before it. Errors (timeouts, network) are recorded
+but do not deactivate a feed.
+"""
+import asyncio
+import logging
+import random
+from collections import Counter, namedtuple
+from datetime import datetime
+from time import monotonic, perf_counter
+
+from telegram import Bot, ChatMember
+from telegram.error import Forbidden, RetryAfter, TimedOut
+from telegram.request import HTTPXRequest
+
+from core import metrics
+from core.extensions import db
+from models.channel_health import ChannelHealth, HealthStatus
+from models.feed import Feed
+from services.telegram_client import TelegramClient, bot_kwargs
+
+CheckResult = namedtuple('CheckResult', 'feed_id name status member_status error duration_ms')
+
+CHECKS = metrics.counter(
+    'channel_health_checks_total', 'Channel health checks by outcome', ['status']
+)
+CHECK_SECONDS = metrics.histogram(
+    'channel_health_check_seconds', 'Duration of one get_chat_member health check'
+)
+RUN_SECONDS = metrics.histogram(
+    'channel_health_run_seconds', 'Duration of a full channel health check run',
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600)
+)
+
+
+class ChannelHealthChecker:
+    """Checks all channel feeds concurrently on a jittered schedule"""
+
+    def __init__(self, app=None):
+        self.app = app
+        self.enabled = True
+        self.interval = 3600
+        self.jitter = 60
+        self.concurrency = 10
+        self.timeout = 10
+        self.logger = logging.getLogger(__name__)
+        self._bot = None
+        self._client = None
+        self._task = None
+        self._next_run = None
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('CHANNEL_HEALTH_ENABLED', True)
+        self.interval = app.config.get('CHANNEL_HEALTH_INTERVAL_SECONDS', 3600)
+        self.jitter = app.config.get('CHANNEL_HEALTH_JITTER_SECONDS', 60)
+        self.concurrency = max(1, app.config.get('CHANNEL_HEALTH_CONCURRENCY', 10))
+        self.timeout = app.config.get('CHANNEL_HEALTH_TIMEOUT_SECONDS', 10)
+
+    def due(self):
+        """True when no run is in progress and the next one is scheduled for now."""
+        if not self.enabled or (self._task and not self._task.done()):
+            return False
+        if self._next_run is None:
+            # First run shortly after start-up, spread over the jitter window
+            self._next_run = monotonic() + random.uniform(0, self.jitter)
+        return monotonic() >= self._next_run
+
+    def start(self, token):
+        """Start a run as a background task of the running event loop."""
+        self._task = asyncio.create_task(self.run(token))
+        return self._task
+
+    async def _get_bot(self, token):
+        if self._bot is None:
+            request = HTTPXRequest(
+                connection_pool_size=self.concurrency,
+                connect_timeout=self.timeout,
+                read_timeout=self.timeout,
+                pool_timeout=self.timeout
+            )
+            bot = Bot(token=token, request=request, **bot_kwargs(self.app.config))
+            await bot.initialize()
+            self._bot = bot
+            self._client = TelegramClient(bot)
+        return self._client
+
+    async def close(self):
+        if self._bot is not None:
+            await self._bot.shutdown()
+            self._bot = None
+            self._client = None
+
+    def _load_feeds(self):
+        with self.app.app_context():
+            return db.session.query(Feed.id, Feed.name, Feed.telegram_channel_id).filter(
+                Feed.is_active == True, Feed.telegram_channel_id != None, Feed.telegram_channel_id != ''
+            ).all()
+
+    async def _check(self, client, semaphore, feed_id, name, channel_id):
+        async with semaphore:
+            started = perf_counter()
+            status, member_status, error = HealthStatus.ERROR, None, None
+            try:
+                member = await client.get_chat_member(channel_id, client.id)
+                member_status = member.status
+                status = HealthStatus.OK if member.status == ChatMember.ADMINISTRATOR else HealthStatus.NOT_ADMIN
+            except RetryAfter as e:
+                error = f'Flood control: retry after {e.retry_after}s'
+            except Forbidden as e:
+                # The bot was removed from the channel
+                status, error = HealthStatus.NOT_ADMIN, str(e)
+            except TimedOut:
+                error = f'Timed out after {self.timeout}s'
+            except Exception as e:
+                error = str(e) or type(e).__name__
+            duration = perf_counter() - started
+            CHECK_SECONDS.observe(duration)
+            CHECKS.labels(status=status.value).inc()
+            return CheckResult(feed_id, name, status, member_status, error, duration * 1000)
+
+    def _save(self, results):
+        """Write all results and deactivations in one transaction."""
+        with self.app.app_context():
+            try:
+                existing_feeds = set(db.session.execute(
+                    db.select(Feed.id).where(Feed.id.in_([result.feed_id for result in results]))
+                ).scalars())
+                results = [result for result in results if result.feed_id in existing_feeds]
+                rows = ChannelHealth.get_by_feed([result.feed_id for result in results])
+                now = datetime.utcnow()
+                for result in results:
+                    row = rows.get(result.feed_id)
+                    if row is None:
+                        row = ChannelHealth(feed_id=result.feed_id, status=result.status)
+                        db.session.add(row)
+                    row.status = result.status
+                    row.member_status = result.member_status
+                    row.error = result.error
+                    row.duration_ms = result.duration_ms
+                    row.last_checked = now
+                    if result.status == HealthStatus.ERROR:
+                        row.consecutive_errors = (row.consecutive_errors or 0) + 1
+                    else:
+                        row.consecutive_errors = 0
+                    if result.status == HealthStatus.OK:
+                        row.last_ok_at = now
+
+                lost = [result for result in results if result.status == HealthStatus.NOT_ADMIN]
+                if lost:
+                    Feed.query.filter(Feed.id.in_([result.feed_id for result in lost])).update(
+                        {'is_active': False, 'updated_at': now}, synchronize_session=False
+                    )
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+        for result in lost:
+            self.logger.info(f"🔇 Deactivated {result.name} - bot is no longer admin ({result.error or result.member_status})")
+        return lost
+
+    async def run(self, token):
+        """
+        Check every active channel feed once.
+
+        Returns:
+            dict: Number of checks per status
+        """
+        started = perf_counter()
+        try:
+            feeds = await asyncio.to_thread(self._load_feeds)
+            if not feeds:
+                return {}
+            client = await self._get_bot(token)
+            semaphore = asyncio.Semaphore(self.concurrency)
+            results = await asyncio.gather(*(
+                self._check(client, semaphore, feed_id, name, channel_id) for feed_id, name, channel_id in feeds
+            ))
+            await asyncio.to_thread(self._save, results)
+
+            summary = Counter(result.status.value for result in results)
+            self.logger.info(
+                f"🔍 Checked {len(results)} channel(s) in {perf_counter() - started:.1f}s: "
+                + ', '.join(f'{status} {count}' for status, count in sorted(summary.items()))
+            )
+            return dict(summary)
+        except Exception as e:
+            self.logger.error(f"Channel health check failed: {e}")
+            return {}
+        finally:
+            RUN_SECONDS.observe(perf_counter() - started)
+            self._next_run = monotonic() + self.interval + random.uniform(-self.jitter, self.jitter)
+
+
+# Global instance
+channel_health = ChannelHealthChecker()
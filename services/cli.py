@@ -19,29 +19,34 @@ def telegram():
 
 @telegram.command()
 @with_appcontext
-@click.option('--limit', default=50, help='Number of messages to fetch per channel')
+@click.option('--limit', default=1000, help='Older messages to import per channel in this run')
 def sync(limit):
-    """Sync all Telegram feeds (History sync not available for bot tokens)."""
-    click.echo(f"⚠️  History sync not available for bot tokens.")
-    click.echo(f"Bot tokens can only monitor NEW messages in real-time.")
-    click.echo(f"Use 'flask telegram monitor' to start real-time monitoring.")
-    
-    # Show current feeds
-    feeds = Feed.query.filter_by(is_active=True).filter(Feed.telegram_channel_id != None).all()
-    if feeds:
-        click.echo(f"\nActive Telegram feeds ({len(feeds)}):")
-        for feed in feeds:
-            click.echo(f"  - {feed.name} ({feed.telegram_channel_id})")
-    else:
-        click.echo("\nNo active Telegram feeds found.")
+    """Import history of all active Telegram feeds (MTProto user session)."""
+    from services.history_backfill import history_backfill
+    
+    if not history_backfill.available(interactive=True):
+        click.echo("⚠️  History import needs pyrogram and TELEGRAM_API_ID / TELEGRAM_API_HASH.")
+        click.echo("Use 'flask telegram monitor' for real-time monitoring only.")
+        return
+    
+    results = asyncio.run(telegram_bot.sync_all_feeds(limit))
+    if not results:
+        click.echo("No active Telegram feeds found.")
+        return
+    feeds = {feed.id: feed for feed in Feed.query.filter(Feed.id.in_(results))}
+    for feed_id, count in results.items():
+        click.echo(f"  - {feeds[feed_id].name}: {count} posts imported")
+    click.echo(f"Imported {sum(results.values())} posts into {len(results)} feeds.")
 
 
 @telegram.command()
 @with_appcontext
 @click.argument('feed_id', type=int)
-@click.option('--limit', default=50, help='Number of messages to fetch')
+@click.option('--limit', default=1000, help='Older messages to import in this run')
 def sync_feed(feed_id, limit):
-    """Sync a specific Telegram feed by ID (History sync not available for bot tokens)."""
+    """Import history of one Telegram feed, continuing where the last import stopped."""
+    from services.history_backfill import history_backfill
+    
     feed = Feed.query.get(feed_id)
     if not feed:
         click.echo(f"Feed with ID {feed_id} not found.")
@@ -51,9 +56,31 @@ def sync_feed(feed_id, limit):
         click.echo(f"Feed '{feed.name}' has no Telegram channel ID.")
         return
     
-    click.echo(f"⚠️  History sync not available for bot tokens.")
-    click.echo(f"Feed '{feed.name}' can only be monitored in real-time.")
-    click.echo(f"Use 'flask telegram monitor' to start monitoring.")
+    if not history_backfill.available(interactive=True):
+        click.echo("⚠️  History import needs pyrogram and TELEGRAM_API_ID / TELEGRAM_API_HASH.")
+        return
+    
+    count = asyncio.run(telegram_bot.sync_channel_to_database(feed_id, limit))
+    click.echo(f"Imported {count} posts into '{feed.name}'.")
+
+
+@telegram.command('sync-status')
+@with_appcontext
+def sync_status():
+    """Show history import progress of every Telegram feed."""
+    from models.feed_backfill import FeedBackfill
+    
+    feeds = Feed.query.filter(Feed.telegram_channel_id != None).order_by(Feed.id).all()
+    backfills = FeedBackfill.get_by_feed([feed.id for feed in feeds])
+    for feed in feeds:
+        backfill = backfills.get(feed.id)
+        if backfill is None:
+            click.echo(f"  {feed.id} {feed.name}: not imported")
+            continue
+        state = 'complete' if backfill.history_complete else f'continues below message {backfill.oldest_message_id}'
+        click.echo(f"  {feed.id} {feed.name}: {backfill.imported_count} posts, {state}")
+        if backfill.last_error:
+            click.echo(f"      last error: {backfill.last_error}")
 
 
 @telegram.command()
@@ -171,6 +198,44 @@ def list_feeds():
         click.echo("  ---")
 
 
+@telegram.command('check-channels')
+@with_appcontext
+def check_channels():
+    """Check once that the bot is still administrator of every active channel."""
+    from services.channel_health import channel_health
+    
+    async def check():
+        try:
+            return await channel_health.run(telegram_bot.bot_token)
+        finally:
+            await channel_health.close()
+    
+    summary = asyncio.run(check())
+    if not summary:
+        click.echo("No channels checked.")
+    for status, count in sorted(summary.items()):
+        click.echo(f"  {status}: {count}")
+
+
+@telegram.command('replay-journal')
+@with_appcontext
+def replay_journal():
+    """Save the updates left in the ingest journal while no bot is running."""
+    from services.ingest_journal import ingest_journal
+    
+    if not ingest_journal.open():
+        click.echo("Ingest journal is disabled or in use by a running bot.")
+        return
+    backlog = ingest_journal.backlog
+    
+    async def replay():
+        async with telegram_bot.bot:
+            await ingest_journal.drain(telegram_bot.apply_journaled)
+    
+    asyncio.run(replay())
+    click.echo(f"Replayed {backlog - ingest_journal.backlog} of {backlog} journaled updates.")
+
+
 @telegram.command()
 @with_appcontext
 def test_connection():
@@ -184,8 +249,8 @@ def test_connection():
             
             # Получаем информацию о боте
             try:
-                if telegram_bot.bot:
-                    me = await telegram_bot.bot.get_me()
+                if telegram_bot.client:
+                    me = await telegram_bot.client.get_me()
                     click.echo(f"Bot info: {me.first_name} (@{me.username})")
                 else:
                     click.echo("Bot object not available")
@@ -200,6 +265,372 @@ def test_connection():
     asyncio.run(test())
 
 
+@click.group()
+def partitions():
+    """Monthly partitions of the posts table (Postgres)."""
+    pass
+
+
+@partitions.command('migrate')
+@with_appcontext
+@click.option('--batch-size', default=10000, help='Rows copied per transaction')
+@click.option('--drop-old', is_flag=True, help='Drop the old table instead of keeping posts_unpartitioned')
+def partitions_migrate(batch_size, drop_old):
+    """Convert the posts table into monthly partitions."""
+    from flask import current_app
+    from services import partitioning
+    
+    try:
+        partitioning.migrate(
+            batch_size=batch_size,
+            months_ahead=current_app.config.get('POSTS_PARTITION_PREMAKE_MONTHS', 3),
+            drop_old=drop_old,
+            log=click.echo
+        )
+    except RuntimeError as e:
+        click.echo(f"❌ {e}", err=True)
+
+
+@partitions.command('ensure')
+@with_appcontext
+@click.option('--months-ahead', default=None, type=int, help='Future months to create')
+def partitions_ensure(months_ahead):
+    """Create partitions for the coming months."""
+    from flask import current_app
+    from services import partitioning
+    
+    if months_ahead is None:
+        months_ahead = current_app.config.get('POSTS_PARTITION_PREMAKE_MONTHS', 3)
+    created = partitioning.ensure_future_partitions(months_ahead)
+    click.echo(f"Created {len(created)} partition(s): {', '.join(created) or '-'}")
+
+
+@partitions.command('retention')
+@with_appcontext
+@click.option('--months', default=None, type=int, help='Keep this many months before the current one')
+@click.option('--action', type=click.Choice(['detach', 'drop']), default=None)
+def partitions_retention(months, action):
+    """Detach or drop partitions past the retention period."""
+    from flask import current_app
+    from services import partitioning
+    
+    months = months if months is not None else current_app.config.get('POSTS_RETENTION_MONTHS', 0)
+    action = action or current_app.config.get('POSTS_RETENTION_ACTION', 'detach')
+    if not months:
+        click.echo("Retention disabled (POSTS_RETENTION_MONTHS=0)")
+        return
+    expired = partitioning.apply_retention(months, action)
+    click.echo(f"{action.capitalize()}ed {len(expired)} partition(s): {', '.join(expired) or '-'}")
+
+
+@partitions.command('status')
+@with_appcontext
+def partitions_status():
+    """List partitions with row estimates and sizes."""
+    from services import partitioning
+    
+    if not partitioning.is_supported():
+        click.echo("Partitioning is only available on Postgres.")
+        return
+    rows = partitioning.status()
+    if not rows:
+        click.echo("posts is not partitioned. Run: flask partitions migrate")
+        return
+    for row in rows:
+        click.echo(f"  {row['name']:<20} {row['rows']:>10} rows {row['bytes'] / 1024 / 1024:>10.1f} MB  {row['bounds']}")
+
+
+@click.group()
+def archive():
+    """Cold archive of old posts."""
+    pass
+
+
+@archive.command('run')
+@with_appcontext
+@click.option('--older-than-days', default=None, type=int, help='Archive posts older than this')
+@click.option('--feed-id', default=None, type=int, help='Only archive this feed')
+@click.option('--batch-size', default=1000, help='Posts moved per transaction')
+def archive_run(older_than_days, feed_id, batch_size):
+    """Move old posts from the database to compressed archive files."""
+    from datetime import datetime, timedelta
+    from flask import current_app
+    from services import archive as cold_archive
+    
+    days = older_than_days if older_than_days is not None else current_app.config.get('ARCHIVE_AFTER_DAYS', 365)
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    click.echo(f"Archiving posts older than {cutoff:%Y-%m-%d} to {cold_archive.archive_dir()}")
+    total = cold_archive.archive_posts(cutoff, batch_size=batch_size, feed_id=feed_id, log=click.echo)
+    click.echo(f"✅ Archived {total} posts")
+
+
+@archive.command('search')
+@with_appcontext
+@click.argument('query')
+@click.option('--feed-id', default=None, type=int)
+@click.option('--since', default=None, type=click.DateTime(), help='Posts on or after this date')
+@click.option('--until', default=None, type=click.DateTime(), help='Posts before this date')
+@click.option('--limit', default=50)
+def archive_search(query, feed_id, since, until, limit):
+    """Search archived posts by text."""
+    from services import archive as cold_archive
+    
+    results = cold_archive.search(query, feed_id=feed_id, since=since, until=until, limit=limit)
+    for row in results:
+        snippet = ' '.join((row['content'] or '').split())[:100]
+        click.echo(f"  #{row['id']} feed {row['feed_id']} msg {row['telegram_message_id']} {row['telegram_date']:%Y-%m-%d %H:%M}  {snippet}")
+    click.echo(f"{len(results)} result(s)")
+
+
+@archive.command('restore')
+@with_appcontext
+@click.option('--feed-id', required=True, type=int)
+@click.option('--month', default=None, help='Only this month (YYYY-MM)')
+def archive_restore(feed_id, month):
+    """Move archived posts back into the database."""
+    from services import archive as cold_archive
+    
+    restored = cold_archive.restore(feed_id, month=month, log=click.echo)
+    click.echo(f"✅ Restored {restored} posts")
+
+
+@archive.command('status')
+@with_appcontext
+def archive_status():
+    """List archive segments per feed."""
+    import os
+    from services import archive as cold_archive
+    
+    directory = cold_archive.archive_dir()
+    feed_dirs = sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+    if not feed_dirs:
+        click.echo(f"Archive {directory} is empty.")
+        return
+    for name in feed_dirs:
+        if not name.startswith('feed_'):
+            continue
+        click.echo(f"{name}:")
+        for segment in cold_archive.segments(int(name[len('feed_'):])):
+            size = os.path.getsize(segment.path) / 1024 if os.path.exists(segment.path) else 0
+            index = segment.index
+            click.echo(f"  {segment.month}  {index['count']:>8} posts {size:>10.1f} KB  {index['min_date']} .. {index['max_date']}")
+
+
+@click.group()
+def posts():
+    """Post maintenance commands."""
+    pass
+
+
+@posts.command('extract-vacancies')
+@with_appcontext
+@click.option('--workers', default=None, type=int, help='Extraction processes (default: CPU count)')
+@click.option('--batch-size', default=2000, help='Posts per batch')
+@click.option('--force', is_flag=True, help='Re-extract posts already at the current extractor version')
+def posts_extract_vacancies(workers, batch_size, force):
+    """Fill city, salary and employer columns of stored posts."""
+    from services import vacancy_extractor
+    
+    total = vacancy_extractor.backfill(workers=workers, batch_size=batch_size, force=force, log=click.echo)
+    click.echo(f"✅ Extracted vacancy fields of {total} posts")
+
+
+@click.group()
+def timeline():
+    """Subscription timelines ("my feed")."""
+    pass
+
+
+@timeline.command('rebuild')
+@with_appcontext
+@click.option('--user-id', default=None, type=int, help='Only this user (default: every subscriber)')
+def timeline_rebuild(user_id):
+    """Refill timelines from subscriptions, e.g. after Redis lost its data."""
+    from models.user_subscription import UserSubscription
+    from services.timeline import timeline as timelines
+    
+    user_ids = [user_id] if user_id else db.session.execute(
+        db.select(UserSubscription.user_id).distinct()
+    ).scalars().all()
+    for current in user_ids:
+        entries = timelines.rebuild_user(current)
+        click.echo(f"  user {current}: {entries} entries")
+    click.echo(f"✅ Rebuilt {len(user_ids)} timeline(s)")
+
+
+@timeline.command('trim')
+@with_appcontext
+def timeline_trim():
+    """Cap database timelines at TIMELINE_MAX_ENTRIES."""
+    from services.timeline import timeline as timelines
+    
+    deleted = timelines.trim()
+    click.echo(f"✅ Deleted {deleted} timeline entries")
+
+
+@click.group()
+def feeds():
+    """Feed maintenance commands."""
+    pass
+
+
+@feeds.command('delete')
+@with_appcontext
+@click.argument('feed_id', type=int)
+def feeds_delete(feed_id):
+    """Delete a feed and its posts in batches, in the foreground."""
+    from services import feed_deletion
+    
+    feed = db.session.get(Feed, feed_id)
+    if not feed:
+        click.echo(f"❌ Feed {feed_id} not found")
+        return
+    job = feed_deletion.start(feed)
+    job = feed_deletion.run(job.id, log=click.echo)
+    if job is None:
+        click.echo("❌ Another runner holds this deletion job")
+    else:
+        click.echo(f"{'✅' if job.status.value == 'completed' else '❌'} Job {job.id}: {job.status.value}, "
+                   f"{job.deleted_posts} posts deleted{f' ({job.error})' if job.error else ''}")
+
+
+@feeds.command('resume-deletions')
+@with_appcontext
+def feeds_resume_deletions():
+    """Run pending feed deletions and those abandoned by a dead runner, in the foreground."""
+    from datetime import timedelta
+    from flask import current_app
+    from models.feed_deletion_job import FeedDeletionJob
+    from services import feed_deletion
+    
+    stale_after = timedelta(seconds=current_app.config.get('FEED_DELETE_STALE_SECONDS', 120))
+    jobs = FeedDeletionJob.get_resumable(stale_after)
+    if not jobs:
+        click.echo("No feed deletions to resume.")
+    for job in jobs:
+        job = feed_deletion.run(job.id, log=click.echo)
+        if job is not None:
+            click.echo(f"  job {job.id} ({job.feed_name}): {job.status.value}, {job.deleted_posts}/{job.total_posts} posts")
+
+
+@click.group()
+def jobs():
+    """Scheduled job commands."""
+    pass
+
+
+@jobs.command('list')
+@with_appcontext
+def jobs_list():
+    """List scheduled jobs and their last run in any process."""
+    from models.job_run import JobRun
+    from services.scheduler import scheduler, describe_schedule
+    
+    runs = JobRun.get_all()
+    for job in scheduler.jobs.values():
+        run = runs.get(job.id)
+        click.echo(f"{job.id:<24} {describe_schedule(job.schedule):<12} {job.description}")
+        if run is None or run.last_started_at is None:
+            click.echo("    never run")
+            continue
+        duration = f"{run.last_duration_ms / 1000:.1f}s" if run.last_duration_ms is not None else '-'
+        click.echo(f"    last: {run.last_status} at {run.last_started_at:%Y-%m-%d %H:%M:%S} UTC, {duration} "
+                   f"on {run.host}; {run.run_count} runs, {run.error_count} errors")
+        if run.last_error:
+            click.echo(f"    error: {run.last_error}")
+
+
+@jobs.command('run')
+@with_appcontext
+@click.argument('job_id')
+def jobs_run(job_id):
+    """Run a scheduled job now, in the foreground."""
+    from services.scheduler import scheduler
+    
+    if job_id not in scheduler.jobs:
+        click.echo(f"❌ Unknown job {job_id}, available: {', '.join(scheduler.jobs)}")
+        return
+    click.echo(f"Running {job_id}...")
+    status, error = scheduler.run(job_id)
+    if status == 'success':
+        click.echo(f"✅ {job_id} finished")
+    else:
+        click.echo(f"❌ {job_id} failed: {error}")
+
+
+@click.group()
+def schema():
+    """Database schema commands."""
+    pass
+
+
+@schema.command('upgrade')
+@with_appcontext
+@click.option('--dry-run', is_flag=True, help='Print the statements without running them')
+def schema_upgrade(dry_run):
+    """Add model columns and indexes missing from existing tables."""
+    from services import schema as database_schema
+    
+    if dry_run:
+        statements = database_schema.pending_changes()
+        for statement in statements:
+            click.echo(f"{statement};")
+        click.echo(f"{len(statements)} statement(s) pending")
+        return
+    count = database_schema.upgrade(log=click.echo)
+    click.echo(f"✅ Schema is up to date ({count} statement(s) run)")
+
+
+@click.group()
+def users():
+    """User account commands."""
+    pass
+
+
+@users.command('create')
+@with_appcontext
+@click.argument('username')
+@click.argument('email')
+@click.password_option()
+@click.option('--admin', is_flag=True, help='Give the user the admin role (admin pages)')
+def users_create(username, email, password, admin):
+    """Create a user account."""
+    from models.user import User, UserRole
+    
+    if User.get_by_username(username) or User.get_by_email(email):
+        click.echo(f"❌ User {username} or {email} already exists")
+        return
+    user = User(username, email, password, role=UserRole.ADMIN if admin else UserRole.USER)
+    db.session.add(user)
+    db.session.commit()
+    click.echo(f"✅ Created {'admin' if admin else 'user'} {username} (id {user.id})")
+
+
+@users.command('set-role')
+@with_appcontext
+@click.argument('username')
+@click.argument('role', type=click.Choice(['user', 'moderator', 'admin']))
+def users_set_role(username, role):
+    """Change the role of a user."""
+    from models.user import User, UserRole
+    
+    user = User.get_by_username(username)
+    if user is None:
+        click.echo(f"❌ User {username} not found")
+        return
+    user.role = UserRole(role)
+    db.session.commit()
+    click.echo(f"✅ {username} is now {role}")
+
+
 def init_app(app):
     """Initialize CLI commands with Flask app."""
     app.cli.add_command(telegram)
+    app.cli.add_command(partitions)
+    app.cli.add_command(archive)
+    app.cli.add_command(posts)
+    app.cli.add_command(timeline)
+    app.cli.add_command(feeds)
+    app.cli.add_command(jobs)
+    app.cli.add_command(users)
+    app.cli.add_command(schema)
@@ -0,0 +1,156 @@
+"""
+Delta sync for polling clients.
+
+Clients keep an opaque cursor and only download posts inserted, edited or
+deleted since that cursor. The work done per poll is proportional to the
+number of changes in ``post_changes``, not to the size of a listing page.
+
+Change ids are taken when a transaction writes, not when it commits, so a
+smaller id can become visible after a larger one. Cursors therefore only
+move past changes older than DELTA_SYNC_SETTLE_SECONDS; newer ones are
+returned again by the next poll, which clients apply idempotently. A
+transaction that commits its changes later than that may still be missed.
+"""
+import base64
+import binascii
+import logging
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from models.post import Post
+from models.post_change import PostChange, ChangeType
+from services import post_serializer
+from services.scheduler import scheduler
+
+CURSOR_VERSION = 'v1'
+
+
+class CursorError(ValueError):
+    """Raised for malformed cursors."""
+
+
+class CursorExpired(Exception):
+    """Raised when the changes behind a cursor have already been pruned."""
+
+
+def encode_cursor(change_id):
+    """Encode a change log position as an opaque URL-safe token."""
+    raw = f'{CURSOR_VERSION}:{change_id}'.encode('ascii')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by ``encode_cursor``.
+
+    Raises:
+        CursorError: If the cursor is not a valid token
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        version, _, change_id = base64.urlsafe_b64decode(padded).decode('ascii').partition(':')
+        change_id = int(change_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise CursorError('Invalid cursor')
+
+    if version != CURSOR_VERSION or change_id < 0:
+        raise CursorError('Invalid cursor')
+    return change_id
+
+
+def get_changes(cursor=None, limit=500, feed_id=None, fields=post_serializer.DEFAULT_FIELDS):
+    """
+    Collect changes after a cursor.
+
+    Several changes of the same post inside the window collapse into the
+    latest one, so a post inserted and then deleted is only reported as
+    deleted. The returned cursor stops before the first change younger than
+    DELTA_SYNC_SETTLE_SECONDS, so recent changes are reported again.
+
+    Args:
+        cursor (str): Cursor from a previous response, None to start at head
+        limit (int): Maximum number of change log rows to read
+        feed_id (int): Only report changes of this feed
+        fields (tuple): Post fields returned for upserted posts
+
+    Returns:
+        dict: ``upserted`` posts, ``deleted`` post ids, ``next_cursor`` and ``has_more``
+
+    Raises:
+        CursorError: If the cursor is malformed
+        CursorExpired: If the cursor points before the retained change log
+    """
+    settled_before = datetime.utcnow() - timedelta(seconds=current_app.config.get('DELTA_SYNC_SETTLE_SECONDS', 10))
+    if not cursor:
+        # New clients start from "now" and load the current state via /api/posts
+        head_id = PostChange.get_head_id(created_before=settled_before)
+        if not head_id:
+            head_id = max((PostChange.get_tail_id() or 1) - 1, 0)
+        return {
+            'upserted': [],
+            'deleted': [],
+            'next_cursor': encode_cursor(head_id),
+            'has_more': False
+        }
+
+    last_id = decode_cursor(cursor)
+    # Pruning keeps the newest change, so a cursor past the head (0 for an empty log)
+    # belongs to a log that was reset
+    tail_id = PostChange.get_tail_id()
+    if last_id > PostChange.get_head_id() or (tail_id is not None and last_id < tail_id - 1):
+        raise CursorExpired('Cursor expired, reload /api/posts and start over')
+
+    changes = PostChange.get_since(last_id, limit + 1, feed_id=feed_id)
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    latest = {}
+    for change in changes:
+        latest[change.post_id] = change.change_type
+
+    upsert_ids = [post_id for post_id, change_type in latest.items() if change_type != ChangeType.DELETE]
+    deleted = [post_id for post_id, change_type in latest.items() if change_type == ChangeType.DELETE]
+
+    upserted = []
+    if upsert_ids:
+        # Always select the id so posts gone without a tombstone can be detected
+        select_fields = fields if 'id' in fields else ('id',) + tuple(fields)
+        upserted = post_serializer.select_posts(
+            select_fields,
+            [Post.id.in_(upsert_ids)],
+            order_by=Post.id
+        )
+        found = {post['id'] for post in upserted}
+        deleted.extend(post_id for post_id in upsert_ids if post_id not in found)
+        if 'id' not in fields:
+            for post in upserted:
+                del post['id']
+
+    # Smaller ids may still commit below unsettled changes: the cursor stops before them
+    next_id = last_id
+    for change in changes:
+        if change.created_at > settled_before:
+            has_more = False
+            break
+        next_id = change.id
+    return {
+        'upserted': upserted,
+        'deleted': sorted(deleted),
+        'next_cursor': encode_cursor(next_id),
+        'has_more': has_more
+    }
+
+
+def prune_changes(app):
+    """Drop changes older than DELTA_SYNC_RETENTION_DAYS; clients behind them get CursorExpired."""
+    days = app.config.get('DELTA_SYNC_RETENTION_DAYS', 30)
+    if days <= 0:
+        return
+    deleted = PostChange.prune(datetime.utcnow() - timedelta(days=days))
+    if deleted:
+        logging.getLogger(__name__).info(f"Pruned {deleted} post changes older than {days} days")
+
+
+scheduler.register('post-changes-prune', prune_changes, hours=24,
+                   description='Delete post change log entries past the delta sync retention')
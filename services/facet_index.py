@@ -0,0 +1,319 @@
+"""
+In-memory facet counts for the sidebar of the post listing.
+
+Every facet value (feed, category, city, salary bucket, "visible" for the
+duplicate filter) is a bitmap over post ids, stored as a Python int: bit
+``id - offset`` is set when the post has that value. Counting the posts of
+every feed under the current filters is then one AND and one popcount per
+feed instead of one COUNT query per facet, and repeated filter combinations
+are served from a small cache until the next change.
+
+Each web process keeps its own index. It applies new rows of
+``post_changes`` every FACET_REFRESH_SECONDS (an edited post is cleared and
+re-read, so re-applying a change is harmless) and is rebuilt from the
+posts table every FACET_REBUILD_SECONDS. Rebuilds pick up what the change
+log does not carry: feeds moved between categories, duplicate marking,
+restored archive posts and posts leaving the POSTS_LISTING_MAX_AGE_DAYS window.
+"""
+import logging
+import threading
+from time import perf_counter
+
+from core import metrics
+from core.extensions import db
+from models.feed import Feed
+from models.post import Post
+from models.post_change import PostChange, ChangeType
+
+# Salary buckets; a salary_from on a bucket boundary is answered exactly
+SALARY_BUCKET = 5000
+SALARY_CURRENCY = 'RUB'
+# Changes read per query while tailing post_changes
+REFRESH_BATCH = 5000
+# Re-read this many change ids below the watermark, for late commits of earlier ids
+REFRESH_OVERLAP_IDS = 200
+CACHE_SIZE = 256
+
+COUNT_SECONDS = metrics.histogram(
+    'facet_index_count_seconds', 'Time to compute facet counts for one filter combination',
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05)
+)
+REBUILD_SECONDS = metrics.histogram(
+    'facet_index_rebuild_seconds', 'Time to rebuild the facet index from the posts table',
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+
+
+def salary_top(salary_min, salary_max, currency):
+    """Highest salary of a post in SALARY_CURRENCY, None when it has none"""
+    if currency != SALARY_CURRENCY:
+        return None
+    values = [value for value in (salary_min, salary_max) if value]
+    return max(values) if values else None
+
+
+class FacetBitmaps:
+    """Bitmaps of one snapshot of the listing, updatable in place"""
+
+    def __init__(self, offset=0, feed_categories=None):
+        self.offset = offset
+        self.feed_categories = dict(feed_categories or {})
+        self.all = 0
+        self.visible = 0
+        self.feeds = {}
+        self.categories = {}
+        self.cities = {}
+        self.salaries = {}
+        self.version = 0
+        self.stale = False
+        self._cache = {}
+
+    def __len__(self):
+        return self.all.bit_count()
+
+    @staticmethod
+    def _bits(positions):
+        """Bitmap with the given positions set, built in O(n) through a byte buffer"""
+        if not positions:
+            return 0
+        buffer = bytearray(max(positions) // 8 + 1)
+        for position in positions:
+            buffer[position >> 3] |= 1 << (position & 7)
+        return int.from_bytes(buffer, 'little')
+
+    @classmethod
+    def build(cls, rows, feed_categories):
+        """
+        Build bitmaps from (post_id, feed_id, visible, city, salary_top) rows.
+
+        The lowest id becomes the offset, so ids freed by archiving do not
+        cost bits.
+        """
+        rows = list(rows)
+        bitmaps = cls(min((row[0] for row in rows), default=0), feed_categories)
+        bitmaps._add(rows)
+        return bitmaps
+
+    def _add(self, rows):
+        groups = {'all': [], 'visible': [], 'feeds': {}, 'categories': {}, 'cities': {}, 'salaries': {}}
+        for post_id, feed_id, visible, city, top in rows:
+            position = post_id - self.offset
+            if position < 0:
+                # Restored archive posts sit below the offset; the next rebuild takes them
+                self.stale = True
+                continue
+            groups['all'].append(position)
+            if visible:
+                groups['visible'].append(position)
+            groups['feeds'].setdefault(feed_id, []).append(position)
+            category_id = self.feed_categories.get(feed_id)
+            if category_id:
+                groups['categories'].setdefault(category_id, []).append(position)
+            if city:
+                groups['cities'].setdefault(city, []).append(position)
+            if top:
+                groups['salaries'].setdefault(top // SALARY_BUCKET, []).append(position)
+
+        self.all |= self._bits(groups['all'])
+        self.visible |= self._bits(groups['visible'])
+        for name in ('feeds', 'categories', 'cities', 'salaries'):
+            bitmaps = getattr(self, name)
+            for key, positions in groups[name].items():
+                bitmaps[key] = bitmaps.get(key, 0) | self._bits(positions)
+
+    def apply(self, post_ids, rows):
+        """
+        Clear ``post_ids`` from every bitmap, then add the current ``rows`` of those posts.
+
+        Deleted posts are simply absent from ``rows``.
+        """
+        cleared = self._bits([post_id - self.offset for post_id in post_ids if post_id >= self.offset])
+        if cleared:
+            keep = ~cleared
+            self.all &= keep
+            self.visible &= keep
+            for name in ('feeds', 'categories', 'cities', 'salaries'):
+                bitmaps = getattr(self, name)
+                for key, bitmap in list(bitmaps.items()):
+                    if bitmap & cleared:
+                        bitmaps[key] = bitmap & keep
+        self._add(rows)
+        self.version += 1
+        self._cache.clear()
+
+    def salary_mask(self, salary_from):
+        """Posts whose salary reaches ``salary_from``, None when it is not a bucket boundary"""
+        if salary_from % SALARY_BUCKET:
+            return None
+        lowest = salary_from // SALARY_BUCKET
+        mask = 0
+        for bucket, bitmap in self.salaries.items():
+            if bucket >= lowest:
+                mask |= bitmap
+        return mask
+
+    def counts(self, feed_id=None, category_id=None, city=None, salary_from=None, hide_duplicates=True):
+        """
+        Facet counts under the given filters.
+
+        Each facet ignores its own filter, as in the sidebar: feed and
+        category counts apply city, salary and duplicates; city counts also
+        apply the selected feed or category.
+
+        Returns:
+            dict: total, feeds, categories and cities counts, or None when
+            salary_from cannot be answered from the buckets
+        """
+        key = (feed_id, category_id, city or None, salary_from or None, hide_duplicates)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        base = self.visible if hide_duplicates else self.all
+        if salary_from:
+            salaries = self.salary_mask(salary_from)
+            if salaries is None:
+                return None
+            base &= salaries
+
+        scoped = base & self.cities.get(city, 0) if city else base
+        if feed_id:
+            selected = base & self.feeds.get(feed_id, 0)
+        elif category_id:
+            selected = base & self.categories.get(category_id, 0)
+        else:
+            selected = base
+
+        result = {
+            'total': scoped.bit_count(),
+            'feeds': {key: (bitmap & scoped).bit_count() for key, bitmap in self.feeds.items()},
+            'categories': {key: (bitmap & scoped).bit_count() for key, bitmap in self.categories.items()},
+            'cities': {key: (bitmap & selected).bit_count() for key, bitmap in self.cities.items()},
+        }
+        if len(self._cache) >= CACHE_SIZE:
+            self._cache.clear()
+        self._cache[key] = result
+        return result
+
+
+class FacetIndex:
+    """Keeps FacetBitmaps in sync with posts and post_changes"""
+
+    def __init__(self, app=None):
+        self.app = app
+        self.enabled = True
+        self.refresh_interval = 5
+        self.rebuild_interval = 600
+        self.bitmaps = None
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._watermark = 0
+        self._seen = set()
+        self._last_refresh = None
+        self._last_rebuild = None
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('FACET_INDEX_ENABLED', True)
+        self.refresh_interval = app.config.get('FACET_REFRESH_SECONDS', 5)
+        self.rebuild_interval = app.config.get('FACET_REBUILD_SECONDS', 600)
+
+    @staticmethod
+    def _rows(*criteria):
+        query = db.session.query(
+            Post.id, Post.feed_id, Post.is_primary_duplicate, Post.duplicate_group_id,
+            Post.city, Post.salary_min, Post.salary_max, Post.salary_currency
+        ).filter(*Post.listing_criteria(), *criteria)
+        for post_id, feed_id, primary, group_id, city, low, high, currency in query.yield_per(10000):
+            visible = bool(primary) or group_id is None
+            yield post_id, feed_id, visible, city, salary_top(low, high, currency)
+
+    def rebuild(self):
+        """Build a new snapshot from the posts table and swap it in (requires an app context)."""
+        started = perf_counter()
+        watermark = PostChange.get_head_id()
+        feed_categories = dict(db.session.query(Feed.id, Feed.category_id))
+        bitmaps = FacetBitmaps.build(self._rows(), feed_categories)
+        self.bitmaps = bitmaps
+        self._watermark = watermark
+        self._seen = set()
+        self._last_rebuild = self._last_refresh = perf_counter()
+        REBUILD_SECONDS.observe(perf_counter() - started)
+        self.logger.info(
+            f"Built facet index: {len(bitmaps)} post(s), {len(bitmaps.feeds)} feed(s), "
+            f"{len(bitmaps.cities)} city(ies) in {perf_counter() - started:.2f}s"
+        )
+
+    def refresh(self):
+        """Apply post_changes written since the last refresh (requires an app context)."""
+        bitmaps = self.bitmaps
+        self._last_refresh = perf_counter()
+        last_id = max(self._watermark - REFRESH_OVERLAP_IDS, 0)
+        while True:
+            changes = [change for change in PostChange.get_since(last_id, REFRESH_BATCH)
+                       if change.id not in self._seen]
+            if not changes:
+                break
+            last_id = changes[-1].id
+            post_ids = {change.post_id for change in changes}
+            # Posts of feeds created after the rebuild still get their category
+            for change in changes:
+                if change.feed_id not in bitmaps.feed_categories:
+                    feed = db.session.get(Feed, change.feed_id)
+                    bitmaps.feed_categories[change.feed_id] = feed.category_id if feed else None
+            live = [change.post_id for change in changes if change.change_type != ChangeType.DELETE]
+            rows = list(self._rows(Post.id.in_(live))) if live else []
+            bitmaps.apply(post_ids, rows)
+
+            self._seen.update(change.id for change in changes)
+            self._watermark = max(self._watermark, last_id)
+            if len(changes) < REFRESH_BATCH:
+                break
+        self._seen = {change_id for change_id in self._seen
+                      if change_id > self._watermark - REFRESH_OVERLAP_IDS}
+
+    def sync(self):
+        """Rebuild or refresh when due; skipped while another thread is at it."""
+        now = perf_counter()
+        rebuild_due = (self.bitmaps is None or self.bitmaps.stale
+                       or now - self._last_rebuild >= self.rebuild_interval)
+        refresh_due = now - (self._last_refresh or 0) >= self.refresh_interval
+        if not (rebuild_due or refresh_due):
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            if rebuild_due:
+                self.rebuild()
+            else:
+                self.refresh()
+        except Exception as e:
+            db.session.rollback()
+            self.logger.error(f"Facet index sync failed: {e}")
+        finally:
+            self._lock.release()
+
+    def counts(self, **filters):
+        """
+        Facet counts for the listing filters (requires an app context).
+
+        Returns None while the index is disabled or not built yet, or when
+        the filters cannot be answered from it; the sidebar then shows no counts.
+        """
+        if not self.enabled:
+            return None
+        self.sync()
+        bitmaps = self.bitmaps
+        if bitmaps is None:
+            return None
+        started = perf_counter()
+        result = bitmaps.counts(**filters)
+        COUNT_SECONDS.observe(perf_counter() - started)
+        return result
+
+
+# Global instance
+facet_index = FacetIndex()
@@ -0,0 +1,201 @@
+"""
+Background deletion of feeds with many posts.
+
+Deleting a feed through the ORM cascade loads every post into the session
+inside the request. Instead ``start`` only deactivates the feed and records
+a FeedDeletionJob; a runner thread then deletes the posts in keyset batches
+of FEED_DELETE_BATCH_SIZE with set-based statements:
+
+* interactions (``user_posts`` rows pointing at the posts) and their
+  ``post_statistics``, then statistics pointing at the posts directly;
+* delete tombstones in ``post_changes`` for delta sync clients;
+* the posts themselves.
+
+Each batch commits together with the job's cursor and progress, so a
+runner that dies leaves a consistent job behind. Runners hold a job by
+heartbeat; jobs whose heartbeat is older than FEED_DELETE_STALE_SECONDS are
+resumed by the ``feed-deletion-resume`` job or ``flask feeds resume-deletions``.
+Once no posts are left, the feed's ingest stats, health checks, archive
+segments and the feed row are removed.
+"""
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, func, select
+
+from core import metrics
+from core.extensions import db
+from models.channel_health import ChannelHealth
+from models.feed_backfill import FeedBackfill
+from models.feed import Feed
+from models.feed_deletion_job import FeedDeletionJob, DeletionStatus
+from models.ingest_stat import IngestStat
+from models.post import Post
+from models.post_change import PostChange
+from models.post_statistics import PostStatistics
+from models.user_post import UserPost
+from services.scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+DELETED_POSTS = metrics.counter(
+    'feed_deletion_posts_total', 'Posts deleted by feed deletion jobs'
+)
+
+
+class LostJob(Exception):
+    """Raised when another runner took over a job."""
+
+
+def _settings():
+    config = current_app.config
+    return (
+        config.get('FEED_DELETE_BATCH_SIZE', 1000),
+        timedelta(seconds=config.get('FEED_DELETE_STALE_SECONDS', 120)),
+        config.get('FEED_DELETE_PAUSE_SECONDS', 0.05),
+    )
+
+
+def start(feed):
+    """
+    Deactivate a feed and record its deletion job (requires an app context).
+
+    Returns the unfinished job of the feed if there already is one.
+    """
+    job = FeedDeletionJob.get_active_for_feed(feed.id)
+    if job:
+        return job
+    total = db.session.execute(select(func.count(Post.id)).where(Post.feed_id == feed.id)).scalar()
+    # Inactive feeds leave the sidebar and the bot stops writing to them
+    feed.is_active = False
+    job = FeedDeletionJob(feed_id=feed.id, feed_name=feed.name, total_posts=total)
+    db.session.add(job)
+    db.session.commit()
+    logger.info(f"Scheduled deletion of feed {feed.id} ({feed.name}) with {total} posts")
+    return job
+
+
+def delete_posts(post_ids):
+    """Delete posts and the rows hanging off them (no commit)."""
+    interactions = select(UserPost.id).where(UserPost.post_id.in_(post_ids))
+    db.session.execute(delete(PostStatistics).where(db.or_(
+        PostStatistics.user_post_id.in_(interactions),
+        PostStatistics.post_id.in_(post_ids)
+    )))
+    db.session.execute(delete(UserPost).where(UserPost.post_id.in_(post_ids)))
+    PostChange.record_deletions(Post.id.in_(post_ids))
+    db.session.execute(delete(Post).where(Post.id.in_(post_ids)))
+
+
+def _checkpoint(job_id, owner, **values):
+    """Update a held job in the current transaction, raising LostJob if it was taken over."""
+    values['heartbeat_at'] = datetime.utcnow()
+    updated = FeedDeletionJob.query.filter_by(id=job_id, owner=owner).update(values, synchronize_session=False)
+    if updated != 1:
+        raise LostJob(job_id)
+
+
+def _finish(job, owner):
+    db.session.execute(delete(IngestStat).where(IngestStat.feed_id == job.feed_id))
+    db.session.execute(delete(ChannelHealth).where(ChannelHealth.feed_id == job.feed_id))
+    db.session.execute(delete(FeedBackfill).where(FeedBackfill.feed_id == job.feed_id))
+    db.session.execute(delete(Feed).where(Feed.id == job.feed_id))
+    _checkpoint(job.id, owner, status=DeletionStatus.COMPLETED, finished_at=datetime.utcnow())
+    db.session.commit()
+
+    from services.archive import feed_dir
+    directory = feed_dir(job.feed_id)
+    if os.path.isdir(directory):
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run(job_id, log=None):
+    """
+    Run or resume a deletion job in this thread (requires an app context).
+
+    Returns:
+        FeedDeletionJob: The job, or None if another runner holds it
+    """
+    batch_size, stale_after, pause = _settings()
+    owner = f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+    if not FeedDeletionJob.claim(job_id, owner, stale_after):
+        return None
+
+    job = db.session.get(FeedDeletionJob, job_id)
+    if job.started_at is None:
+        _checkpoint(job_id, owner, started_at=datetime.utcnow())
+        db.session.commit()
+    feed_id = job.feed_id
+    cursor = job.last_post_id
+    deleted = job.deleted_posts
+
+    try:
+        while True:
+            post_ids = db.session.execute(
+                select(Post.id).where(Post.feed_id == feed_id, Post.id > cursor).order_by(Post.id).limit(batch_size)
+            ).scalars().all()
+            if not post_ids:
+                # Posts written below the cursor meanwhile (e.g. archive restores) get a final pass
+                if cursor and db.session.execute(select(Post.id).where(Post.feed_id == feed_id).limit(1)).first():
+                    cursor = 0
+                    continue
+                break
+
+            delete_posts(post_ids)
+            cursor = post_ids[-1]
+            deleted += len(post_ids)
+            _checkpoint(job_id, owner, last_post_id=cursor, deleted_posts=deleted)
+            db.session.commit()
+            DELETED_POSTS.inc(len(post_ids))
+            if log:
+                log(f"Deleted {deleted} posts of feed {feed_id}")
+            if pause:
+                time.sleep(pause)
+
+        _finish(job, owner)
+        logger.info(f"Deleted feed {feed_id} ({job.feed_name}): {deleted} posts")
+    except LostJob:
+        db.session.rollback()
+        logger.warning(f"Feed deletion job {job_id} was taken over by another runner")
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Feed deletion job {job_id} failed: {e}")
+        FeedDeletionJob.query.filter_by(id=job_id, owner=owner).update(
+            {'status': DeletionStatus.FAILED, 'error': str(e), 'finished_at': datetime.utcnow()},
+            synchronize_session=False
+        )
+        db.session.commit()
+
+    db.session.expire_all()
+    return db.session.get(FeedDeletionJob, job_id)
+
+
+def run_async(app, job_id):
+    """Run a job in a daemon thread of this process."""
+    def target():
+        with app.app_context():
+            run(job_id)
+
+    thread = threading.Thread(target=target, name=f'feed-deletion-{job_id}', daemon=True)
+    thread.start()
+    return thread
+
+
+def resume_deletions(app):
+    """Run pending jobs and jobs abandoned by a dead runner, one after the other in this thread."""
+    with app.app_context():
+        _, stale_after, _ = _settings()
+        job_ids = [job.id for job in FeedDeletionJob.get_resumable(stale_after)]
+        for job_id in job_ids:
+            run(job_id)
+    return len(job_ids)
+
+
+scheduler.register('feed-deletion-resume', resume_deletions, minutes=5,
+                   description='Resume pending and abandoned feed deletions')
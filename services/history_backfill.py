@@ -0,0 +1,430 @@
+"""
+History import of channel feeds over MTProto.
+
+The Bot API only delivers new messages, so a channel added to the site
+starts empty. The backfill reads channel history with a user session
+(pyrogram, TELEGRAM_API_ID / TELEGRAM_API_HASH, session file
+``<TELEGRAM_SESSION_DIR>/<TELEGRAM_SESSION_NAME>.session``, created once
+with an interactive ``flask telegram sync``; its account must be able to
+see the channels) and stores it like the bot stores new messages:
+
+* up to HISTORY_BACKFILL_CONCURRENCY feeds are imported at once, and all of
+  them draw their history requests from one token bucket
+  (HISTORY_BACKFILL_REQUESTS_PER_SECOND); a FLOOD_WAIT pauses every worker
+  for the requested time;
+* each feed first picks up messages newer than the last import, then goes
+  further back from where the previous run stopped, at most
+  HISTORY_BACKFILL_LIMIT older messages per run, until the beginning of the
+  channel;
+* every page (HISTORY_BACKFILL_BATCH_SIZE messages) is inserted in one
+  flush together with its ``post_changes`` rows and the feed's checkpoint
+  (``feed_backfills``), so an interrupted import resumes at the last
+  committed page. Messages already stored (e.g. by the bot) or moved to the
+  cold archive (services/archive.py) are skipped. Database work runs in
+  worker threads, off the bot's event loop.
+
+In the bot, channels added while an import runs are queued for the same
+import: one task owns the MTProto session, starts it when feeds are queued
+and stops it once the queue is empty.
+
+Contacts, vacancy fields and duplicate groups are filled by the flush hook
+(services/post_pipeline.py) as for live posts. Imported posts are not
+pushed to the live feed, notifications or timelines, since they are old.
+Media file ids of a user session are not valid for the bot, so media posts
+keep their type without a ``media_url``.
+
+The Telegram side is pluggable: anything with ``start()``, ``stop()`` and
+``get_history(channel_id, offset_id, limit)`` returning ``HistoryMessage``
+lists works, e.g. ``bench.fakes.FakeHistoryClient``.
+"""
+import asyncio
+import logging
+import os
+import random
+from collections import namedtuple
+from datetime import datetime, timezone
+from time import perf_counter
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from core import metrics
+from core.extensions import db
+from models.feed import Feed
+from models.feed_backfill import FeedBackfill
+from models.post import Post
+from models.post_change import PostChange, ChangeType
+from services.telegram_client import ApiLimits
+
+HistoryMessage = namedtuple('HistoryMessage', 'message_id date text media_type views edit_date')
+
+# Media the bot stores too (see TelegramBot.resolve_media)
+MEDIA_TYPES = ('photo', 'video', 'document', 'animation', 'voice', 'audio')
+
+IMPORTED = metrics.counter(
+    'history_backfill_messages_total', 'History messages by outcome', ['outcome']
+)
+REQUEST_SECONDS = metrics.histogram(
+    'history_backfill_request_seconds', 'Duration of one history page request'
+)
+FLOOD_WAIT_SECONDS = metrics.counter(
+    'history_backfill_flood_wait_seconds_total', 'Seconds Telegram asked the history import to wait'
+)
+
+
+class FloodWait(Exception):
+    """Telegram asked to wait ``seconds`` before the next request"""
+
+    def __init__(self, seconds):
+        super().__init__(f'Flood wait of {seconds}s')
+        self.seconds = seconds
+
+
+class PyrogramHistoryClient:
+    """Reads channel history with a pyrogram user session"""
+
+    def __init__(self, api_id, api_hash, session_name, workdir='.'):
+        self.api_id = api_id
+        self.api_hash = api_hash
+        self.session_name = session_name
+        self.workdir = workdir
+        self._client = None
+
+    async def start(self):
+        from pyrogram import Client
+
+        # Flood waits are handled by the importer so they pause all workers
+        self._client = Client(self.session_name, api_id=int(self.api_id), api_hash=self.api_hash,
+                              workdir=self.workdir, no_updates=True, sleep_threshold=0)
+        await self._client.start()
+
+    async def stop(self):
+        if self._client is not None:
+            await self._client.stop()
+            self._client = None
+
+    async def get_history(self, channel_id, offset_id=0, limit=100):
+        """One page of messages older than ``offset_id`` (0: the newest), newest first."""
+        from pyrogram.errors import FloodWait as PyrogramFloodWait
+
+        chat_id = int(channel_id) if str(channel_id).lstrip('-').isdigit() else channel_id
+        try:
+            messages = [message async for message in self._client.get_chat_history(
+                chat_id, limit=limit, offset_id=offset_id
+            )]
+        except PyrogramFloodWait as e:
+            raise FloodWait(e.value)
+        return [self._convert(message) for message in messages if not message.empty]
+
+    @staticmethod
+    def _convert(message):
+        media = message.media.value if message.media else None
+        return HistoryMessage(
+            message_id=message.id,
+            # pyrogram returns naive local time, the bot stores UTC
+            date=message.date.astimezone(timezone.utc),
+            text=str(message.text or message.caption or ''),
+            media_type=media if media in MEDIA_TYPES else None,
+            views=message.views or 0,
+            edit_date=message.edit_date,
+        )
+
+
+class HistoryBackfill:
+    """Concurrent, resumable history import of channel feeds"""
+
+    def __init__(self, app=None):
+        self.app = app
+        self.concurrency = 4
+        self.batch_size = 100
+        self.limit = 1000
+        self.max_flood_wait = 300
+        self.on_channel_added = True
+        self.limits = ApiLimits()
+        self.logger = logging.getLogger(__name__)
+        self._pending = set()
+        self._wakeup = None
+        self._runner = None
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.concurrency = max(1, app.config.get('HISTORY_BACKFILL_CONCURRENCY', 4))
+        self.batch_size = min(100, max(1, app.config.get('HISTORY_BACKFILL_BATCH_SIZE', 100)))
+        self.limit = app.config.get('HISTORY_BACKFILL_LIMIT', 1000)
+        self.max_flood_wait = app.config.get('HISTORY_BACKFILL_MAX_FLOOD_WAIT', 300)
+        self.on_channel_added = app.config.get('HISTORY_BACKFILL_ON_CHANNEL_ADDED', True)
+        self.limits.rates = {'default': app.config.get('HISTORY_BACKFILL_REQUESTS_PER_SECOND', 1.0)}
+        self.limits.max_retries = app.config.get('TELEGRAM_API_MAX_RETRIES', 3)
+
+    def _session_path(self):
+        config = self.app.config
+        return os.path.join(config.get('TELEGRAM_SESSION_DIR') or '.',
+                            f"{config.get('TELEGRAM_SESSION_NAME', 'telegram_bot')}.session")
+
+    def available(self, interactive=False):
+        """
+        Whether the MTProto client can be used.
+
+        Without ``interactive`` the session file must already exist: a new
+        session asks for a phone number and login code on the terminal.
+        """
+        config = self.app.config if self.app else {}
+        if not config.get('TELEGRAM_API_ID') or not config.get('TELEGRAM_API_HASH'):
+            return False
+        try:
+            import pyrogram  # noqa: F401
+        except ImportError:
+            return False
+        return interactive or os.path.exists(self._session_path())
+
+    def make_client(self):
+        config = self.app.config
+        return PyrogramHistoryClient(config['TELEGRAM_API_ID'], config['TELEGRAM_API_HASH'],
+                                     config.get('TELEGRAM_SESSION_NAME', 'telegram_bot'),
+                                     config.get('TELEGRAM_SESSION_DIR') or '.')
+
+    async def run(self, feed_ids=None, limit=None, client=None):
+        """
+        Import history of active channel feeds (all of them, or ``feed_ids``).
+
+        Args:
+            feed_ids (list): Feeds to import, None for every active channel feed
+            limit (int): Older messages per feed in this run, HISTORY_BACKFILL_LIMIT by default
+            client: History client, a pyrogram session by default
+
+        Returns:
+            dict: feed_id -> number of posts imported
+        """
+        feeds = await asyncio.to_thread(self._channel_feeds, feed_ids)
+        if not feeds:
+            return {}
+
+        own_client = client is None
+        if own_client:
+            client = self.make_client()
+            await client.start()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        limit = self.limit if limit is None else limit
+
+        async def worker(feed_id, channel_id):
+            async with semaphore:
+                return await self.backfill_feed(client, feed_id, channel_id, limit)
+
+        started = perf_counter()
+        try:
+            counts = await asyncio.gather(*(worker(feed_id, channel_id) for feed_id, channel_id in feeds))
+        finally:
+            if own_client:
+                await client.stop()
+        results = dict(zip((feed_id for feed_id, _ in feeds), counts))
+        self.logger.info(f"📚 History import: {sum(counts)} posts into {len(feeds)} feeds "
+                         f"in {perf_counter() - started:.1f}s")
+        return results
+
+    def _channel_feeds(self, feed_ids):
+        with self.app.app_context():
+            query = Feed.query.filter(Feed.is_active == True, Feed.telegram_channel_id != None)  # noqa: E712
+            if feed_ids is not None:
+                query = query.filter(Feed.id.in_(feed_ids))
+            return [(feed.id, feed.telegram_channel_id) for feed in query]
+
+    def start(self, feed_ids):
+        """Queue newly added feeds for the background import (bot process)."""
+        if not self.on_channel_added or not self.available():
+            return
+        self._pending.update(feed_ids)
+        if self._runner is None or self._runner.done():
+            self._wakeup = asyncio.Event()
+            self._runner = asyncio.ensure_future(self._serve())
+        self._wakeup.set()
+
+    async def _serve(self):
+        """Import queued feeds with one client, started while there is work."""
+        client = None
+        try:
+            while True:
+                if not self._pending:
+                    if client is not None:
+                        await client.stop()
+                        client = None
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                feed_ids, self._pending = self._pending, set()
+                try:
+                    if client is None:
+                        client = self.make_client()
+                        await client.start()
+                    await self.run(sorted(feed_ids), client=client)
+                except Exception as e:
+                    self.logger.error(f"History import of feeds {sorted(feed_ids)} failed: {e}")
+                    if client is not None:
+                        await client.stop()
+                        client = None
+        finally:
+            if client is not None:
+                await client.stop()
+
+    async def close(self):
+        """Stop the background import; unfinished feeds resume from their checkpoints."""
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+        self._pending.clear()
+
+    async def _fetch(self, client, channel_id, offset_id):
+        """One history page under the global request budget, waiting out flood waits."""
+        attempt = 0
+        while True:
+            await self.limits.wait('get_history')
+            started = perf_counter()
+            try:
+                return await client.get_history(channel_id, offset_id=offset_id, limit=self.batch_size)
+            except FloodWait as e:
+                FLOOD_WAIT_SECONDS.inc(e.seconds)
+                if e.seconds > self.max_flood_wait:
+                    raise
+                self.logger.warning(f"History import flood wait: pausing all feeds for {e.seconds}s")
+                self.limits.pause('get_history', e.seconds + random.uniform(0, 1))
+            except (OSError, asyncio.TimeoutError) as e:
+                if attempt >= self.limits.max_retries:
+                    raise
+                backoff = self.limits.backoff(attempt)
+                self.logger.warning(f"History request for {channel_id} failed ({e}), retry in {backoff:.1f}s")
+                await asyncio.sleep(backoff)
+            finally:
+                REQUEST_SECONDS.observe(perf_counter() - started)
+            attempt += 1
+
+    async def backfill_feed(self, client, feed_id, channel_id, limit):
+        """Import one feed: newer messages first, then older history from the checkpoint."""
+        newest, oldest, complete = await asyncio.to_thread(self._begin, feed_id)
+
+        imported = 0
+        try:
+            if newest:
+                # Messages posted since the last import (e.g. while the bot was down)
+                offset_id = 0
+                while True:
+                    page = await self._fetch(client, channel_id, offset_id)
+                    fresh = [message for message in page if message.message_id > newest]
+                    imported += await asyncio.to_thread(self._store, feed_id, fresh)
+                    if not page or len(fresh) < len(page):
+                        break
+                    offset_id = page[-1].message_id
+
+            fetched = 0
+            while not complete and fetched < limit:
+                page = await self._fetch(client, channel_id, oldest or 0)
+                if not page:
+                    complete = True
+                    await asyncio.to_thread(self._store, feed_id, [], complete=True)
+                    break
+                fetched += len(page)
+                oldest = min(message.message_id for message in page)
+                imported += await asyncio.to_thread(self._store, feed_id, page, oldest=oldest)
+        except Exception as e:
+            self.logger.error(f"History import of feed {feed_id} stopped: {e}")
+            await asyncio.to_thread(self._fail, feed_id, e)
+        return imported
+
+    def _begin(self, feed_id):
+        """Mark the import of a feed started, returns (newest, oldest, complete) of its checkpoint."""
+        with self.app.app_context():
+            backfill = FeedBackfill.get_or_create(feed_id)
+            backfill.started_at = datetime.utcnow()
+            backfill.last_error = None
+            checkpoint = backfill.newest_message_id, backfill.oldest_message_id, backfill.history_complete
+            db.session.commit()
+            return checkpoint
+
+    def _fail(self, feed_id, error):
+        with self.app.app_context():
+            db.session.rollback()
+            FeedBackfill.get_or_create(feed_id).last_error = str(error)[:1000]
+            db.session.commit()
+
+    def _store(self, feed_id, messages, oldest=None, complete=False):
+        """Insert a page of messages and move the checkpoint in one transaction."""
+        with self.app.app_context():
+            for _ in range(3):
+                try:
+                    inserted = self._insert(feed_id, messages)
+                    backfill = FeedBackfill.get_or_create(feed_id)
+                    if messages:
+                        newest = max(message.message_id for message in messages)
+                        backfill.newest_message_id = max(backfill.newest_message_id or 0, newest)
+                    if oldest is not None:
+                        backfill.oldest_message_id = oldest
+                    if complete:
+                        backfill.history_complete = True
+                        backfill.completed_at = datetime.utcnow()
+                    backfill.imported_count += inserted
+                    backfill.updated_at = datetime.utcnow()
+                    db.session.commit()
+                    break
+                except IntegrityError:
+                    # The bot stored one of these messages meanwhile: look again
+                    db.session.rollback()
+            else:
+                raise RuntimeError(f"Could not store history page of feed {feed_id}")
+
+        IMPORTED.labels(outcome='inserted').inc(inserted)
+        IMPORTED.labels(outcome='skipped').inc(len(messages) - inserted)
+        return inserted
+
+    def _insert(self, feed_id, messages):
+        """Add posts for messages not stored or archived yet and flush them (no commit)."""
+        from services import archive
+        from services.telegram_bot import has_meaningful_text
+
+        if not messages:
+            return 0
+        ids = [message.message_id for message in messages]
+        existing = set(db.session.execute(
+            select(Post.telegram_message_id).where(Post.feed_id == feed_id, Post.telegram_message_id.in_(ids))
+        ).scalars())
+        existing |= archive.archived_message_ids(feed_id, ids)
+        posts = [
+            Post(
+                telegram_message_id=message.message_id,
+                content=message.text,
+                feed_id=feed_id,
+                telegram_date=message.date,
+                media_type=message.media_type,
+                is_edited=message.edit_date is not None,
+                views=message.views,
+            )
+            for message in messages
+            if message.message_id not in existing
+            and (message.media_type or has_meaningful_text(message.text))
+        ]
+        if not posts:
+            return 0
+        self._ensure_partitions(posts)
+        db.session.add_all(posts)
+        db.session.flush()
+        for post in posts:
+            PostChange.record(post, ChangeType.INSERT)
+        return len(posts)
+
+    def _ensure_partitions(self, posts):
+        """Old months may have no partition yet; create them instead of filling posts_default."""
+        from services import partitioning
+
+        if not partitioning.is_supported() or not partitioning.is_partitioned():
+            return
+        dates = [post.telegram_date.replace(tzinfo=None) for post in posts]
+        partitioning.ensure_partitions(partitioning.month_start(min(dates)),
+                                       partitioning.month_start(max(dates)))
+
+
+# Global instance
+history_backfill = HistoryBackfill()
@@ -0,0 +1,405 @@
+"""
+Durable local journal of incoming channel updates.
+
+Telegram considers an update delivered once the next ``getUpdates`` call
+moves the offset past it, whether or not we managed to save it. With the
+journal on, the bot's channel handler only appends the raw update JSON to
+an append-only file and returns; a separate applier task reads the journal
+in order and saves the posts. A slow or unavailable database delays the
+applier but no longer loses updates, and polling keeps going at full speed.
+
+* Segments are ``<INGEST_JOURNAL_DIR>/<sequence>.log``, one
+  ``<crc32> <json>`` line per update, rotated at
+  INGEST_JOURNAL_SEGMENT_BYTES.
+* Appends are written at once and fsynced in batches: after
+  INGEST_JOURNAL_FSYNC_BATCH appends or INGEST_JOURNAL_FSYNC_MS after the
+  first unsynced one, well before the poller confirms the batch (it polls
+  every 2 seconds).
+* The applier retries a record while the database is unreachable and
+  skips it (logged, counted) on any other error. Its position is saved to
+  ``checkpoint.json`` every INGEST_JOURNAL_CHECKPOINT_SECONDS, and applied
+  segments are deleted.
+* On start the journal drops a torn last line and replays everything after
+  the checkpoint. Replaying an update twice is harmless: edits set the
+  same text again and inserts hit the existing post (or the unique index).
+
+The journal is opened by the active poller (services/bot_leader.py),
+closed with its applier when polling stops, and locked to one process.
+While it is open the poller keeps polling through an outage of the lock
+database. Another process on the same host that becomes the
+poller while the lock is taken saves updates directly, as without the
+journal. Keep the directory on persistent storage: records not yet applied
+when a host is lost are replayed when a bot starts there again.
+"""
+import asyncio
+import json
+import logging
+import os
+import zlib
+from time import monotonic, perf_counter
+
+from sqlalchemy.exc import DisconnectionError, InterfaceError, OperationalError, TimeoutError as PoolTimeout
+
+from core import metrics
+from services.scheduler import FileLeaderLock
+
+# Errors that mean "database not reachable right now": retry the record
+RETRYABLE_ERRORS = (OperationalError, InterfaceError, DisconnectionError, PoolTimeout)
+
+APPENDED = metrics.counter(
+    'ingest_journal_appended_total', 'Updates written to the ingest journal'
+)
+APPLIED = metrics.counter(
+    'ingest_journal_applied_total', 'Journal records applied, by outcome', ['outcome']
+)
+FSYNC_SECONDS = metrics.histogram(
+    'ingest_journal_fsync_seconds', 'Duration of one batched journal fsync',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+)
+BACKLOG = metrics.gauge(
+    'ingest_journal_backlog', 'Journal records written but not applied yet', multiprocess_mode='livesum'
+)
+
+
+def encode_record(data):
+    """One journal line: crc32 of the JSON, a space, the JSON and a newline"""
+    payload = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode()
+    return b'%08x %s\n' % (zlib.crc32(payload), payload)
+
+
+def decode_record(line):
+    """Parse a journal line; returns None when it is damaged."""
+    crc, _, payload = line.rstrip(b'\n').partition(b' ')
+    try:
+        if int(crc, 16) != zlib.crc32(payload):
+            return None
+        return json.loads(payload)
+    except ValueError:
+        return None
+
+
+class IngestJournal:
+    """Append-only update journal and its applier"""
+
+    def __init__(self, app=None):
+        self.app = app
+        self.enabled = False
+        self.directory = 'journal'
+        self.segment_bytes = 16 * 1024 * 1024
+        self.fsync_batch = 100
+        self.fsync_interval = 0.05
+        self.checkpoint_seconds = 1.0
+        self.retry_seconds = 1.0
+        self.retry_max_seconds = 30.0
+        self.logger = logging.getLogger(__name__)
+        self._lock = None
+        self._fd = None
+        self._segment = 0
+        self._size = 0
+        self._retired = []
+        self._unsynced = 0
+        self._sync_task = None
+        self._sync_lock = None
+        self._position = (0, 0)
+        self._saved_position = None
+        self._checkpointed_at = 0
+        self._written = 0
+        self._applied = 0
+        self._wakeup = None
+        self._applier = None
+        self._stopping = False
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('INGEST_JOURNAL_ENABLED', True)
+        self.directory = app.config.get('INGEST_JOURNAL_DIR') or 'journal'
+        self.segment_bytes = app.config.get('INGEST_JOURNAL_SEGMENT_BYTES', 16 * 1024 * 1024)
+        self.fsync_batch = max(1, app.config.get('INGEST_JOURNAL_FSYNC_BATCH', 100))
+        self.fsync_interval = app.config.get('INGEST_JOURNAL_FSYNC_MS', 50) / 1000
+        self.checkpoint_seconds = app.config.get('INGEST_JOURNAL_CHECKPOINT_SECONDS', 1.0)
+
+    @property
+    def is_open(self):
+        return self._fd is not None
+
+    @property
+    def backlog(self):
+        return self._written - self._applied
+
+    # === Files ===
+
+    def _segment_path(self, sequence):
+        return os.path.join(self.directory, f'{sequence:012d}.log')
+
+    def _segments(self):
+        return sorted(int(name[:-4]) for name in os.listdir(self.directory)
+                      if name.endswith('.log') and name[:-4].isdigit())
+
+    def _checkpoint_path(self):
+        return os.path.join(self.directory, 'checkpoint.json')
+
+    def _load_checkpoint(self):
+        try:
+            with open(self._checkpoint_path()) as f:
+                data = json.load(f)
+            return data['segment'], data['offset']
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError) as e:
+            self.logger.error(f"Ingest journal checkpoint unreadable, replaying from the start: {e}")
+            return None
+
+    def _save_checkpoint(self):
+        """Persist the applier position (no fsync: replaying a few records again is harmless)."""
+        if self._position == self._saved_position:
+            return
+        segment, offset = self._position
+        path = self._checkpoint_path()
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'segment': segment, 'offset': offset}, f)
+        os.replace(path + '.tmp', path)
+        self._saved_position = self._position
+        self._checkpointed_at = monotonic()
+        # Segments before the applier position are done
+        for sequence in self._segments():
+            if sequence < segment:
+                os.remove(self._segment_path(sequence))
+
+    def _fsync_directory(self):
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _recover_tail(self, sequence):
+        """Cut a line left half-written by a crash from the end of a segment."""
+        path = self._segment_path(sequence)
+        with open(path, 'rb+') as f:
+            data = f.read()
+            end = data.rfind(b'\n') + 1
+            if end < len(data):
+                self.logger.warning(f"Ingest journal: dropping {len(data) - end} bytes of a torn record in {path}")
+                f.truncate(end)
+        return end
+
+    def _count_records(self, segments, start):
+        count = 0
+        for sequence in segments:
+            if sequence < start[0]:
+                continue
+            with open(self._segment_path(sequence), 'rb') as f:
+                if sequence == start[0]:
+                    f.seek(start[1])
+                count += sum(1 for _ in f)
+        return count
+
+    def _open_segment(self, sequence):
+        self._fd = os.open(self._segment_path(sequence), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._segment = sequence
+        self._size = os.fstat(self._fd).st_size
+        self._fsync_directory()
+
+    def _rotate(self):
+        # The old descriptor is fsynced and closed by the next sync
+        self._retired.append(self._fd)
+        self._open_segment(self._segment + 1)
+
+    # === Writer ===
+
+    def open(self):
+        """
+        Lock the journal directory, recover it and start writing.
+
+        Returns:
+            bool: False when the journal is disabled or used by another process
+        """
+        if self.is_open:
+            return True
+        if not self.enabled:
+            return False
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = FileLeaderLock(os.path.join(self.directory, 'journal.lock'))
+        if not self._lock.acquire():
+            self.logger.warning(f"Ingest journal {self.directory} is used by another process, "
+                                f"saving updates directly")
+            self._lock = None
+            return False
+
+        segments = self._segments()
+        if segments:
+            self._recover_tail(segments[-1])
+        self._position = self._load_checkpoint() or ((segments[0] if segments else 1), 0)
+        self._saved_position = self._position
+        self._written = self._count_records(segments, self._position)
+        self._applied = 0
+        BACKLOG.set(self._written)
+
+        # Always write to a fresh segment: the applier never reads a file that is being recovered
+        self._open_segment((segments[-1] + 1) if segments else 1)
+        self._sync_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        if self._written:
+            self.logger.info(f"📒 Ingest journal: replaying {self._written} unapplied updates")
+        return True
+
+    async def append(self, data):
+        """Write one update (its ``to_dict()``); it is fsynced with the current batch."""
+        line = encode_record(data)
+        if self._size and self._size + len(line) > self.segment_bytes:
+            self._rotate()
+        os.write(self._fd, line)
+        self._size += len(line)
+        self._written += 1
+        self._unsynced += 1
+        APPENDED.inc()
+        BACKLOG.set(self.backlog)
+        self._wakeup.set()
+
+        if self._unsynced >= self.fsync_batch:
+            await self.sync()
+        elif self._sync_task is None:
+            self._sync_task = asyncio.ensure_future(self._sync_later())
+
+    async def _sync_later(self):
+        await asyncio.sleep(self.fsync_interval)
+        self._sync_task = None
+        await self.sync()
+
+    async def sync(self):
+        """fsync everything appended so far."""
+        async with self._sync_lock:
+            if not self._unsynced and not self._retired:
+                return
+            fds, retired = [self._fd, *self._retired], self._retired
+            self._retired, self._unsynced = [], 0
+            started = perf_counter()
+            await asyncio.to_thread(_fsync_all, fds, retired)
+            FSYNC_SECONDS.observe(perf_counter() - started)
+
+    # === Applier ===
+
+    def _read_next(self):
+        """Next record after the applier position: (data or None if damaged, next position) or None."""
+        segment, offset = self._position
+        while True:
+            try:
+                with open(self._segment_path(segment), 'rb') as f:
+                    f.seek(offset)
+                    line = f.readline()
+            except FileNotFoundError:
+                line = b''
+            if line.endswith(b'\n'):
+                return decode_record(line), (segment, offset + len(line))
+            if segment >= self._segment:
+                return None
+            # End of a finished segment
+            segment, offset = segment + 1, 0
+            self._position = (segment, offset)
+
+    async def _wait(self, seconds):
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _apply(self, apply, data):
+        """Apply one record, retrying while the database is unreachable."""
+        delay = self.retry_seconds
+        while True:
+            try:
+                await apply(data)
+                APPLIED.labels(outcome='ok').inc()
+                return
+            except RETRYABLE_ERRORS as e:
+                APPLIED.labels(outcome='retry').inc()
+                self.logger.warning(f"Ingest journal: database unavailable ({e.__class__.__name__}), "
+                                    f"retrying in {delay:.1f}s, {self.backlog} updates waiting")
+            except Exception as e:
+                APPLIED.labels(outcome='failed').inc()
+                self.logger.error(f"Ingest journal: skipping update {data.get('update_id')}: {e}")
+                return
+            if self._stopping:
+                raise asyncio.CancelledError
+            await asyncio.sleep(delay)
+            delay = min(self.retry_max_seconds, delay * 2)
+
+    async def _run(self, apply):
+        while not self._stopping:
+            record = self._read_next()
+            if record is None:
+                self._save_checkpoint()
+                await self._wait(self.checkpoint_seconds)
+                continue
+
+            data, position = record
+            if data is None:
+                APPLIED.labels(outcome='damaged').inc()
+                self.logger.error(f"Ingest journal: skipping damaged record at {self._position}")
+            else:
+                try:
+                    await self._apply(apply, data)
+                except asyncio.CancelledError:
+                    break
+            self._position = position
+            self._applied += 1
+            BACKLOG.set(self.backlog)
+            if monotonic() - self._checkpointed_at >= self.checkpoint_seconds:
+                self._save_checkpoint()
+        self._save_checkpoint()
+
+    def start(self, apply):
+        """
+        Start the applier task.
+
+        Args:
+            apply: coroutine function taking the update dict; raises on failure
+        """
+        if self.is_open and self._applier is None:
+            self._stopping = False
+            self._applier = asyncio.ensure_future(self._run(apply))
+
+    async def drain(self, apply):
+        """Apply everything in the journal, then close it (flask telegram replay-journal)."""
+        self.start(apply)
+        while self.backlog and not self._applier.done():
+            await asyncio.sleep(0.1)
+        await self.close()
+
+    async def close(self, timeout=10):
+        """Stop the applier (after the record in progress), sync and release the journal."""
+        if not self.is_open:
+            return
+        self._stopping = True
+        if self._applier is not None:
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._applier, timeout)
+            except asyncio.TimeoutError:
+                self.logger.warning("Ingest journal applier did not stop in time, it will replay on start")
+            self._applier = None
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            self._sync_task = None
+        await self.sync()
+        os.close(self._fd)
+        self._fd = None
+        self._lock.release()
+        self._lock = None
+        if self.backlog:
+            self.logger.info(f"📒 Ingest journal closed with {self.backlog} updates to replay")
+
+
+def _fsync_all(fds, retired):
+    for fd in fds:
+        os.fsync(fd)
+    for fd in retired:
+        os.close(fd)
+
+
+# Global instance
+ingest_journal = IngestJournal()
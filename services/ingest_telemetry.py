@@ -0,0 +1,263 @@
+"""
+Ingest latency telemetry for the Telegram bot.
+
+Every channel message is timed from its Telegram ``date`` (or ``edit_date``)
+through handler entry, parsing, media resolution and the database commit.
+Durations feed Prometheus histograms per feed and stage, and are also
+aggregated in memory into bucketed windows that the bot flushes to the
+``ingest_stats`` table, so the admin page of the web app can show p50/p95
+per feed and flag feeds whose p95 lag exceeds INGEST_LAG_ALERT_SECONDS.
+"""
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+
+from core import metrics
+from core.extensions import db
+from models.ingest_stat import IngestStat
+
+# Stages recorded per message, in pipeline order
+STAGES = ('queue', 'parse', 'media', 'commit', 'lag')
+
+STAGE_LABELS = {
+    'queue': 'Telegram → handler',
+    'parse': 'Parse',
+    'media': 'Media resolution',
+    'commit': 'DB commit',
+    'lag': 'End-to-end lag',
+}
+
+# Upper bounds in seconds, shared by Prometheus and the stored windows
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900, 3600)
+
+INGEST_STAGE_SECONDS = metrics.histogram(
+    'telegram_ingest_stage_seconds', 'Duration of each ingest stage per feed',
+    ['feed_id', 'stage'], buckets=BUCKETS
+)
+INGEST_LAG_P95 = metrics.gauge(
+    'telegram_ingest_lag_p95_seconds', 'p95 end-to-end ingest lag of the last flushed window',
+    ['feed_id'], multiprocess_mode='max'
+)
+INGEST_LAG_ALERTS = metrics.counter(
+    'telegram_ingest_lag_alerts_total', 'Windows whose p95 ingest lag exceeded the alert threshold',
+    ['feed_id']
+)
+
+
+def percentile(buckets, count, q, max_value=None):
+    """
+    Estimate a percentile from bucket counts by linear interpolation.
+
+    Args:
+        buckets (list): Counts per bucket of ``BUCKETS`` plus a final +Inf bucket
+        count (int): Total number of observations
+        q (float): Percentile between 0 and 1
+        max_value (float): Largest observation, used for the +Inf bucket
+
+    Returns:
+        float: Estimated value, None without observations
+    """
+    if not count:
+        return None
+
+    rank = q * count
+    seen = 0
+    for i, bucket_count in enumerate(buckets):
+        if bucket_count and seen + bucket_count >= rank:
+            lower = BUCKETS[i - 1] if i > 0 else 0.0
+            upper = BUCKETS[i] if i < len(BUCKETS) else (max_value or lower)
+            if max_value is not None:
+                upper = min(upper, max_value)
+            return lower + (upper - lower) * (rank - seen) / bucket_count
+        seen += bucket_count
+    return max_value
+
+
+class IngestTimer:
+    """Timings of one message as it moves through the ingest pipeline"""
+
+    def __init__(self, message_date=None):
+        self.started = perf_counter()
+        self.started_at = datetime.now(timezone.utc)
+        self.durations = {}
+        if message_date is not None:
+            if message_date.tzinfo is None:
+                message_date = message_date.replace(tzinfo=timezone.utc)
+            self.durations['queue'] = max(0.0, (self.started_at - message_date).total_seconds())
+        self.message_date = message_date
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block as ``name``; repeated blocks add up."""
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] = self.durations.get(name, 0.0) + perf_counter() - started
+
+    def finish(self):
+        """Close the timer after the commit: computes the end-to-end lag."""
+        if 'parse' in self.durations and 'media' in self.durations:
+            # The parse block wraps media resolution, report them separately
+            self.durations['parse'] = max(0.0, self.durations['parse'] - self.durations['media'])
+        if 'queue' in self.durations:
+            self.durations['lag'] = self.durations['queue'] + perf_counter() - self.started
+        return self.durations
+
+
+class _Window:
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.buckets[bisect.bisect_left(BUCKETS, value)] += 1
+
+
+class IngestTelemetry:
+    """Aggregates ingest timings per feed and persists them periodically"""
+
+    def __init__(self, app=None):
+        self.app = app
+        self.window_seconds = 300
+        self.flush_interval = 60
+        self.retention_days = 7
+        self.alert_seconds = 60.0
+        self.logger = logging.getLogger(__name__)
+        self._windows = {}
+        self._last_flush = perf_counter()
+        # (feed_id, window_start) of windows that already alerted; flushes repeat a window
+        self._alerted = set()
+        # Messages are recorded from the bot's database worker threads
+        self._lock = threading.Lock()
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.window_seconds = app.config.get('INGEST_STATS_WINDOW_SECONDS', 300)
+        self.flush_interval = app.config.get('INGEST_STATS_FLUSH_SECONDS', 60)
+        self.retention_days = app.config.get('INGEST_STATS_RETENTION_DAYS', 7)
+        self.alert_seconds = app.config.get('INGEST_LAG_ALERT_SECONDS', 60.0)
+
+    def start(self, message_date=None):
+        """Start timing a message at handler entry."""
+        return IngestTimer(message_date)
+
+    def _window_start(self, moment):
+        epoch = int(moment.timestamp())
+        start = epoch - epoch % self.window_seconds
+        return datetime.utcfromtimestamp(start)
+
+    def record(self, feed_id, timer):
+        """Record the stage durations of a committed message."""
+        durations = timer.finish()
+        window_start = self._window_start(timer.started_at)
+        with self._lock:
+            for stage, seconds in durations.items():
+                INGEST_STAGE_SECONDS.labels(feed_id=str(feed_id), stage=stage).observe(seconds)
+                key = (feed_id, stage, window_start)
+                window = self._windows.get(key)
+                if window is None:
+                    window = self._windows[key] = _Window()
+                window.observe(seconds)
+
+        if perf_counter() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Merge in-memory windows into ``ingest_stats`` (requires an app context)."""
+        with self._lock:
+            windows, self._windows = self._windows, {}
+            self._last_flush = perf_counter()
+        if not windows:
+            return
+
+        try:
+            for (feed_id, stage, window_start), window in windows.items():
+                stat = IngestStat.query.filter_by(
+                    feed_id=feed_id, stage=stage, window_start=window_start
+                ).first()
+                if stat is None:
+                    stat = IngestStat(feed_id, stage, window_start, [0] * (len(BUCKETS) + 1))
+                    db.session.add(stat)
+
+                stat.count += window.count
+                stat.total_seconds += window.total
+                stat.max_seconds = max(stat.max_seconds, window.max)
+                stat.buckets = [a + b for a, b in zip(stat.buckets, window.buckets)]
+
+                if stage == 'lag':
+                    self._check_alert(feed_id, stat)
+
+            cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+            IngestStat.prune(cutoff)
+            db.session.commit()
+            self._alerted = {key for key in self._alerted if key[1] >= cutoff}
+        except Exception as e:
+            db.session.rollback()
+            self.logger.error(f"Error flushing ingest telemetry: {e}")
+
+    def _check_alert(self, feed_id, stat):
+        p95 = percentile(stat.buckets, stat.count, 0.95, stat.max_seconds)
+        INGEST_LAG_P95.labels(feed_id=str(feed_id)).set(p95)
+        key = (feed_id, stat.window_start)
+        if p95 > self.alert_seconds and key not in self._alerted:
+            self._alerted.add(key)
+            INGEST_LAG_ALERTS.labels(feed_id=str(feed_id)).inc()
+            self.logger.warning(
+                f"⚠️  Ingest lag alert: feed {feed_id} p95 {p95:.1f}s > {self.alert_seconds:.0f}s "
+                f"(window {stat.window_start:%H:%M}, {stat.count} messages)"
+            )
+
+    def summarize(self, since):
+        """
+        Aggregate stored windows per feed for the admin page.
+
+        Args:
+            since (datetime): Only windows starting after this moment (UTC)
+
+        Returns:
+            dict: feed_id -> {'count', 'alert', 'stages': {stage: {'p50', 'p95', 'max', 'mean'}}}
+        """
+        merged = {}
+        for stat in IngestStat.get_since(since):
+            entry = merged.setdefault(stat.feed_id, {}).setdefault(
+                stat.stage, {'count': 0, 'total': 0.0, 'max': 0.0, 'buckets': [0] * (len(BUCKETS) + 1)}
+            )
+            entry['count'] += stat.count
+            entry['total'] += stat.total_seconds
+            entry['max'] = max(entry['max'], stat.max_seconds)
+            entry['buckets'] = [a + b for a, b in zip(entry['buckets'], stat.buckets)]
+
+        summary = {}
+        for feed_id, stages in merged.items():
+            feed_summary = {'count': 0, 'alert': False, 'stages': {}}
+            for stage, entry in stages.items():
+                feed_summary['stages'][stage] = {
+                    'p50': percentile(entry['buckets'], entry['count'], 0.5, entry['max']),
+                    'p95': percentile(entry['buckets'], entry['count'], 0.95, entry['max']),
+                    'max': entry['max'],
+                    'mean': entry['total'] / entry['count'] if entry['count'] else None,
+                }
+            if 'lag' in stages:
+                feed_summary['count'] = stages['lag']['count']
+                p95 = feed_summary['stages']['lag']['p95']
+                feed_summary['alert'] = p95 is not None and p95 > self.alert_seconds
+            summary[feed_id] = feed_summary
+        return summary
+
+
+# Global instance
+ingest_telemetry = IngestTelemetry()
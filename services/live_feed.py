@@ -0,0 +1,196 @@
+"""
+Live feed of newly ingested posts for the Server-Sent Events endpoint.
+
+The ingest process publishes one small JSON event per new post. Every web
+process runs a single background listener (Redis pub/sub when REDIS_URL is
+configured, Postgres LISTEN/NOTIFY otherwise) and fans events out to the
+in-process queues of connected SSE clients, so open streams never hold a
+database connection.
+"""
+import json
+import logging
+import queue
+import select
+import sys
+import threading
+import time
+
+from sqlalchemy import text
+
+CHANNEL = 'new_posts'
+
+
+class RedisBackend:
+    """Publish/subscribe through a Redis channel."""
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def publish(self, payload):
+        self.client.publish(CHANNEL, payload)
+
+    def listen(self, timeout):
+        """Yield payloads as they arrive, None every ``timeout`` seconds of silence."""
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(CHANNEL)
+        try:
+            while True:
+                message = pubsub.get_message(timeout=timeout)
+                yield message['data'].decode('utf-8') if message else None
+        finally:
+            pubsub.close()
+
+
+class PostgresBackend:
+    """Publish/subscribe through Postgres NOTIFY/LISTEN."""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def publish(self, payload):
+        with self.engine.begin() as conn:
+            conn.execute(text('SELECT pg_notify(:channel, :payload)'),
+                         {'channel': CHANNEL, 'payload': payload})
+
+    def listen(self, timeout):
+        """Yield payloads as they arrive, None every ``timeout`` seconds of silence."""
+        import psycopg2
+
+        # Dedicated connection: LISTEN must not hold a slot of the request pool
+        dsn = self.engine.url.set(drivername='postgresql').render_as_string(hide_password=False)
+        conn = psycopg2.connect(dsn)
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN {CHANNEL}')
+
+            while True:
+                if not select.select([conn], [], [], timeout)[0]:
+                    yield None
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    yield conn.notifies.pop(0).payload
+        finally:
+            conn.close()
+
+
+class LiveFeed:
+    """Publishes new posts and fans them out to SSE subscribers"""
+
+    def __init__(self, app=None):
+        self.app = app
+        self.backend = None
+        self.heartbeat = 15
+        self.max_stream_seconds = 300
+        self.logger = logging.getLogger(__name__)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._listener = None
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Select the pub/sub backend from the app configuration."""
+        self.app = app
+        self.heartbeat = app.config.get('LIVE_FEED_HEARTBEAT', 15)
+        self.max_stream_seconds = app.config.get('LIVE_FEED_MAX_STREAM_SECONDS', 300)
+
+        redis_url = app.config.get('REDIS_URL')
+        database_uri = app.config.get('SQLALCHEMY_DATABASE_URI') or ''
+
+        try:
+            if redis_url:
+                self.backend = RedisBackend(redis_url)
+            elif database_uri.startswith('postgresql') and not app.config.get('DB_PGBOUNCER'):
+                # LISTEN needs a session-pooled connection, PgBouncer transaction mode breaks it
+                from core.extensions import db
+                with app.app_context():
+                    self.backend = PostgresBackend(db.engine)
+        except ImportError as e:
+            self.logger.warning(f"Live feed disabled, backend client not installed: {e}")
+            self.backend = None
+
+        if not self.backend:
+            self.logger.info("Live feed disabled: configure REDIS_URL or use Postgres")
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    @staticmethod
+    def can_stream(environ):
+        """
+        Check that the current worker can hold a long-lived response.
+
+        Sync Gunicorn workers serve one request at a time, so streams are only
+        accepted on threaded servers or gevent workers.
+        """
+        if environ.get('wsgi.multithread'):
+            return True
+        gevent_monkey = sys.modules.get('gevent.monkey')
+        return bool(gevent_monkey and gevent_monkey.is_module_patched('socket'))
+
+    def publish_post(self, post):
+        """Publish a committed post. Never raises: live push is best effort."""
+        if not self.backend:
+            return
+
+        payload = json.dumps({
+            'id': post.id,
+            'feed_id': post.feed_id,
+            'category_id': post.feed.category_id if post.feed else None,
+            'telegram_date': post.telegram_date.isoformat() if post.telegram_date else None,
+            'duplicate_group_id': post.duplicate_group_id,
+            'is_primary_duplicate': post.is_primary_duplicate,
+        })
+        try:
+            self.backend.publish(payload)
+        except Exception as e:
+            self.logger.warning(f"Could not publish post {post.id} to live feed: {e}")
+
+    def subscribe(self):
+        """Register a subscriber and return its queue of JSON payloads."""
+        self._ensure_listener()
+        subscription = queue.Queue(maxsize=100)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen_forever, name='live-feed-listener', daemon=True)
+            self._listener.start()
+
+    def _listen_forever(self):
+        delay = 1
+        while True:
+            try:
+                for payload in self.backend.listen(self.heartbeat):
+                    delay = 1
+                    if payload is None:
+                        continue
+                    with self._lock:
+                        subscribers = list(self._subscribers)
+                    for subscription in subscribers:
+                        try:
+                            subscription.put_nowait(payload)
+                        except queue.Full:
+                            # Slow client: drop the event rather than block everyone
+                            pass
+            except Exception as e:
+                self.logger.warning(f"Live feed listener error, reconnecting in {delay}s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+
+
+# Global instance
+live_feed = LiveFeed()
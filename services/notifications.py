@@ -0,0 +1,361 @@
+"""
+Subscription notifications.
+
+The bot enqueues every new post with its feed's category right after the
+commit, and posts matching a saved search for their owner; both are dict
+updates, so ingest never waits on subscribers. Every
+NOTIFY_DIGEST_INTERVAL_SECONDS the monitoring loop flushes the queue:
+
+* one indexed query loads the active, notifying subscribers of all
+  categories that received posts (not one query per post or category);
+* posts are grouped per user, so each user gets a single digest per
+  interval however many posts and categories it covers;
+* digests are sent through the first transport of NOTIFY_TRANSPORTS that
+  can reach the user (Telegram private chat, email, or a JSON-lines file
+  for development), paced by a token bucket of NOTIFY_RATE_PER_SECOND.
+
+The queue lives in the bot process; posts enqueued since the last flush
+are lost if the process is killed, a stop flushes them.
+"""
+import json
+import logging
+import os
+import smtplib
+import threading
+import time
+from datetime import datetime
+from email.message import EmailMessage
+
+import httpx
+
+from core import metrics
+from models.post import Post
+from models.user import User
+from models.user_subscription import UserSubscription
+
+NOTIFICATIONS_SENT = metrics.counter(
+    'notifications_sent_total', 'Notification digests by transport and outcome',
+    ['transport', 'status']
+)
+NOTIFICATIONS_THROUGHPUT = metrics.gauge(
+    'notifications_throughput_per_second', 'Digests sent per second during the last flush',
+    multiprocess_mode='max'
+)
+NOTIFICATIONS_PENDING = metrics.gauge(
+    'notifications_pending_posts', 'Posts waiting for the next digest flush',
+    multiprocess_mode='max'
+)
+
+
+class RateLimiter:
+    """Token bucket allowing ``rate`` sends per second with bursts up to ``rate``"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            time.sleep((1 - self.tokens) / self.rate)
+
+
+class Transport:
+    """Delivers a digest to a user; subclasses implement ``can_deliver`` and ``send``"""
+
+    name = 'base'
+
+    def can_deliver(self, user):
+        return False
+
+    def send(self, user, subject, body):
+        raise NotImplementedError
+
+    def open(self):
+        """Called before a flush sends its digests."""
+
+    def close(self):
+        """Called after a flush, also when it failed."""
+
+
+class TelegramTransport(Transport):
+    """Bot API sendMessage to the user's private chat with the bot, linked by /start (services/telegram_link.py)"""
+
+    name = 'telegram'
+
+    def __init__(self, token):
+        self.url = f'https://api.telegram.org/bot{token}/sendMessage'
+        self.client = httpx.Client(timeout=10)
+
+    def can_deliver(self, user):
+        return bool(user.telegram_chat_id)
+
+    def send(self, user, subject, body):
+        payload = {'chat_id': user.telegram_chat_id, 'text': f'{subject}\n\n{body}',
+                   'disable_web_page_preview': True}
+        response = self.client.post(self.url, json=payload)
+        if response.status_code == 429:
+            # Flood control: wait as told and retry once
+            retry_after = response.json().get('parameters', {}).get('retry_after', 1)
+            time.sleep(retry_after)
+            response = self.client.post(self.url, json=payload)
+        response.raise_for_status()
+
+
+class EmailTransport(Transport):
+    """SMTP, one connection per flush"""
+
+    name = 'email'
+
+    def __init__(self, host, port=587, username=None, password=None, sender=None, starttls=True):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender or username
+        self.starttls = starttls
+        self.connection = None
+
+    def can_deliver(self, user):
+        return bool(user.email)
+
+    def open(self):
+        self.connection = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.starttls:
+            self.connection.starttls()
+        if self.username:
+            self.connection.login(self.username, self.password)
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.quit()
+            except smtplib.SMTPException:
+                pass
+            self.connection = None
+
+    def send(self, user, subject, body):
+        message = EmailMessage()
+        message['From'] = self.sender
+        message['To'] = user.email
+        message['Subject'] = subject
+        message.set_content(body)
+        self.connection.send_message(message)
+
+
+class FileTransport(Transport):
+    """Appends digests as JSON lines, for development and tests"""
+
+    name = 'file'
+
+    def __init__(self, path):
+        self.path = path
+
+    def can_deliver(self, user):
+        return True
+
+    def send(self, user, subject, body):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({
+                'sent_at': datetime.utcnow().isoformat(),
+                'user_id': user.id,
+                'username': user.username,
+                'subject': subject,
+                'body': body
+            }, ensure_ascii=False) + '\n')
+
+
+def post_link(post):
+    """Public t.me link of a post, None for feeds without a public username."""
+    url = (post.feed.url or '').rstrip('/')
+    if url.startswith('https://t.me/') and '/c/' not in url:
+        return f'{url}/{post.telegram_message_id}'
+    return None
+
+
+class NotificationDispatcher:
+    """Queues new posts per category and sends per-user digests"""
+
+    def __init__(self, app=None):
+        self.app = app
+        self.enabled = False
+        self.interval = 300
+        self.max_posts = 10
+        self.transports = []
+        self.limiter = RateLimiter(20)
+        self.logger = logging.getLogger(__name__)
+        self._pending = {}
+        self._direct = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('NOTIFY_ENABLED', True)
+        self.interval = app.config.get('NOTIFY_DIGEST_INTERVAL_SECONDS', 300)
+        self.max_posts = app.config.get('NOTIFY_DIGEST_MAX_POSTS', 10)
+        self.limiter = RateLimiter(app.config.get('NOTIFY_RATE_PER_SECOND', 20))
+        self.transports = [
+            transport for transport in (
+                self._create_transport(app, name.strip())
+                for name in (app.config.get('NOTIFY_TRANSPORTS') or '').split(',') if name.strip()
+            ) if transport is not None
+        ]
+        if self.enabled and not self.transports:
+            self.logger.info("No notification transport configured, notifications disabled")
+            self.enabled = False
+
+    def _create_transport(self, app, name):
+        if name == 'telegram':
+            token = app.config.get('TELEGRAM_BOT_TOKEN')
+            return TelegramTransport(token) if token else None
+        if name == 'email':
+            host = app.config.get('SMTP_HOST')
+            if not host:
+                return None
+            return EmailTransport(
+                host, app.config.get('SMTP_PORT', 587), app.config.get('SMTP_USERNAME'),
+                app.config.get('SMTP_PASSWORD'), app.config.get('SMTP_FROM'),
+                app.config.get('SMTP_STARTTLS', True)
+            )
+        if name == 'file':
+            return FileTransport(app.config.get('NOTIFY_FILE_PATH', 'logs/notifications.jsonl'))
+        raise ValueError(f"Unknown notification transport {name!r}")
+
+    def enqueue(self, post):
+        """Queue a newly committed post for the subscribers of its feed's category."""
+        if not self.enabled or post.feed is None or post.feed.category_id is None:
+            return
+        with self._lock:
+            self._pending.setdefault(post.feed.category_id, []).append(post.id)
+            self._report_pending()
+
+    def enqueue_for_user(self, user_id, post_id):
+        """Queue a post for one user, e.g. because it matched a saved search."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._direct.setdefault(user_id, set()).add(post_id)
+            self._report_pending()
+
+    def _report_pending(self):
+        NOTIFICATIONS_PENDING.set(
+            sum(len(ids) for ids in self._pending.values()) + sum(len(ids) for ids in self._direct.values())
+        )
+
+    def due(self):
+        return bool(self._pending or self._direct) and time.monotonic() - self._last_flush >= self.interval
+
+    def flush(self):
+        """
+        Send digests for all queued posts (requires an app context).
+
+        Returns:
+            int: Number of digests sent
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            direct, self._direct = self._direct, {}
+            self._last_flush = time.monotonic()
+        NOTIFICATIONS_PENDING.set(0)
+        if not pending and not direct:
+            return 0
+
+        # One query for the subscribers of every category in the queue
+        digests = {}
+        for category_id, user in UserSubscription.get_notification_targets(list(pending)):
+            digest = digests.setdefault(user.id, {'user': user, 'post_ids': set()})
+            digest['post_ids'].update(pending[category_id])
+        if direct:
+            for user in User.query.filter(User.id.in_(list(direct))).all():
+                digest = digests.setdefault(user.id, {'user': user, 'post_ids': set()})
+                digest['post_ids'].update(direct[user.id])
+        if not digests:
+            return 0
+
+        post_ids = set().union(*(digest['post_ids'] for digest in digests.values()))
+        posts = {post.id: post for post in Post.query.filter(Post.id.in_(post_ids)).all()}
+
+        for transport in self.transports:
+            try:
+                transport.open()
+            except Exception as e:
+                self.logger.error(f"Cannot open {transport.name} transport: {e}")
+
+        started = time.monotonic()
+        sent = 0
+        try:
+            for digest in digests.values():
+                digest_posts = sorted(
+                    (posts[post_id] for post_id in digest['post_ids'] if post_id in posts),
+                    key=lambda post: post.telegram_date, reverse=True
+                )
+                if digest_posts and self._deliver(digest['user'], digest_posts):
+                    sent += 1
+        finally:
+            for transport in self.transports:
+                transport.close()
+
+        elapsed = time.monotonic() - started
+        NOTIFICATIONS_THROUGHPUT.set(sent / elapsed if elapsed > 0 else sent)
+        self.logger.info(f"📬 Sent {sent} notification digest(s) for {len(post_ids)} post(s) in {elapsed:.1f}s")
+        return sent
+
+    def _deliver(self, user, posts):
+        transport = next((t for t in self.transports if t.can_deliver(user)), None)
+        if transport is None:
+            NOTIFICATIONS_SENT.labels(transport='none', status='undeliverable').inc()
+            return False
+
+        subject, body = self.render(posts)
+        self.limiter.acquire()
+        try:
+            transport.send(user, subject, body)
+        except Exception as e:
+            NOTIFICATIONS_SENT.labels(transport=transport.name, status='error').inc()
+            self.logger.warning(f"Failed to notify user {user.id} via {transport.name}: {e}")
+            return False
+        NOTIFICATIONS_SENT.labels(transport=transport.name, status='sent').inc()
+        return True
+
+    def render(self, posts):
+        """Subject and plain-text body of a digest."""
+        subject = f"{len(posts)} new post(s) in your subscriptions"
+        lines = []
+        for post in posts[:self.max_posts]:
+            snippet = ' '.join((post.content or '').split())[:140]
+            link = post_link(post)
+            lines.append(f"• {post.feed.name}: {snippet}" + (f"\n  {link}" if link else ''))
+        if len(posts) > self.max_posts:
+            lines.append(f"… and {len(posts) - self.max_posts} more")
+        return subject, '\n'.join(lines)
+
+
+def dispatch_pending(app, force=False):
+    """Flush the notification queue when its interval has passed; for the bot loop."""
+    if not force and not notification_dispatcher.due():
+        return 0
+    with app.app_context():
+        try:
+            return notification_dispatcher.flush()
+        except Exception as e:
+            notification_dispatcher.logger.error(f"Error dispatching notifications: {e}")
+            return 0
+
+
+# Global instance
+notification_dispatcher = NotificationDispatcher()
@@ -0,0 +1,333 @@
+"""
+Monthly range partitioning of ``posts`` by ``telegram_date`` (Postgres only).
+
+Almost every read hits the last few weeks of posts, so the table is split
+into one partition per month (``posts_pYYYYMM``) plus ``posts_default``
+for dates outside the created range. Postgres then prunes partitions for
+queries bounded on ``telegram_date`` and keeps every index small.
+
+* ``migrate`` converts the existing table online: rows are copied to a new
+  partitioned table in batches, then a short exclusive lock replays what
+  changed meanwhile (new ids, ``updated_at`` and the post change log) and
+  swaps the tables.
+* ``ensure_future_partitions`` creates partitions ahead of time; rows that
+  already landed in the default partition are moved in.
+* ``apply_retention`` detaches (or drops) partitions older than
+  POSTS_RETENTION_MONTHS, writing delete tombstones for delta sync and
+  deleting the interactions (``user_posts``) and statistics of their posts
+  first, as feed deletion does.
+
+A partitioned table's primary key must contain the partition key, so it is
+``(id, telegram_date)``; ``id`` still comes from the same sequence. Foreign
+keys can only target unique constraints, so ``migrate`` drops the foreign
+keys of ``user_posts`` and ``post_statistics`` on ``posts``; unpartitioned
+databases keep them. On SQLite every function here is a no-op.
+"""
+import logging
+import re
+from datetime import date, datetime
+
+from sqlalchemy import delete, select, text
+
+from core.extensions import db
+from models.post import Post
+from models.post_change import PostChange
+from models.post_statistics import PostStatistics
+from models.user_post import UserPost
+from services.scheduler import scheduler
+
+PARENT = 'posts'
+DEFAULT_PARTITION = 'posts_default'
+PARTITION_NAME = re.compile(r'^posts_p(\d{4})(\d{2})$')
+
+logger = logging.getLogger(__name__)
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'posts_p{month:%Y%m}'
+
+
+def partition_month(name):
+    """Month of a ``posts_pYYYYMM`` partition, None for other tables."""
+    match = PARTITION_NAME.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def is_supported():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def is_partitioned(table=PARENT):
+    relkind = db.session.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"), {'table': table}
+    ).scalar()
+    return relkind == 'p'
+
+
+def list_partitions(parent=PARENT):
+    """Names of the partitions attached to ``parent``."""
+    return db.session.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:parent) ORDER BY c.relname"
+    ), {'parent': parent}).scalars().all()
+
+
+def create_partition(month, parent=PARENT):
+    """
+    Create the partition of ``month`` (no commit).
+
+    Rows of that month already in the default partition are moved into the
+    new table before it is attached, otherwise ATTACH would fail.
+    """
+    name = partition_name(month)
+    lower, upper = month, add_months(month, 1)
+    default = f'{parent}_default'
+    bounds = {'lower': lower, 'upper': upper}
+
+    has_default = default in list_partitions(parent)
+    stray = has_default and db.session.execute(text(
+        f"SELECT EXISTS (SELECT 1 FROM {default} WHERE telegram_date >= :lower AND telegram_date < :upper)"
+    ), bounds).scalar()
+
+    if not stray:
+        db.session.execute(text(
+            f"CREATE TABLE {name} PARTITION OF {parent} "
+            f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+        ))
+        return name
+
+    db.session.execute(text(f"CREATE TABLE {name} (LIKE {parent} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    db.session.execute(text(
+        f"WITH moved AS (DELETE FROM {default} WHERE telegram_date >= :lower AND telegram_date < :upper "
+        f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+    ), bounds)
+    db.session.execute(text(
+        f"ALTER TABLE {parent} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+    ))
+    logger.info(f"Moved rows of {month:%Y-%m} out of {default}")
+    return name
+
+
+def ensure_partitions(first_month, last_month, parent=PARENT):
+    """Create missing monthly partitions from ``first_month`` to ``last_month`` inclusive."""
+    existing = set(list_partitions(parent))
+    created = []
+    month = month_start(first_month)
+    while month <= last_month:
+        if partition_name(month) not in existing:
+            created.append(create_partition(month, parent))
+        month = add_months(month, 1)
+    return created
+
+
+def ensure_future_partitions(months_ahead=3):
+    """Make sure partitions exist from the current month to ``months_ahead`` later."""
+    if not is_supported() or not is_partitioned():
+        return []
+    current = month_start(datetime.utcnow())
+    created = ensure_partitions(current, add_months(current, months_ahead))
+    db.session.commit()
+    for name in created:
+        logger.info(f"Created partition {name}")
+    return created
+
+
+def apply_retention(months, action='detach'):
+    """
+    Detach or drop partitions whose rows are all older than ``months`` months.
+
+    Args:
+        months (int): Retention in months, partitions of the current month and
+            the ``months`` before it are kept
+        action (str): 'detach' keeps the table for archiving, 'drop' deletes it
+
+    Returns:
+        list: Names of the detached or dropped partitions
+    """
+    if action not in ('detach', 'drop'):
+        raise ValueError("action must be 'detach' or 'drop'")
+    if not months or not is_supported() or not is_partitioned():
+        return []
+
+    cutoff = add_months(month_start(datetime.utcnow()), -months)
+    expired = [
+        name for name in list_partitions()
+        if partition_month(name) and add_months(partition_month(name), 1) <= cutoff
+    ]
+
+    for name in expired:
+        lower = partition_month(name)
+        upper = add_months(lower, 1)
+        in_partition = (Post.telegram_date >= lower, Post.telegram_date < upper)
+
+        # Delta sync clients drop these posts too; interactions with them go, as in feed deletion
+        PostChange.record_deletions(*in_partition)
+        post_ids = select(Post.id).where(*in_partition)
+        interactions = select(UserPost.id).where(UserPost.post_id.in_(post_ids))
+        db.session.execute(delete(PostStatistics).where(db.or_(
+            PostStatistics.user_post_id.in_(interactions),
+            PostStatistics.post_id.in_(post_ids)
+        )))
+        db.session.execute(delete(UserPost).where(UserPost.post_id.in_(post_ids)))
+        db.session.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+        if action == 'drop':
+            db.session.execute(text(f"DROP TABLE {name}"))
+        db.session.commit()
+        logger.info(f"Retention: {action} {name}")
+
+    return expired
+
+
+def status():
+    """Partitions with their estimated row count and size, newest first."""
+    if not is_supported() or not is_partitioned():
+        return []
+    rows = db.session.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint, "
+        "pg_total_relation_size(c.oid) "
+        "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:parent) ORDER BY c.relname DESC"
+    ), {'parent': PARENT}).all()
+    return [
+        {'name': name, 'bounds': bounds, 'rows': max(rows, 0), 'bytes': size}
+        for name, bounds, rows, size in rows
+    ]
+
+
+def migrate(batch_size=10000, months_ahead=3, drop_old=False, log=print):
+    """
+    Convert the regular ``posts`` table into a partitioned one.
+
+    Args:
+        batch_size (int): Rows copied per transaction before the switch
+        months_ahead (int): Future partitions created up front
+        drop_old (bool): Drop the old table after the switch instead of
+            keeping it as ``posts_unpartitioned``
+        log (callable): Progress output
+    """
+    if not is_supported():
+        raise RuntimeError('Partitioning requires Postgres')
+    if is_partitioned():
+        log('posts is already partitioned')
+        return
+
+    new = f'{PARENT}_partitioned'
+    old = f'{PARENT}_unpartitioned'
+
+    # Foreign keys to posts(id) cannot survive: posts(id) stops being unique on its own
+    for table, constraint in db.session.execute(text(
+        "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+        "WHERE contype = 'f' AND confrelid = to_regclass(:parent)"
+    ), {'parent': PARENT}).all():
+        db.session.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT "{constraint}"'))
+        log(f'Dropped foreign key {table}.{constraint}')
+
+    # Everything changed after this point is replayed under the lock (updated_at is UTC)
+    change_head = PostChange.get_head_id()
+    copy_started = db.session.execute(text("SELECT now() AT TIME ZONE 'utc'")).scalar()
+
+    db.session.execute(text(f"DROP TABLE IF EXISTS {new} CASCADE"))
+    db.session.execute(text(
+        f"CREATE TABLE {new} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE) "
+        f"PARTITION BY RANGE (telegram_date)"
+    ))
+    db.session.execute(text(f"ALTER TABLE {new} ADD CONSTRAINT {new}_pkey PRIMARY KEY (id, telegram_date)"))
+    db.session.execute(text(
+        f"ALTER TABLE {new} ADD CONSTRAINT {PARENT}_feed_id_fkey FOREIGN KEY (feed_id) REFERENCES feeds (id)"
+    ))
+
+    # Same secondary indexes, built on the empty table and renamed at the switch
+    indexes = db.session.execute(text(
+        "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = :parent "
+        "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:parent))"
+    ), {'parent': PARENT}).all()
+    for name, definition in indexes:
+        if definition.startswith('CREATE UNIQUE') and 'telegram_date' not in definition:
+            log(f'Skipped unique index {name}: it must include telegram_date on a partitioned table')
+            continue
+        definition = definition.replace(f'INDEX {name} ON ', f'INDEX {name}_new ON ', 1)
+        definition = re.sub(rf' ON (?:\w+\.)?{PARENT} ', f' ON {new} ', definition, count=1)
+        db.session.execute(text(definition))
+
+    first, last = db.session.execute(text(f"SELECT min(telegram_date), max(telegram_date) FROM {PARENT}")).one()
+    current = month_start(datetime.utcnow())
+    first_month = month_start(first) if first else current
+    last_month = max(month_start(last) if last else current, add_months(current, months_ahead))
+    db.session.execute(text(f"CREATE TABLE {new}_default PARTITION OF {new} DEFAULT"))
+    ensure_partitions(first_month, last_month, parent=new)
+    db.session.commit()
+    log(f'Created {new} with partitions {first_month:%Y-%m} .. {last_month:%Y-%m}')
+
+    # Online copy in id ranges
+    min_id, max_id = db.session.execute(text(f"SELECT min(id), max(id) FROM {PARENT}")).one()
+    copied_max = 0
+    if min_id is not None:
+        for start in range(min_id, max_id + 1, batch_size):
+            db.session.execute(text(
+                f"INSERT INTO {new} SELECT * FROM {PARENT} WHERE id >= :start AND id < :end"
+            ), {'start': start, 'end': start + batch_size})
+            db.session.commit()
+            log(f'Copied ids < {min(start + batch_size, max_id + 1)} of {max_id}')
+        copied_max = max_id
+
+    # Switch: replay concurrent changes and swap the tables under a short lock;
+    # give up rather than queue every reader behind a long-running transaction
+    db.session.execute(text("SET LOCAL lock_timeout = '10s'"))
+    db.session.execute(text(f"LOCK TABLE {PARENT} IN ACCESS EXCLUSIVE MODE"))
+    changed = (
+        f"SELECT id FROM {PARENT} WHERE updated_at >= :started "
+        f"UNION SELECT post_id FROM post_changes WHERE id > :head"
+    )
+    params = {'started': copy_started, 'head': change_head, 'copied_max': copied_max}
+    db.session.execute(text(f"DELETE FROM {new} WHERE id IN ({changed})"), params)
+    db.session.execute(text(
+        f"INSERT INTO {new} SELECT * FROM {PARENT} WHERE id > :copied_max OR id IN ({changed})"
+    ), params)
+
+    sequence = db.session.execute(text("SELECT pg_get_serial_sequence(:parent, 'id')"), {'parent': PARENT}).scalar()
+    if sequence:
+        db.session.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {new}.id"))
+
+    db.session.execute(text(f"ALTER TABLE {PARENT} RENAME TO {old}"))
+    db.session.execute(text(f"ALTER TABLE {old} RENAME CONSTRAINT {PARENT}_pkey TO {old}_pkey"))
+    for name, _ in indexes:
+        db.session.execute(text(f"ALTER INDEX IF EXISTS {name} RENAME TO {name}_old"))
+        db.session.execute(text(f"ALTER INDEX IF EXISTS {name}_new RENAME TO {name}"))
+    db.session.execute(text(f"ALTER TABLE {new} RENAME TO {PARENT}"))
+    db.session.execute(text(f"ALTER TABLE {PARENT} RENAME CONSTRAINT {new}_pkey TO {PARENT}_pkey"))
+    db.session.execute(text(f"ALTER TABLE {new}_default RENAME TO {DEFAULT_PARTITION}"))
+    if drop_old:
+        db.session.execute(text(f"DROP TABLE {old}"))
+    db.session.commit()
+
+    db.session.execute(text(f"ANALYZE {PARENT}"))
+    db.session.commit()
+    log('posts is now partitioned by month' + ('' if drop_old else f'; old table kept as {old}'))
+
+
+def run_maintenance(app):
+    """Create future partitions and apply retention with the app settings."""
+    with app.app_context():
+        if not is_supported():
+            return
+        try:
+            ensure_future_partitions(app.config.get('POSTS_PARTITION_PREMAKE_MONTHS', 3))
+            apply_retention(app.config.get('POSTS_RETENTION_MONTHS', 0),
+                            app.config.get('POSTS_RETENTION_ACTION', 'detach'))
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Partition maintenance failed: {e}")
+
+
+scheduler.register('partition-maintenance', run_maintenance, hours=6,
+                   description='Create future posts partitions and apply retention')
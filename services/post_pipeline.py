@@ -0,0 +1,170 @@
+"""
+Derived post data kept in step with ``Post.content``.
+
+Setting ``Post.content`` (new posts and edits alike) rehashes the text and
+flags the post. When the session flushes, flagged posts get, in the same
+transaction:
+
+* contacts and vacancy fields re-extracted from the new text;
+* their duplicate group recomputed from ``content_hash``: a post joins the
+  group of the posts with the same hash, stored or in the same flush
+  (creating it if needed), and the earliest post of the group by
+  ``telegram_date`` is its primary, so an older message imported later
+  takes over; the group a post leaves promotes its next earliest member
+  when the post was primary, and is dissolved when one member remains;
+* ``post_changes`` rows for every other post whose duplicate flags changed,
+  so delta sync clients and the facet index pick them up.
+
+Posts whose content did not change are skipped entirely. An edit costs
+the same as an insert: two extractions and at most a few indexed lookups
+on ``content_hash`` and ``duplicate_group_id``. The writer of a post
+still records that post's own change, as before.
+"""
+import uuid
+from datetime import datetime, timezone
+from time import perf_counter
+
+from sqlalchemy import event, or_, select, update
+
+from core import metrics
+from core.replicas import RoutingSession
+from models.post import Post
+from models.post_change import PostChange, ChangeType
+from services.telegram_bot import extract_contacts_from_text
+from services.vacancy_extractor import extract_vacancy, EXTRACTOR_VERSION
+
+PIPELINE_SECONDS = metrics.histogram(
+    'post_pipeline_seconds', 'Time to refresh derived data of one post with changed content',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+)
+REGROUPED = metrics.counter(
+    'post_pipeline_regrouped_total', 'Other posts whose duplicate flags changed by an insert or edit'
+)
+
+_installed = False
+
+
+def _record(session, post_id, feed_id):
+    session.add(PostChange(post_id=post_id, feed_id=feed_id, change_type=ChangeType.UPDATE))
+    REGROUPED.inc()
+
+
+def _leave_group(session, post, group_id, was_primary):
+    """Fix up the group a post left: promote a new primary or dissolve it."""
+    remaining = session.execute(
+        select(Post.id, Post.feed_id, Post.telegram_date, Post.is_primary_duplicate)
+        .where(Post.duplicate_group_id == group_id, Post.id != post.id)
+        .order_by(Post.telegram_date, Post.id).limit(2)
+    ).all()
+    if len(remaining) == 1:
+        member = remaining[0]
+        session.execute(update(Post).where(Post.id == member.id, Post.telegram_date == member.telegram_date)
+                        .values(duplicate_group_id=None, is_primary_duplicate=True))
+        if not member.is_primary_duplicate:
+            _record(session, member.id, member.feed_id)
+    elif remaining and was_primary:
+        member = remaining[0]
+        session.execute(update(Post).where(Post.id == member.id, Post.telegram_date == member.telegram_date)
+                        .values(is_primary_duplicate=True))
+        _record(session, member.id, member.feed_id)
+
+
+def _order(telegram_date, post_id):
+    """Sort key of a group member: earliest message first, pending posts after stored ones."""
+    if telegram_date is not None and telegram_date.tzinfo is not None:
+        telegram_date = telegram_date.astimezone(timezone.utc).replace(tzinfo=None)
+    return (telegram_date or datetime.max, post_id if post_id is not None else float('inf'))
+
+
+def regroup(session, posts):
+    """
+    Put posts sharing one content hash into their duplicate group (no flush).
+
+    ``posts`` are the posts of the current flush with that hash; stored
+    posts with the hash are looked up, the earliest post of all becomes
+    the group's primary.
+    """
+    previous = [(post, post.duplicate_group_id, post.is_primary_duplicate is not False) for post in posts]
+    own_ids = [post.id for post in posts if post.id is not None]
+    match = None
+    if posts[0].content_hash:
+        query = select(Post.id, Post.feed_id, Post.telegram_date, Post.duplicate_group_id).where(
+            Post.content_hash == posts[0].content_hash
+        )
+        if own_ids:
+            query = query.where(Post.id.notin_(own_ids))
+        match = session.execute(query.order_by(Post.telegram_date, Post.id).limit(1)).first()
+
+    if match is None and len(posts) == 1:
+        posts[0].duplicate_group_id = None
+        posts[0].is_primary_duplicate = True
+    else:
+        ordered = sorted(posts, key=lambda post: _order(post.telegram_date, post.id))
+        group_id = (match.duplicate_group_id if match else None) or str(uuid.uuid4())
+        stored_is_primary = match is not None and (
+            _order(match.telegram_date, match.id) < _order(ordered[0].telegram_date, ordered[0].id)
+        )
+        if match is not None:
+            if stored_is_primary:
+                if match.duplicate_group_id is None:
+                    # The earlier stored post was unique so far and becomes the group's primary
+                    session.execute(update(Post).where(Post.id == match.id, Post.telegram_date == match.telegram_date)
+                                    .values(duplicate_group_id=group_id, is_primary_duplicate=True))
+                    _record(session, match.id, match.feed_id)
+            else:
+                # A post of this flush is older than every stored member: it takes over as primary
+                demoted = session.execute(
+                    select(Post.id, Post.feed_id, Post.telegram_date).where(
+                        or_(Post.duplicate_group_id == group_id, Post.id == match.id),
+                        Post.is_primary_duplicate.isnot(False), Post.id.notin_(own_ids)
+                    )
+                ).all()
+                session.execute(update(Post).where(Post.id == match.id, Post.telegram_date == match.telegram_date)
+                                .values(duplicate_group_id=group_id, is_primary_duplicate=False))
+                for member in demoted:
+                    if member.id != match.id:
+                        session.execute(update(Post).where(Post.id == member.id,
+                                                           Post.telegram_date == member.telegram_date)
+                                        .values(is_primary_duplicate=False))
+                    _record(session, member.id, member.feed_id)
+        for post in ordered:
+            post.duplicate_group_id = group_id
+            post.is_primary_duplicate = post is ordered[0] and not stored_is_primary
+
+    for post, old_group, was_primary in previous:
+        if old_group and old_group != post.duplicate_group_id:
+            _leave_group(session, post, old_group, was_primary)
+
+
+def refresh(session, post):
+    """Re-extract contacts and vacancy fields of a post with changed content (no flush)."""
+    started = perf_counter()
+    content = post.content or ''
+    post.set_contacts(extract_contacts_from_text(content))
+    post.set_vacancy(extract_vacancy(content), EXTRACTOR_VERSION)
+    post.content_changed = False
+    PIPELINE_SECONDS.observe(perf_counter() - started)
+
+
+def _before_flush(session, flush_context, instances):
+    changed = [obj for obj in list(session.new) + list(session.dirty)
+               if isinstance(obj, Post) and getattr(obj, 'content_changed', False)]
+    if not changed:
+        return
+    by_hash = {}
+    with session.no_autoflush:
+        for post in changed:
+            refresh(session, post)
+            # Posts without a hash are never duplicates, each is its own group
+            by_hash.setdefault(post.content_hash or id(post), []).append(post)
+        # Same-hash posts of one flush (e.g. a history import batch) are grouped together
+        for posts in by_hash.values():
+            regroup(session, posts)
+
+
+def init_app(app):
+    """Install the flush hook (once per process)."""
+    global _installed
+    if not _installed:
+        event.listen(RoutingSession, 'before_flush', _before_flush)
+        _installed = True
@@ -0,0 +1,177 @@
+"""
+Lean, column-projected serialization of posts for the JSON API.
+
+Unlike ``Post.to_dict`` this never hydrates ORM objects: only the columns
+needed for the requested ``fields`` are selected with SQLAlchemy Core, rows
+are turned into plain dicts and encoded with orjson when it is installed.
+"""
+import json
+
+from flask import Response
+from sqlalchemy import func, select
+
+from core.extensions import db
+from models.feed import Feed
+from models.post import Post
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the stdlib encoder
+    orjson = None
+
+
+posts_table = Post.__table__
+feeds_table = Feed.__table__
+
+# Response keys that map 1:1 onto a column of the posts table
+COLUMN_FIELDS = {
+    'id': posts_table.c.id,
+    'telegram_message_id': posts_table.c.telegram_message_id,
+    'content': posts_table.c.content,
+    'media_url': posts_table.c.media_url,
+    'media_type': posts_table.c.media_type,
+    'feed_id': posts_table.c.feed_id,
+    'telegram_date': posts_table.c.telegram_date,
+    'is_edited': posts_table.c.is_edited,
+    'views': posts_table.c.views,
+    'content_hash': posts_table.c.content_hash,
+    'duplicate_group_id': posts_table.c.duplicate_group_id,
+    'is_primary_duplicate': posts_table.c.is_primary_duplicate,
+    'created_at': posts_table.c.created_at,
+    'updated_at': posts_table.c.updated_at,
+    'city': posts_table.c.city,
+    'salary_min': posts_table.c.salary_min,
+    'salary_max': posts_table.c.salary_max,
+    'salary_currency': posts_table.c.salary_currency,
+    'company_name': posts_table.c.company_name,
+}
+
+CONTACT_KEYS = ('phone_numbers', 'emails', 'telegram_users', 'urls')
+
+# Response keys computed from one or more columns
+DERIVED_FIELDS = {
+    'feed_name': (feeds_table.c.name.label('feed_name'),),
+    'contacts': tuple(posts_table.c[key] for key in CONTACT_KEYS),
+    'has_contacts': tuple(posts_table.c[key] for key in CONTACT_KEYS),
+}
+
+# Same keys, in the same order, as Post.to_dict()
+DEFAULT_FIELDS = (
+    'id', 'telegram_message_id', 'content', 'media_url', 'media_type',
+    'feed_id', 'feed_name', 'telegram_date', 'is_edited', 'content_hash',
+    'duplicate_group_id', 'is_primary_duplicate', 'contacts', 'has_contacts',
+    'created_at',
+)
+
+AVAILABLE_FIELDS = frozenset(COLUMN_FIELDS) | frozenset(DERIVED_FIELDS)
+
+
+def parse_fields(raw):
+    """
+    Parse a comma separated ``fields=`` parameter.
+
+    Args:
+        raw (str): Raw query string value, may be empty
+
+    Returns:
+        tuple: Requested field names in request order
+
+    Raises:
+        ValueError: If an unknown field is requested
+    """
+    if not raw:
+        return DEFAULT_FIELDS
+
+    fields = []
+    for name in raw.split(','):
+        name = name.strip()
+        if not name or name in fields:
+            continue
+        if name not in AVAILABLE_FIELDS:
+            raise ValueError(f"Unknown field '{name}'")
+        fields.append(name)
+
+    return tuple(fields) or DEFAULT_FIELDS
+
+
+def _columns_for(fields):
+    """Collect the distinct columns needed to build the requested fields."""
+    columns = {}
+    for name in fields:
+        if name in COLUMN_FIELDS:
+            column = COLUMN_FIELDS[name]
+            columns[column.key] = column
+        else:
+            for column in DERIVED_FIELDS[name]:
+                columns[column.key] = column
+    return list(columns.values())
+
+
+def _contacts(row):
+    return {key: row[key] or [] for key in CONTACT_KEYS}
+
+
+def _build_row(row, fields):
+    item = {}
+    for name in fields:
+        if name == 'contacts':
+            item[name] = _contacts(row)
+        elif name == 'has_contacts':
+            item[name] = any(row[key] for key in CONTACT_KEYS)
+        else:
+            item[name] = row[name]
+    return item
+
+
+def select_posts(fields, criteria=(), order_by=None, offset=0, limit=None):
+    """
+    Select posts as plain dicts without going through the ORM identity map.
+
+    Args:
+        fields (tuple): Field names, as returned by ``parse_fields``
+        criteria (iterable): SQL expressions combined with AND
+        order_by: Optional ORDER BY expression
+        offset (int): Rows to skip
+        limit (int): Maximum number of rows
+
+    Returns:
+        list: One dict per post with exactly the requested keys
+    """
+    source = posts_table
+    if 'feed_name' in fields:
+        source = posts_table.outerjoin(feeds_table, feeds_table.c.id == posts_table.c.feed_id)
+
+    stmt = select(*_columns_for(fields)).select_from(source).where(*criteria)
+    if order_by is not None:
+        stmt = stmt.order_by(order_by)
+    if offset:
+        stmt = stmt.offset(offset)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+
+    rows = db.session.execute(stmt).mappings()
+    return [_build_row(row, fields) for row in rows]
+
+
+def count_posts(criteria=()):
+    """Count posts matching the criteria with a single Core statement."""
+    stmt = select(func.count()).select_from(posts_table).where(*criteria)
+    return db.session.execute(stmt).scalar_one()
+
+
+def _default(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(payload):
+    """Encode payload to UTF-8 JSON bytes using the fastest available backend."""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default)
+    return json.dumps(payload, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(payload, status=200):
+    """Build a JSON response without going through ``jsonify``."""
+    return Response(dumps(payload), status=status, mimetype='application/json')
@@ -0,0 +1,376 @@
+"""
+Periodic jobs run by exactly one process.
+
+Services register their jobs at import time::
+
+    scheduler.register('timeline-trim', trim_timelines, hours=6,
+                       description='Cap database timelines')
+
+A job is a function taking the app. Creating the app only registers jobs:
+the Gunicorn workers (``post_worker_init`` in gunicorn.conf.py) and the bot
+(``start_realtime_monitoring``) call ``start_if_enabled``, so importing the
+app from a benchmark, a test or ``python -c`` never starts threads. Every
+process so started whose PROCESS_ROLE is in SCHEDULER_PROCESS_ROLES runs an
+APScheduler BackgroundScheduler, but only the leader executes jobs; the
+others skip them. Leadership is re-checked
+every SCHEDULER_LEADER_CHECK_SECONDS:
+
+* on Postgres with a session-level advisory lock held on a dedicated
+  connection (SCHEDULER_LOCK_DATABASE_URL must point past PgBouncer when
+  DB_PGBOUNCER is on, transaction pooling does not keep session locks);
+* elsewhere with an exclusive ``flock`` on SCHEDULER_LOCK_FILE, which only
+  elects a leader among processes of one host.
+
+The lock dies with its process, so another one takes over within a check
+interval. A process that becomes leader first runs the jobs that are
+overdue according to ``job_runs``, so restarts and Gunicorn worker recycling
+never starve jobs with long intervals. ``flask jobs list`` and
+``flask jobs run <id>`` inspect and trigger jobs from the command line.
+"""
+import atexit
+import importlib
+import logging
+import os
+import socket
+import zlib
+from collections import namedtuple
+from datetime import datetime, timezone
+from time import perf_counter
+
+try:
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.triggers.cron import CronTrigger
+    from apscheduler.triggers.interval import IntervalTrigger
+except ImportError:  # apscheduler is optional, jobs can still be run by the CLI
+    BackgroundScheduler = None
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from core import metrics
+from core.extensions import db
+from models.job_run import JobRun
+
+LEADER_CHECK_JOB = '_leader-check'
+# Services registering jobs at import time
+JOB_MODULES = (
+    'services.partitioning',
+    'services.timeline',
+    'services.feed_deletion',
+    'services.delta_sync',
+)
+# Advisory lock key shared by all processes of the deployment
+LOCK_KEY = zlib.crc32(b'telegram_feed_website:scheduler')
+
+Job = namedtuple('Job', 'id func schedule description')
+
+JOB_SECONDS = metrics.histogram(
+    'scheduler_job_duration_seconds', 'Duration of scheduled job runs', ['job'],
+    buckets=(0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600)
+)
+JOB_RUNS = metrics.counter(
+    'scheduler_job_runs_total', 'Scheduled job runs by outcome', ['job', 'status']
+)
+IS_LEADER = metrics.gauge(
+    'scheduler_is_leader', 'Whether this process runs the scheduled jobs', multiprocess_mode='livemax'
+)
+
+
+class PostgresLeaderLock:
+    """Session advisory lock on a connection of its own"""
+
+    def __init__(self, url, key=LOCK_KEY, keepalive_seconds=None):
+        self.key = key
+        self.keepalive_seconds = keepalive_seconds
+        connect_args = {}
+        if keepalive_seconds:
+            # A dead server breaks the lock connection instead of hanging on it
+            connect_args = {'keepalives': 1, 'keepalives_idle': keepalive_seconds,
+                            'keepalives_interval': max(1, keepalive_seconds // 3), 'keepalives_count': 3}
+        self.engine = create_engine(url, poolclass=NullPool, isolation_level='AUTOCOMMIT',
+                                    connect_args=connect_args)
+        self.connection = None
+        self.held = False
+
+    def _connect(self):
+        connection = self.engine.connect()
+        if self.keepalive_seconds:
+            # Server side too: the session of a dead holder ends, and its lock with it, within seconds
+            interval = max(1, self.keepalive_seconds // 3)
+            connection.execute(text(f'SET tcp_keepalives_idle = {int(self.keepalive_seconds)}'))
+            connection.execute(text(f'SET tcp_keepalives_interval = {int(interval)}'))
+            connection.execute(text('SET tcp_keepalives_count = 3'))
+        return connection
+
+    def acquire(self):
+        """Take or keep the lock, returns True while this process holds it."""
+        try:
+            if self.connection is None:
+                self.connection = self._connect()
+            if self.held:
+                # The lock lives as long as the session, make sure it is still alive
+                self.connection.execute(text('SELECT 1'))
+            else:
+                self.held = bool(self.connection.execute(
+                    text('SELECT pg_try_advisory_lock(:key)'), {'key': self.key}
+                ).scalar())
+        except Exception:
+            self._close()
+            raise
+        return self.held
+
+    def _close(self):
+        self.held = False
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+    def release(self):
+        if self.held:
+            try:
+                self.connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': self.key})
+            except Exception:
+                pass
+        self._close()
+
+
+class FileLeaderLock:
+    """Exclusive flock on a file, for SQLite and single-host setups"""
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    @property
+    def held(self):
+        return self.fd is not None
+
+    def acquire(self):
+        """Take or keep the lock, returns True while this process holds it."""
+        if self.fd is not None:
+            return True
+        import fcntl
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f'{socket.gethostname()}:{os.getpid()}\n'.encode())
+        self.fd = fd
+        return True
+
+    def release(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def describe_schedule(schedule):
+    """Human readable form of a job schedule"""
+    if 'cron' in schedule:
+        return f"cron '{schedule['cron']}'"
+    seconds = schedule['seconds']
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds >= size and seconds % size == 0:
+            return f'every {seconds // size}{unit}'
+    return f'every {seconds}s'
+
+
+class JobScheduler:
+    """Registry of periodic jobs and the leader-elected scheduler running them"""
+
+    def __init__(self, app=None):
+        self.app = app
+        self.jobs = {}
+        self.enabled = True
+        self.roles = ['web', 'bot']
+        self.leader_check_seconds = 15
+        self.is_leader = False
+        self.identity = f'{socket.gethostname()}:{os.getpid()}'
+        self.logger = logging.getLogger(__name__)
+        self._scheduler = None
+        self._lock = None
+
+        if app:
+            self.init_app(app)
+
+    def register(self, job_id, func, description='', seconds=0, minutes=0, hours=0, cron=None, jitter=None):
+        """
+        Register a job run every ``seconds``/``minutes``/``hours`` or on a crontab.
+
+        Args:
+            job_id: Unique job name, used by metrics and ``flask jobs run``
+            func: Callable taking the Flask app
+            cron: Crontab expression (UTC), instead of an interval
+            jitter: Random delay of each run, in seconds
+        """
+        if job_id in self.jobs:
+            raise ValueError(f"Job {job_id!r} is already registered")
+        if cron:
+            schedule = {'cron': cron}
+        else:
+            schedule = {'seconds': seconds + minutes * 60 + hours * 3600}
+            if schedule['seconds'] <= 0:
+                raise ValueError(f"Job {job_id!r} needs an interval or a crontab")
+        if jitter:
+            schedule['jitter'] = jitter
+        self.jobs[job_id] = Job(job_id, func, schedule, description)
+        return func
+
+    def init_app(self, app):
+        self.app = app
+        for module in JOB_MODULES:
+            importlib.import_module(module)
+        self.enabled = app.config.get('SCHEDULER_ENABLED', True)
+        self.leader_check_seconds = app.config.get('SCHEDULER_LEADER_CHECK_SECONDS', 15)
+        self.roles = [role.strip() for role in app.config.get('SCHEDULER_PROCESS_ROLES', 'web,bot').split(',')]
+
+    def start_if_enabled(self):
+        """
+        Start the scheduler if this process's role runs jobs; called by the Gunicorn and bot entry points.
+
+        Returns:
+            bool: Whether the scheduler runs in this process
+        """
+        if self.app is None or not self.enabled or self.app.config.get('PROCESS_ROLE') not in self.roles:
+            return False
+        if BackgroundScheduler is None:
+            self.logger.warning("apscheduler is not installed, scheduled jobs will not run")
+            return False
+        self.start()
+        return self._scheduler is not None
+
+    def _make_lock(self):
+        config = self.app.config
+        url = config.get('SCHEDULER_LOCK_DATABASE_URL') or config.get('SQLALCHEMY_DATABASE_URI') or ''
+        if url.startswith('postgres'):
+            if config.get('DB_PGBOUNCER') and not config.get('SCHEDULER_LOCK_DATABASE_URL'):
+                self.logger.error("DB_PGBOUNCER is on: set SCHEDULER_LOCK_DATABASE_URL to a direct "
+                                  "Postgres URL, advisory locks do not survive transaction pooling")
+                return None
+            return PostgresLeaderLock(url)
+        return FileLeaderLock(config.get('SCHEDULER_LOCK_FILE', '/tmp/telegram_feed_scheduler.lock'))
+
+    def _trigger(self, schedule):
+        if 'cron' in schedule:
+            return CronTrigger.from_crontab(schedule['cron'], timezone=timezone.utc)
+        return IntervalTrigger(seconds=schedule['seconds'], jitter=schedule.get('jitter'), timezone=timezone.utc)
+
+    def start(self):
+        """Start the background scheduler of this process."""
+        if self._scheduler is not None:
+            return
+        self._lock = self._make_lock()
+        if self._lock is None:
+            return
+        self._scheduler = BackgroundScheduler(
+            timezone=timezone.utc,
+            job_defaults={'coalesce': True, 'max_instances': 1, 'misfire_grace_time': None}
+        )
+        for job in self.jobs.values():
+            self._scheduler.add_job(self._run_scheduled, self._trigger(job.schedule), args=[job.id],
+                                    id=job.id, name=job.description or job.id)
+        self._scheduler.add_job(self.check_leadership, 'interval', seconds=self.leader_check_seconds,
+                                id=LEADER_CHECK_JOB, next_run_time=datetime.now(timezone.utc))
+        self._scheduler.start()
+        atexit.register(self.shutdown)
+        self.logger.info(f"⏰ Scheduler started with {len(self.jobs)} job(s), leader lock: {type(self._lock).__name__}")
+
+    def shutdown(self):
+        if self._scheduler is not None:
+            self._scheduler.shutdown(wait=False)
+            self._scheduler = None
+        if self._lock is not None:
+            self._lock.release()
+        self._set_leader(False)
+
+    def _set_leader(self, leader):
+        if leader != self.is_leader:
+            self.logger.info(f"⏰ {self.identity} {'is now' if leader else 'is no longer'} the scheduler leader")
+        self.is_leader = leader
+        IS_LEADER.set(1 if leader else 0)
+
+    def check_leadership(self):
+        """Take or keep leadership; a new leader catches up on overdue jobs."""
+        was_leader = self.is_leader
+        try:
+            leader = self._lock.acquire()
+        except Exception as e:
+            self.logger.error(f"Scheduler leader lock failed: {e}")
+            leader = False
+        self._set_leader(leader)
+        if leader and not was_leader:
+            self._run_overdue()
+
+    def _run_overdue(self):
+        """Bring jobs whose next run, counted from their last run anywhere, has passed forward to now."""
+        try:
+            with self.app.app_context():
+                last_started = {job_id: run.last_started_at for job_id, run in JobRun.get_all().items()}
+                db.session.rollback()
+        except Exception as e:
+            self.logger.error(f"Loading job runs failed: {e}")
+            return
+        now = datetime.now(timezone.utc)
+        for job in self.jobs.values():
+            last = last_started.get(job.id)
+            last = last.replace(tzinfo=timezone.utc) if last else None
+            next_run = self._trigger(job.schedule).get_next_fire_time(last, now) if last else now
+            if next_run is not None and next_run <= now:
+                self._scheduler.modify_job(job.id, next_run_time=now)
+
+    def _run_scheduled(self, job_id):
+        if self.is_leader:
+            self.run(job_id)
+
+    def _record(self, job_id, **values):
+        try:
+            run = JobRun.get_or_create(job_id)
+            for name, value in values.items():
+                setattr(run, name, value)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self.logger.warning(f"Recording run of job {job_id} failed: {e}")
+
+    def run(self, job_id):
+        """
+        Run a job in this thread now, whether or not this process is the leader.
+
+        Returns:
+            tuple: (status, error) with status 'success' or 'error'
+        """
+        job = self.jobs[job_id]
+        with self.app.app_context():
+            self._record(job_id, last_status='running', last_started_at=datetime.utcnow(),
+                         last_error=None, host=self.identity)
+            started = perf_counter()
+            status, error = 'success', None
+            try:
+                job.func(self.app)
+            except Exception as e:
+                db.session.rollback()
+                status, error = 'error', str(e) or type(e).__name__
+                self.logger.error(f"Job {job_id} failed: {error}")
+            duration = perf_counter() - started
+            JOB_SECONDS.labels(job=job_id).observe(duration)
+            JOB_RUNS.labels(job=job_id, status=status).inc()
+
+            self._record(job_id, last_status=status, last_error=error,
+                         last_finished_at=datetime.utcnow(), last_duration_ms=duration * 1000,
+                         run_count=JobRun.run_count + 1,
+                         error_count=JobRun.error_count + (1 if status == 'error' else 0))
+        return status, error
+
+
+# Global instance
+scheduler = JobScheduler()
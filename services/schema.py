@@ -0,0 +1,86 @@
+"""
+Bring an existing database up to the models (``flask schema upgrade``).
+
+``db.create_all()`` at startup creates missing tables but never alters
+existing ones, so columns and indexes added to a model later (the vacancy
+fields of ``posts``, ``users.telegram_chat_id``) are missing on databases
+created before them. ``pending_changes`` compares the models with the live
+schema and returns the statements that add what is missing; ``upgrade``
+runs them. Nothing is dropped or altered, so running it again is a no-op.
+
+New columns are added as nullable or with the model's scalar default as
+their DEFAULT, which both SQLite and Postgres can do without rewriting the
+table. Foreign keys of new columns are not added. Building an index locks
+the table against writes on Postgres, so run it when the bot is quiet; on
+a partitioned ``posts`` the index is created on every partition.
+"""
+import logging
+
+from sqlalchemy import inspect, literal
+from sqlalchemy.schema import CreateIndex
+
+from core.extensions import db
+
+logger = logging.getLogger(__name__)
+
+
+def _column_default(column, dialect):
+    """DEFAULT clause of a new column, '' when the model has no scalar default."""
+    if column.server_default is not None:
+        return f" DEFAULT {column.server_default.arg}"
+    if column.default is not None and column.default.is_scalar:
+        value = literal(column.default.arg, column.type).compile(
+            dialect=dialect, compile_kwargs={'literal_binds': True}
+        )
+        return f" DEFAULT {value}"
+    return ''
+
+
+def _add_column(table, column, dialect):
+    preparer = dialect.identifier_preparer
+    default = _column_default(column, dialect)
+    # Rows already in the table need a value for NOT NULL
+    not_null = ' NOT NULL' if not column.nullable and default else ''
+    return (f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} "
+            f"{column.type.compile(dialect=dialect)}{default}{not_null}")
+
+
+def pending_changes():
+    """
+    DDL adding the model columns and indexes missing from existing tables.
+
+    Returns:
+        list: SQL statements, in the order they must run
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    statements = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            # Created by db.create_all() with all its columns and indexes
+            continue
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                statements.append(_add_column(table, column, engine.dialect))
+        indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in indexes:
+                statements.append(str(CreateIndex(index).compile(dialect=engine.dialect)))
+    return statements
+
+
+def upgrade(log=logger.info):
+    """
+    Run ``pending_changes`` in one transaction.
+
+    Returns:
+        int: Number of statements run
+    """
+    statements = pending_changes()
+    with db.engine.begin() as connection:
+        for statement in statements:
+            log(statement)
+            connection.exec_driver_sql(statement)
+    return len(statements)
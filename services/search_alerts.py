@@ -0,0 +1,337 @@
+"""
+Saved-search alerts.
+
+All terms of all active saved searches are compiled into one Aho-Corasick
+automaton, so matching a post costs one pass over its text however many
+searches exist, instead of one regex per search. A search matches when
+every one of its terms occurs in the post (substring match on normalized
+text, so "водител" also finds "водителя").
+
+Changes are applied incrementally:
+
+* every search hangs off its rarest term only, and is verified against
+  the other terms found in the post when that term occurs;
+* a search whose terms are all known only updates these maps;
+* new terms go into a small delta automaton that is rebuilt on its own,
+  and merged into the main automaton once it grows past COMPACT_DELTA_RATIO;
+* removed searches leave inert terms behind until the next compaction.
+
+The bot keeps the index in sync by polling ``saved_searches.updated_at``
+every SAVED_SEARCH_REFRESH_SECONDS; matches are queued as notification
+digests for their owners.
+"""
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from time import perf_counter
+
+from core import metrics
+from models.saved_search import SavedSearch
+
+# Merge the delta automaton once it holds this share of the main one's terms
+COMPACT_DELTA_RATIO = 0.05
+COMPACT_DELTA_MIN = 256
+# Rebuild once this share of the main automaton's terms no longer belongs to a search
+COMPACT_DEAD_RATIO = 0.25
+# Re-read changes this far behind the watermark, for commits with earlier timestamps
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+MATCH_SECONDS = metrics.histogram(
+    'saved_search_match_seconds', 'Time to match one post against all saved searches',
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+)
+MATCHES = metrics.counter(
+    'saved_search_matches_total', 'Saved searches matched by incoming posts'
+)
+
+
+def normalize_text(text):
+    return ' '.join((text or '').lower().replace('ё', 'е').split())
+
+
+class Automaton:
+    """Aho-Corasick automaton over (term, term_id) pairs"""
+
+    def __init__(self, terms=()):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [()]
+        self.size = 0
+        for term, term_id in terms:
+            self._insert(term, term_id)
+        self._link()
+
+    def _insert(self, term, term_id):
+        node = 0
+        for char in term:
+            child = self.goto[node].get(char)
+            if child is None:
+                child = len(self.goto)
+                self.goto[node][char] = child
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(())
+            node = child
+        self.out[node] = self.out[node] + (term_id,)
+        self.size += 1
+
+    def _link(self):
+        """Breadth-first failure links; outputs of the failure node are inherited."""
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                target = self.goto[state].get(char, 0)
+                self.fail[child] = target if target != child else 0
+                if self.out[self.fail[child]]:
+                    self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def find(self, text):
+        """Ids of all terms occurring in ``text``."""
+        goto, fail, out = self.goto, self.fail, self.out
+        found = set()
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+
+class SearchIndex:
+    """Saved searches compiled for matching, updatable in place"""
+
+    def __init__(self):
+        self.term_ids = {}
+        self.term_counts = {}
+        self.anchored = {}
+        self.searches = {}
+        self.main = Automaton()
+        self.main_terms = 0
+        self.delta = Automaton()
+        self.delta_terms = []
+        self._delta_dirty = False
+        self._next_term_id = 0
+
+    def __len__(self):
+        return len(self.searches)
+
+    @classmethod
+    def build(cls, rows):
+        """
+        Build an index in one pass from (search_id, user_id, terms) rows.
+
+        Term frequencies are known before anchoring, so every search hangs
+        off its globally rarest term, and the automaton is built once.
+        """
+        rows = [row for row in rows if row[2]]
+        index = cls()
+        for _, _, terms in rows:
+            for term in terms:
+                term_id = index.term_ids.get(term)
+                if term_id is None:
+                    term_id = index.term_ids[term] = index._next_term_id
+                    index._next_term_id += 1
+                    index.term_counts[term_id] = 0
+                index.term_counts[term_id] += 1
+
+        for search_id, user_id, terms in rows:
+            ids = frozenset(index.term_ids[term] for term in terms)
+            anchor = min(ids, key=index.term_counts.__getitem__)
+            index.anchored.setdefault(anchor, set()).add(search_id)
+            index.searches[search_id] = (user_id, ids, anchor)
+
+        index.main = Automaton(index.term_ids.items())
+        index.main_terms = len(index.term_ids)
+        return index
+
+    def add(self, search_id, user_id, terms):
+        """Add or replace a search."""
+        self.remove(search_id)
+        if not terms:
+            return
+        ids = []
+        for term in terms:
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                term_id = self.term_ids[term] = self._next_term_id
+                self._next_term_id += 1
+                self.term_counts[term_id] = 0
+                self.delta_terms.append((term, term_id))
+                self._delta_dirty = True
+            self.term_counts[term_id] += 1
+            ids.append(term_id)
+
+        # Only the rarest term points at the search; the others are checked on a hit
+        anchor = min(ids, key=self.term_counts.__getitem__)
+        self.anchored.setdefault(anchor, set()).add(search_id)
+        self.searches[search_id] = (user_id, frozenset(ids), anchor)
+
+        if len(self.delta_terms) > max(COMPACT_DELTA_MIN, self.main_terms * COMPACT_DELTA_RATIO):
+            self.compact()
+
+    def remove(self, search_id):
+        entry = self.searches.pop(search_id, None)
+        if entry is None:
+            return
+        _, term_ids, anchor = entry
+        self.anchored[anchor].discard(search_id)
+        for term_id in term_ids:
+            self.term_counts[term_id] -= 1
+
+    def compact(self):
+        """Rebuild the main automaton from live terms and empty the delta."""
+        live = {term: term_id for term, term_id in self.term_ids.items() if self.term_counts[term_id]}
+        self.term_ids = live
+        self.term_counts = {term_id: self.term_counts[term_id] for term_id in live.values()}
+        self.anchored = {term_id: searches for term_id, searches in self.anchored.items() if searches}
+        self.main = Automaton(live.items())
+        self.main_terms = len(live)
+        self.delta = Automaton()
+        self.delta_terms = []
+        self._delta_dirty = False
+
+    def dead_ratio(self):
+        if not self.main_terms:
+            return 0.0
+        dead = sum(1 for count in self.term_counts.values() if not count)
+        return dead / self.main_terms
+
+    def match(self, text):
+        """
+        Match normalized text against every search.
+
+        Returns:
+            dict: search_id -> user_id of the searches whose terms all occur
+        """
+        if self._delta_dirty:
+            self.delta = Automaton(self.delta_terms)
+            self._delta_dirty = False
+
+        found = self.main.find(text)
+        if self.delta_terms:
+            found |= self.delta.find(text)
+
+        matched = {}
+        searches = self.searches
+        for term_id in found:
+            for search_id in self.anchored.get(term_id, ()):
+                user_id, term_ids, _ = searches[search_id]
+                if term_ids <= found:
+                    matched[search_id] = user_id
+        return matched
+
+
+class SavedSearchMatcher:
+    """Keeps a SearchIndex in sync with saved_searches and matches new posts"""
+
+    def __init__(self, app=None):
+        self.app = app
+        self.enabled = True
+        self.refresh_interval = 30
+        self.index = SearchIndex()
+        self.logger = logging.getLogger(__name__)
+        self._watermark = None
+        self._last_refresh = None
+        # The bot loop refreshes while posts are matched from its database worker threads
+        self._lock = threading.RLock()
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('SAVED_SEARCH_ALERTS_ENABLED', True)
+        self.refresh_interval = app.config.get('SAVED_SEARCH_REFRESH_SECONDS', 30)
+
+    def load(self):
+        """Rebuild the index from all active searches (requires an app context)."""
+        with self._lock:
+            self._load()
+
+    def _load(self):
+        started = perf_counter()
+        # Without any rows the next refresh starts from the moment of loading
+        watermark = datetime.utcnow()
+        rows = []
+        for search in SavedSearch.query.filter_by(is_active=True).yield_per(5000):
+            rows.append((search.id, search.user_id, search.terms))
+            watermark = max(watermark, search.updated_at or watermark)
+        index = SearchIndex.build(rows)
+        self.index = index
+        self._watermark = watermark
+        self._last_refresh = perf_counter()
+        self.logger.info(
+            f"Loaded {len(index)} saved search(es), {index.main_terms} term(s) in {perf_counter() - started:.2f}s"
+        )
+
+    def refresh(self):
+        """Apply searches changed since the last refresh (requires an app context)."""
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        if self._watermark is None:
+            self._load()
+            return
+        self._last_refresh = perf_counter()
+        for search in SavedSearch.get_changed_since(self._watermark - REFRESH_OVERLAP):
+            if search.is_active:
+                self.index.add(search.id, search.user_id, search.terms)
+            else:
+                self.index.remove(search.id)
+            self._watermark = max(self._watermark, search.updated_at)
+
+        if self.index.dead_ratio() > COMPACT_DEAD_RATIO:
+            self.index.compact()
+        if SavedSearch.count_active() != len(self.index):
+            # Rows deleted outright leave no updated_at behind
+            self._load()
+
+    def due(self):
+        return self._last_refresh is None or perf_counter() - self._last_refresh >= self.refresh_interval
+
+    def match(self, text):
+        """Saved searches matching ``text``: search_id -> user_id."""
+        started = perf_counter()
+        with self._lock:
+            matched = self.index.match(normalize_text(text))
+        MATCH_SECONDS.observe(perf_counter() - started)
+        if matched:
+            MATCHES.inc(len(matched))
+        return matched
+
+    def process_post(self, post):
+        """Match a newly committed post and queue alerts for the owners (requires an app context)."""
+        if not self.enabled:
+            return {}
+        if self.due():
+            self.refresh()
+        matched = self.match(post.content)
+        if matched:
+            from services.notifications import notification_dispatcher
+            for user_id in set(matched.values()):
+                notification_dispatcher.enqueue_for_user(user_id, post.id)
+        return matched
+
+
+def refresh_saved_searches(app):
+    """Refresh the index when its interval has passed; for the bot loop."""
+    if not saved_search_matcher.enabled or not saved_search_matcher.due():
+        return
+    with app.app_context():
+        try:
+            saved_search_matcher.refresh()
+        except Exception as e:
+            saved_search_matcher.logger.error(f"Error refreshing saved searches: {e}")
+
+
+# Global instance
+saved_search_matcher = SavedSearchMatcher()
@@ -1,15 +1,30 @@
 import asyncio
 import logging
 import re
+import signal
+from contextlib import nullcontext
 from typing import Dict, Optional
 from datetime import datetime
 from telegram import Bot, Update, ChatMember
-from telegram.ext import Application, MessageHandler, filters, ContextTypes, ChatMemberHandler
+from telegram.ext import Application, MessageHandler, CommandHandler, filters, ContextTypes, ChatMemberHandler
 from telegram.error import TelegramError, BadRequest, Forbidden
+from sqlalchemy.exc import IntegrityError
 
+from core import metrics
 from core.extensions import db
 from models.feed import Feed
 from models.post import Post
+from models.post_change import PostChange, ChangeType
+from services.live_feed import live_feed
+from services.ingest_telemetry import ingest_telemetry
+from services.notifications import notification_dispatcher, dispatch_pending
+from services.search_alerts import saved_search_matcher, refresh_saved_searches
+from services.timeline import fan_out_post
+from services.channel_health import channel_health
+from services.bot_leader import bot_leader
+from services.ingest_journal import ingest_journal
+from services.telegram_client import TelegramClient, bot_kwargs
+from services.telegram_link import link_chat, unlink_chat
 
 def extract_contacts_from_text(text):
     """Извлечение контактов из текста сообщения"""
@@ -37,6 +52,12 @@ def extract_contacts_from_text(text):
     }
 
 
+def has_meaningful_text(text):
+    """Проверка, что текст содержит не только пробелы, переводы строк и специальные символы"""
+    meaningful_content = ''.join(c for c in text if c.isalnum() or c in '.,!?;:-()[]{}@#$%^&*+=<>/\\|`~"\'').strip()
+    return bool(meaningful_content)
+
+
 class TelegramBot:
     """Единый сервис для автоматического мониторинга Telegram каналов"""
     
@@ -44,6 +65,7 @@ class TelegramBot:
         self.app = app
         self.bot_token = None
         self.bot = None
+        self.client = None
         self.application = None
         self.logger = logging.getLogger(__name__)
         
@@ -61,8 +83,9 @@ class TelegramBot:
             self.logger.warning("TELEGRAM_BOT_TOKEN not found. Bot functionality disabled.")
             return
         
-        # Инициализация бота
-        self.bot = Bot(token=self.bot_token)
+        # Инициализация бота; запросы к API идут через клиент с лимитами и повторами
+        self.bot = Bot(token=self.bot_token, **bot_kwargs(app.config))
+        self.client = TelegramClient(self.bot)
         
         self.logger.info("Telegram bot service initialized")
         
@@ -85,38 +108,23 @@ class TelegramBot:
                 pool_timeout=30.0
             )
             
-            self.application = Application.builder().token(self.bot_token).request(request).build()
-            
-            # Универсальный обработчик для всех обновлений (для отладки)
-            from telegram.ext import TypeHandler
-            debug_handler = TypeHandler(Update, self.debug_all_updates)
-            self.application.add_handler(debug_handler, group=-1)
-            
-            # Обработчик для всех сообщений в каналах
-            channel_handler = MessageHandler(
-                filters.ChatType.CHANNEL, 
-                self.handle_channel_message
-            )
-            self.application.add_handler(channel_handler)
-            
-            # Обработчик для изменений статуса участников (когда бот добавляется/удаляется)
-            member_handler = ChatMemberHandler(
-                self.handle_bot_status_change,
-                ChatMemberHandler.MY_CHAT_MEMBER
-            )
-            self.application.add_handler(member_handler)
+            builder = Application.builder().token(self.bot_token).request(request)
+            api_urls = bot_kwargs(self.app.config) if self.app else {}
+            if 'base_url' in api_urls:
+                builder = builder.base_url(api_urls['base_url'])
+            if 'base_file_url' in api_urls:
+                builder = builder.base_file_url(api_urls['base_file_url'])
+            self.application = builder.build()
+            self.add_handlers(self.application)
             
-            # Запуск бота с retry логикой
+            # Запуск бота с retry логикой; опрос обновлений запускает только лидер (start_polling)
             max_retries = 3
             for attempt in range(max_retries):
                 try:
                     await self.application.initialize()
                     await self.application.start()
                     
-                    if self.application.updater:
-                        await self.application.updater.start_polling(poll_interval=2.0, timeout=30)
-                    
-                    self.logger.info("✅ Telegram bot initialized and started polling")
+                    self.logger.info("✅ Telegram bot initialized")
                     break
                     
                 except Exception as e:
@@ -125,15 +133,70 @@ class TelegramBot:
                         raise
                     await asyncio.sleep(5)  # Ждем перед повторной попыткой
             
-            # Проверяем существующие активные каналы при запуске
-            await self.check_existing_channels()
-            
+            # Каналы проверяются периодически в фоне (channel_health), не задерживая первый опрос
             return True
             
         except Exception as e:
             self.logger.error(f"Error initializing bot: {str(e)}")
             return False
     
+    def add_handlers(self, application):
+        """Регистрация обработчиков обновлений (также используется в bench/ingest_replay.py)"""
+        # Универсальный обработчик для всех обновлений (для отладки)
+        from telegram.ext import TypeHandler
+        debug_handler = TypeHandler(Update, self.debug_all_updates)
+        application.add_handler(debug_handler, group=-1)
+        
+        # Обработчик для всех сообщений в каналах
+        channel_handler = MessageHandler(
+            filters.ChatType.CHANNEL, 
+            self.handle_channel_message
+        )
+        application.add_handler(channel_handler)
+        
+        # Обработчик для изменений статуса участников (когда бот добавляется/удаляется)
+        member_handler = ChatMemberHandler(
+            self.handle_bot_status_change,
+            ChatMemberHandler.MY_CHAT_MEMBER
+        )
+        application.add_handler(member_handler)
+        
+        # Привязка личного чата к аккаунту для уведомлений (services/telegram_link.py)
+        application.add_handler(CommandHandler('start', self.handle_start, filters=filters.ChatType.PRIVATE))
+        application.add_handler(CommandHandler('stop', self.handle_stop, filters=filters.ChatType.PRIVATE))
+    
+    async def start_polling(self):
+        """Запуск опроса getUpdates - только в процессе, держащем блокировку лидера"""
+        updater = self.application.updater
+        if not updater or updater.running:
+            return
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                # Неподтвержденные обновления не сбрасываются: новый лидер дочитывает их после предыдущего
+                await updater.start_polling(poll_interval=2.0, timeout=30, drop_pending_updates=False)
+                self.logger.info("✅ Telegram bot started polling")
+                return
+            except Exception as e:
+                self.logger.warning(f"Polling attempt {attempt + 1}/{max_retries} failed: {str(e)}")
+                if attempt == max_retries - 1:
+                    raise
+                await asyncio.sleep(5)
+    
+    async def stop_polling(self):
+        """Остановка опроса; последние полученные обновления подтверждаются, журнал закрывается"""
+        if self.application and self.application.updater and self.application.updater.running:
+            await self.application.updater.stop()
+            # Полученные обновления еще в очереди приложения: обработчик успевает дописать их в журнал
+            for _ in range(100):
+                if self.application.update_queue.empty():
+                    break
+                await asyncio.sleep(0.05)
+            self.logger.info("⏸️  Telegram bot stopped polling")
+        # Журнал применяет только активный процесс: задача применения останавливается,
+        # непримененные записи дописываются, когда процесс снова станет лидером
+        await ingest_journal.close()
+    
     async def debug_all_updates(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Отладочный обработчик для всех обновлений"""
         try:
@@ -150,15 +213,51 @@ class TelegramBot:
         
     async def stop_bot(self):
         """Остановка бота"""
+        if self.app:
+            with self.app.app_context():
+                ingest_telemetry.flush()
+            await asyncio.to_thread(dispatch_pending, self.app, True)
+        await channel_health.close()
+        from services.history_backfill import history_backfill
+        await history_backfill.close()
+        
         try:
-            if self.application and self.application.updater:
-                await self.application.updater.stop()
+            if self.application:
+                await self.stop_polling()
                 await self.application.stop()
                 await self.application.shutdown()
+            # Журнал закрыт в stop_polling; несохраненные обновления будут дописаны при следующем запуске
+            await bot_leader.release()
             self.logger.info("⏸️  Telegram bot stopped")
         except Exception as e:
             self.logger.error(f"Error stopping bot: {str(e)}")
 
+    async def handle_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/start <токен> из ссылки на странице подписок привязывает чат к аккаунту"""
+        chat_id = update.effective_chat.id
+        token = context.args[0] if context.args else None
+        try:
+            user = await asyncio.to_thread(link_chat, self.app, token, chat_id) if token else None
+        except Exception as e:
+            self.logger.error(f"Error linking chat {chat_id}: {e}")
+            user = None
+        if user is None:
+            text = "Откройте бота по ссылке со страницы подписок на сайте, чтобы получать уведомления."
+        else:
+            text = f"Готово, {user.username}! Дайджесты новых постов будут приходить в этот чат. /stop - отключить."
+        await self.client.send_message(chat_id, text)
+    
+    async def handle_stop(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/stop отвязывает чат: уведомления в Telegram прекращаются"""
+        chat_id = update.effective_chat.id
+        try:
+            unlinked = await asyncio.to_thread(unlink_chat, self.app, chat_id)
+        except Exception as e:
+            self.logger.error(f"Error unlinking chat {chat_id}: {e}")
+            unlinked = 0
+        text = "Уведомления в этот чат отключены." if unlinked else "Этот чат не привязан к аккаунту."
+        await self.client.send_message(chat_id, text)
+    
     async def handle_bot_status_change(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка изменения статуса бота в чате (добавление/удаление)"""
         try:
@@ -220,6 +319,10 @@ class TelegramBot:
                     db.session.add(feed)
                     db.session.commit()
                     self.logger.info(f"✅ Created new feed for channel: {chat.title} (ID: {feed.id})")
+                    
+                    # Новый канал не начинается с пустой ленты: история импортируется в фоне
+                    from services.history_backfill import history_backfill
+                    history_backfill.start([feed.id])
                 else:
                     # Активируем существующий фид
                     existing_feed.is_active = True
@@ -252,21 +355,52 @@ class TelegramBot:
 
     async def handle_channel_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка нового сообщения в канале"""
+        if ingest_journal.is_open:
+            # Сначала в журнал: в БД обновление сохраняет отдельная задача (apply_journaled),
+            # недоступность БД задерживает сохранение, но не теряет обновления
+            await ingest_journal.append(update.to_dict())
+            return
         try:
-            message = update.channel_post or update.edited_channel_post
-            if not message:
-                self.logger.debug("No channel message found in update")
-                return
-                
-            chat = message.chat
-            channel_id = str(chat.id)
-            self.logger.info(f"📨 Received message from channel {channel_id} ({chat.title}): {message.text or 'media message'}")
+            await self.save_channel_message(update)
+        except Exception as e:
+            self.logger.error(f"Error handling channel message: {str(e)}")
+    
+    async def apply_journaled(self, data: Dict):
+        """Сохранение обновления из журнала (services/ingest_journal.py), ошибки БД пробрасываются"""
+        await self.save_channel_message(Update.de_json(data, self.bot))
+    
+    async def save_channel_message(self, update: Update):
+        """Сохранение сообщения канала в БД; при ошибке транзакция откатывается и ошибка пробрасывается"""
+        message = update.channel_post or update.edited_channel_post
+        if not message:
+            self.logger.debug("No channel message found in update")
+            return
             
-            # Проверяем, есть ли этот канал в нашей БД
-            if not self.app:
-                return
-                
-            with self.app.app_context():
+        # Замер задержки: от даты сообщения в Telegram до коммита в БД
+        timer = ingest_telemetry.start(message.edit_date or message.date)
+        
+        chat = message.chat
+        self.logger.info(f"📨 Received message from channel {chat.id} ({chat.title}): {message.text or 'media message'}")
+        
+        # Проверяем, есть ли этот канал в нашей БД
+        if not self.app:
+            return
+        
+        # Запросы к БД синхронные и идут в отдельном потоке: медленная БД не останавливает
+        # опрос getUpdates, запись журнала и его fsync в цикле событий
+        feed_id = await asyncio.to_thread(self._get_or_create_feed, chat)
+        
+        # Создаем пост из сообщения
+        with timer.stage('parse'):
+            post_data = await self.parse_telegram_message(message, feed_id, timer)
+        if post_data:
+            await asyncio.to_thread(self._store_post, post_data, bool(update.edited_channel_post), timer)
+    
+    def _get_or_create_feed(self, chat) -> int:
+        """Id активного фида канала; фид создается для нового канала (в рабочем потоке)"""
+        channel_id = str(chat.id)
+        with self.app.app_context():
+            try:
                 feed = Feed.query.filter_by(telegram_channel_id=channel_id, is_active=True).first()
                 if not feed:
                     # Автоматически создаем фид для нового канала
@@ -280,58 +414,100 @@ class TelegramBot:
                     db.session.add(feed)
                     db.session.commit()
                     self.logger.info(f"📁 Auto-created feed for new channel: {chat.title} (ID: {feed.id})")
-                
-                # Создаем пост из сообщения
-                post_data = await self.parse_telegram_message(message, feed.id)
-                if post_data:
-                    # Проверяем, не существует ли уже такое сообщение
+                return feed.id
+            except Exception:
+                db.session.rollback()
+                raise
+    
+    def _store_post(self, post_data: Dict, edited: bool, timer):
+        """Вставка нового или обновление отредактированного поста (в рабочем потоке)"""
+        feed_id = post_data["feed_id"]
+        with self.app.app_context():
+            try:
+                feed = db.session.get(Feed, feed_id)
+                # Проверяем, не существует ли уже такое сообщение
+                # Дата сообщения не меняется при редактировании и сужает поиск до одной партиции
+                existing_post = Post.get_by_telegram_message_id(
+                    post_data["telegram_message_id"], 
+                    feed_id,
+                    post_data["telegram_date"]
+                )
+                if existing_post is None and edited:
                     existing_post = Post.get_by_telegram_message_id(
                         post_data["telegram_message_id"], 
-                        feed.id
+                        feed_id
                     )
-                    
-                    if existing_post:
-                        if update.edited_channel_post:
-                            # Обновляем существующее сообщение
-                            existing_post.content = post_data["content"]
-                            existing_post.is_edited = True
-                            existing_post.updated_at = datetime.utcnow()
-                            if post_data["contacts"]:
-                                existing_post.set_contacts(post_data["contacts"])
+                
+                if existing_post:
+                    if edited:
+                        # Обновляем существующее сообщение; хеш, контакты, вакансия и группа дублей
+                        # пересчитываются при flush, только если текст изменился (services/post_pipeline.py)
+                        existing_post.content = post_data["content"]
+                        existing_post.is_edited = True
+                        existing_post.updated_at = datetime.utcnow()
+                        PostChange.record(existing_post, ChangeType.UPDATE)
+                        with timer.stage('commit'):
                             db.session.commit()
-                            self.logger.info(f"✏️  Updated post {existing_post.id} in feed {feed.name}")
-                    else:
-                        # Создаем новое сообщение
-                        new_post = Post(
-                            telegram_message_id=post_data["telegram_message_id"],
-                            content=post_data["content"],
-                            feed_id=feed.id,
-                            telegram_date=post_data["telegram_date"],
-                            media_url=post_data["media_url"],
-                            media_type=post_data["media_type"],
-                            is_edited=post_data["is_edited"],
-                            views=post_data.get("views", 0)
-                        )
-                        
-                        # Установка контактов
-                        if post_data["contacts"]:
-                            new_post.set_contacts(post_data["contacts"])
-                        
-                        db.session.add(new_post)
-                        db.session.commit()
-                        
-                        # Обновляем время последней синхронизации фида
-                        feed.update_last_sync()
-                        
-                        self.logger.info(f"💾 Saved new post {new_post.id} from {feed.name}: {post_data['content'][:50]}...")
-                        
-        except Exception as e:
-            if self.app:
-                with self.app.app_context():
+                        ingest_telemetry.record(feed_id, timer)
+                        self.logger.info(f"✏️  Updated post {existing_post.id} in feed {feed.name}")
+                    return
+                
+                # Создаем новое сообщение
+                new_post = Post(
+                    telegram_message_id=post_data["telegram_message_id"],
+                    content=post_data["content"],
+                    feed_id=feed_id,
+                    telegram_date=post_data["telegram_date"],
+                    media_url=post_data["media_url"],
+                    media_type=post_data["media_type"],
+                    is_edited=post_data["is_edited"],
+                    views=post_data.get("views", 0)
+                )
+                
+                # Контакты, поля вакансии и группа дублей заполняются при flush (services/post_pipeline.py)
+                db.session.add(new_post)
+                try:
+                    db.session.flush()
+                except IntegrityError:
+                    # Сообщение уже сохранено (уникальный индекс feed_id, telegram_message_id, telegram_date)
                     db.session.rollback()
-            self.logger.error(f"Error handling channel message: {str(e)}")
+                    self.logger.info(f"⏭️  Message {post_data['telegram_message_id']} of feed {feed_id} is already stored")
+                    return
+                PostChange.record(new_post, ChangeType.INSERT)
+                with timer.stage('commit'):
+                    db.session.commit()
+                ingest_telemetry.record(feed_id, timer)
+                self.logger.info(f"💾 Saved new post {new_post.id} from {feed.name}: {post_data['content'][:50]}...")
+            except Exception:
+                db.session.rollback()
+                raise
+            
+            # Пост уже сохранен: сбой любого из действий ниже только логируется. Исключение
+            # повторило бы обработку из журнала, а повтор увидит сохраненный пост и ничего не сделает
+            self._after_insert(new_post, feed)
+    
+    def _after_insert(self, new_post, feed):
+        """Действия после коммита нового поста, каждое со своей обработкой ошибок"""
+        post_id, telegram_date = new_post.id, new_post.telegram_date
+        steps = (
+            # Время последней синхронизации фида
+            ('last sync time', feed.update_last_sync),
+            # Подписчики live-ленты
+            ('live feed', lambda: live_feed.publish_post(new_post)),
+            # Очередь дайджестов подписчиков категории
+            ('notifications', lambda: notification_dispatcher.enqueue(new_post)),
+            ('saved searches', lambda: saved_search_matcher.process_post(new_post)),
+            # Ленты подписчиков категории
+            ('timeline fan-out', lambda: fan_out_post(self.app, post_id, feed.id, telegram_date)),
+        )
+        for name, step in steps:
+            try:
+                step()
+            except Exception as e:
+                db.session.rollback()
+                self.logger.error(f"Post {post_id} is stored, but {name} failed: {e}")
     
-    async def parse_telegram_message(self, message, feed_id: int) -> Optional[Dict]:
+    async def parse_telegram_message(self, message, feed_id: int, timer=None) -> Optional[Dict]:
         """Парсит сообщение Telegram в формат для БД"""
         try:
             content = message.text or message.caption or ""
@@ -343,9 +519,7 @@ class TelegramBot:
             
             # Дополнительная проверка: если есть только текст, он должен содержать значимые символы
             if has_content and not has_media:
-                # Проверяем, что текст содержит не только пробелы, переводы строк и специальные символы
-                meaningful_content = ''.join(c for c in content if c.isalnum() or c in '.,!?;:-()[]{}@#$%^&*+=<>/\\|`~"\'').strip()
-                if not meaningful_content:
+                if not has_meaningful_text(content):
                     self.logger.info(f"Skipping message {message.message_id} with only whitespace/special chars")
                     return None
             
@@ -354,58 +528,8 @@ class TelegramBot:
                 return None
             
             # Обработка медиафайлов
-            media_url = None
-            media_type = None
-            
-            if message.photo:
-                # Берем самое большое фото
-                photo = message.photo[-1]
-                try:
-                    file = await self.bot.get_file(photo.file_id)
-                    media_url = file.file_path  # Сохраняем только file_path
-                    media_type = "photo"
-                except Exception as e:
-                    self.logger.error(f"Error getting photo file path: {e}")
-                    media_url = None
-                    media_type = None
-            elif message.video:
-                try:
-                    file = await self.bot.get_file(message.video.file_id)
-                    media_url = file.file_path  # Сохраняем только file_path
-                    media_type = "video"
-                except Exception as e:
-                    self.logger.error(f"Error getting video file path: {e}")
-            elif message.document:
-                try:
-                    file = await self.bot.get_file(message.document.file_id)
-                    media_url = file.file_path  # Сохраняем только file_path
-                    media_type = "document"
-                except Exception as e:
-                    self.logger.error(f"Error getting document file path: {e}")
-            elif message.animation:
-                try:
-                    file = await self.bot.get_file(message.animation.file_id)
-                    media_url = file.file_path  # Сохраняем только file_path
-                except Exception as e:
-                    self.logger.error(f"Error getting animation file path: {e}")
-                media_type = "animation"
-            elif message.voice:
-                try:
-                    file = await self.bot.get_file(message.voice.file_id)
-                    media_url = file.file_path  # Сохраняем только file_path
-                except Exception as e:
-                    self.logger.error(f"Error getting voice file path: {e}")
-                media_type = "voice"
-            elif message.audio:
-                try:
-                    file = await self.bot.get_file(message.audio.file_id)
-                    media_url = file.file_path  # Сохраняем только file_path
-                except Exception as e:
-                    self.logger.error(f"Error getting audio file path: {e}")
-                media_type = "audio"
-            
-            # Извлечение контактов из текста
-            contacts = extract_contacts_from_text(content) if content else None
+            with timer.stage('media') if timer else nullcontext():
+                media_url, media_type = await self.resolve_media(message)
             
             return {
                 "telegram_message_id": message.message_id,
@@ -415,58 +539,45 @@ class TelegramBot:
                 "feed_id": feed_id,
                 "telegram_date": message.date,
                 "is_edited": hasattr(message, 'edit_date') and message.edit_date is not None,
-                "views": getattr(message, 'views', 0) or 0,
-                "contacts": contacts
+                "views": getattr(message, 'views', 0) or 0
             }
             
         except Exception as e:
             self.logger.error(f"Error parsing telegram message: {str(e)}")
             return None
 
-    async def check_existing_channels(self):
-        """Проверяет существующие активные каналы при запуске бота"""
-        if not self.app:
-            return
-            
+    async def resolve_media(self, message):
+        """Получает file_path медиафайла сообщения, возвращает (media_url, media_type)"""
+        if message.photo:
+            # Берем самое большое фото
+            media, media_type = message.photo[-1], "photo"
+        elif message.video:
+            media, media_type = message.video, "video"
+        elif message.document:
+            media, media_type = message.document, "document"
+        elif message.animation:
+            media, media_type = message.animation, "animation"
+        elif message.voice:
+            media, media_type = message.voice, "voice"
+        elif message.audio:
+            media, media_type = message.audio, "audio"
+        else:
+            return None, None
+        
+        media_url = None
         try:
-            # Ждем, пока бот полностью инициализируется
-            await asyncio.sleep(2)
-            
-            with self.app.app_context():
-                # Получаем все активные фиды с telegram_channel_id
-                active_feeds = Feed.query.filter_by(is_active=True).filter(
-                    Feed.telegram_channel_id != None
-                ).all()
-                
-                self.logger.info(f"🔍 Checking {len(active_feeds)} existing channels...")
-                
-                for feed in active_feeds:
-                    try:
-                        # Проверяем, что бот все еще админ в канале
-                        if self.application and self.application.bot:
-                            chat_member = await self.application.bot.get_chat_member(
-                                feed.telegram_channel_id, 
-                                self.application.bot.id
-                            )
-                            if chat_member.status == ChatMember.ADMINISTRATOR:
-                                self.logger.info(f"✅ Monitoring channel: {feed.name} ({feed.telegram_channel_id})")
-                            else:
-                                # Деактивируем фид, если бот больше не админ
-                                feed.is_active = False
-                                feed.updated_at = datetime.utcnow()
-                                db.session.commit()
-                                self.logger.info(f"🔇 Deactivated {feed.name} - bot is no longer admin")
-                        else:
-                            self.logger.warning("Bot application not initialized, skipping channel check")
-                            
-                    except Exception as e:
-                        self.logger.warning(f"Could not check status for channel {feed.name}: {str(e)}")
-                        # Не деактивируем фид при ошибке, может быть временная проблема
-                        
-                    await asyncio.sleep(0.1)  # Пауза между проверками
-                    
+            # Клиент соблюдает RetryAfter и лимиты, одинаковые file_id запрашиваются один раз
+            file = await self.client.get_file(media.file_id)
+            media_url = file.file_path  # Сохраняем только file_path
         except Exception as e:
-            self.logger.error(f"Error during startup channel check: {str(e)}")
+            self.logger.error(f"Error getting {media_type} file path: {e}")
+        return media_url, media_type
+
+    async def check_existing_channels(self):
+        """Проверяет все активные каналы один раз (конкурентно, результаты в channel_health)"""
+        if not self.app or not self.bot_token:
+            return {}
+        return await channel_health.run(self.bot_token)
 
     async def get_channel_info(self, channel_id: str) -> Optional[Dict]:
         """Получает информацию о канале"""
@@ -475,7 +586,7 @@ class TelegramBot:
                 self.logger.error("Bot not initialized")
                 return None
                 
-            chat = await self.bot.get_chat(channel_id)
+            chat = await self.client.get_chat(channel_id)
             return {
                 "id": str(chat.id),
                 "title": chat.title,
@@ -488,9 +599,8 @@ class TelegramBot:
             return None
 
     async def sync_channel_history(self, channel_id: str, feed_id: int, limit: int = 20):
-        """Синхронизация истории сообщений канала - недоступно для bot token"""
-        self.logger.warning("History sync not available for bot tokens - only real-time monitoring")
-        return 0
+        """Импорт истории канала через MTProto (services/history_backfill.py)"""
+        return await self.sync_channel_to_database(feed_id, limit)
     
     # === СОВМЕСТИМОСТЬ С CLI ===
     
@@ -503,19 +613,38 @@ class TelegramBot:
         await self.stop_bot()
     
     async def sync_all_feeds(self, limit_per_feed: int = 50) -> Dict[int, int]:
-        """Совместимость с CLI - синхронизация недоступна для ботов"""
-        self.logger.warning("History sync not available for bot tokens - only real-time monitoring")
-        return {}
+        """Импорт истории всех активных каналов: фид -> число импортированных постов"""
+        from services.history_backfill import history_backfill
+        return await history_backfill.run(limit=limit_per_feed)
     
     async def sync_channel_to_database(self, feed_id: int, limit: int = 50) -> int:
-        """Совместимость с CLI - синхронизация недоступна для ботов"""
-        self.logger.warning("History sync not available for bot tokens - only real-time monitoring")
-        return 0
+        """Импорт истории одного фида, продолжает с сохраненной позиции (feed_backfills)"""
+        from services.history_backfill import history_backfill
+        results = await history_backfill.run([feed_id], limit=limit)
+        return results.get(feed_id, 0)
     
     async def start_monitoring(self):
-        """Запуск мониторинга в реальном времени"""
+        """Запуск мониторинга в реальном времени; SIGINT и SIGTERM останавливают бота штатно"""
         if not await self.initialize_bot():
             return False
+        
+        # У бота нет веб-сервера: метрики отдаются на отдельном порту (BOT_METRICS_PORT)
+        port = self.app.config.get('BOT_METRICS_PORT') if self.app else None
+        if port and metrics.serve(port, self.app.config.get('BOT_METRICS_ADDR', '127.0.0.1')):
+            self.logger.info(f"Metrics served on port {port}")
+        
+        # Под asyncio.run Ctrl+C приходит как отмена задачи, а не KeyboardInterrupt;
+        # SIGTERM (docker stop, systemd) отменяет ее так же, остановка выполняется в finally
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+        signals = []
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, task.cancel)
+                signals.append(sig)
+            except (NotImplementedError, RuntimeError):
+                # Windows или не главный поток
+                pass
             
         try:
             self.logger.info("🚀 Starting Telegram channel monitoring...")
@@ -523,17 +652,39 @@ class TelegramBot:
             self.logger.info("💾 New messages will be saved to database automatically")
             self.logger.info("📨 Monitoring started. Press Ctrl+C to stop.")
             
-            # Поддержание работы - простой цикл
-            try:
-                while True:
+            # Поддержание работы - простой цикл: проверка каналов, отправка дайджестов подписчикам,
+            # сохраненные поиски синхронизируются с БД. Обслуживание БД выполняет планировщик (services.scheduler)
+            while True:
+                # Горячий резерв: getUpdates опрашивает только процесс, держащий блокировку лидера
+                await bot_leader.acquire()
+                # Журнал открывается до опроса: сначала дописываются обновления, не сохраненные до перезапуска
+                if ingest_journal.open():
+                    ingest_journal.start(self.apply_journaled)
+                await self.start_polling()
+                # С журналом опрос не зависит от доступности БД блокировки (services/bot_leader.py)
+                while await bot_leader.check(through_outage=ingest_journal.is_open):
+                    if channel_health.due():
+                        # Проверка каналов идет отдельной задачей, цикл ее не ждет
+                        channel_health.start(self.bot_token)
+                    if saved_search_matcher.enabled and saved_search_matcher.due():
+                        await asyncio.to_thread(refresh_saved_searches, self.app)
+                    if notification_dispatcher.due():
+                        await asyncio.to_thread(dispatch_pending, self.app)
                     await asyncio.sleep(1)
-            except KeyboardInterrupt:
-                self.logger.info("⏸️  Monitoring stopped by user")
-                await self.stop_bot()
+                # Блокировка потеряна - прекращаем опрос, пока ее не получит другой процесс
+                await self.stop_polling()
                 
+        except asyncio.CancelledError:
+            self.logger.info("⏸️  Monitoring stopped by signal")
+            return True
         except Exception as e:
             self.logger.error(f"Error during monitoring: {str(e)}")
             return False
+        finally:
+            # Повторный сигнал во время остановки завершает процесс сразу
+            for sig in signals:
+                loop.remove_signal_handler(sig)
+            await self.stop_bot()
 
 
 # Глобальный экземпляр
@@ -548,6 +699,10 @@ async def start_realtime_monitoring():
         logging.error("Telegram bot not initialized")
         return
     
+    # Периодические задачи запускаются только в процессах бота и Gunicorn, не при импорте приложения
+    from services.scheduler import scheduler
+    scheduler.start_if_enabled()
+    
     await telegram_bot.start_monitoring()
 
 
@@ -0,0 +1,227 @@
+"""
+Rate-limit-aware layer over the PTB ``Bot`` for the API calls we make.
+
+``TelegramClient(bot).get_file(file_id)`` (and ``get_chat``,
+``get_chat_member``, ``get_me``) instead of calling the bot directly:
+
+* every method draws from its own token bucket (TELEGRAM_API_RATE_LIMITS,
+  calls per second), shared by all clients of the process since the limits
+  belong to the bot token, not to a connection;
+* ``RetryAfter`` pauses that method for the requested time plus a little
+  jitter, then retries, unless the wait exceeds TELEGRAM_API_MAX_RETRY_AFTER;
+* timeouts and network errors are retried with jittered exponential
+  backoff, up to TELEGRAM_API_MAX_RETRIES times; other API errors
+  (``BadRequest``, ``Forbidden``) are raised at once;
+* concurrent ``get_file`` calls for the same ``file_id`` (and ``get_chat``
+  for the same chat) share one request.
+
+TELEGRAM_API_BASE_URL / TELEGRAM_API_BASE_FILE_URL point the bot at
+another Bot API server, e.g. a local fake one (see bench/telegram_client.py).
+"""
+import asyncio
+import logging
+import random
+from time import monotonic, perf_counter
+
+from telegram.error import BadRequest, NetworkError, RetryAfter, TelegramError
+
+from core import metrics
+
+# Calls per second per method; others use 'default'
+METHOD_RATES = {
+    'get_file': 20,
+    'get_chat': 10,
+    'get_chat_member': 20,
+    'default': 30,
+}
+
+REQUESTS = metrics.counter(
+    'telegram_api_requests_total', 'Bot API requests by method and outcome', ['method', 'outcome']
+)
+REQUEST_SECONDS = metrics.histogram(
+    'telegram_api_request_seconds', 'Duration of one Bot API request', ['method']
+)
+THROTTLE_SECONDS = metrics.histogram(
+    'telegram_api_throttle_seconds', 'Time a call waited for its token bucket or a flood pause', ['method'],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60)
+)
+FLOOD_WAIT_SECONDS = metrics.counter(
+    'telegram_api_flood_wait_seconds_total', 'Seconds Telegram asked us to wait with RetryAfter', ['method']
+)
+COALESCED = metrics.counter(
+    'telegram_api_coalesced_total', 'Calls answered by an identical request already in flight', ['method']
+)
+
+
+def bot_kwargs(config):
+    """Keyword arguments for ``telegram.Bot`` selecting the configured Bot API server"""
+    kwargs = {}
+    if config.get('TELEGRAM_API_BASE_URL'):
+        kwargs['base_url'] = config['TELEGRAM_API_BASE_URL']
+    if config.get('TELEGRAM_API_BASE_FILE_URL'):
+        kwargs['base_file_url'] = config['TELEGRAM_API_BASE_FILE_URL']
+    return kwargs
+
+
+def parse_rates(value):
+    """Parse 'get_file=20,get_chat=10' into a dict of calls per second"""
+    rates = {}
+    for item in (value or '').split(','):
+        method, _, rate = item.partition('=')
+        if method.strip() and rate.strip():
+            rates[method.strip()] = float(rate)
+    return rates
+
+
+class TokenBucket:
+    """Asyncio token bucket; a call reserves its token first, then sleeps off any debt"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, rate)
+        self.tokens = self.burst
+        self.updated = monotonic()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return 0
+        now = monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0
+        wait = -self.tokens / self.rate
+        await asyncio.sleep(wait)
+        return wait
+
+
+class ApiLimits:
+    """Buckets, flood pauses and retry settings shared by the clients of a process"""
+
+    def __init__(self, app=None):
+        self.rates = dict(METHOD_RATES)
+        self.max_retries = 3
+        self.max_retry_after = 60
+        self.backoff_base = 0.5
+        self.backoff_max = 10
+        self._buckets = {}
+        self._paused_until = {}
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.rates = dict(METHOD_RATES, **parse_rates(app.config.get('TELEGRAM_API_RATE_LIMITS')))
+        self.max_retries = app.config.get('TELEGRAM_API_MAX_RETRIES', 3)
+        self.max_retry_after = app.config.get('TELEGRAM_API_MAX_RETRY_AFTER', 60)
+        self._buckets.clear()
+
+    def _bucket(self, method):
+        bucket = self._buckets.get(method)
+        if bucket is None:
+            bucket = self._buckets[method] = TokenBucket(self.rates.get(method, self.rates['default']))
+        return bucket
+
+    async def wait(self, method):
+        """Sleep until ``method`` may be called; returns the seconds waited."""
+        waited = 0
+        pause = self._paused_until.get(method, 0) - monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+            waited += pause
+        waited += await self._bucket(method).acquire()
+        if waited:
+            THROTTLE_SECONDS.labels(method=method).observe(waited)
+        return waited
+
+    def pause(self, method, seconds):
+        """Hold all calls of ``method`` for ``seconds`` (after a RetryAfter)."""
+        self._paused_until[method] = max(self._paused_until.get(method, 0), monotonic() + seconds)
+
+    def backoff(self, attempt):
+        """Full-jitter exponential backoff for the given retry attempt"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+
+class TelegramClient:
+    """Wraps a ``telegram.Bot`` with rate limits, retries and request coalescing"""
+
+    def __init__(self, bot, limits=None):
+        self.bot = bot
+        self.limits = limits or api_limits
+        self.logger = logging.getLogger(__name__)
+        self._inflight = {}
+
+    @property
+    def id(self):
+        return self.bot.id
+
+    async def call(self, method, *args, **kwargs):
+        """Call a Bot method under its rate limit, retrying flood waits and network errors."""
+        limits = self.limits
+        attempt = 0
+        while True:
+            await limits.wait(method)
+            backoff = 0
+            started = perf_counter()
+            try:
+                result = await getattr(self.bot, method)(*args, **kwargs)
+            except RetryAfter as e:
+                delay = getattr(e.retry_after, 'total_seconds', lambda: e.retry_after)()
+                REQUESTS.labels(method=method, outcome='retry_after').inc()
+                FLOOD_WAIT_SECONDS.labels(method=method).inc(delay)
+                if attempt >= limits.max_retries or delay > limits.max_retry_after:
+                    raise
+                self.logger.warning(f"Telegram flood control on {method}: waiting {delay}s")
+                limits.pause(method, delay + random.uniform(0, 1))
+            except BadRequest:
+                REQUESTS.labels(method=method, outcome='error').inc()
+                raise
+            except NetworkError as e:
+                REQUESTS.labels(method=method, outcome='network_error').inc()
+                if attempt >= limits.max_retries:
+                    raise
+                backoff = limits.backoff(attempt)
+                self.logger.warning(f"Telegram {method} failed ({e}), retry {attempt + 1} in {backoff:.1f}s")
+            except TelegramError:
+                REQUESTS.labels(method=method, outcome='error').inc()
+                raise
+            else:
+                REQUESTS.labels(method=method, outcome='ok').inc()
+                return result
+            finally:
+                REQUEST_SECONDS.labels(method=method).observe(perf_counter() - started)
+            if backoff:
+                await asyncio.sleep(backoff)
+            attempt += 1
+
+    async def _coalesced(self, method, key, *args):
+        inflight = self._inflight.get((method, key))
+        if inflight is None:
+            inflight = asyncio.ensure_future(self.call(method, *args))
+            self._inflight[(method, key)] = inflight
+            inflight.add_done_callback(lambda _: self._inflight.pop((method, key), None))
+        else:
+            COALESCED.labels(method=method).inc()
+        # One caller giving up must not cancel the request for the others
+        return await asyncio.shield(inflight)
+
+    async def get_file(self, file_id):
+        return await self._coalesced('get_file', file_id, file_id)
+
+    async def get_chat(self, chat_id):
+        return await self._coalesced('get_chat', str(chat_id), chat_id)
+
+    async def get_chat_member(self, chat_id, user_id):
+        return await self.call('get_chat_member', chat_id, user_id)
+
+    async def get_me(self):
+        return await self.call('get_me')
+
+    async def send_message(self, chat_id, text):
+        return await self.call('send_message', chat_id, text)
+
+
+# Global instance
+api_limits = ApiLimits()
@@ -0,0 +1,118 @@
+"""
+Linking user accounts to their private chat with the bot.
+
+Notification digests go to ``User.telegram_chat_id`` (TelegramTransport in
+services/notifications.py). The account page links to
+``https://t.me/<TELEGRAM_BOT_USERNAME>?start=<token>``; Telegram opens the
+chat and sends ``/start <token>``, and the bot stores the chat id of the
+sender for the user the token was issued to. ``/stop`` unlinks the chat.
+
+The token is ``<user id>_<issued at, base 36>_<HMAC>`` signed with
+SECRET_KEY, since a start parameter allows only ``A-Z a-z 0-9 _ -`` and
+64 characters. It expires after TELEGRAM_LINK_MAX_AGE_SECONDS.
+"""
+import base64
+import hashlib
+import hmac
+import logging
+import time
+
+from flask import current_app
+
+from core.extensions import db
+from models.user import User
+
+logger = logging.getLogger(__name__)
+
+
+def _signature(secret, payload):
+    digest = hmac.new(secret.encode(), f'telegram-link:{payload}'.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip('=')[:22]
+
+
+def _base36(number):
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    text = ''
+    while True:
+        number, remainder = divmod(number, 36)
+        text = digits[remainder] + text
+        if not number:
+            return text
+
+
+def make_token(user_id, secret, now=None):
+    """Start parameter linking the chat that sends it to ``user_id``."""
+    payload = f'{user_id}_{_base36(int(now if now is not None else time.time()))}'
+    return f'{payload}_{_signature(secret, payload)}'
+
+
+def verify_token(token, secret, max_age, now=None):
+    """
+    Check a start parameter.
+
+    Returns:
+        int: User id the token was issued to, None if it is forged, malformed or expired
+    """
+    parts = (token or '').split('_', 2)
+    if len(parts) != 3 or not parts[0].isdigit():
+        return None
+    payload = f'{parts[0]}_{parts[1]}'
+    if not hmac.compare_digest(parts[2].encode(), _signature(secret, payload).encode()):
+        return None
+    try:
+        issued = int(parts[1], 36)
+    except ValueError:
+        return None
+    if (now if now is not None else time.time()) - issued > max_age:
+        return None
+    return int(parts[0])
+
+
+def link_url():
+    """t.me link opening the bot with a fresh token for the logged in user, None without a bot username."""
+    from flask_login import current_user
+    username = current_app.config.get('TELEGRAM_BOT_USERNAME')
+    if not username:
+        return None
+    return f'https://t.me/{username.lstrip("@")}?start={make_token(current_user.id, current_app.config["SECRET_KEY"])}'
+
+
+def link_chat(app, token, chat_id):
+    """
+    Store ``chat_id`` for the user of ``token``; from a worker thread of the bot.
+
+    A chat is linked to one user at a time: linking it again moves it.
+
+    Returns:
+        User: The linked user, None if the token is invalid
+    """
+    with app.app_context():
+        user_id = verify_token(token, app.config['SECRET_KEY'], app.config.get('TELEGRAM_LINK_MAX_AGE_SECONDS', 86400))
+        user = db.session.get(User, user_id) if user_id else None
+        if user is None:
+            return None
+        try:
+            User.query.filter(User.telegram_chat_id == chat_id, User.id != user.id).update(
+                {User.telegram_chat_id: None}, synchronize_session=False
+            )
+            user.telegram_chat_id = chat_id
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        logger.info(f"Linked Telegram chat {chat_id} to user {user.id}")
+        return user
+
+
+def unlink_chat(app, chat_id):
+    """Stop notifications to ``chat_id``; returns the number of unlinked users."""
+    with app.app_context():
+        try:
+            count = User.query.filter_by(telegram_chat_id=chat_id).update(
+                {User.telegram_chat_id: None}, synchronize_session=False
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return count
@@ -0,0 +1,346 @@
+"""
+Personalized "my feed" timelines, built by fan-out on write.
+
+When the bot commits a new post, its id is pushed into the timeline of
+every active subscriber of the post's category: a sorted set per user in
+Redis (score = telegram_date) when REDIS_URL is configured, rows of
+``timeline_entries`` otherwise. Timelines are capped at TIMELINE_MAX_ENTRIES,
+so reading a page of "my feed" is one range read plus one primary key
+lookup of the posts, instead of a join of subscriptions, feeds and posts.
+
+Categories with more than TIMELINE_FANOUT_LIMIT subscribers are not fanned
+out; their posts would cost one write per subscriber. Readers subscribed to
+such a category pull its latest posts at read time and merge them with
+their pushed entries (hybrid fan-out).
+
+A timeline is rebuilt from the subscriptions when the user subscribes or
+unsubscribes, and lazily when it is found empty (e.g. after Redis lost its
+data).
+
+Posts leave the database without touching timelines: archived, dropped by
+retention or deleted with their feed. Readers drop entries whose post is
+gone and read the page again, and the trim job deletes such entries from
+the database store.
+"""
+import logging
+from datetime import datetime
+from time import monotonic, perf_counter
+
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy import delete, exists, func, select, tuple_
+
+from core import metrics
+from core.extensions import db
+from models.feed import Feed
+from models.post import Post
+from models.timeline_entry import TimelineEntry
+from models.user_subscription import UserSubscription
+from services.scheduler import scheduler
+
+EPOCH = datetime(1970, 1, 1)
+KEY_PREFIX = 'timeline:'
+# Subscribers written per Redis pipeline or INSERT batch
+PUSH_BATCH = 1000
+# How long readers trust the list of pull-only categories
+LARGE_CATEGORIES_TTL = 60
+# Reads of a page that may drop entries of removed posts before giving up on filling it
+READ_ATTEMPTS = 3
+
+FANOUT_SECONDS = metrics.histogram(
+    'timeline_fanout_seconds', 'Time to push one post into its subscribers\' timelines',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+FANOUT_ENTRIES = metrics.counter(
+    'timeline_fanout_entries_total', 'Timeline entries written by fan-out'
+)
+FANOUT_SKIPPED = metrics.counter(
+    'timeline_fanout_skipped_total', 'Posts of pull-only categories not fanned out'
+)
+STALE_ENTRIES = metrics.counter(
+    'timeline_stale_entries_total', 'Timeline entries dropped at read time because their post was removed'
+)
+
+
+def to_score(moment):
+    return (moment - EPOCH).total_seconds()
+
+
+def from_score(score):
+    return datetime.utcfromtimestamp(score)
+
+
+class RedisTimelineStore:
+    """Timelines as capped sorted sets, one key per user."""
+
+    def __init__(self, url, max_entries):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.max_entries = max_entries
+
+    def push(self, user_ids, post_id, telegram_date):
+        score = to_score(telegram_date)
+        for start in range(0, len(user_ids), PUSH_BATCH):
+            pipe = self.client.pipeline(transaction=False)
+            for user_id in user_ids[start:start + PUSH_BATCH]:
+                key = f'{KEY_PREFIX}{user_id}'
+                pipe.zadd(key, {post_id: score})
+                pipe.zremrangebyrank(key, 0, -self.max_entries - 1)
+            pipe.execute()
+
+    def replace(self, user_id, entries):
+        key = f'{KEY_PREFIX}{user_id}'
+        pipe = self.client.pipeline()
+        pipe.delete(key)
+        if entries:
+            pipe.zadd(key, {post_id: to_score(telegram_date) for post_id, telegram_date in entries})
+        pipe.execute()
+
+    def remove(self, user_id, post_ids):
+        self.client.zrem(f'{KEY_PREFIX}{user_id}', *post_ids)
+
+    def range(self, user_id, offset, limit):
+        """(post_id, telegram_date) pairs, newest first."""
+        rows = self.client.zrevrange(f'{KEY_PREFIX}{user_id}', offset, offset + limit - 1, withscores=True)
+        return [(int(member), from_score(score)) for member, score in rows]
+
+    def count(self, user_id):
+        return self.client.zcard(f'{KEY_PREFIX}{user_id}')
+
+    def trim(self):
+        """Sorted sets are capped on every push."""
+        return 0
+
+
+class DatabaseTimelineStore:
+    """Timelines as rows of timeline_entries, trimmed periodically."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+
+    def push(self, user_ids, post_id, telegram_date):
+        for start in range(0, len(user_ids), PUSH_BATCH):
+            db.session.execute(TimelineEntry.__table__.insert(), [
+                {'user_id': user_id, 'post_id': post_id, 'telegram_date': telegram_date}
+                for user_id in user_ids[start:start + PUSH_BATCH]
+            ])
+        db.session.commit()
+
+    def replace(self, user_id, entries):
+        db.session.execute(delete(TimelineEntry).where(TimelineEntry.user_id == user_id))
+        if entries:
+            db.session.execute(TimelineEntry.__table__.insert(), [
+                {'user_id': user_id, 'post_id': post_id, 'telegram_date': telegram_date}
+                for post_id, telegram_date in entries
+            ])
+        db.session.commit()
+
+    def remove(self, user_id, post_ids):
+        db.session.execute(delete(TimelineEntry).where(
+            TimelineEntry.user_id == user_id, TimelineEntry.post_id.in_(post_ids)
+        ))
+        db.session.commit()
+
+    def range(self, user_id, offset, limit):
+        """(post_id, telegram_date) pairs, newest first."""
+        return db.session.execute(
+            select(TimelineEntry.post_id, TimelineEntry.telegram_date)
+            .where(TimelineEntry.user_id == user_id)
+            .order_by(TimelineEntry.telegram_date.desc(), TimelineEntry.post_id.desc())
+            .offset(offset).limit(limit)
+        ).all()
+
+    def count(self, user_id):
+        return db.session.execute(
+            select(func.count()).select_from(TimelineEntry).where(TimelineEntry.user_id == user_id)
+        ).scalar()
+
+    def trim(self):
+        """Delete entries of removed posts and past max_entries of every user, returns deleted row count."""
+        removed = db.session.execute(
+            delete(TimelineEntry).where(~exists().where(Post.id == TimelineEntry.post_id))
+        ).rowcount
+        ranked = select(
+            TimelineEntry.user_id, TimelineEntry.post_id,
+            func.row_number().over(
+                partition_by=TimelineEntry.user_id,
+                order_by=(TimelineEntry.telegram_date.desc(), TimelineEntry.post_id.desc())
+            ).label('position')
+        ).subquery()
+        stale = select(ranked.c.user_id, ranked.c.post_id).where(ranked.c.position > self.max_entries)
+        result = db.session.execute(
+            delete(TimelineEntry).where(tuple_(TimelineEntry.user_id, TimelineEntry.post_id).in_(stale))
+        )
+        db.session.commit()
+        return removed + result.rowcount
+
+
+class Timeline:
+    """Fan-out on write of new posts and hybrid reads of "my feed"."""
+
+    def __init__(self, app=None):
+        self.app = app
+        self.enabled = True
+        self.max_entries = 800
+        self.fanout_limit = 10000
+        self.store = None
+        self.logger = logging.getLogger(__name__)
+        self._large_categories = None
+        self._large_categories_at = 0
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('TIMELINE_ENABLED', True)
+        self.max_entries = app.config.get('TIMELINE_MAX_ENTRIES', 800)
+        self.fanout_limit = app.config.get('TIMELINE_FANOUT_LIMIT', 10000)
+
+        redis_url = app.config.get('REDIS_URL')
+        self.store = None
+        if redis_url:
+            try:
+                self.store = RedisTimelineStore(redis_url, self.max_entries)
+            except ImportError:
+                self.logger.warning("redis package missing, timelines fall back to the database")
+        if self.store is None:
+            self.store = DatabaseTimelineStore(self.max_entries)
+
+    def large_categories(self):
+        """Ids of pull-only categories, cached for LARGE_CATEGORIES_TTL seconds."""
+        if self._large_categories is None or monotonic() - self._large_categories_at >= LARGE_CATEGORIES_TTL:
+            self._large_categories = set(UserSubscription.get_categories_with_more_subscribers(self.fanout_limit))
+            self._large_categories_at = monotonic()
+        return self._large_categories
+
+    def fan_out(self, post_id, category_id, telegram_date):
+        """
+        Push a new post into its category subscribers' timelines.
+
+        Returns:
+            int: Number of timelines written, 0 for pull-only categories
+        """
+        if not self.enabled or not category_id:
+            return 0
+        started = perf_counter()
+        user_ids = UserSubscription.get_subscriber_ids(category_id)
+        if len(user_ids) > self.fanout_limit:
+            FANOUT_SKIPPED.inc()
+            return 0
+        if user_ids:
+            self.store.push(user_ids, post_id, telegram_date)
+            FANOUT_ENTRIES.inc(len(user_ids))
+        FANOUT_SECONDS.observe(perf_counter() - started)
+        return len(user_ids)
+
+    def _latest(self, category_ids, limit):
+        """(post_id, telegram_date) of the latest posts of feeds in ``category_ids``."""
+        if not category_ids:
+            return []
+        feed_ids = select(Feed.id).where(Feed.category_id.in_(category_ids))
+        return db.session.execute(
+            select(Post.id, Post.telegram_date)
+            .where(Post.feed_id.in_(feed_ids), *Post.listing_criteria())
+            .order_by(Post.telegram_date.desc(), Post.id.desc())
+            .limit(limit)
+        ).all()
+
+    def rebuild_user(self, user_id):
+        """Refill a user's timeline from the pushed categories of their subscriptions."""
+        category_ids = set(UserSubscription.get_user_category_ids(user_id)) - self.large_categories()
+        entries = self._latest(category_ids, self.max_entries)
+        self.store.replace(user_id, entries)
+        return len(entries)
+
+    def read(self, user_id, offset, limit):
+        """
+        A page of a user's timeline.
+
+        Returns:
+            tuple: (posts newest first, total entries capped at TIMELINE_MAX_ENTRIES)
+        """
+        pulled_categories = set(UserSubscription.get_user_category_ids(user_id)) & self.large_categories()
+        pushed_count = self.store.count(user_id)
+        if not pushed_count and not pulled_categories and self.rebuild_user(user_id):
+            pushed_count = self.store.count(user_id)
+
+        posts = []
+        for _ in range(READ_ATTEMPTS):
+            entries, total = self._entries(user_id, offset, limit, pulled_categories, pushed_count)
+            if not entries:
+                return [], total
+            # The date bound lets Postgres prune partitions of the posts table
+            by_id = {post.id: post for post in Post.query.filter(
+                Post.id.in_([post_id for post_id, _ in entries]),
+                Post.telegram_date >= min(telegram_date for _, telegram_date in entries)
+            )}
+            posts = [by_id[post_id] for post_id, _ in entries if post_id in by_id]
+            missing = [post_id for post_id, _ in entries if post_id not in by_id]
+            if not missing:
+                break
+            # Archived, dropped by retention or deleted with the feed: drop the entries, read the page again
+            self.store.remove(user_id, missing)
+            STALE_ENTRIES.inc(len(missing))
+            pushed_count = self.store.count(user_id)
+        return posts, total
+
+    def _entries(self, user_id, offset, limit, pulled_categories, pushed_count):
+        """A page of (post_id, telegram_date) pairs and the total."""
+        if not pulled_categories:
+            return self.store.range(user_id, offset, limit), pushed_count
+
+        # Hybrid: merge the head of the pushed timeline with posts pulled from large categories
+        pushed = self.store.range(user_id, 0, offset + limit)
+        pulled = self._latest(pulled_categories, self.max_entries)
+        merged = {post_id: telegram_date for post_id, telegram_date in pushed}
+        merged.update((post_id, telegram_date) for post_id, telegram_date in pulled)
+        entries = sorted(merged.items(), key=lambda entry: (entry[1], entry[0]), reverse=True)
+        total = min(self.max_entries, pushed_count + len(pulled))
+        return entries[offset:offset + limit], total
+
+    def trim(self):
+        return self.store.trim()
+
+
+class TimelinePagination(Pagination):
+    """Pagination over a user's timeline"""
+
+    def _query_items(self):
+        items, self._query_args['total'] = timeline.read(
+            self._query_args['user_id'], self._query_offset, self.per_page
+        )
+        return items
+
+    def _query_count(self):
+        return self._query_args['total']
+
+
+def fan_out_post(app, post_id, feed_id, telegram_date):
+    """Fan a committed post out from a worker thread of the bot."""
+    with app.app_context():
+        try:
+            feed = db.session.get(Feed, feed_id)
+            return timeline.fan_out(post_id, feed.category_id if feed else None, telegram_date)
+        except Exception as e:
+            db.session.rollback()
+            timeline.logger.error(f"Timeline fan-out of post {post_id} failed: {e}")
+            return 0
+
+
+def trim_timelines(app):
+    """Cap database timelines and drop entries of removed posts, run as a scheduled job."""
+    with app.app_context():
+        try:
+            deleted = timeline.trim()
+            if deleted:
+                timeline.logger.info(f"Trimmed {deleted} timeline entries")
+        except Exception as e:
+            db.session.rollback()
+            timeline.logger.error(f"Timeline trim failed: {e}")
+
+
+# Global instance
+timeline = Timeline()
+
+scheduler.register('timeline-trim', trim_timelines, hours=6,
+                   description='Cap database timelines at TIMELINE_MAX_ENTRIES, drop entries of removed posts')
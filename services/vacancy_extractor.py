@@ -0,0 +1,302 @@
+"""
+Structured fields of vacancy posts.
+
+``extract_vacancy`` pulls the salary range, city and employer out of a
+post's free text so they can be stored in indexed columns of ``posts`` and
+filtered with index lookups instead of scanning content:
+
+* salary: numbers next to a salary keyword or a currency ("от 50 000 до
+  80 000 руб", "120-150 тыс.", "з/п 90к", "$1500"), monthly amounts only;
+* city: the first gazetteer city, preferring one after a "Город:" label;
+  inflected forms are matched by stem ("в Москве", "Екатеринбурга");
+* employer: a legal form with its name (ООО "Вектор", ИП Смирнов А.В.) or
+  the text after "Работодатель:"/"Компания:".
+
+EXTRACTOR_VERSION is stored with every post; bump it when the rules change
+and run ``flask posts extract-vacancies`` to re-extract older posts.
+"""
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import bindparam, select
+
+from core.extensions import db
+
+EXTRACTOR_VERSION = 1
+
+# Canonical name -> regex alternatives matched at a word start
+CITY_GAZETTEER = {
+    'Москва': [r'москв\w*', r'мск'],
+    'Санкт-Петербург': [r'санкт-петербург\w*', r'петербург\w*', r'спб', r'питер\w*'],
+    'Новосибирск': [r'новосибирск\w*'],
+    'Екатеринбург': [r'екатеринбург\w*', r'екб'],
+    'Казань': [r'казан[ьиюе]\w*'],
+    'Нижний Новгород': [r'нижн\w* новгород\w*', r'н\.\s?новгород\w*'],
+    'Челябинск': [r'челябинск\w*'],
+    'Самара': [r'самар[аеуы]\b'],
+    'Омск': [r'омск\w*'],
+    'Ростов-на-Дону': [r'ростов\w*-на-дону', r'ростов[аеу]?\b'],
+    'Уфа': [r'уф[аеуы]\b'],
+    'Красноярск': [r'красноярск\w*'],
+    'Воронеж': [r'воронеж\w*'],
+    'Пермь': [r'перм[ьиюе]\b'],
+    'Волгоград': [r'волгоград\w*'],
+    'Краснодар': [r'краснодар\w*'],
+    'Саратов': [r'саратов\w*'],
+    'Тюмень': [r'тюмен[ьиюе]\b'],
+    'Тольятти': [r'тольятти'],
+    'Ижевск': [r'ижевск\w*'],
+    'Барнаул': [r'барнаул\w*'],
+    'Ульяновск': [r'ульяновск\w*'],
+    'Иркутск': [r'иркутск\w*'],
+    'Хабаровск': [r'хабаровск\w*'],
+    'Ярославль': [r'ярославл[ьеюи]\b'],
+    'Владивосток': [r'владивосток\w*'],
+    'Махачкала': [r'махачкал\w*'],
+    'Томск': [r'томск\w*'],
+    'Оренбург': [r'оренбург\w*'],
+    'Кемерово': [r'кемерово'],
+    'Новокузнецк': [r'новокузнецк\w*'],
+    'Рязань': [r'рязан[ьиюе]\b'],
+    'Астрахань': [r'астрахан[ьиюе]\b'],
+    'Набережные Челны': [r'набережн\w* челн\w*'],
+    'Пенза': [r'пенз[аеуы]\b'],
+    'Липецк': [r'липецк\w*'],
+    'Киров': [r'киров[аеу]?\b'],
+    'Чебоксары': [r'чебоксар\w*'],
+    'Тула': [r'тул[аеуы]\b'],
+    'Калининград': [r'калининград\w*'],
+    'Курск': [r'курск\w*'],
+    'Ставрополь': [r'ставропол[ьеюи]\b'],
+    'Сочи': [r'сочи'],
+    'Тверь': [r'твер[ьиюе]\b'],
+    'Белгород': [r'белгород\w*'],
+    'Сургут': [r'сургут\w*'],
+    # A common first name too, only taken with the "г." prefix
+    'Владимир': [r'г\.\s?владимир\w*'],
+    'Архангельск': [r'архангельск\w*'],
+    'Смоленск': [r'смоленск\w*'],
+    'Калуга': [r'калуг[аеиу]\b'],
+    'Мурманск': [r'мурманск\w*'],
+    'Якутск': [r'якутск\w*'],
+    'Севастополь': [r'севастопол[ьеюи]\b'],
+    'Симферополь': [r'симферопол[ьеюи]\b'],
+    'Донецк': [r'донецк\w*'],
+    'Луганск': [r'луганск\w*'],
+    'Новый Уренгой': [r'нов\w* уренго\w*'],
+    'Норильск': [r'норильск\w*'],
+}
+
+_CITY_GROUPS = {}
+
+
+def _compile_cities():
+    parts = []
+    for index, (city, patterns) in enumerate(CITY_GAZETTEER.items()):
+        group = f'c{index}'
+        _CITY_GROUPS[group] = city
+        parts.append(f'(?P<{group}>{"|".join(patterns)})')
+    return re.compile(r'(?<![\w-])(?:' + '|'.join(parts) + ')', re.IGNORECASE)
+
+
+CITY_RE = _compile_cities()
+CITY_LABEL_RE = re.compile(r'(?:город|г\.|локация|место работы|адрес)\s*:?\s*', re.IGNORECASE)
+
+# A number with optional thousand separators ("120 000", "120.000", "1,5")
+_NUMBER = r'\d{1,3}(?:[   .]\d{3})+|\d+(?:[.,]\d+)?'
+_MULTIPLIER = r'(?:\s*(?:тыс\.?|т\.\s?р\.?|тр\b|к\b|k\b))?'
+_CURRENCY = r'(?:\s*(?:руб(?:лей|\.)?|р\.|₽|rub|\$|usd|долл\w*|€|eur|евро))?'
+
+SALARY_RE = re.compile(
+    r'(?P<prefix>от\s*|до\s*|from\s*)?(?P<cur1>[$€]\s?)?(?P<a>' + _NUMBER + r')(?P<mul_a>' + _MULTIPLIER + r')'
+    r'(?:\s*(?:-|–|—|до)\s*(?P<cur2>[$€]\s?)?(?P<b>' + _NUMBER + r')(?P<mul_b>' + _MULTIPLIER + r'))?'
+    r'(?P<currency>' + _CURRENCY + r')',
+    re.IGNORECASE
+)
+SALARY_KEYWORD_RE = re.compile(
+    r'зарплат\w*|з/п|зп\b|оклад\w*|доход\w*|оплат\w*|выплат\w*|ставк\w*|💰|salary', re.IGNORECASE
+)
+# Same pattern as contact extraction; phone digits must not look like amounts
+PHONE_RE = re.compile(r'(?:\+7|8)[\s\-]?\(?[0-9]{3}\)?[\s\-]?[0-9]{3}[\s\-]?[0-9]{2}[\s\-]?[0-9]{2}')
+# Amounts that are not monthly pay
+NOT_MONTHLY_RE = re.compile(r'^\s*(?:руб\.?|₽|р\.)?\s*(?:/|в|за)\s*(?:час|смен\w*|ч\b|сутки|день)', re.IGNORECASE)
+
+COMPANY_LABEL_RE = re.compile(
+    r'(?:работодатель|компания|организация|employer)\s*:\s*(?P<name>[^\n;]{2,100})', re.IGNORECASE
+)
+COMPANY_FORM_RE = re.compile(
+    r'\b(?P<name>(?:ООО|ОАО|ЗАО|ПАО|АО|ГК|ИП|НКО|ФГУП|МУП|ГБУ|ГУП)\s+'
+    r'(?:["«“][^"»”\n]{1,80}["»”]|[А-ЯЁA-Z][\w-]*(?:\s+[А-ЯЁA-Z]\.\s?[А-ЯЁA-Z]\.?)?))'
+)
+
+MIN_MONTHLY = {'RUB': 5000, 'USD': 100, 'EUR': 100}
+MAX_MONTHLY = {'RUB': 3000000, 'USD': 50000, 'EUR': 50000}
+
+
+def _to_int(number, multiplier):
+    number = re.sub(r'[   ]', '', number)
+    if re.fullmatch(r'\d{1,3}(?:\.\d{3})+', number):
+        number = number.replace('.', '')
+    value = float(number.replace(',', '.'))
+    if (multiplier or '').strip():
+        value *= 1000
+    return int(value)
+
+
+def _currency(match):
+    marker = ' '.join(filter(None, (match.group('cur1'), match.group('cur2'), match.group('currency')))).lower()
+    if '$' in marker or 'usd' in marker or 'долл' in marker:
+        return 'USD'
+    if '€' in marker or 'eur' in marker or 'евро' in marker:
+        return 'EUR'
+    return 'RUB'
+
+
+def extract_salary(text):
+    """
+    Salary range of a post.
+
+    Returns:
+        tuple: (salary_min, salary_max, currency), (None, None, None) if none found
+    """
+    for line in PHONE_RE.sub(' ', text).splitlines():
+        has_keyword = SALARY_KEYWORD_RE.search(line) is not None
+        for match in SALARY_RE.finditer(line):
+            explicit = match.group('currency').strip() or match.group('cur1') or match.group('cur2') \
+                or match.group('mul_a').strip() or match.group('mul_b')
+            if not (has_keyword or explicit):
+                continue
+            if NOT_MONTHLY_RE.match(line[match.end():]):
+                continue
+
+            currency = _currency(match)
+            # "от 50 до 80 тыс.": the multiplier of the upper bound applies to both
+            mul_a = match.group('mul_a') or (match.group('mul_b') if match.group('b') else '')
+            low = _to_int(match.group('a'), mul_a)
+            high = _to_int(match.group('b'), match.group('mul_b')) if match.group('b') else None
+            if not MIN_MONTHLY[currency] <= low <= MAX_MONTHLY[currency]:
+                continue
+            if high is not None and not (low <= high <= MAX_MONTHLY[currency]):
+                high = None
+
+            prefix = (match.group('prefix') or '').strip().lower()
+            if high is None and prefix == 'до':
+                return None, low, currency
+            return low, high, currency
+    return None, None, None
+
+
+def extract_city(text):
+    """Canonical city name from the gazetteer, None if no city is mentioned."""
+    first = None
+    for match in CITY_RE.finditer(text):
+        city = _CITY_GROUPS[match.lastgroup]
+        preceding = text[max(0, match.start() - 20):match.start()]
+        if CITY_LABEL_RE.search(preceding):
+            return city
+        if first is None:
+            first = city
+    return first
+
+
+def extract_company(text):
+    """Employer name, None if not found."""
+    match = COMPANY_LABEL_RE.search(text)
+    if match:
+        return match.group('name').strip(' .,')[:100] or None
+    match = COMPANY_FORM_RE.search(text)
+    if match:
+        return ' '.join(match.group('name').split())[:100]
+    return None
+
+
+def extract_vacancy(text):
+    """
+    Extract the structured fields of a vacancy post.
+
+    Args:
+        text (str): Post content
+
+    Returns:
+        dict: city, salary_min, salary_max, salary_currency and company_name
+    """
+    text = text or ''
+    salary_min, salary_max, currency = extract_salary(text)
+    return {
+        'city': extract_city(text),
+        'salary_min': salary_min,
+        'salary_max': salary_max,
+        'salary_currency': currency,
+        'company_name': extract_company(text),
+    }
+
+
+def extract_batch(rows):
+    """Extract a batch of (id, content) rows; runs in backfill worker processes."""
+    return [(post_id, extract_vacancy(content)) for post_id, content in rows]
+
+
+def city_choices():
+    """City names for filter forms."""
+    return sorted(CITY_GAZETTEER)
+
+
+def backfill(workers=None, batch_size=2000, force=False, log=print):
+    """
+    Extract the vacancy fields of stored posts in parallel.
+
+    The main process reads (id, content) batches by keyset pagination and
+    writes the results with one executemany UPDATE per batch; regex work
+    runs in ``workers`` processes. Posts already at EXTRACTOR_VERSION are
+    skipped unless ``force`` is set, so an interrupted run can be resumed.
+
+    Returns:
+        int: Number of updated posts
+    """
+    from models.post import Post
+
+    posts = Post.__table__
+    workers = workers or os.cpu_count() or 1
+    criteria = [] if force else [posts.c.extraction_version < EXTRACTOR_VERSION]
+    # Keyed on telegram_date too, so partitioned tables update one partition per row
+    statement = posts.update().where(
+        posts.c.id == bindparam('_id'), posts.c.telegram_date == bindparam('_telegram_date')
+    ).values(
+        city=bindparam('city'), salary_min=bindparam('salary_min'), salary_max=bindparam('salary_max'),
+        salary_currency=bindparam('salary_currency'), company_name=bindparam('company_name'),
+        extraction_version=EXTRACTOR_VERSION
+    )
+
+    def write(future, dates):
+        rows = [dict(fields, _id=post_id, _telegram_date=dates[post_id]) for post_id, fields in future.result()]
+        db.session.execute(statement, rows)
+        db.session.commit()
+        return len(rows)
+
+    total = 0
+    last_id = 0
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            rows = db.session.execute(
+                select(posts.c.id, posts.c.content, posts.c.telegram_date)
+                .where(posts.c.id > last_id, *criteria).order_by(posts.c.id).limit(batch_size)
+            ).all()
+            db.session.commit()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            dates = {row.id: row.telegram_date for row in rows}
+            pending.append((pool.submit(extract_batch, [(row.id, row.content) for row in rows]), dates))
+
+            # Keep every worker busy without holding the whole table in memory
+            while len(pending) >= workers * 2:
+                total += write(*pending.popleft())
+                log(f'Extracted {total} posts')
+
+        while pending:
+            total += write(*pending.popleft())
+            log(f'Extracted {total} posts')
+    return total
@@ -66,6 +66,9 @@ document.addEventListener('DOMContentLoaded', function() {
     // Initialize post card clicks
     initializePostCardClicks();
     
+    // Subscribe to newly ingested posts
+    initializeLiveUpdates();
+    
     // Also try to initialize after a small delay to handle dynamic content
     setTimeout(function() {
         console.log('Secondary initialization after delay...');
@@ -168,3 +171,43 @@ function openPostModal(postCard) {
         alert('Ошибка при открытии модального окна: ' + error.message);
     }
 }
+
+// Live updates: prepend newly ingested posts streamed over Server-Sent Events
+function initializeLiveUpdates() {
+    const container = document.querySelector('.posts-container[data-live-stream-url]');
+    if (!container || typeof EventSource === 'undefined') {
+        return;
+    }
+    
+    const hideDuplicates = container.dataset.hideDuplicates === 'true';
+    const source = new EventSource(container.dataset.liveStreamUrl);
+    
+    source.addEventListener('post', function(e) {
+        const post = JSON.parse(e.data);
+        
+        if (hideDuplicates && post.duplicate_group_id && !post.is_primary_duplicate) {
+            return;
+        }
+        if (container.querySelector(`.post-card[data-post-id="${post.id}"]`)) {
+            return;
+        }
+        
+        // Cards are rendered by the server so they match the rest of the page
+        fetch(`/post/${post.id}/card`)
+            .then(response => response.ok ? response.text() : Promise.reject(response.status))
+            .then(html => {
+                const template = document.createElement('template');
+                template.innerHTML = html.trim();
+                const card = template.content.firstElementChild;
+                if (card) {
+                    container.prepend(card);
+                    initializePostCardClicks();
+                }
+            })
+            .catch(error => console.warn('Could not load live post', post.id, error));
+    });
+    
+    source.onerror = function() {
+        console.warn('Live updates connection lost, browser will reconnect');
+    };
+}
@@ -0,0 +1,49 @@
+"""
+Shared fixtures: the application against a temporary SQLite database.
+"""
+import os
+
+import pytest
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    os.environ['PROCESS_ROLE'] = 'cli'
+    os.environ['DATABASE_URL'] = f"sqlite:///{tmp_path_factory.mktemp('db') / 'test.db'}"
+    from app import app
+    return app
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(app, app_context, client):
+    """Create a user and log the test client in as them; users are deleted afterwards"""
+    from core.extensions import db
+    from models.user import User, UserRole
+
+    created = []
+
+    def login(username='reader', admin=False):
+        user = User(username, f'{username}@example.com', 'secret-password',
+                    role=UserRole.ADMIN if admin else UserRole.USER)
+        db.session.add(user)
+        db.session.commit()
+        created.append(user)
+        response = client.post('/auth/login', data={'username': username, 'password': 'secret-password'})
+        assert response.status_code == 302
+        return user
+
+    yield login
+    for user in created:
+        db.session.delete(user)
+    db.session.commit()
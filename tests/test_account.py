@@ -0,0 +1,65 @@
+"""
+Tests for the account pages: registration, subscriptions and the "my feed" timeline.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from core.extensions import db
+from models.category import Category
+from models.feed import Feed
+from models.post import Post
+from models.timeline_entry import TimelineEntry
+from models.user import User
+from models.user_subscription import UserSubscription
+from services.timeline import timeline
+
+
+@pytest.fixture
+def category_feed(app_context):
+    category = Category('account_test', 'Account test')
+    db.session.add(category)
+    db.session.flush()
+    feed = Feed(name='Account feed', url='https://t.me/account_feed', telegram_channel_id='-1009100000000')
+    feed.category_id = category.id
+    db.session.add(feed)
+    db.session.commit()
+    yield category, feed
+    TimelineEntry.query.filter(TimelineEntry.post_id.in_(
+        db.session.query(Post.id).filter_by(feed_id=feed.id))).delete(synchronize_session=False)
+    Post.query.filter_by(feed_id=feed.id).delete()
+    UserSubscription.query.filter_by(category_id=category.id).delete()
+    db.session.delete(feed)
+    db.session.delete(category)
+    db.session.commit()
+
+
+def test_account_pages_need_a_login(client):
+    response = client.get('/account/feed')
+    assert response.status_code == 302
+    assert '/auth/login' in response.headers['Location']
+
+
+def test_register_logs_the_user_in(client, app_context):
+    response = client.post('/auth/register', data={
+        'username': 'new_reader', 'email': 'new_reader@example.com', 'password': 'secret-password'
+    })
+    assert response.status_code == 302
+    assert client.get('/account/subscriptions').status_code == 200
+    db.session.delete(User.get_by_username('new_reader'))
+    db.session.commit()
+
+
+def test_subscribing_fills_my_feed(client, login, category_feed):
+    category, feed = category_feed
+    user = login('feed_reader')
+    db.session.add(Post(1, 'fanned out post', feed.id, datetime.utcnow() - timedelta(hours=1)))
+    db.session.commit()
+
+    response = client.post('/account/subscriptions/add', data={'category_id': category.id})
+    assert response.status_code == 302
+    assert timeline.store.count(user.id) == 1
+
+    response = client.get('/account/feed')
+    assert response.status_code == 200
+    assert 'fanned out post' in response.get_data(as_text=True)
@@ -0,0 +1,55 @@
+"""
+Tests for the admin pages: access control and rendering.
+"""
+import pytest
+
+from core.extensions import db
+from models.feed import Feed
+from models.post import Post
+
+
+@pytest.fixture
+def telegram_feed(app_context):
+    from datetime import datetime
+    feed = Feed(name='Admin feed', url='https://t.me/admin_feed', telegram_channel_id='-1009000000000')
+    db.session.add(feed)
+    db.session.commit()
+    db.session.add(Post(1, 'post', feed.id, datetime.utcnow()))
+    db.session.commit()
+    yield feed
+    Post.query.filter_by(feed_id=feed.id).delete()
+    db.session.delete(feed)
+    db.session.commit()
+
+
+def test_admin_pages_need_an_admin(client, login):
+    response = client.get('/admin/telegram-bot')
+    assert response.status_code == 302
+    assert '/auth/login' in response.headers['Location']
+
+    login('plain_user')
+    assert client.get('/admin/telegram-bot').status_code == 403
+
+
+def test_telegram_bot_page_renders(client, login, telegram_feed):
+    login('admin_user', admin=True)
+    response = client.get('/admin/telegram-bot')
+    assert response.status_code == 200
+    assert b'Admin feed' in response.data
+
+
+def test_telegram_bot_page_shows_channel_health(client, login, telegram_feed):
+    from models.channel_health import ChannelHealth, HealthStatus
+
+    health = ChannelHealth(telegram_feed.id, HealthStatus.NOT_ADMIN)
+    health.member_status = 'left'
+    db.session.add(health)
+    db.session.commit()
+    try:
+        login('health_admin', admin=True)
+        response = client.get('/admin/telegram-bot')
+        assert response.status_code == 200
+        assert b'not_admin' in response.data
+    finally:
+        db.session.delete(health)
+        db.session.commit()
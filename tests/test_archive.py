@@ -0,0 +1,67 @@
+"""
+Tests for archive segments: replaced entries and frame reads.
+"""
+from datetime import datetime
+
+import pytest
+
+from services import archive
+
+
+@pytest.fixture
+def segment(app, app_context, tmp_path):
+    path = str(tmp_path / 'feed_1' / '2024-01.jsonl.gz')
+    yield archive.Segment(1, '2024-01', path)
+    archive._decoded.pop(path, None)
+
+
+def row(post_id, message_id, content, day=1):
+    return {'id': post_id, 'feed_id': 1, 'telegram_message_id': message_id, 'content': content,
+            'telegram_date': datetime(2024, 1, day)}
+
+
+def test_archiving_a_message_again_replaces_its_entry(segment):
+    segment.append([row(1, 10, 'first'), row(2, 11, 'other', day=2)])
+    assert [r['content'] for r in segment.read()] == ['other', 'first']
+
+    segment.append([row(1, 10, 'edited')])
+    assert segment.count == 2
+    assert [r['content'] for r in segment.read()] == ['other', 'edited']
+    assert segment.read_entry(segment.index['messages']['10'])['content'] == 'edited'
+
+
+def test_unindexed_bytes_are_skipped(segment):
+    segment.append([row(1, 10, 'first')])
+    # A crashed run wrote a frame but never indexed it
+    with open(segment.path, 'ab') as f:
+        f.write(archive.compress(b'not json\n', 'gzip'))
+    segment.append([row(2, 11, 'second', day=2)])
+    assert [r['content'] for r in segment.read()] == ['second', 'first']
+
+
+def test_restored_posts_leave_the_archive_with_insert_changes(app, app_context, tmp_path):
+    from core.extensions import db
+    from models.feed import Feed
+    from models.post import Post
+    from models.post_change import ChangeType, PostChange
+
+    app.config['ARCHIVE_DIR'] = str(tmp_path / 'archive')
+    feed = Feed(name='Restore feed', url='https://t.me/restore_feed', telegram_channel_id='-1009200000000')
+    db.session.add(feed)
+    db.session.commit()
+    db.session.add_all([Post(n, f'post {n}', feed.id, datetime(2024, 1, 1 + n)) for n in range(3)])
+    db.session.commit()
+    try:
+        assert archive.archive_posts(datetime(2024, 2, 1), feed_id=feed.id, log=lambda message: None) == 3
+        head = PostChange.get_head_id()
+
+        assert archive.restore(feed.id, log=lambda message: None) == 3
+        assert archive.count_archived(feed.id) == 0
+        assert Post.query.filter_by(feed_id=feed.id).count() == 3
+        changes = PostChange.get_since(head, 10, feed_id=feed.id)
+        assert [change.change_type for change in changes] == [ChangeType.INSERT] * 3
+    finally:
+        Post.query.filter_by(feed_id=feed.id).delete()
+        PostChange.query.filter_by(feed_id=feed.id).delete()
+        db.session.delete(feed)
+        db.session.commit()
@@ -0,0 +1,63 @@
+"""
+Tests for delta sync cursors.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from core.extensions import db
+from models.post_change import PostChange, ChangeType
+from services import delta_sync
+
+
+@pytest.fixture
+def change_log(app_context):
+    PostChange.query.delete()
+    db.session.commit()
+    yield
+    PostChange.query.delete()
+    db.session.commit()
+
+
+def add_change(post_id, age_seconds):
+    change = PostChange(post_id=post_id, feed_id=1, change_type=ChangeType.DELETE)
+    change.created_at = datetime.utcnow() - timedelta(seconds=age_seconds)
+    db.session.add(change)
+    db.session.commit()
+    return change.id
+
+
+def test_cursor_stops_before_unsettled_changes(change_log):
+    settled = add_change(1, age_seconds=60)
+    add_change(2, age_seconds=0)
+
+    first = delta_sync.get_changes(delta_sync.encode_cursor(settled - 1))
+    assert first['deleted'] == [1, 2]
+    assert delta_sync.decode_cursor(first['next_cursor']) == settled
+    assert not first['has_more']
+
+    # The recent change is reported again until it settles
+    second = delta_sync.get_changes(first['next_cursor'])
+    assert second['deleted'] == [2]
+
+
+def test_new_cursor_starts_at_settled_head(change_log):
+    settled = add_change(1, age_seconds=60)
+    add_change(2, age_seconds=0)
+    assert delta_sync.decode_cursor(delta_sync.get_changes()['next_cursor']) == settled
+
+
+def test_prune_keeps_newest_change(change_log):
+    old = add_change(1, age_seconds=3600)
+    newest = add_change(2, age_seconds=3600)
+    PostChange.prune(datetime.utcnow())
+    assert PostChange.get_tail_id() == newest
+
+    with pytest.raises(delta_sync.CursorExpired):
+        delta_sync.get_changes(delta_sync.encode_cursor(old - 1))
+    assert delta_sync.get_changes(delta_sync.encode_cursor(newest))['deleted'] == []
+
+
+def test_cursor_past_empty_log_expires(change_log):
+    with pytest.raises(delta_sync.CursorExpired):
+        delta_sync.get_changes(delta_sync.encode_cursor(42))
@@ -0,0 +1,77 @@
+"""
+Tests for the history import queue and its duplicate checks.
+"""
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from bench.fakes import FakeHistoryClient
+from core.extensions import db
+from models.feed import Feed
+from models.feed_backfill import FeedBackfill
+from models.post import Post
+from services import archive
+from services.history_backfill import HistoryBackfill
+
+
+@pytest.fixture
+def feeds(app, app_context, tmp_path):
+    app.config['ARCHIVE_DIR'] = str(tmp_path / 'archive')
+    feeds = [Feed(name=f'History {n}', url=f'https://t.me/history_{n}', telegram_channel_id=str(-1007000000000 - n))
+             for n in range(2)]
+    db.session.add_all(feeds)
+    db.session.commit()
+    yield feeds
+    for feed in feeds:
+        Post.query.filter_by(feed_id=feed.id).delete()
+        FeedBackfill.query.filter_by(feed_id=feed.id).delete()
+        db.session.delete(feed)
+    db.session.commit()
+
+
+def make_backfill(app, client):
+    backfill = HistoryBackfill(app)
+    backfill.limits.rates = {'default': 0}
+    backfill.available = lambda interactive=False: True
+    clients = []
+
+    def make_client():
+        clients.append(client)
+        return client
+
+    backfill.make_client = make_client
+    return backfill, clients
+
+
+def test_feeds_added_during_an_import_share_one_client(app, feeds):
+    client = FakeHistoryClient({feed.telegram_channel_id: 150 for feed in feeds}, latency=0.01)
+    backfill, clients = make_backfill(app, client)
+
+    async def scenario():
+        backfill.start([feeds[0].id])
+        await asyncio.sleep(0.02)
+        backfill.start([feeds[1].id])
+        while backfill._pending or client.started:
+            await asyncio.sleep(0.01)
+        await backfill.close()
+
+    asyncio.run(scenario())
+    assert len(clients) == 1
+    assert not client.started
+    for feed in feeds:
+        assert Post.query.filter_by(feed_id=feed.id).count() == 150
+
+
+def test_archived_messages_are_not_imported_again(app, feeds):
+    feed = feeds[0]
+    client = FakeHistoryClient({feed.telegram_channel_id: 50})
+    backfill, _ = make_backfill(app, client)
+    asyncio.run(backfill.run([feed.id], client=client))
+    assert archive.archive_posts(datetime.utcnow(), feed_id=feed.id, log=lambda message: None) == 50
+
+    db.session.delete(db.session.get(FeedBackfill, feed.id))
+    db.session.commit()
+    results = asyncio.run(backfill.run([feed.id], client=client))
+    assert results == {feed.id: 0}
+    assert Post.query.filter_by(feed_id=feed.id).count() == 0
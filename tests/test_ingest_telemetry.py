@@ -0,0 +1,25 @@
+"""
+Tests for the ingest lag alert.
+"""
+import logging
+from datetime import datetime
+from types import SimpleNamespace
+
+from services.ingest_telemetry import BUCKETS, IngestTelemetry
+
+
+def test_lag_alert_fires_once_per_window_and_feed(caplog):
+    telemetry = IngestTelemetry()
+    telemetry.alert_seconds = 60
+    buckets = [0] * (len(BUCKETS) + 1)
+    buckets[BUCKETS.index(300)] = 10
+    window = datetime(2024, 1, 1, 12, 0)
+
+    with caplog.at_level(logging.WARNING, logger='services.ingest_telemetry'):
+        for _ in range(5):
+            # Every flush of a window re-checks its merged stat
+            telemetry._check_alert(1, SimpleNamespace(buckets=buckets, count=10, max_seconds=250,
+                                                      window_start=window))
+        telemetry._check_alert(2, SimpleNamespace(buckets=buckets, count=10, max_seconds=250,
+                                                  window_start=window))
+    assert len(caplog.records) == 2
@@ -0,0 +1,53 @@
+"""
+Tests for duplicate grouping in the post pipeline.
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from core.extensions import db
+from models.feed import Feed
+from models.post import Post
+
+TEXT = 'Требуется водитель категории C, оплата еженедельно'
+NOW = datetime(2026, 10, 1, 12, 0)
+
+
+@pytest.fixture
+def feed(app_context):
+    feed = Feed(name='Pipeline test', url='https://t.me/pipeline_test')
+    db.session.add(feed)
+    db.session.commit()
+    yield feed
+    Post.query.filter_by(feed_id=feed.id).delete()
+    db.session.delete(feed)
+    db.session.commit()
+
+
+def make_post(feed, message_id, telegram_date, content=TEXT):
+    return Post(telegram_message_id=message_id, content=content, feed_id=feed.id, telegram_date=telegram_date)
+
+
+def test_older_post_inserted_later_becomes_primary(feed):
+    newer = make_post(feed, 2, NOW)
+    db.session.add(newer)
+    db.session.commit()
+    older = make_post(feed, 1, NOW - timedelta(days=1))
+    db.session.add(older)
+    db.session.commit()
+    db.session.refresh(newer)
+
+    assert older.duplicate_group_id is not None
+    assert newer.duplicate_group_id == older.duplicate_group_id
+    assert older.is_primary_duplicate
+    assert not newer.is_primary_duplicate
+
+
+def test_same_hash_posts_of_one_flush_are_grouped(feed):
+    posts = [make_post(feed, n, NOW.replace(tzinfo=timezone.utc) - timedelta(hours=n)) for n in range(1, 4)]
+    db.session.add_all(posts)
+    db.session.commit()
+
+    groups = {post.duplicate_group_id for post in posts}
+    assert len(groups) == 1 and None not in groups
+    assert [post.is_primary_duplicate for post in posts] == [False, False, True]
@@ -0,0 +1,28 @@
+"""
+Tests for adding model columns and indexes to existing tables.
+"""
+from sqlalchemy import inspect, text
+
+from core.extensions import db
+from services import schema
+
+
+def test_upgrade_adds_missing_columns_and_indexes(app, app_context):
+    # A database created before the vacancy fields and chat linking
+    with db.engine.begin() as connection:
+        connection.execute(text('DROP INDEX ix_posts_salary_max'))
+        connection.execute(text('ALTER TABLE posts DROP COLUMN salary_max'))
+        connection.execute(text('ALTER TABLE posts DROP COLUMN extraction_version'))
+        connection.execute(text('ALTER TABLE users DROP COLUMN telegram_chat_id'))
+    try:
+        statements = schema.pending_changes()
+        assert len(statements) == 4
+        # Rows already stored get the model default
+        assert any(statement.endswith('extraction_version SMALLINT DEFAULT 0 NOT NULL') for statement in statements)
+    finally:
+        assert schema.upgrade(log=lambda statement: None) == 4
+
+    inspector = inspect(db.engine)
+    assert 'telegram_chat_id' in {column['name'] for column in inspector.get_columns('users')}
+    assert 'ix_posts_salary_max' in {index['name'] for index in inspector.get_indexes('posts')}
+    assert schema.pending_changes() == []
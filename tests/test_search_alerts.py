@@ -0,0 +1,40 @@
+"""
+Tests for the saved search matcher.
+"""
+from datetime import datetime
+
+from core.extensions import db
+from models.saved_search import SavedSearch
+from services.search_alerts import SavedSearchMatcher
+
+
+def test_refresh_without_saved_searches(app_context):
+    matcher = SavedSearchMatcher()
+    matcher.refresh()
+    assert matcher._watermark is not None
+    assert matcher._watermark > datetime.min
+
+    # The second refresh looks back from the watermark
+    matcher.refresh()
+    assert len(matcher.index) == 0
+
+
+def test_searches_saved_through_the_account_page_are_matched(client, login):
+    user = login('search_owner')
+    matcher = SavedSearchMatcher()
+    matcher.load()
+
+    response = client.post('/account/searches/add', data={'name': 'Drivers', 'terms': 'водитель, москва'})
+    assert response.status_code == 302
+    assert 'водитель' in client.get('/account/searches').get_data(as_text=True)
+
+    matcher.refresh()
+    search = SavedSearch.query.filter_by(user_id=user.id).one()
+    assert matcher.match('Требуется водитель, Москва, график 2/2') == {search.id: user.id}
+
+    response = client.post(f'/account/searches/{search.id}/delete')
+    assert response.status_code == 302
+    matcher.refresh()
+    assert matcher.match('Требуется водитель, Москва, график 2/2') == {}
+    db.session.delete(search)
+    db.session.commit()
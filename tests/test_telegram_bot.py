@@ -0,0 +1,44 @@
+"""
+Tests for storing channel posts from the bot's worker threads.
+"""
+from datetime import datetime
+
+import pytest
+
+from core.extensions import db
+from models.feed import Feed
+from models.post import Post
+from services import telegram_bot as telegram_bot_module
+from services.ingest_telemetry import IngestTimer
+from services.telegram_bot import TelegramBot
+
+
+@pytest.fixture
+def feed(app_context):
+    feed = Feed(name='Bot feed', url='https://t.me/bot_feed', telegram_channel_id='-1009300000000')
+    db.session.add(feed)
+    db.session.commit()
+    yield feed
+    Post.query.filter_by(feed_id=feed.id).delete()
+    db.session.delete(feed)
+    db.session.commit()
+
+
+def test_side_effect_failures_do_not_fail_a_stored_post(app, feed, monkeypatch):
+    def broken(post):
+        raise RuntimeError('live feed is down')
+
+    fanned_out = []
+    monkeypatch.setattr(telegram_bot_module.live_feed, 'publish_post', broken)
+    monkeypatch.setattr(telegram_bot_module, 'fan_out_post', lambda app, post_id, *args: fanned_out.append(post_id))
+
+    bot = TelegramBot()
+    bot.app = app
+    post_data = {
+        'feed_id': feed.id, 'telegram_message_id': 1, 'content': 'Ищем водителя', 'telegram_date': datetime.utcnow(),
+        'media_url': None, 'media_type': None, 'is_edited': False,
+    }
+    bot._store_post(post_data, False, IngestTimer())
+
+    post = Post.query.filter_by(feed_id=feed.id).one()
+    assert fanned_out == [post.id]
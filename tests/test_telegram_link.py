@@ -0,0 +1,35 @@
+"""
+Tests for linking accounts to their private chat with the bot.
+"""
+from core.extensions import db
+from models.user import User
+from services.telegram_link import link_chat, make_token, unlink_chat, verify_token
+
+
+def test_tokens_are_signed_and_expire():
+    token = make_token(42, 'secret', now=1_000_000)
+    assert len(token) <= 64
+    assert all(c.isalnum() or c in '_-' for c in token)
+    assert verify_token(token, 'secret', 3600, now=1_000_100) == 42
+    assert verify_token(token, 'other secret', 3600, now=1_000_100) is None
+    assert verify_token(token, 'secret', 3600, now=1_010_000) is None
+    assert verify_token(token.replace('42_', '43_', 1), 'secret', 3600, now=1_000_100) is None
+    assert verify_token('garbage', 'secret', 3600) is None
+    assert verify_token('1_2_ж', 'secret', 3600) is None
+
+
+def test_start_links_the_chat_and_stop_unlinks_it(app, client, login):
+    app.config['TELEGRAM_BOT_USERNAME'] = 'feed_test_bot'
+    user = login('chat_owner')
+    page = client.get('/account/subscriptions').get_data(as_text=True)
+    assert 'https://t.me/feed_test_bot?start=' in page
+
+    token = make_token(user.id, app.config['SECRET_KEY'])
+    assert link_chat(app, token, 555).id == user.id
+    db.session.expire_all()
+    assert db.session.get(User, user.id).telegram_chat_id == 555
+    assert link_chat(app, token + 'x', 556) is None
+
+    assert unlink_chat(app, 555) == 1
+    db.session.expire_all()
+    assert db.session.get(User, user.id).telegram_chat_id is None
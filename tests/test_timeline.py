@@ -0,0 +1,73 @@
+"""
+Tests for timeline reads of removed posts.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from core.extensions import db
+from models.category import Category
+from models.feed import Feed
+from models.post import Post
+from models.timeline_entry import TimelineEntry
+from models.user import User
+from models.user_subscription import UserSubscription
+from services.timeline import DatabaseTimelineStore, Timeline
+
+
+@pytest.fixture
+def subscriber(app, app_context):
+    category = Category('timeline_test', 'Timeline test')
+    user = User('timeline_reader', 'timeline_reader@example.com', 'secret')
+    db.session.add_all([category, user])
+    db.session.flush()
+    feed = Feed(name='Timeline feed', url='https://t.me/timeline_feed', telegram_channel_id='-1008000000000')
+    feed.category_id = category.id
+    db.session.add_all([feed, UserSubscription(user.id, category.id)])
+    db.session.commit()
+    yield user, feed
+    TimelineEntry.query.filter_by(user_id=user.id).delete()
+    Post.query.filter_by(feed_id=feed.id).delete()
+    UserSubscription.query.filter_by(user_id=user.id).delete()
+    for row in (feed, user, category):
+        db.session.delete(row)
+    db.session.commit()
+
+
+def test_removed_posts_are_dropped_and_the_page_backfilled(app, subscriber):
+    user, feed = subscriber
+    started = datetime.utcnow() - timedelta(days=1)
+    posts = [Post(n, f'post {n}', feed.id, started + timedelta(minutes=n)) for n in range(10)]
+    db.session.add_all(posts)
+    db.session.commit()
+
+    timeline = Timeline()
+    timeline.app = app
+    timeline.store = DatabaseTimelineStore(800)
+    timeline._large_categories, timeline._large_categories_at = set(), float('inf')
+    for post in posts:
+        timeline.store.push([user.id], post.id, post.telegram_date)
+
+    # Removed without touching timelines, like archiving or retention does
+    newest = [post.id for post in posts[-4:]]
+    db.session.execute(Post.__table__.delete().where(Post.id.in_(newest)))
+    db.session.commit()
+
+    page, total = timeline.read(user.id, 0, 3)
+    assert [post.content for post in page] == ['post 5', 'post 4', 'post 3']
+    assert total == 6
+    assert timeline.store.count(user.id) == 6
+
+
+def test_trim_deletes_entries_of_removed_posts(app, subscriber):
+    user, feed = subscriber
+    post = Post(1, 'post', feed.id, datetime.utcnow())
+    db.session.add(post)
+    db.session.commit()
+    store = DatabaseTimelineStore(800)
+    store.push([user.id], post.id, post.telegram_date)
+
+    db.session.delete(post)
+    db.session.commit()
+    assert store.trim() == 1
+    assert store.count(user.id) == 0
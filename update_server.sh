@@ -17,9 +17,13 @@ mv telegram_feed_website telegram-feed-app
 chown -R root:root telegram-feed-app
 chmod +x telegram-feed-app/*.sh
 
-# Start containers
+# Build, then add new model columns and indexes to the existing tables before the app starts
 cd telegram-feed-app
-docker compose up -d --build
+docker compose build
+docker compose run --rm -e PROCESS_ROLE=cli web flask schema upgrade
+
+# Start containers
+docker compose up -d
 
 # Check status
 docker compose ps